@@ -80,10 +80,9 @@ async def admin_client_history_handler(callback: CallbackQuery, config: dict, db
     if page < 0:
         page = 0
 
-    history = db_manager.get_user_bookings(user_id, active_only=False)
-    total = len(history)
+    total = db_manager.count_client_orders(user_id)
     offset = page * page_size
-    items = history[offset: offset + page_size]
+    items = db_manager.get_client_history(user_id, limit=page_size, offset=offset)
 
     text = f"📚 <b>История клиента</b>\n\nВсего заказов: {total}\n\n"
     if not items:
@@ -5,9 +5,11 @@
 from datetime import datetime, timedelta
 
 from aiogram import F
-from aiogram.types import Message, BufferedInputFile
+from aiogram.types import Message, BufferedInputFile, InlineKeyboardMarkup
 from aiogram.fsm.context import FSMContext
 
+from admin_bot.handlers.stats import ANALYTICS_BUTTON
+
 
 async def reply_stats_handler(message: Message, state: FSMContext, config: dict, db_manager):
     """Подробная статистика"""
@@ -31,7 +33,7 @@ async def reply_stats_handler(message: Message, state: FSMContext, config: dict,
     for i, (service, count) in enumerate(stats_month['top_services'][:5], 1):
         text += f"{i}. {service} ({count} шт.)\n"
 
-    await message.answer(text)
+    await message.answer(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=[[ANALYTICS_BUTTON]]))
 
 
 async def reply_orders_today_handler(message: Message, db_manager, config: dict):
@@ -24,8 +24,7 @@ async def admin_order_detail_handler(callback: CallbackQuery, config: dict, db_m
         return
 
     user_id = order.get('user_id')
-    history = db_manager.get_user_bookings(user_id, active_only=False) if user_id else []
-    visits = len(history)
+    visits = db_manager.count_client_orders(user_id) if user_id else 0
 
     booking_date = order.get('booking_date')
     try:
@@ -6,10 +6,21 @@ import logging
 from datetime import datetime, timedelta
 
 from aiogram import F
-from aiogram.types import CallbackQuery, BufferedInputFile, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.filters import Command, CommandObject
+from aiogram.types import CallbackQuery, BufferedInputFile, InlineKeyboardMarkup, InlineKeyboardButton, Message
+
+from utils.analytics import DEFAULT_PERIOD, PERIODS, cube_screen
+from utils.latency import get_latency_registry
+from utils.query_trace import get_query_tracer
+from utils.timeseries import trend_report
+from utils.utilisation import UTILISATION_PERIODS, utilisation_report
 
 logger = logging.getLogger(__name__)
 
+# Ограничение Telegram на callback_data
+CALLBACK_DATA_LIMIT = 64
+ANALYTICS_BUTTON = InlineKeyboardButton(text="📈 Аналитика по мастерам и услугам", callback_data="admin_cube:month::")
+
 
 async def admin_stats_handler(callback: CallbackQuery, config: dict, db_manager):
     """Обработчик статистики"""
@@ -34,7 +45,7 @@ async def admin_stats_handler(callback: CallbackQuery, config: dict, db_manager)
     for i, (service, count) in enumerate(stats_month['top_services'][:5], 1):
         text += f"{i}. {service} ({count} шт.)\n"
 
-    await callback.message.edit_text(text)
+    await callback.message.edit_text(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=[[ANALYTICS_BUTTON]]))
     await callback.answer()
 
 
@@ -74,6 +85,7 @@ async def admin_stats_period_handler(callback: CallbackQuery, config: dict, db_m
     text = f"{title}\n\n📦 Заказов: {total_orders}\n💰 Выручка: {total_revenue}₽\n📈 Средний чек: {avg_check}₽\n👥 Уникальных клиентов: {unique_clients}"
 
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [ANALYTICS_BUTTON],
         [InlineKeyboardButton(text="🔙 Назад к заказам", callback_data=f"admin_orders_page:{period}:0")],
     ])
 
@@ -104,8 +116,103 @@ async def admin_export_csv_handler(callback: CallbackQuery, config: dict, db_man
         await callback.answer("❌ Ошибка экспорта", show_alert=True)
 
 
+def _cube_data(period: str, master=None, service=None) -> str:
+    return f"admin_cube:{period}:{master or ''}:{service or ''}"
+
+
+def _cube_keyboard(period: str, master, service, drill: list) -> InlineKeyboardMarkup:
+    """Переходы вглубь, выбор периода и шаг назад"""
+    rows = []
+    for label, drill_master, drill_service in drill:
+        data = _cube_data(period, drill_master, drill_service)
+        if len(data.encode()) <= CALLBACK_DATA_LIMIT:
+            rows.append([InlineKeyboardButton(text=label, callback_data=data)])
+    periods = [
+        InlineKeyboardButton(text=("• " if key == period else "") + label, callback_data=_cube_data(key, master, service))
+        for key, (label, _, _) in PERIODS.items()
+    ]
+    rows += [periods[:3], periods[3:]]
+    if service is not None:
+        rows.append([InlineKeyboardButton(text="🔙 К услугам", callback_data=_cube_data(period, master))])
+    elif master is not None:
+        rows.append([InlineKeyboardButton(text="🔙 К мастерам", callback_data=_cube_data(period))])
+    else:
+        rows.append([InlineKeyboardButton(text="⏱ Загрузка мастеров", callback_data="admin_util:month")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def _utilisation_keyboard(period: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=("• " if key == period else "") + label, callback_data=f"admin_util:{key}")
+         for key, label in UTILISATION_PERIODS.items()],
+        [InlineKeyboardButton(text="🔙 К аналитике", callback_data=_cube_data(DEFAULT_PERIOD))],
+    ])
+
+
+async def admin_analytics_handler(message: Message, config: dict, db_manager):
+    """Выручка, записи, отмены и часы по мастерам за 30 дней (/analytics)"""
+    text, drill = cube_screen(db_manager, config)
+    await message.answer(text, reply_markup=_cube_keyboard(DEFAULT_PERIOD, None, None, drill))
+
+
+async def admin_cube_handler(callback: CallbackQuery, config: dict, db_manager):
+    """Переход по кубу: admin_cube:<период>:<мастер>:<услуга> (пусто — не выбран)"""
+    _, period, master, service = (callback.data.split(":", 3) + ["", "", ""])[:4]
+    period = period if period in PERIODS else DEFAULT_PERIOD
+    master, service = master or None, service or None
+    text, drill = cube_screen(db_manager, config, period, master, service)
+    try:
+        await callback.message.edit_text(text, reply_markup=_cube_keyboard(period, master, service, drill))
+    except Exception as e:
+        # Тот же экран (повторное нажатие) Telegram не даёт отредактировать
+        logger.debug("Analytics screen not updated: %s", e)
+    await callback.answer()
+
+
+async def admin_utilisation_handler(message: Message, command: CommandObject, config: dict, db_manager):
+    """Загрузка мастеров: /utilisation — 30 дней, /utilisation quarter | next"""
+    period = (command.args or '').strip().lower()
+    period = period if period in UTILISATION_PERIODS else 'month'
+    await message.answer(utilisation_report(config, db_manager, period), reply_markup=_utilisation_keyboard(period))
+
+
+async def admin_utilisation_callback(callback: CallbackQuery, config: dict, db_manager):
+    """Загрузка мастеров за выбранный период (admin_util:<период>)"""
+    period = callback.data.split(":", 1)[1]
+    period = period if period in UTILISATION_PERIODS else 'month'
+    try:
+        await callback.message.edit_text(utilisation_report(config, db_manager, period),
+                                         reply_markup=_utilisation_keyboard(period))
+    except Exception as e:
+        logger.debug("Utilisation screen not updated: %s", e)
+    await callback.answer()
+
+
+async def admin_latency_handler(message: Message):
+    """Задержки обработки: p50 / p95 / p99 по обработчикам, middlewares и БД"""
+    await message.answer(get_latency_registry().report())
+
+
+async def admin_sql_handler(message: Message):
+    """Самые затратные SQL-запросы по суммарному времени"""
+    await message.answer(get_query_tracer().report())
+
+
+async def admin_trend_handler(message: Message, command: CommandObject, db_manager):
+    """Тренд записей, отмен, обновлений и ошибок: /trend — по часам, /trend day — по дням"""
+    period = 'day' if (command.args or '').strip().lower() in ('day', 'days', 'дни') else 'hour'
+    await message.answer(trend_report(db_manager, period))
+
+
 def register_handlers(dp):
     """Регистрация обработчиков статистики"""
+    dp.message.register(admin_latency_handler, Command("latency"))
+    dp.message.register(admin_sql_handler, Command("sql"))
+    dp.message.register(admin_trend_handler, Command("trend"))
+    dp.message.register(admin_analytics_handler, Command("analytics"))
+    dp.message.register(admin_utilisation_handler, Command("utilisation"))
     dp.callback_query.register(admin_stats_handler, F.data == "admin_stats")
     dp.callback_query.register(admin_stats_period_handler, F.data.startswith("admin_stats_period:"))
     dp.callback_query.register(admin_export_csv_handler, F.data == "admin_export_csv")
+    dp.callback_query.register(admin_cube_handler, F.data.startswith("admin_cube:"))
+    dp.callback_query.register(admin_utilisation_callback, F.data.startswith("admin_util:"))
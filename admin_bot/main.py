@@ -6,6 +6,7 @@ BOT-BUSINESS V2.0 - Админ-панель
 
 import argparse
 import asyncio
+import contextlib
 import json
 import logging
 import logging.handlers
@@ -21,10 +22,10 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 
 from utils.db import DatabaseManager
 from utils.config_editor import ConfigEditor
+from utils.fsm_storage import create_fsm_storage
 
 from admin_bot.middleware import (
     AdminAuthMiddleware,
@@ -33,18 +34,29 @@ from admin_bot.middleware import (
     PinMiddlewareInjector,
 )
 from admin_bot.handlers import setup_handlers
+from middlewares import UserOrderingMiddleware
+from utils.analytics import configure_analytics
+from utils.health import HealthDaemon, serve_health
+from utils.latency import get_latency_registry
+from utils.lazy_router import lazy_router
 from utils.logger import setup_logger
-
-# Импортируем admin handlers (роутеры)
-from admin_handlers import (
-    services_editor,
-    settings_editor,
-    business_settings,
-    texts_editor,
-    notifications_editor,
-    promotions_editor,
+from utils.metrics import MetricsExporter, serve_metrics
+from utils.query_trace import configure_query_tracer
+from utils.rate_governor import get_rate_governor
+from utils.timeseries import build_recorder
+from utils.webhook import WebhookServer
+
+
+ADMIN_EDITOR_MODULES = (
+    'admin_handlers.services_editor',
+    'admin_handlers.settings_editor',
+    'admin_handlers.business_settings',
+    'admin_handlers.texts_editor',
+    'admin_handlers.notifications_editor',
+    'admin_handlers.staff',
+    'admin_handlers.promotions_editor',
 )
-from admin_handlers.staff import router as staff_router
+
 
 def load_config(config_path: str) -> dict:
     """Загрузка конфигурации"""
@@ -52,10 +64,42 @@ def load_config(config_path: str) -> dict:
         return json.load(f)
 
 
+def build_admin_dispatcher(config: dict, db_manager, config_path: str) -> Dispatcher:
+    """Диспетчер админ-бота со всеми middlewares и роутерами"""
+    config_editor = ConfigEditor(config_path)
+    logging.getLogger(__name__).info("✅ ConfigEditor initialized")
+
+    dp = Dispatcher(storage=create_fsm_storage(config, 'admin'))
+    latency = get_latency_registry(config)
+    latency.instrument_db(db_manager)
+    dp.update.outer_middleware(UserOrderingMiddleware.from_config(config))
+
+    # Подключаем middlewares
+    dp.update.middleware(latency.timed(AdminAuthMiddleware(config)))
+    pin_middleware = AdminPinMiddleware(config)
+    dp.update.middleware(latency.timed(pin_middleware))
+    dp.update.middleware(latency.timed(PinMiddlewareInjector(pin_middleware)))
+    dp.update.middleware(latency.timed(ConfigMiddleware(config, db_manager, config_editor)))
+
+    # Регистрируем handlers из модулей
+    setup_handlers(dp, pin_middleware)
+
+    # Подключаем роутеры из admin_handlers: редакторы импортируются при
+    # первом обращении к ним (триггеры — в utils/router_manifest.json)
+    for module in ADMIN_EDITOR_MODULES:
+        dp.include_router(lazy_router(module))
+
+    # Задержки обработчиков, middlewares и запросов к БД (/latency)
+    latency.instrument_dispatcher(dp)
+    return dp
+
+
 async def main():
     """Главная функция админ-бота"""
     parser = argparse.ArgumentParser(description='Admin Bot for Bot-Business V2.0')
     parser.add_argument('--config', type=str, required=True, help='Path to config JSON')
+    parser.add_argument('--webhook', action='store_true',
+                        help='Receive updates via webhook (config webhook / WEBHOOK_* env) instead of polling')
     args = parser.parse_args()
 
     # Настройка логгера
@@ -65,6 +109,8 @@ async def main():
     # Загрузка конфигурации
     try:
         config = load_config(args.config)
+        # Отдельный процесс — свой файл логов
+        setup_logger(config.get('logging'), name='admin')
         logger.info(f"✅ Config loaded: {config.get('business_name')}")
     except Exception as e:
         logging.error(f"❌ Failed to load config: {e}")
@@ -76,7 +122,8 @@ async def main():
         logger.error("❌ ADMIN_BOT_TOKEN not found in .env!")
         return
 
-    # Инициализация БД
+    # Инициализация БД (журнал медленных запросов включается до соединения)
+    configure_query_tracer(config)
     db_manager = DatabaseManager(config['business_slug'])
     try:
         logger.info(f"✅ Database ready: db_{config['business_slug']}.sqlite")
@@ -84,44 +131,49 @@ async def main():
         logger.error(f"❌ Database error: {e}")
         return
 
-    # Инициализация ConfigEditor
-    config_editor = ConfigEditor(args.config)
-    logger.info("✅ ConfigEditor initialized")
+    # Отмены и переносы из админки тоже обновляют куб аналитики
+    configure_analytics(config, db_manager)
 
     # Создаём бота и диспетчер
     bot = Bot(token=admin_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
-
-    # Подключаем middlewares
-    dp.update.middleware(AdminAuthMiddleware(config))
-    pin_middleware = AdminPinMiddleware(config)
-    dp.update.middleware(pin_middleware)
-    dp.update.middleware(PinMiddlewareInjector(pin_middleware))
-    dp.update.middleware(ConfigMiddleware(config, db_manager, config_editor))
-
-    # Регистрируем handlers из модулей
-    setup_handlers(dp, pin_middleware)
-
-    # Подключаем роутеры из admin_handlers
-    dp.include_router(services_editor.router)
-    dp.include_router(settings_editor.router)
-    dp.include_router(business_settings.router)
-    dp.include_router(texts_editor.router)
-    dp.include_router(notifications_editor.router)
-    dp.include_router(staff_router)
-    dp.include_router(promotions_editor.router)
+    bot.session.middleware(get_rate_governor(config))
+    dp = build_admin_dispatcher(config, db_manager, args.config)
+    exporter = MetricsExporter(get_latency_registry(config), get_rate_governor(config))
+    exporter.watch_bot('admin', dp, db_manager)
+    metrics_runner = await serve_metrics(config, exporter)
+    # Минутные точки метрик для тренда (/trend)
+    recorder = build_recorder(config, db_manager, [dp], get_latency_registry(config), get_rate_governor(config))
+    background = [asyncio.create_task(recorder.run())] if recorder else []
+    # Проверки работоспособности и /healthz (config health / HEALTH_PORT)
+    health = HealthDaemon.from_config(config, db_manager, {'admin': admin_token})
+    # Отдельный процесс админ-бота слушает порт клиентского + 1
+    health_runner = await serve_health(config, health, port_offset=1)
+    if health_runner is not None or os.getenv('WATCHDOG_USEC'):
+        background.append(asyncio.create_task(health.run()))
 
     logger.info(f"🚀 Admin Bot for '{config.get('business_name')}' started!")
 
     try:
-        await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot)
+        if args.webhook:
+            server = WebhookServer.from_config(config)
+            server.add_bot('admin', dp, bot)
+            exporter.watch_webhook(server)
+            await server.serve_forever()
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            await dp.start_polling(bot)
     except KeyboardInterrupt:
         logger.info("Received KeyboardInterrupt")
     except Exception as e:
         logger.error(f"❌ Error: {e}")
     finally:
+        for runner in (metrics_runner, health_runner):
+            if runner is not None:
+                await runner.cleanup()
+        for task in background:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
         db_manager.close()
         await bot.session.close()
         logger.info("🛑 Admin Bot stopped")
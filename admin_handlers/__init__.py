@@ -3,15 +3,7 @@ Package for all admin handlers.
 Содержит редакторы для админ-панели.
 """
 
-from . import (
-    staff,
-    services_editor,
-    settings_editor,
-    business_settings,
-    texts_editor,
-    notifications_editor,
-    promotions_editor,
-)
+# Модули подключаются лениво (utils.lazy_router): импорт пакета их не загружает
 
 __all__ = [
     'staff',
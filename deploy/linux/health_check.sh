@@ -9,6 +9,9 @@ CLIENT_SERVICE="digital-admin-client"
 ADMIN_SERVICE="digital-admin-admin"
 EXIT_CODE=0
 
+# Порт /healthz клиентского бота (админ-бот — порт + 1), см. utils/health.py
+HEALTH_PORT="${HEALTH_PORT:-$(grep -E '^HEALTH_PORT=' "$INSTALL_DIR/.env" 2>/dev/null | cut -d= -f2 | tr -d '"' || true)}"
+
 check_service() {
     local service=$1
     if systemctl is-active --quiet "$service"; then
@@ -19,6 +22,18 @@ check_service() {
     fi
 }
 
+# Кэшированный отчёт демона проверок: 0 — healthy, иначе проблема или недоступен
+check_healthz() {
+    local name=$1 port=$2 body
+    if body=$(curl -fsS --max-time 3 "http://127.0.0.1:${port}/healthz" 2>/dev/null); then
+        echo "✅ $name: healthy (/healthz)"
+    else
+        body=$(curl -sS --max-time 3 "http://127.0.0.1:${port}/healthz" 2>/dev/null || true)
+        echo "❌ $name: ${body:-/healthz not responding}"
+        EXIT_CODE=1
+    fi
+}
+
 check_db() {
     local db_path=$(ls -1 "$INSTALL_DIR"/db_*.sqlite 2>/dev/null | head -n 1)
     if [[ -z "$db_path" ]]; then
@@ -75,9 +90,15 @@ echo "=== Digital Admin Health Check ==="
 echo "Time: $(date)"
 echo
 
-check_service "$CLIENT_SERVICE"
-check_service "$ADMIN_SERVICE"
-check_db
+if [[ -n "$HEALTH_PORT" ]] && command -v curl >/dev/null 2>&1; then
+    # Сервисы, БД, WAL, outbox и Bot API проверяет сам процесс
+    check_healthz "$CLIENT_SERVICE" "$HEALTH_PORT"
+    check_healthz "$ADMIN_SERVICE" "$((HEALTH_PORT + 1))"
+else
+    check_service "$CLIENT_SERVICE"
+    check_service "$ADMIN_SERVICE"
+    check_db
+fi
 check_disk_space
 check_logs
 
@@ -4,14 +4,15 @@
 
 from aiogram import Router
 
-# Импортируем роутеры из всех модулей
+from utils.lazy_router import lazy_router
+
+# Импортируем роутеры из всех модулей («Мои записи» — при первом обращении)
 from .start import router as start_router
-from .mybookings import mybookings_router
 from .booking import all_booking_routers # Теперь импортируем единый роутер бронирования
 
 # Главный роутер, который будет подключен к диспетчеру
 all_routers = Router()
 
 all_routers.include_router(start_router)
-all_routers.include_router(mybookings_router)
+all_routers.include_router(lazy_router('handlers.mybookings'))
 all_routers.include_router(all_booking_routers)
@@ -9,6 +9,7 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
 from aiogram.fsm.context import FSMContext
 
 from states.booking import BookingState
+from .utils import release_slot_hold
 
 logger = logging.getLogger(__name__)
 
@@ -44,8 +45,9 @@ async def show_confirmation(message: Message, state: FSMContext):
 
 
 @router.callback_query(BookingState.confirmation, F.data == "cancel_booking_process")
-async def cancel_booking_process_callback(callback: CallbackQuery, state: FSMContext, config: dict):
+async def cancel_booking_process_callback(callback: CallbackQuery, state: FSMContext, config: dict, db_manager):
     """Отменяет процесс бронирования на этапе подтверждения."""
+    release_slot_hold(config, db_manager, state)
     await state.clear()
     cancel_message = config.get('messages', {}).get('booking_cancelled', "Запись отменена.")
     await callback.message.edit_text(cancel_message)
@@ -8,6 +8,7 @@ from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 
 from states.booking import BookingState
+from utils.privacy import mask_name, mask_phone
 from .confirmation import show_confirmation
 
 logger = logging.getLogger(__name__)
@@ -33,7 +34,7 @@ async def request_contact_info(callback_or_message, state: FSMContext, db_manage
 async def name_entered(message: Message, state: FSMContext):
     """Handles the user entering their name."""
     await state.update_data(name=message.text)
-    logger.info(f"User {message.from_user.id} entered name: {message.text}")
+    logger.info("User %s entered name: %s", message.from_user.id, mask_name(message.text))
     await message.answer("Теперь, пожалуйста, введите ваш номер телефона (например, +79123456789):")
     await state.set_state(BookingState.input_phone)
 
@@ -42,7 +43,7 @@ async def phone_entered(message: Message, state: FSMContext, db_manager):
     """Handles the user entering their phone number."""
     # Basic validation could be added here
     await state.update_data(phone=message.text)
-    logger.info(f"User {message.from_user.id} entered phone: {message.text}")
+    logger.info("User %s entered phone: %s", message.from_user.id, mask_phone(message.text))
     
     # Save/update user contact info in the database
     user_id = message.from_user.id
@@ -56,5 +57,5 @@ async def phone_entered(message: Message, state: FSMContext, db_manager):
 async def comment_entered(message: Message, state: FSMContext):
     """Handles the user entering a comment."""
     await state.update_data(comment=message.text)
-    logger.info(f"User {message.from_user.id} entered comment: {message.text}")
+    logger.info("User %s entered comment (%s chars)", message.from_user.id, len(message.text))
     await show_confirmation(message, state)
@@ -9,8 +9,11 @@ from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 
 from states.booking import BookingState
-from .keyboards import get_calendar_keyboard
-from .time import show_time_slots
+from utils.master_assignment import get_master_assigner
+from utils.slot_engine import get_slot_engine
+from .keyboards import get_calendar_keyboard, get_nearest_slots_keyboard
+from .time import show_time_slots, apply_time_selection
+from .utils import release_slot_hold
 
 logger = logging.getLogger(__name__)
 
@@ -59,8 +62,45 @@ async def calendar_callback_handler(callback: CallbackQuery, state: FSMContext,
             return
         
         await state.update_data(booking_date=selected_date.isoformat())
-        logger.info(f"User {callback.from_user.id} selected date: {selected_date.isoformat()}")
+        logger.info("User %s selected date: %s", callback.from_user.id, selected_date.isoformat())
         
         # Proceed to time selection
         await show_time_slots(callback, state, config, db_manager, selected_date)
         await callback.answer()
+
+
+@router.callback_query(BookingState.choosing_date, F.data == "nearest_slots")
+async def nearest_slots_handler(callback: CallbackQuery, state: FSMContext, db_manager, config: dict):
+    """Shows the nearest free slots across the booking horizon in one step."""
+    release_slot_hold(config, db_manager, state)
+    data = await state.get_data()
+    service_id = data.get('service_id')
+
+    if data.get('any_master'):
+        assigner = get_master_assigner(config, db_manager)
+        master_ids = [m['id'] for m in assigner.qualified_masters(service_id)]
+    elif data.get('master_id'):
+        master_ids = [data['master_id']]
+    else:
+        master_ids = None
+
+    slots = await get_slot_engine(config, db_manager).find_nearest_slots(service_id, master_ids)
+    if not slots:
+        await callback.answer("В ближайшие дни нет свободного времени", show_alert=True)
+        return
+
+    await callback.message.edit_text(
+        "⚡ Ближайшее свободное время:",
+        reply_markup=get_nearest_slots_keyboard(slots)
+    )
+    await callback.answer()
+
+@router.callback_query(BookingState.choosing_date, F.data.startswith("nearest:"))
+async def nearest_slot_selected(callback: CallbackQuery, state: FSMContext, db_manager, config: dict):
+    """Handles the selection of a slot from the nearest-slots keyboard."""
+    date_str, time_str = callback.data.split(":", 1)[1].split("T")
+    selected_date = date.fromisoformat(date_str)
+    logger.info("User %s selected nearest slot: %s %s", callback.from_user.id, date_str, time_str)
+
+    if await apply_time_selection(callback, state, config, db_manager, selected_date, time_str):
+        await callback.answer()
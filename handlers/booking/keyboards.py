@@ -95,6 +95,8 @@ def get_calendar_keyboard(year: int, month: int) -> InlineKeyboardMarkup:
         InlineKeyboardButton(text=">", callback_data=f"calendar:next-month:{year}:{month}:1")
     ]
     buttons.append(nav_row)
+
+    buttons.append([InlineKeyboardButton(text="⚡ Ближайшее свободное время", callback_data="nearest_slots")])
     
     # Back button
     buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data="back_to_master_choice")])
@@ -117,3 +119,21 @@ def get_time_slots_keyboard(slots: list) -> InlineKeyboardMarkup:
     buttons.append([InlineKeyboardButton(text="◀️ Назад к выбору даты", callback_data="back_to_date_choice")])
 
     return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+def get_nearest_slots_keyboard(slots: list) -> InlineKeyboardMarkup:
+    """Creates a keyboard with the nearest free slots across several days."""
+    week_days = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+    buttons = []
+    row = []
+    for slot_date, slot_time in slots:
+        text = f"{week_days[slot_date.weekday()]} {slot_date.strftime('%d.%m')} {slot_time}"
+        row.append(InlineKeyboardButton(text=text, callback_data=f"nearest:{slot_date.isoformat()}T{slot_time}"))
+        if len(row) == 2:
+            buttons.append(row)
+            row = []
+    if row:
+        buttons.append(row)
+
+    buttons.append([InlineKeyboardButton(text="◀️ Назад к выбору даты", callback_data="back_to_date_choice")])
+
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -39,17 +39,18 @@ async def master_selected(callback: CallbackQuery, state: FSMContext, config: di
     master_id = callback.data.split(":", 1)[1]
     
     if master_id == 'any':
-        await state.update_data(master_id=None, master_name="Любой")
+        # Конкретный мастер назначается при выборе времени (см. time.time_selected)
+        await state.update_data(master_id=None, master_name="Любой", any_master=True)
         master_name = "Любой мастер"
     else:
         master = get_master_by_id(config, master_id)
         if not master:
             await callback.answer("Мастер не найден", show_alert=True)
             return
-        await state.update_data(master_id=master_id, master_name=master['name'])
+        await state.update_data(master_id=master_id, master_name=master['name'], any_master=False)
         master_name = master['name']
 
-    logger.info(f"User {callback.from_user.id} selected master: {master_name}")
+    logger.info("User %s selected master: %s", callback.from_user.id, master_name)
 
     service_id = (await state.get_data()).get('service_id')
     service = next((s for s in config.get('services', []) if s['id'] == service_id), None)
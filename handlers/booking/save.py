@@ -8,15 +8,17 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from states.booking import BookingState
-from utils.notify import send_order_to_admins
+from utils.outbox import admin_notifications, wake_outbox
 from .keyboards import get_time_slots_keyboard
+from .time import get_available_slots
+from .utils import release_slot_hold
 
 logger = logging.getLogger(__name__)
 
 router = Router()
 
 @router.callback_query(BookingState.confirmation, F.data == "confirm_booking")
-async def confirm_booking_and_save(callback: CallbackQuery, state: FSMContext, config: dict, db_manager):
+async def confirm_booking_and_save(callback: CallbackQuery, state: FSMContext, config: dict, db_manager, scheduler=None):
     data = await state.get_data()
     if data.get('booking_confirmed'):
         await callback.answer("Запись уже создана", show_alert=True)
@@ -25,13 +27,25 @@ async def confirm_booking_and_save(callback: CallbackQuery, state: FSMContext, c
     await state.update_data(booking_confirmed=True)
 
     try:
-        order_id = await save_booking_to_db(data, callback.from_user.id, db_manager)
+        # Уведомление админам записывается в outbox в одной транзакции с заказом
+        notifications = build_admin_notifications(callback, config, data)
+        order_id = await save_booking_to_db(data, callback.from_user.id, db_manager, notifications)
+        wake_outbox(db_manager)
         db_manager.add_user(user_id=callback.from_user.id, username=callback.from_user.username, first_name=callback.from_user.first_name, last_name=callback.from_user.last_name)
-        logger.info(f"Booking confirmed: order_id={order_id}, user_id={callback.from_user.id}")
+        logger.info("Booking confirmed: order_id=%s, user_id=%s", order_id, callback.from_user.id)
+
+        if scheduler:
+            try:
+                scheduler.schedule_reminders(
+                    order_id, user_id=callback.from_user.id, booking_date=data.get('booking_date'),
+                    booking_time=data.get('booking_time'), service_name=data.get('service_name'),
+                )
+            except Exception as e:
+                logger.error(f"Error scheduling reminders for order {order_id}: {e}")
 
         await send_success_message(callback, state, config, db_manager, order_id)
-        await send_admin_notification(callback, config, data, order_id, db_manager)
 
+        release_slot_hold(config, db_manager, state)
         await state.clear()
         await callback.answer("✅ Запись создана!")
 
@@ -46,7 +60,7 @@ async def confirm_booking_and_save(callback: CallbackQuery, state: FSMContext, c
         await callback.answer("❌ Произошла ошибка. Попробуйте ещё раз.", show_alert=True)
         await state.clear()
 
-async def save_booking_to_db(data: dict, user_id: int, db_manager) -> int:
+async def save_booking_to_db(data: dict, user_id: int, db_manager, notifications: list = None) -> int:
     return db_manager.add_order(
         user_id=user_id,
         service_id=data.get('service_id'),
@@ -57,7 +71,9 @@ async def save_booking_to_db(data: dict, user_id: int, db_manager) -> int:
         comment=data.get('comment'),
         booking_date=data.get('booking_date'),
         booking_time=data.get('booking_time'),
-        master_id=data.get('master_id')
+        master_id=data.get('master_id'),
+        master_name=data.get('master_name'),
+        notifications=notifications
     )
 
 async def send_success_message(callback: CallbackQuery, state: FSMContext, config: dict, db_manager, order_id: int):
@@ -83,58 +99,36 @@ async def send_success_message(callback: CallbackQuery, state: FSMContext, confi
         await callback.message.answer(profile_text, reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons))
     await callback.message.answer("🏠 Главное меню", reply_markup=get_main_keyboard())
 
-async def send_admin_notification(callback: CallbackQuery, config: dict, data: dict, order_id: int, db_manager):
-    try:
-        await send_order_to_admins(
-            bot=callback.message.bot,
-            admin_ids=config.get('admin_ids', []),
-            order_data={
-                'order_id': order_id,
-                'user_id': callback.from_user.id,
-                'service_name': data.get('service_name'),
-                'price': data.get('price'),
-                'booking_date': data.get('booking_date'),
-                'booking_time': data.get('booking_time'),
-                'client_name': data.get('name'),  # contact.py сохраняет как 'name'
-                'phone': data.get('phone'),
-                'username': callback.from_user.username,
-                'master_name': data.get('master_name')
-            },
-            business_name=config.get('business_name', ''),
-            db_manager=db_manager
-        )
-    except Exception as e:
-        logger.error(f"Failed to notify admins: {e}")
+def build_admin_notifications(callback: CallbackQuery, config: dict, data: dict) -> list:
+    """Уведомления о новой записи для outbox (order_id подставляется при сохранении)."""
+    return admin_notifications(config, 'new_order', {
+        'order_data': {
+            'user_id': callback.from_user.id,
+            'service_name': data.get('service_name'),
+            'price': data.get('price'),
+            'booking_date': data.get('booking_date'),
+            'booking_time': data.get('booking_time'),
+            'client_name': data.get('name'),  # contact.py сохраняет как 'name'
+            'phone': data.get('phone'),
+            'username': callback.from_user.username,
+            'master_name': data.get('master_name'),
+            'comment': data.get('comment'),
+        },
+        'business_name': config.get('business_name', ''),
+    })
 
 async def return_to_time_selection(callback: CallbackQuery, state: FSMContext, config: dict, db_manager):
     """Возвращает пользователя к выбору времени при конфликте слотов."""
-    from datetime import date as date_type, timedelta
+    from datetime import date as date_type
 
     data = await state.get_data()
-    booking_date_str = data.get('booking_date')
-    master_id = data.get('master_id')
-
-    # Получаем занятые слоты
-    busy_slots = db_manager.get_busy_slots(booking_date_str, master_id)
-
-    # Генерируем все возможные слоты на основе конфига
-    selected_date = date_type.fromisoformat(booking_date_str)
-    work_hours_str = config.get('work_hours', {}).get(selected_date.strftime('%A').lower(), "09:00-18:00")
-    start_work_str, end_work_str = work_hours_str.split('-')
-    start_work_time = datetime.strptime(start_work_str, '%H:%M').time()
-    end_work_time = datetime.strptime(end_work_str, '%H:%M').time()
-    interval_minutes = config.get('booking_settings', {}).get('time_slot_interval', 30)
-
-    all_slots = []
-    current_time = datetime.combine(selected_date, start_work_time)
-    end_datetime = datetime.combine(selected_date, end_work_time)
-
-    while current_time < end_datetime:
-        all_slots.append(current_time.strftime('%H:%M'))
-        current_time += timedelta(minutes=interval_minutes)
-
-    # Фильтруем занятые слоты
-    available_slots = [slot for slot in all_slots if slot not in busy_slots]
+    selected_date = date_type.fromisoformat(data.get('booking_date'))
+
+    if data.get('any_master'):
+        # Назначенный мастер мог быть занят — подберём заново при выборе времени
+        await state.update_data(master_id=None, master_name="Любой")
+    release_slot_hold(config, db_manager, state)
+    available_slots = await get_available_slots(config, db_manager, data, selected_date)
 
     keyboard = get_time_slots_keyboard(available_slots)
     await callback.message.edit_text(
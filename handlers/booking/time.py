@@ -3,47 +3,42 @@
 """
 
 import logging
-from datetime import datetime, time, date, timedelta
+from datetime import datetime, time, date
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 
 from states.booking import BookingState
+from utils.master_assignment import get_master_assigner
+from utils.slot_engine import get_slot_engine
 from .keyboards import get_time_slots_keyboard
+from .utils import release_slot_hold
 from .contact import request_contact_info
 
 logger = logging.getLogger(__name__)
 
 router = Router()
 
+async def get_available_slots(config: dict, db_manager, data: dict, selected_date: date) -> list:
+    """Свободные слоты с учётом выбранного мастера или «Любой свободный мастер»."""
+    if data.get('any_master'):
+        return await get_master_assigner(config, db_manager).get_free_slots(
+            selected_date, data.get('service_id')
+        )
+    return await get_slot_engine(config, db_manager).get_free_slots(
+        selected_date, data.get('master_id'), data.get('service_id')
+    )
+
 async def show_time_slots(callback_or_message, state: FSMContext, config: dict, db_manager, selected_date: date):
     """Displays available time slots for the selected date."""
+    # Пользователь вернулся к выбору времени — его прежний слот снова свободен
+    release_slot_hold(config, db_manager, state)
     data = await state.get_data()
-    master_id = data.get('master_id')
     
     # Decide if we're editing a message or sending a new one
     message = callback_or_message if isinstance(callback_or_message, Message) else callback_or_message.message
 
-    # Fetch busy slots from the database
-    busy_slots = db_manager.get_busy_slots(selected_date.isoformat(), master_id)
-
-    # Generate all possible time slots based on config
-    work_hours_str = config.get('work_hours', {}).get(selected_date.strftime('%A').lower(), "09:00-18:00")
-    start_work_str, end_work_str = work_hours_str.split('-')
-    start_work_time = datetime.strptime(start_work_str, '%H:%M').time()
-    end_work_time = datetime.strptime(end_work_str, '%H:%M').time()
-    interval_minutes = config.get('booking_settings', {}).get('time_slot_interval', 30)
-
-    all_slots = []
-    current_time = datetime.combine(selected_date, start_work_time)
-    end_datetime = datetime.combine(selected_date, end_work_time)
-
-    while current_time < end_datetime:
-        all_slots.append(current_time.strftime('%H:%M'))
-        current_time += timedelta(minutes=interval_minutes)
-
-    # Filter out busy slots
-    available_slots = [slot for slot in all_slots if slot not in busy_slots]
+    available_slots = await get_available_slots(config, db_manager, data, selected_date)
     
     if not available_slots:
         await message.edit_text("На выбранную дату нет свободных слотов. Пожалуйста, выберите другую дату.")
@@ -57,11 +52,45 @@ async def show_time_slots(callback_or_message, state: FSMContext, config: dict,
     await state.set_state(BookingState.choosing_time)
 
 @router.callback_query(BookingState.choosing_time, F.data.startswith("time:"))
-async def time_selected(callback: CallbackQuery, state: FSMContext, db_manager):
+async def time_selected(callback: CallbackQuery, state: FSMContext, db_manager, config: dict):
     """Handles the selection of a time slot."""
     selected_time_str = callback.data.split(":", 1)[1]
     data = await state.get_data()
     booking_date = date.fromisoformat(data.get('booking_date'))
+
+    if await apply_time_selection(callback, state, config, db_manager, booking_date, selected_time_str):
+        await callback.answer()
+
+async def apply_time_selection(callback: CallbackQuery, state: FSMContext, config: dict, db_manager,
+                               booking_date: date, selected_time_str: str) -> bool:
+    """
+    Сохраняет выбранные дату/время и переходит к вводу контактов.
+
+    Слот удерживается за пользователем на время ввода контактов.
+    Возвращает False, если слот уже занят или удержан другим пользователем
+    (или для «Любой свободный мастер» никто не свободен) — пользователь уже
+    получил alert и обновлённую сетку.
+    """
+    await state.update_data(booking_date=booking_date.isoformat())
+    data = await state.get_data()
+
+    if data.get('any_master'):
+        master = await get_master_assigner(config, db_manager).assign(
+            booking_date, data.get('service_id'), selected_time_str
+        )
+        if not master:
+            await callback.answer("Это время уже занято. Выберите другое.", show_alert=True)
+            await show_time_slots(callback, state, config, db_manager, booking_date)
+            return False
+        await state.update_data(master_id=master['id'], master_name=master['name'])
+        data = await state.get_data()
+
+    holds = get_slot_engine(config, db_manager).holds
+    if not holds.hold(booking_date.isoformat(), selected_time_str, data.get('master_id'),
+                      state.key.user_id, data.get('service_id')):
+        await callback.answer("Это время уже занято. Выберите другое.", show_alert=True)
+        await show_time_slots(callback, state, config, db_manager, booking_date)
+        return False
     
     # Combine date and time to create a full datetime object
     booking_datetime = datetime.combine(booking_date, time.fromisoformat(selected_time_str))
@@ -70,8 +99,8 @@ async def time_selected(callback: CallbackQuery, state: FSMContext, db_manager):
         booking_datetime=booking_datetime.isoformat(),
         booking_time=selected_time_str  # Сохраняем время отдельно для save.py
     )
-    logger.info(f"User {callback.from_user.id} selected time: {booking_datetime.isoformat()}")
+    logger.info("User %s selected time: %s", callback.from_user.id, booking_datetime.isoformat())
     
     # Proceed to contact info request
     await request_contact_info(callback, state, db_manager)
-    await callback.answer()
\ No newline at end of file
+    return True
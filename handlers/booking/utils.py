@@ -2,6 +2,11 @@
 Вспомогательные функции для процесса бронирования.
 """
 
+from aiogram.fsm.context import FSMContext
+
+from utils.master_assignment import get_masters_for_service, get_staff_list
+from utils.slot_engine import get_slot_engine
+
 def get_categories_from_services(services: list) -> list:
     """Extracts unique categories from a list of services."""
     categories = []
@@ -14,11 +19,11 @@ def get_services_by_category(services: list, category_name: str) -> list:
     """Filters services by a given category name."""
     return [s for s in services if s.get('category') == category_name]
 
-def get_masters_for_service(config: dict, service_id: str) -> list:
-    """Gets a list of masters who provide a specific service."""
-    staff_list = config.get('staff', {}).get('list', [])
-    return [master for master in staff_list if service_id in master.get('services', [])]
-
 def get_master_by_id(config: dict, master_id: str) -> dict or None:
     """Finds a master by their ID."""
-    return next((m for m in config.get('staff', {}).get('list', []) if m['id'] == master_id), None)
+    return next((m for m in get_staff_list(config) if m['id'] == master_id), None)
+
+def release_slot_hold(config: dict, db_manager, state: FSMContext) -> None:
+    """Снимает удержание слота текущего пользователя (если есть)."""
+    # callback.message.from_user — это бот, поэтому пользователь берётся из ключа FSM
+    get_slot_engine(config, db_manager).holds.release(state.key.user_id)
@@ -6,39 +6,13 @@ import logging
 from datetime import datetime
 
 from .keyboards import get_cancel_confirmation_keyboard, format_time
-from utils.notify import get_client_history_text
+from utils.outbox import admin_notifications, wake_outbox
 
 logger = logging.getLogger(__name__)
 
 router = Router()
 
 
-async def notify_admin_about_cancellation(bot, admin_ids: list, order: dict, business_name: str, db_manager):
-    """Уведомление администраторов об отмене"""
-    formatted_time = format_time(order.get('booking_time', ''))
-
-    message_text = (
-        f"❌ Отмена записи в {business_name}\n\n"
-        f"ID заявки: #{order['id']}\n"
-        f"Услуга: {order['service_name']}\n"
-        f"Дата: {order['booking_date']}\n"
-        f"Время: {formatted_time}\n"
-        f"Клиент: {order['client_name']}\n"
-        f"Телефон: {order['phone']}\n"
-    )
-
-    history_text = get_client_history_text(db_manager, order['user_id'], order['id'])
-    if history_text:
-        message_text += f"\n{history_text}"
-
-    for admin_id in admin_ids:
-        try:
-            await bot.send_message(admin_id, message_text)
-            logger.info(f"Cancellation notification sent to admin {admin_id}")
-        except Exception as e:
-            logger.error(f"Failed to notify admin {admin_id} about cancellation: {e}")
-
-
 @router.callback_query(F.data.startswith("cancel_order:"))
 async def cancel_order_handler(callback: CallbackQuery, db_manager):
     """Запрос подтверждения отмены записи."""
@@ -71,7 +45,7 @@ async def cancel_order_handler(callback: CallbackQuery, db_manager):
 
 
 @router.callback_query(F.data.startswith("confirm_cancel:"))
-async def confirm_cancel_order_handler(callback: CallbackQuery, config: dict, db_manager, messages: dict, admin_bot=None, scheduler=None):
+async def confirm_cancel_order_handler(callback: CallbackQuery, config: dict, db_manager, messages: dict, scheduler=None):
     """Подтверждение и выполнение отмены записи."""
     order_id = int(callback.data.split(":")[1])
     order = db_manager.get_order_by_id(order_id)
@@ -80,10 +54,16 @@ async def confirm_cancel_order_handler(callback: CallbackQuery, config: dict, db
         await callback.answer("Заказ не найден или уже отменён.", show_alert=True)
         return
 
-    success = db_manager.cancel_order(order_id)
+    # Уведомление админам уходит через outbox в той же транзакции, что и отмена
+    notifications = admin_notifications(config, 'order_cancelled', {
+        'order': order,
+        'business_name': config['business_name'],
+    })
+    success = db_manager.cancel_order(order_id, notifications=notifications)
     if not success:
         await callback.answer("Ошибка отмены заказа", show_alert=True)
         return
+    wake_outbox(db_manager)
 
     if scheduler:
         try:
@@ -91,16 +71,7 @@ async def confirm_cancel_order_handler(callback: CallbackQuery, config: dict, db
         except Exception as e:
             logger.error(f"Error cancelling reminders: {e}")
 
-    if config.get('features', {}).get('enable_admin_notify', True):
-        notify_bot = admin_bot if admin_bot else callback.message.bot
-        await notify_admin_about_cancellation(
-            bot=notify_bot,
-            admin_ids=config['admin_ids'],
-            order=order,
-            business_name=config['business_name'],
-            db_manager=db_manager
-        )
-    
+
     formatted_time = format_time(order.get('booking_time', ''))
     cancel_msg = messages.get('booking_cancelled', 'Запись отменена.')
     await callback.message.edit_text(
@@ -110,5 +81,5 @@ async def confirm_cancel_order_handler(callback: CallbackQuery, config: dict, db
         f"• {order['booking_date']} {formatted_time}"
     )
 
-    logger.info(f"Order {order_id} cancelled by user {callback.from_user.id}")
+    logger.info("Order %s cancelled by user %s", order_id, callback.from_user.id)
     await callback.answer()
@@ -14,7 +14,8 @@ from .keyboards import (
 )
 from handlers.booking.keyboards import get_time_slots_keyboard
 from utils.calendar import DialogCalendar, DialogCalendarCallback
-from utils.notify import send_order_change_to_admins
+from utils.outbox import admin_notifications, wake_outbox
+from utils.slot_engine import get_slot_engine
 
 logger = logging.getLogger(__name__)
 
@@ -69,33 +70,15 @@ async def edit_date_selected_handler(callback: CallbackQuery, callback_data: Dia
     selected, date = await DialogCalendar().process_selection(callback, callback_data)
 
     if selected:
-        from datetime import timedelta
-
         booking_date = date.strftime("%Y-%m-%d")
         await state.update_data(new_booking_date=booking_date)
         data = await state.get_data()
         order_id = data.get('editing_order_id')
+        order = db_manager.get_order_by_id(order_id) or {}
 
-        # Получаем занятые слоты
-        busy_slots = db_manager.get_busy_slots(booking_date)
-
-        # Генерируем все возможные слоты на основе конфига
-        work_hours_str = config.get('work_hours', {}).get(date.strftime('%A').lower(), "09:00-18:00")
-        start_work_str, end_work_str = work_hours_str.split('-')
-        start_work_time = datetime.strptime(start_work_str, '%H:%M').time()
-        end_work_time = datetime.strptime(end_work_str, '%H:%M').time()
-        interval_minutes = config.get('booking_settings', {}).get('time_slot_interval', 30)
-
-        all_slots = []
-        current_time = datetime.combine(date, start_work_time)
-        end_datetime = datetime.combine(date, end_work_time)
-
-        while current_time < end_datetime:
-            all_slots.append(current_time.strftime('%H:%M'))
-            current_time += timedelta(minutes=interval_minutes)
-
-        # Фильтруем занятые слоты
-        available_slots = [slot for slot in all_slots if slot not in busy_slots]
+        available_slots = await get_slot_engine(config, db_manager).get_free_slots(
+            date, order.get('master_id'), order.get('service_id'), exclude_order_id=order_id
+        )
 
         keyboard = get_time_slots_keyboard(available_slots)
 
@@ -200,7 +183,7 @@ async def edit_service_selected_handler(callback: CallbackQuery, state: FSMConte
 # --- Финальное подтверждение --- 
 
 @router.callback_query(EditBookingState.confirmation, F.data == "confirm_edit")
-async def confirm_order_edit_handler(callback: CallbackQuery, state: FSMContext, config: dict, db_manager, scheduler=None, admin_bot=None):
+async def confirm_order_edit_handler(callback: CallbackQuery, state: FSMContext, config: dict, db_manager, scheduler=None):
     """Финальное подтверждение всех изменений."""
     data = await state.get_data()
     order_id = data.get('editing_order_id')
@@ -210,12 +193,27 @@ async def confirm_order_edit_handler(callback: CallbackQuery, state: FSMContext,
         key: data[f'new_{key}'] for key in ('booking_date', 'booking_time', 'service_id', 'service_name', 'price') if f'new_{key}' in data
     }
 
-    if not db_manager.update_order(order_id, **updates):
+    # Уведомление админов уходит через outbox в той же транзакции, что и изменение
+    notifications = admin_notifications(config, 'order_changed', {
+        'old_order': old_order,
+        'new_order': {**old_order, **updates},
+        'business_name': config['business_name'],
+    })
+
+    try:
+        updated = db_manager.update_order(order_id, notifications=notifications, **updates)
+    except ValueError as e:
+        logger.warning(f"Reschedule conflict for order {order_id}: {e}")
+        await callback.answer("Это время уже занято. Выберите другой слот.", show_alert=True)
+        return
+
+    if not updated:
         await callback.message.edit_text("❌ Ошибка изменения заказа")
         await state.clear()
         await callback.answer()
         return
 
+    wake_outbox(db_manager)
     new_order = db_manager.get_order_by_id(order_id)
     
     # Обновление запланированных напоминаний
@@ -226,17 +224,6 @@ async def confirm_order_edit_handler(callback: CallbackQuery, state: FSMContext,
         except Exception as e:
             logger.error(f"Error rescheduling reminders: {e}")
 
-    # Уведомление админов
-    if config.get('features', {}).get('enable_admin_notify', True):
-        notify_bot = admin_bot or callback.message.bot
-        await send_order_change_to_admins(
-            bot=notify_bot,
-            admin_ids=config['admin_ids'],
-            old_order=old_order, new_order=new_order,
-            business_name=config['business_name'],
-            db_manager=db_manager
-        )
-
     await callback.message.edit_text("✅ Заказ успешно изменён!")
     await state.clear()
     await callback.answer()
@@ -28,7 +28,7 @@ async def show_my_bookings_handler(message: Message, db_manager, state: FSMConte
 
     text, keyboard = format_bookings_list(bookings, config)
     await message.answer(text, reply_markup=keyboard)
-    logger.info(f"User {user_id} viewed their bookings ({len(bookings)} active)")
+    logger.info("User %s viewed their bookings (%s active)", user_id, len(bookings))
 
 @router.callback_query(F.data == "back_to_mybookings")
 async def back_to_mybookings_handler(callback: CallbackQuery, state: FSMContext, db_manager, config: dict = None):
@@ -45,5 +45,5 @@ async def back_to_mybookings_handler(callback: CallbackQuery, state: FSMContext,
     except Exception:
         await callback.message.answer(text, reply_markup=keyboard)
         
-    logger.info(f"User {user_id} returned to bookings list ({len(bookings)} active)")
+    logger.info("User %s returned to bookings list (%s active)", user_id, len(bookings))
     await callback.answer()
@@ -34,7 +34,7 @@ async def cmd_start(message: Message, state: FSMContext, config: dict):
     """Обработчик команды /start."""
     await state.clear()
     await show_main_menu(message, config)
-    logger.info(f"User {message.from_user.id} started bot")
+    logger.info("User %s started bot", message.from_user.id)
 
 @router.message(Command("menu"))
 @router.message(F.text.in_(["🏠 Меню", "🏠 Главное меню", "Отмена"]))
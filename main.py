@@ -1,23 +1,42 @@
 
 import argparse
 import asyncio
+import contextlib
 import logging
 import os
+import signal
+from aiohttp import web
 from dotenv import load_dotenv
 from aiogram import Bot, Dispatcher, BaseMiddleware
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import TelegramObject, Message
-from typing import Any, Awaitable, Callable, Dict
+from typing import Any, Awaitable, Callable, Dict, Sequence
 
 # Загружаем переменные окружения из .env
 load_dotenv()
 
 # Импорты из проекта
+from utils.analytics import configure_analytics
 from utils.db import DatabaseManager
+from utils.fsm_storage import create_fsm_storage
+from utils.health import HealthDaemon, serve_health
+from utils.latency import get_latency_registry
 from utils.logger import setup_logger
-from utils.config_loader import load_config
+from utils.metrics import MetricsExporter, serve_metrics
+from utils.config_loader import ConfigWatcher, load_config
+from utils.outbox import start_outbox_dispatcher
+from utils.query_trace import configure_query_tracer
+from utils.reminders import ReminderScheduler
+from utils.rate_governor import DEFAULT_GLOBAL_RATE, get_rate_governor
+from utils.timeseries import build_recorder
+from utils.sharding import ShardedRunner, build_front_app, consume_updates, poll_into
+from utils.slot_engine import get_slot_engine
+from utils.webhook import WebhookServer, derive_secret
+
+from middlewares import UserOrderingMiddleware
 
 # Импортируем handlers
 from handlers import all_routers
@@ -26,60 +45,20 @@ from handlers import all_routers
 async def watch_config_updates(config_path: str, config: dict, poll_interval_seconds: float = 3.0):
     """
     Отслеживает изменения в директории с конфигурационными файлами.
-    ОПТИМИЗИРОВАНО: файлы читаются только если изменился mtime или версия.
+    ОПТИМИЗИРОВАНО: файлы читаются только если изменился mtime или версия,
+    правки из админ-панели в этом же процессе применяются сразу.
     """
-    last_mtime = None
-    last_version = config.get('config_version', 0)
-
-    def get_latest_mtime(path: str):
-        try:
-            files = [os.path.join(path, f) for f in os.listdir(path) if f.endswith('.json')]
-            if not files:
-                return None
-            return max(os.path.getmtime(f) for f in files)
-        except Exception:
-            return None
-
-    last_mtime = get_latest_mtime(config_path)
-
-    while True:
-        await asyncio.sleep(poll_interval_seconds)
-
-        current_mtime = get_latest_mtime(config_path)
-        if current_mtime is None:
-            continue
-
-        if last_mtime is not None and current_mtime == last_mtime:
-            continue
-
-        try:
-            new_config = load_config(config_path)
-        except Exception as e:
-            logging.error(f"❌ Не удалось перезагрузить конфигурацию: {e}")
-            last_mtime = current_mtime
-            continue
-
-        new_version = new_config.get('config_version', 0)
-
-        if new_version == last_version:
-            last_mtime = current_mtime
-            continue
-
-        config.clear()
-        config.update(new_config)
-
-        last_mtime = current_mtime
-        last_version = new_version
-        logging.info(f"🔄 Конфигурация обновлена (config_version={last_version})")
+    await ConfigWatcher(config_path, config).run(poll_interval_seconds)
 
 
 class ConfigMiddleware(BaseMiddleware):
-    """Middleware для передачи config, db_manager и admin_bot в handlers"""
-    def __init__(self, config: dict, db_manager, admin_bot: Bot = None):
+    """Middleware для передачи config, db_manager, admin_bot и scheduler в handlers"""
+    def __init__(self, config: dict, db_manager, admin_bot: Bot = None, scheduler=None):
         super().__init__()
         self.config = config
         self.db_manager = db_manager
         self.admin_bot = admin_bot
+        self.scheduler = scheduler
 
     async def __call__(
         self,
@@ -91,20 +70,266 @@ class ConfigMiddleware(BaseMiddleware):
         data['messages'] = self.config.get('messages', {})
         data['db_manager'] = self.db_manager
         data['admin_bot'] = self.admin_bot
+        data['scheduler'] = self.scheduler
         return await handler(event, data)
 
 
-async def main():
+KNOWN_MENU_TEXTS = {
+    "🏠 Меню", "◀️ Назад", "📅 Записаться", "📋 Мои записи",
+    "💅 Услуги и цены", "👩‍🎨 Мастера", "🎁 Акции", "ℹ️ О нас", "❓ FAQ",
+    "📍 Адрес", "📅 Записаться / Заказать", "❓ Часто задаваемые вопросы",
+    "🏠 Главное меню",
+}
+
+# Как часто назначенный воркер подхватывает напоминания, созданные другими воркерами
+SHARDED_REMINDER_POLL_SECONDS = 10.0
+
+
+async def unknown_message_handler(message: Message):
+    from handlers.start import get_main_keyboard
+    await message.answer(
+        "Я не понял ваш запрос. Воспользуйтесь кнопками меню ниже:",
+        reply_markup=get_main_keyboard()
+    )
+
+
+def create_bots(config: dict, bot_token: str, workers: int = 1, shared_session: bool = False):
+    """
+    Клиентский бот и (если есть ADMIN_BOT_TOKEN) админ-бот для уведомлений.
+    shared_session — оба бота ходят в Telegram через один пул соединений.
+    TELEGRAM_API_URL — свой сервер Bot API (локальный telegram-bot-api, профилирование).
+    """
+    logger = logging.getLogger(__name__)
+    api_url = os.getenv('TELEGRAM_API_URL')
+    api = TelegramAPIServer.from_base(api_url) if api_url else PRODUCTION
+    shared = AiohttpSession(api=api) if shared_session else None
+
+    def session():
+        return shared or (AiohttpSession(api=api) if api_url else None)
+
+    bot = Bot(
+        token=bot_token,
+        session=session(),
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+
+    admin_bot = None
+    admin_token = os.getenv('ADMIN_BOT_TOKEN')
+    if admin_token:
+        admin_bot = Bot(
+            token=admin_token,
+            session=session(),
+            default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+        )
+        logger.info("✅ Админ-бот для уведомлений инициализирован")
+    else:
+        logger.warning("⚠️ ADMIN_BOT_TOKEN не найден - уведомления будут через клиентского бота")
+
+    # Общий лимит исходящих запросов к Telegram для обоих ботов
+    # (в многопроцессном режиме глобальный лимит делится между воркерами)
+    limits = dict(config.get('telegram_limits', {}))
+    limits['global_rate'] = limits.get('global_rate', DEFAULT_GLOBAL_RATE) / workers
+    rate_governor = get_rate_governor(dict(config, telegram_limits=limits))
+    bot.session.middleware(rate_governor)
+    if admin_bot and admin_bot.session is not bot.session:
+        admin_bot.session.middleware(rate_governor)
+    return bot, admin_bot
+
+
+def build_client_dispatcher(config: dict, db_manager, admin_bot: Bot = None, scheduler=None) -> Dispatcher:
+    """Диспетчер клиентского бота со всеми middlewares и роутерами"""
+    # Незавершённые сценарии переживают перезапуск (config fsm.storage)
+    dp = Dispatcher(storage=create_fsm_storage(config, 'client'))
+    latency = get_latency_registry(config)
+    latency.instrument_db(db_manager)
+    # Обновления одного пользователя — по порядку, разных — параллельно
+    dp.update.outer_middleware(UserOrderingMiddleware.from_config(config))
+    dp.update.middleware(latency.timed(ConfigMiddleware(config, db_manager, admin_bot, scheduler)))
+
+    dp.include_router(all_routers)
+
+    from aiogram.filters import StateFilter
+    from aiogram import F
+
+    dp.message.register(
+        unknown_message_handler,
+        StateFilter(None), F.text, ~F.text.startswith("/"), ~F.text.in_(KNOWN_MENU_TEXTS),
+    )
+    # Задержки обработчиков, middlewares и запросов к БД (/latency в админ-боте)
+    latency.instrument_dispatcher(dp)
+    return dp
+
+
+def build_cohosted_admin(config_dir: str, config: dict, db_manager, admin_config_path: str) -> Dispatcher:
+    """
+    Диспетчер админ-панели для запуска в процессе клиентского бота.
+    Если её конфиг лежит в директории клиентского, оба бота работают с одним
+    снимком конфигурации (правки админки сразу видны клиентскому боту).
+    """
+    from admin_bot.main import build_admin_dispatcher, load_config as load_admin_config
+
+    shared = os.path.dirname(os.path.abspath(admin_config_path)) == os.path.abspath(config_dir)
+    admin_config = config if shared else load_admin_config(admin_config_path)
+    return build_admin_dispatcher(admin_config, db_manager, admin_config_path)
+
+
+async def poll_together(pairs: Sequence) -> None:
+    """Polling нескольких ботов в одном цикле событий; SIGINT/SIGTERM останавливают все"""
+    dispatchers = [dp for dp, _ in pairs]
+
+    async def stop_polling(dp: Dispatcher):
+        with contextlib.suppress(RuntimeError):  # polling ещё не запущен или уже остановлен
+            await dp.stop_polling()
+
+    def on_signal():
+        for dp in dispatchers:
+            asyncio.ensure_future(stop_polling(dp))
+
+    loop = asyncio.get_running_loop()
+    with contextlib.suppress(NotImplementedError):  # Windows
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, on_signal)
+
+    for _, bot in pairs:
+        await bot.delete_webhook(drop_pending_updates=True)
+    # Сессии закрывает владелец: у ботов может быть один пул соединений
+    await asyncio.gather(*(
+        dp.start_polling(bot, handle_signals=False, close_bot_session=False) for dp, bot in pairs
+    ))
+
+
+def start_background_tasks(config_dir: str, config: dict, db_manager, bot: Bot, admin_bot: Bot,
+                           scheduler, designated: bool = True, dispatchers: Sequence = ()) -> list:
+    """
+    Фоновые задачи процесса. Рассылки (outbox, напоминания) запускаются
+    только в назначенном процессе.
+    """
+    # Длительности услуг для куба аналитики (занятые часы мастеров)
+    configure_analytics(config, db_manager)
+    tasks = [
+        asyncio.create_task(watch_config_updates(config_dir, config)),
+        # Единый таймер истечения удержаний слотов
+        asyncio.create_task(get_slot_engine(config, db_manager).holds.run()),
+    ]
+    # Минутные точки метрик для тренда (/trend в админ-боте)
+    recorder = build_recorder(config, db_manager, dispatchers,
+                              get_latency_registry(config), get_rate_governor(config))
+    if recorder is not None:
+        tasks.append(asyncio.create_task(recorder.run()))
+    if designated:
+        # Рассылка уведомлений админам из outbox (через админ-бота, если он есть)
+        tasks.append(start_outbox_dispatcher(db_manager, admin_bot or bot, config))
+        tasks.append(asyncio.create_task(scheduler.run()))
+    return tasks
+
+
+def build_exporter(config: dict, bots: Sequence, scheduler=None) -> MetricsExporter:
+    """Метрики процесса (/metrics): боты (имя, диспетчер, БД) и планировщик напоминаний"""
+    exporter = MetricsExporter(get_latency_registry(config), get_rate_governor(config))
+    for name, dp, db_manager in bots:
+        exporter.watch_bot(name, dp, db_manager)
+    if scheduler is not None:
+        exporter.watch_scheduler(scheduler)
+    return exporter
+
+
+async def stop_background_tasks(tasks: list) -> None:
+    for task in tasks:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+async def run_client_worker(index: int, workers: int, updates, config_dir: str):
+    """Процесс-воркер многопроцессного режима (см. utils.sharding)"""
+    setup_logger()
+    logger = logging.getLogger(__name__)
+    config = load_config(config_dir)
+    # У каждого воркера свой файл логов (ротация не делится между процессами)
+    setup_logger(config.get('logging'), name=f"worker{index + 1}")
+    configure_query_tracer(config)
+    bot_token = os.getenv('BOT_TOKEN') or config.get('bot_token')
+    db_manager = DatabaseManager(config.get('business_slug', 'default_business'))
+    bot, admin_bot = create_bots(config, bot_token, workers)
+
+    designated = index == 0
+    scheduler = ReminderScheduler(
+        db_manager, bot, config,
+        poll_interval=SHARDED_REMINDER_POLL_SECONDS if designated else None,
+        # Остальные воркеры только пишут напоминания в БД, рассылает назначенный
+        persist_only=not designated,
+    )
+    dp = build_client_dispatcher(config, db_manager, admin_bot, scheduler)
+    tasks = start_background_tasks(config_dir, config, db_manager, bot, admin_bot, scheduler, designated,
+                                   dispatchers=[dp])
+    exporter = build_exporter(config, [('client', dp, db_manager)], scheduler if designated else None)
+    metrics_runner = await serve_metrics(config, exporter, port_offset=index)
+    logger.info(f"🧩 Воркер {index + 1}/{workers} запущен{' (рассылки)' if designated else ''}")
+    try:
+        processed = await consume_updates(updates, dp, bot)
+        logger.info(f"🧩 Воркер {index + 1}/{workers}: обработано {processed} обновлений")
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await stop_background_tasks(tasks)
+        await dp.storage.close()
+        db_manager.close()
+        await bot.session.close()
+        if admin_bot:
+            await admin_bot.session.close()
+
+
+async def run_sharded_front(args, config: dict, bot_token: str):
+    """Фронт многопроцессного режима: принимает обновления и раздаёт их воркерам"""
+    logger = logging.getLogger(__name__)
+    bot, _ = create_bots(config, bot_token)
+    runner = ShardedRunner(run_client_worker, args.workers, args=(args.config_dir,))
+    runner.start()
+    site_runner = None
+    try:
+        if args.webhook:
+            server = WebhookServer.from_config(config)
+            path = f"{server.path_prefix}/client"
+            secret = derive_secret(bot, server.secret_token)
+            site_runner = web.AppRunner(build_front_app(runner, path, secret))
+            await site_runner.setup()
+            await web.TCPSite(site_runner, server.host, server.port).start()
+            await bot.set_webhook(url=f"{server.base_url}{path}", secret_token=secret)
+            logger.info(f"🌐 Webhook-фронт на {server.host}:{server.port}{path}, воркеров: {args.workers}")
+            await asyncio.Event().wait()
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            logger.info(f"🔄 Polling-фронт, воркеров: {args.workers}")
+            await poll_into(runner, bot)
+    finally:
+        if site_runner is not None:
+            await site_runner.cleanup()
+        await asyncio.get_running_loop().run_in_executor(None, runner.stop)
+        await bot.session.close()
+        logger.info("🛑 Бот остановлен")
+
+
+async def main(argv=None):
     setup_logger()
     logger = logging.getLogger(__name__)
 
     parser = argparse.ArgumentParser(description='Telegram Business Bot V2.0')
     parser.add_argument('--config-dir', type=str, default='config',
                         help='Путь к директории с JSON файлами конфигурации.')
-    args = parser.parse_args()
+    parser.add_argument('--webhook', action='store_true',
+                        help='Принимать обновления через webhook (config webhook / WEBHOOK_*) вместо polling.')
+    parser.add_argument('--admin-config', type=str, default=None,
+                        help='Обслуживать в этом же процессе и админ-панель (путь к её JSON конфигу).')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Число процессов-воркеров (обновления шардируются по user_id).')
+    args = parser.parse_args(argv)
 
     try:
         config = load_config(args.config_dir)
+        if config.get('logging'):
+            setup_logger(config['logging'])
         logger.info(f"✅ Конфигурация загружена: {config.get('business_name', 'Неизвестно')}")
     except Exception as e:
         logger.critical(f"❌ Не удалось загрузить конфигурацию из '{args.config_dir}': {e}", exc_info=True)
@@ -116,7 +341,13 @@ async def main():
         logger.critical("❌ BOT_TOKEN не найден ни в .env, ни в конфиге!")
         return
 
+    if args.workers > 1:
+        await run_sharded_front(args, config, bot_token)
+        return
+
     business_slug = config.get('business_slug', 'default_business')
+    # Журнал медленных запросов (config sql_trace) — до открытия соединений
+    configure_query_tracer(config)
     db_manager = DatabaseManager(business_slug)
     
     try:
@@ -125,67 +356,62 @@ async def main():
         logger.critical(f"❌ Ошибка инициализации БД: {e}", exc_info=True)
         return
 
-    bot = Bot(
-        token=bot_token,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    # Оба бота в одном процессе: общие БД, снимок конфигурации и пул соединений
+    bot, admin_bot = create_bots(config, bot_token, shared_session=bool(args.admin_config))
+    admin_dp = None
+    if args.admin_config:
+        if admin_bot:
+            admin_dp = build_cohosted_admin(args.config_dir, config, db_manager, args.admin_config)
+        else:
+            logger.warning("⚠️ --admin-config задан, но ADMIN_BOT_TOKEN не найден - админ-панель не запущена")
+
+    # Напоминания клиентам (одна куча и один таймер на все записи)
+    scheduler = ReminderScheduler(db_manager, bot, config)
+    dp = build_client_dispatcher(config, db_manager, admin_bot, scheduler)
+    tasks = start_background_tasks(args.config_dir, config, db_manager, bot, admin_bot, scheduler,
+                                   dispatchers=[dp] + ([admin_dp] if admin_dp else []))
+    exporter = build_exporter(
+        config, [('client', dp, db_manager)] + ([('admin', admin_dp, db_manager)] if admin_dp else []), scheduler,
     )
-
-    admin_bot = None
-    admin_token = os.getenv('ADMIN_BOT_TOKEN')
-    if admin_token:
-        admin_bot = Bot(
-            token=admin_token,
-            default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-        )
-        logger.info("✅ Админ-бот для уведомлений инициализирован")
-    else:
-        logger.warning("⚠️ ADMIN_BOT_TOKEN не найден - уведомления будут через клиентского бота")
-
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
-
-    dp.update.middleware(ConfigMiddleware(config, db_manager, admin_bot))
-
-    watcher_task = asyncio.create_task(watch_config_updates(args.config_dir, config))
-
-    dp.include_router(all_routers)
-    
-    from aiogram.filters import StateFilter
-    from aiogram import F
-
-    known_menu_texts = {
-        "🏠 Меню", "◀️ Назад", "📅 Записаться", "📋 Мои записи",
-        "💅 Услуги и цены", "👩‍🎨 Мастера", "🎁 Акции", "ℹ️ О нас", "❓ FAQ",
-        "📍 Адрес", "📅 Записаться / Заказать", "❓ Часто задаваемые вопросы",
-        "🏠 Главное меню",
-    }
-
-    @dp.message(StateFilter(None), F.text, ~F.text.startswith("/"), ~F.text.in_(known_menu_texts))
-    async def unknown_message_handler(message: Message):
-        from handlers.start import get_main_keyboard
-        await message.answer(
-            "Я не понял ваш запрос. Воспользуйтесь кнопками меню ниже:",
-            reply_markup=get_main_keyboard()
-        )
+    metrics_runner = await serve_metrics(config, exporter)
+    # Проверки работоспособности и /healthz (config health / HEALTH_PORT)
+    health = HealthDaemon.from_config(
+        config, db_manager, {'client': bot.token, **({'admin': admin_bot.token} if admin_dp else {})},
+    )
+    health_runner = await serve_health(config, health)
+    if health_runner is not None or os.getenv('WATCHDOG_USEC'):
+        tasks.append(asyncio.create_task(health.run()))
 
     logger.info(f"🚀 Бот '{config.get('business_name', 'Неизвестно')}' запущен!")
     logger.info(f"📂 Конфигурация из директории: {args.config_dir}")
     logger.info(f"💾 База данных: db_{business_slug}.sqlite")
-    logger.info("💾 Хранилище FSM: MemoryStorage")
+    logger.info(f"💾 Хранилище FSM: {type(dp.storage).__name__}")
 
     try:
-        await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot)
+        if args.webhook:
+            # Оба бота в одном aiohttp-приложении
+            server = WebhookServer.from_config(config)
+            server.add_bot('client', dp, bot)
+            if admin_dp:
+                server.add_bot('admin', admin_dp, admin_bot)
+            exporter.watch_webhook(server)
+            logger.info(f"🌐 Режим webhook: {', '.join(server.handlers)}")
+            await server.serve_forever()
+        elif admin_dp:
+            logger.info("🤝 Клиентский и админ-бот в одном процессе")
+            await poll_together([(dp, bot), (admin_dp, admin_bot)])
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            await dp.start_polling(bot)
     except KeyboardInterrupt:
         logger.info("Получено прерывание с клавиатуры")
     except Exception as e:
         logger.error(f"❌ Ошибка во время работы: {e}", exc_info=True)
     finally:
-        watcher_task.cancel()
-        try:
-            await watcher_task
-        except asyncio.CancelledError:
-            pass
+        for runner in (metrics_runner, health_runner):
+            if runner is not None:
+                await runner.cleanup()
+        await stop_background_tasks(tasks)
         db_manager.close()
         await bot.session.close()
         if admin_bot:
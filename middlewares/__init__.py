@@ -0,0 +1,14 @@
+"""
+Общие middleware ботов.
+"""
+
+from .latency import HandlerLatencyMiddleware, TimedMiddleware, UpdateLatencyMiddleware
+from .user_ordering import UserOrderingMiddleware, find_ordering_middleware
+
+__all__ = [
+    'HandlerLatencyMiddleware',
+    'TimedMiddleware',
+    'UpdateLatencyMiddleware',
+    'UserOrderingMiddleware',
+    'find_ordering_middleware',
+]
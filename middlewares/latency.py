@@ -0,0 +1,88 @@
+"""
+Middlewares замера задержек (см. utils.latency).
+
+- UpdateLatencyMiddleware — outer-middleware на dp.update: кадр учёта
+  обновления и полное время его обработки (точка «update»).
+- HandlerLatencyMiddleware — inner-middleware на событиях диспетчера;
+  middlewares корневого роутера оборачивают обработчики всех вложенных,
+  поэтому замеряется каждый обработчик (data['handler']).
+- TimedMiddleware — обёртка вокруг middleware для замера его собственного
+  времени.
+"""
+
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from utils.latency import LatencyRegistry
+
+
+class UpdateLatencyMiddleware(BaseMiddleware):
+    """Кадр учёта и полное время обновления"""
+
+    def __init__(self, registry: LatencyRegistry):
+        super().__init__()
+        self.registry = registry
+        self.stats = registry.stats('update')
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        token = self.registry.begin_update()
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            return await handler(event, data)
+        finally:
+            self.stats.record(time.perf_counter() - wall_start, time.thread_time() - cpu_start)
+            self.registry.end_update(token)
+
+
+class HandlerLatencyMiddleware(BaseMiddleware):
+    """Собственное время каждого обработчика"""
+
+    def __init__(self, registry: LatencyRegistry):
+        super().__init__()
+        self.registry = registry
+        # callback обработчика -> точка измерения (имя строится один раз)
+        self._stats: Dict[Any, Any] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get('handler')
+        if handler_object is None:
+            return await handler(event, data)
+        callback = handler_object.callback
+        stats = self._stats.get(callback)
+        if stats is None:
+            name = getattr(callback, '__qualname__', type(callback).__qualname__)
+            stats = self._stats[callback] = self.registry.stats(
+                f"handler:{getattr(callback, '__module__', '')}.{name}"
+            )
+        return await self.registry.measure(stats, handler, event, data)
+
+
+class TimedMiddleware(BaseMiddleware):
+    """Обёртка middleware: замеряет время без учёта вызванных им дальше шагов"""
+
+    def __init__(self, registry: LatencyRegistry, middleware, name: str):
+        super().__init__()
+        self.registry = registry
+        self.middleware = middleware
+        self.stats = registry.stats(f"middleware:{name}")
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        return await self.registry.measure(self.stats, self.middleware, handler, event, data)
@@ -0,0 +1,138 @@
+"""
+Упорядоченная по пользователю и параллельная между пользователями обработка обновлений.
+
+UserOrderingMiddleware подключается как outer-middleware на dp.update.
+Обновления одного пользователя (event_from_user) выстраиваются в очередь
+и обрабатываются строго по порядку поступления, обновления разных
+пользователей — параллельно. Поэтому двойное нажатие «✅ Подтвердить»
+не гоняется само с собой: второе нажатие начнёт обработку только после
+первого.
+
+- Общее число одновременно обрабатываемых обновлений ограничено
+  max_concurrency; ожидание своей очереди слот не занимает.
+- Очередь одного пользователя ограничена max_user_queue: лишние
+  обновления (спам кнопкой) отбрасываются.
+- Метрики: queue_depth (ждут очереди пользователя или общего слота),
+  active, max_queue_depth, processed, failed (обработчик упал), dropped.
+
+Настройки — config['updates'] (max_concurrency, max_user_queue).
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 100
+DEFAULT_MAX_USER_QUEUE = 8
+
+
+class _UserQueue:
+    __slots__ = ('lock', 'depth')
+
+    def __init__(self):
+        # asyncio.Lock отдаёт блокировку ожидающим в порядке очереди (FIFO)
+        self.lock = asyncio.Lock()
+        self.depth = 0
+
+
+class UserOrderingMiddleware(BaseMiddleware):
+    """Очередь на пользователя + общий лимит параллельности"""
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 max_user_queue: int = DEFAULT_MAX_USER_QUEUE):
+        super().__init__()
+        self.max_user_queue = max(1, max_user_queue)
+        self.semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._queues: Dict[int, _UserQueue] = {}
+        # Метрики
+        self.queue_depth = 0
+        self.active = 0
+        self.max_queue_depth = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_config(cls, config: dict) -> "UserOrderingMiddleware":
+        settings = config.get('updates', {})
+        return cls(
+            max_concurrency=settings.get('max_concurrency', DEFAULT_MAX_CONCURRENCY),
+            max_user_queue=settings.get('max_user_queue', DEFAULT_MAX_USER_QUEUE),
+        )
+
+    async def _run(self, handler, event, data) -> Any:
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.queue_depth -= 1
+        self.active += 1
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.active -= 1
+            self.processed += 1
+            self.semaphore.release()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user = data.get('event_from_user')
+        if user is None:
+            return await self._run(handler, event, data)
+
+        queue = self._queues.get(user.id)
+        if queue is None:
+            queue = self._queues[user.id] = _UserQueue()
+        if queue.depth >= self.max_user_queue:
+            self.dropped += 1
+            logger.warning(f"User {user.id}: {queue.depth} updates already queued, dropping update")
+            return None
+
+        queue.depth += 1
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        waiting = True
+        try:
+            async with queue.lock:
+                self.queue_depth -= 1
+                waiting = False
+                return await self._run(handler, event, data)
+        finally:
+            if waiting:
+                self.queue_depth -= 1
+            queue.depth -= 1
+            if queue.depth == 0:
+                del self._queues[user.id]
+
+    def stats(self) -> dict:
+        """Снимок метрик"""
+        return {
+            'queue_depth': self.queue_depth,
+            'active': self.active,
+            'users': len(self._queues),
+            'max_queue_depth': self.max_queue_depth,
+            'processed': self.processed,
+            'failed': self.failed,
+            'dropped': self.dropped,
+        }
+
+
+def find_ordering_middleware(dp) -> Optional[UserOrderingMiddleware]:
+    """UserOrderingMiddleware диспетчера, если он подключён"""
+    for middleware in dp.update.outer_middleware:
+        if isinstance(middleware, UserOrderingMiddleware):
+            return middleware
+    return None
@@ -1,9 +1,16 @@
 #!/usr/bin/env python3
 """
 Единый лаунчер для запуска клиентского и админ-бота одной командой.
-Использование: python run.py
+Использование: python run.py [--config-dir config] [--admin-config config/settings.json]
+
+По умолчанию оба бота работают в одном процессе и одном цикле событий:
+одна загрузка aiogram, общие соединение с БД, снимок конфигурации и пул
+HTTP-соединений (токены и роутеры у ботов свои). Флаг --processes
+запускает их по-старому, двумя отдельными процессами.
 """
 
+import argparse
+import asyncio
 import subprocess
 import sys
 import os
@@ -42,21 +49,8 @@ def stream_errors(process, prefix, color):
             print(f"{color}[{prefix}]{Colors.RESET} {Colors.ERROR}{line.strip()}{Colors.RESET}")
     process.stderr.close()
 
-def main():
-    print_header()
-
-    # Проверяем наличие .env
-    if not os.path.exists('.env'):
-        print(f"{Colors.ERROR}❌ Файл .env не найден!{Colors.RESET}")
-        print("   Сначала запустите: python setup.py")
-        sys.exit(1)
-
-    # Проверяем наличие конфига
-    if not os.path.exists('config'):
-        print(f"{Colors.ERROR}❌ Папка config не найдена!{Colors.RESET}")
-        print("   Сначала запустите: python setup.py")
-        sys.exit(1)
-
+def run_processes(config_dir: str, admin_config: str):
+    """Два отдельных процесса с пересылкой их вывода"""
     processes = []
     threads = []
 
@@ -64,7 +58,7 @@ def main():
         # Запускаем клиентского бота
         print(f"{Colors.CLIENT}▶ Запуск клиентского бота...{Colors.RESET}")
         client = subprocess.Popen(
-            [sys.executable, 'main.py'],
+            [sys.executable, 'main.py', '--config-dir', config_dir],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
@@ -84,7 +78,7 @@ def main():
         # Запускаем админ-бота
         print(f"{Colors.ADMIN}▶ Запуск админ-бота...{Colors.RESET}")
         admin = subprocess.Popen(
-            [sys.executable, 'admin_bot/main.py'],
+            [sys.executable, 'admin_bot/main.py', '--config', admin_config],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
@@ -125,5 +119,43 @@ def main():
 
         print(f"{Colors.BOLD}✅ Все боты остановлены.{Colors.RESET}\n")
 
+def main():
+    parser = argparse.ArgumentParser(description='Запуск клиентского и админ-бота')
+    parser.add_argument('--config-dir', type=str, default='config',
+                        help='Путь к директории с JSON файлами конфигурации.')
+    parser.add_argument('--admin-config', type=str, default=None,
+                        help='JSON конфиг админ-панели (по умолчанию <config-dir>/settings.json).')
+    parser.add_argument('--processes', action='store_true',
+                        help='Запустить ботов двумя отдельными процессами.')
+    args = parser.parse_args()
+
+    print_header()
+
+    # Проверяем наличие .env
+    if not os.path.exists('.env'):
+        print(f"{Colors.ERROR}❌ Файл .env не найден!{Colors.RESET}")
+        print("   Сначала запустите: python setup.py")
+        sys.exit(1)
+
+    # Проверяем наличие конфига
+    if not os.path.exists(args.config_dir):
+        print(f"{Colors.ERROR}❌ Папка {args.config_dir} не найдена!{Colors.RESET}")
+        print("   Сначала запустите: python setup.py")
+        sys.exit(1)
+
+    admin_config = args.admin_config or os.path.join(args.config_dir, 'settings.json')
+    if args.processes:
+        run_processes(args.config_dir, admin_config)
+        return
+
+    from main import main as run_bots
+
+    print(f"{Colors.BOLD}▶ Запуск ботов в одном процессе... Нажмите Ctrl+C для остановки.{Colors.RESET}\n")
+    try:
+        asyncio.run(run_bots(['--config-dir', args.config_dir, '--admin-config', admin_config]))
+    except KeyboardInterrupt:
+        pass
+    print(f"{Colors.BOLD}✅ Все боты остановлены.{Colors.RESET}\n")
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,134 @@
+"""
+Тесты куба аналитики (день × мастер × услуга).
+"""
+
+import copy
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.analytics import ALL, configure_analytics, cube_screen
+from utils.db import DatabaseManager
+
+TODAY = date(2099, 6, 10)
+CONFIG = {
+    'booking': {'slot_duration': 30},
+    'services': [
+        {'id': 'cut', 'name': 'Стрижка', 'price': 1500, 'duration': 60},
+        {'id': 'color', 'name': 'Окрашивание', 'price': 3500, 'duration': 120},
+    ],
+    'staff': {'masters': [{'id': 'anna', 'name': 'Анна'}, {'id': 'maria', 'name': 'Мария'}]},
+}
+
+
+@pytest.fixture
+def db(tmp_path):
+    original_dir = os.getcwd()
+    os.chdir(tmp_path)
+    db = DatabaseManager("cube")
+    try:
+        yield db
+    finally:
+        db.close()
+        os.chdir(original_dir)
+
+
+def add(db, day, booking_time, master_id, service_id, price):
+    return db.add_order(1, service_id, service_id, price, "Клиент", "+79990000000", None,
+                        day, booking_time, master_id)
+
+
+def cells(db):
+    return db.get_booking_cube('2000-01-01', '2999-12-31', 'master')
+
+
+def test_cube_follows_inserts_moves_and_cancels(db):
+    configure_analytics(CONFIG, db)
+    first = add(db, '2099-06-01', '10:00', 'anna', 'cut', 1500)
+    add(db, '2099-06-01', '12:00', 'anna', 'color', 3500)
+    moved = add(db, '2099-06-02', '10:00', 'maria', 'cut', 1500)
+    add(db, '2099-06-03', '10:00', None, 'unknown', 500)
+    db.cancel_order(first)
+    db.update_order(moved, booking_date='2099-06-05', master_id='anna', price=1800)
+
+    by_master = {row['key']: row for row in cells(db)}
+    assert by_master['anna']['bookings'] == 2
+    assert by_master['anna']['revenue'] == 3500 + 1800
+    assert by_master['anna']['cancelled'] == 1
+    assert by_master['anna']['minutes'] == 120 + 60
+    assert by_master['maria']['bookings'] == 0
+    assert by_master['']['minutes'] == 30  # услуги нет в конфиге — шаг сетки
+    days = [row['key'] for row in db.get_booking_cube('2099-06-01', '2099-06-30', 'day', 'anna', 'cut')
+            if row['bookings']]
+    assert days == ['2099-06-05']
+
+    # Пересборка из таблицы записей даёт те же записи, выручку и минуты
+    db.rebuild_booking_cube()
+    rebuilt = {row['key']: row for row in cells(db)}
+    for key, row in rebuilt.items():
+        assert (row['bookings'], row['revenue'], row['minutes']) == \
+            (by_master[key]['bookings'], by_master[key]['revenue'], by_master[key]['minutes'])
+
+
+def test_cube_minutes_use_duration_stored_at_booking_time(db):
+    config = copy.deepcopy(CONFIG)
+    configure_analytics(config, db)
+    moved = add(db, '2099-06-01', '10:00', 'anna', 'cut', 1500)
+    cancelled = add(db, '2099-06-01', '12:00', 'anna', 'cut', 1500)
+    config['services'][0]['duration'] = 120  # услугу удлинили после записи
+
+    db.update_order(moved, booking_date='2099-06-02')
+    db.cancel_order(cancelled)
+    anna = {row['key']: row for row in cells(db)}['anna']
+    assert (anna['bookings'], anna['minutes']) == (1, 60)
+
+    db.update_order(moved, service_id='color')
+    assert {row['key']: row for row in cells(db)}['anna']['minutes'] == 120
+
+
+def test_drill_down_screens(db):
+    configure_analytics(CONFIG, db)
+    add(db, '2099-06-01', '10:00', 'anna', 'cut', 1500)
+    add(db, '2099-06-08', '10:00', 'anna', 'color', 3500)
+    add(db, '2099-06-08', '10:00', 'maria', 'cut', 1500)
+    add(db, '2099-06-09', '10:00', 'maria', 'cut', 1500)
+
+    text, drill = cube_screen(db, CONFIG, 'week', today=TODAY)
+    assert "Записей: 3" in text and "Анна" in text
+    assert drill[0] == ('Анна', 'anna', None)  # по выручке: 3500 > 3000
+    assert drill[-1] == ("Все мастера по услугам", ALL, None)
+
+    text, drill = cube_screen(db, CONFIG, 'month', 'anna', today=TODAY)
+    assert "Мастер: Анна" in text and "Записей: 2" in text
+    assert [item[2] for item in drill] == ['color', 'cut', ALL]
+
+    text, drill = cube_screen(db, CONFIG, '2y', ALL, 'cut', today=TODAY)
+    assert "Услуга: Стрижка" in text and "06.2099" in text and drill == []
+
+
+def test_legacy_staff_list_and_removed_services_keep_names(db):
+    config = dict(CONFIG, staff={'list': CONFIG['staff']['masters']}, services=[])
+    configure_analytics(config, db)
+    add(db, '2099-06-08', '10:00', 'anna', 'cut', 1500)
+    assert db.get_service_names(['cut', 'gone']) == {'cut': 'cut'}
+
+    text, drill = cube_screen(db, config, 'week', today=TODAY)
+    assert drill[0] == ('Анна', 'anna', None)
+
+
+def test_long_ranges_read_whole_months_from_rollup(db):
+    configure_analytics(CONFIG, db)
+    for day in ('2099-04-30', '2099-05-01', '2099-05-31', '2099-06-15', '2099-07-01', '2099-07-02'):
+        add(db, day, '10:00', 'anna', 'cut', 1000)
+    assert DatabaseManager._cube_ranges('2099-04-30', '2099-07-01') == (
+        [('2099-04-30', '2099-04-30'), ('2099-07-01', '2099-07-01')], ('2099-05', '2099-06'))
+    assert DatabaseManager._cube_ranges('2099-05-02', '2099-05-30') == ([('2099-05-02', '2099-05-30')], None)
+
+    total = db.get_booking_cube('2099-04-30', '2099-07-01')[0]
+    assert (total['bookings'], total['revenue'], total['minutes']) == (5, 5000, 300)
+    months = {row['key']: row['bookings'] for row in db.get_booking_cube('2099-04-30', '2099-07-01', 'month')}
+    assert months == {'2099-04': 1, '2099-05': 2, '2099-06': 1, '2099-07': 1}
@@ -0,0 +1,113 @@
+"""
+Тесты истории клиента: запрос с LIMIT и кэш готовых текстов.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import DatabaseManager
+from utils.db.booking_queries import BookingQueries
+from utils.db.database import Database
+from utils.notify import get_client_history_text, get_history_cache
+
+
+@pytest.fixture
+def workdir(tmp_path):
+    original_dir = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        yield tmp_path
+    finally:
+        os.chdir(original_dir)
+
+
+@pytest.fixture
+def db(workdir):
+    db = DatabaseManager("history")
+    yield db
+    db.close()
+
+
+def add(db, user_id, hour, comment=None):
+    return db.add_order(
+        user_id=user_id, service_id="cut", service_name="Стрижка", price=1000,
+        client_name="Тест", phone="+79990000000", comment=comment,
+        booking_date="2099-06-01", booking_time=f"{hour:02d}:00", master_id=None,
+    )
+
+
+def test_history_is_limited_and_newest_first(db):
+    ids = [add(db, 1, hour) for hour in range(8, 16)]
+    add(db, 2, 17)
+
+    history = db.get_client_history(1, limit=3)
+    assert [b["id"] for b in history] == ids[::-1][:3]
+    assert db.get_client_history(1, limit=3, offset=6)[-1]["id"] == ids[0]
+    assert db.count_client_orders(1) == 8
+
+
+def test_history_query_uses_index(db):
+    plan = db.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM bookings WHERE user_id = ? ORDER BY created_at DESC LIMIT 5", (1,)
+    ).fetchall()
+    assert any("idx_bookings_user_created" in row["detail"] for row in plan)
+
+
+def test_orders_history_and_count(workdir):
+    database = Database("orders")
+    database.init_db()
+    try:
+        queries = BookingQueries(database.connection)
+        for hour in range(8, 12):
+            add(queries, 1, hour)
+        assert len(queries.get_client_history(1, limit=2)) == 2
+        assert queries.count_client_orders(1) == 4
+
+        plan = database.connection.execute(
+            "EXPLAIN QUERY PLAN SELECT COUNT(*) FROM orders WHERE user_id = ?", (1,)
+        ).fetchall()
+        assert any("idx_orders_user_created" in row[3] for row in plan)
+    finally:
+        database.close()
+
+
+def test_history_text_marks_current_order(db):
+    add(db, 1, 9)
+    current = add(db, 1, 10, comment="Без спешки")
+    text = get_client_history_text(db, 1, current, comment="Без спешки")
+    assert f"Заказ #{current}" in text and "🆕" in text
+    assert "Без спешки" in text
+    # Заказ старше последних limit записей комментарий не теряет
+    for hour in range(11, 18):
+        add(db, 1, hour)
+    text = get_client_history_text(db, 1, current, comment="Без спешки")
+    assert f"Заказ #{current}" not in text and "Без спешки" in text
+    # Первый заказ — истории нет
+    assert get_client_history_text(db, 3, 0) == ""
+
+
+def test_history_cache_is_invalidated_per_user(db):
+    add(db, 1, 9)
+    current = add(db, 1, 10)
+    add(db, 2, 11)
+    cache = get_history_cache(db)
+
+    get_client_history_text(db, 1, current)
+    get_client_history_text(db, 1, current)
+    assert cache.hits == 1
+
+    # Запись другого клиента не сбрасывает кэш
+    add(db, 2, 12)
+    get_client_history_text(db, 1, current)
+    assert cache.hits == 2
+
+    newer = add(db, 1, 13)
+    assert f"#{newer}" in get_client_history_text(db, 1, current)
+    assert cache.hits == 2
+
+    db.cancel_order(newer)
+    assert f"#{newer}" not in get_client_history_text(db, 1, current)
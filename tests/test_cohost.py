@@ -0,0 +1,51 @@
+"""
+Тесты запуска клиентского и админ-бота в одном процессе.
+"""
+
+import asyncio
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from admin_bot.middleware import ConfigMiddleware
+from utils.config_loader import load_config
+
+
+@pytest.fixture
+def config_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('ADMIN_BOT_TOKEN', '43:ADMIN')
+    directory = tmp_path / 'config'
+    directory.mkdir()
+    (directory / 'settings.json').write_text(json.dumps({
+        "config_version": 1, "business_slug": "cohost", "business_name": "Салон",
+        "admin_ids": [1], "fsm": {"storage": "memory"},
+    }), encoding='utf-8')
+    return str(directory)
+
+
+def test_bots_share_connection_pool(config_dir):
+    config = load_config(config_dir)
+    bot, admin_bot = main.create_bots(config, '42:CLIENT', shared_session=True)
+    try:
+        assert bot.session is admin_bot.session
+        assert bot.token != admin_bot.token
+        # Ограничитель запросов подключён к общей сессии один раз
+        assert len(bot.session.middleware._middlewares) == 1
+    finally:
+        asyncio.run(bot.session.close())
+
+
+def test_admin_uses_client_config_snapshot(config_dir):
+    config = load_config(config_dir)
+    settings = os.path.join(config_dir, 'settings.json')
+    admin_dp = main.build_cohosted_admin(config_dir, config, SimpleNamespace(), settings)
+    middlewares = [getattr(m, 'middleware', m) for m in admin_dp.update.middleware._middlewares]
+    config_middleware = next(m for m in middlewares if isinstance(m, ConfigMiddleware))
+    assert config_middleware.config is config
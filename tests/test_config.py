@@ -10,7 +10,7 @@ import json
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.config_loader import load_config
+from utils.config_loader import ConfigWatcher, load_config
 from utils.config_editor import ConfigEditor
 
 
@@ -137,3 +137,31 @@ class TestConfigEditor:
         config = editor.load()
         master_ids = [m['id'] for m in config['staff']['masters']]
         assert "m1" not in master_ids
+
+
+class TestConfigWatcher:
+    """Тесты для ConfigWatcher (единый снимок конфигурации процесса)."""
+
+    def test_editor_save_updates_snapshot_immediately(self, tmp_path):
+        """Правка через ConfigEditor сразу видна в снимке и подписчикам."""
+        config_file = tmp_path / 'settings.json'
+        config_file.write_text(json.dumps({"config_version": 1, "business_name": "Старое"}), encoding='utf-8')
+        config = load_config(str(tmp_path))
+        watcher = ConfigWatcher(str(tmp_path), config)
+        seen = []
+        watcher.subscribe(lambda snapshot: seen.append(snapshot['business_name']))
+
+        ConfigEditor(str(config_file)).update_field('business_name', 'Новое')
+
+        assert config['business_name'] == 'Новое'
+        assert config['config_version'] == 2
+        assert seen == ['Новое']
+
+    def test_reload_skips_unchanged_version(self, tmp_path):
+        """Без смены config_version снимок не перечитывается."""
+        config_file = tmp_path / 'settings.json'
+        config_file.write_text(json.dumps({"config_version": 1, "business_name": "A"}), encoding='utf-8')
+        watcher = ConfigWatcher(str(tmp_path))
+        config_file.write_text(json.dumps({"config_version": 1, "business_name": "B"}), encoding='utf-8')
+        assert watcher.reload(force=True) is False
+        assert watcher.config['business_name'] == 'A'
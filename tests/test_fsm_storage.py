@@ -0,0 +1,125 @@
+"""
+Тесты SQLite-хранилища FSM: переживание перезапуска, объединение записей,
+вытеснение и удаление заброшенных сценариев.
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from states.booking import BookingState
+from utils.fsm_storage import SQLiteStorage
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def key(user_id):
+    return StorageKey(bot_id=42, chat_id=user_id, user_id=user_id)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "fsm.sqlite")
+
+
+def rows(storage):
+    return storage.conn.execute("SELECT key, state FROM fsm_state ORDER BY key").fetchall()
+
+
+def test_state_survives_restart(path):
+    async def first_run():
+        storage = SQLiteStorage(path)
+        await storage.set_state(key(1), BookingState.confirmation)
+        await storage.update_data(key(1), {"service_id": "cut", "slots": {"10:00"}})
+        await storage.close()
+
+    async def second_run():
+        storage = SQLiteStorage(path)
+        try:
+            return await storage.get_state(key(1)), await storage.get_data(key(1))
+        finally:
+            await storage.close()
+
+    asyncio.run(first_run())
+    state, data = asyncio.run(second_run())
+    assert state == BookingState.confirmation.state
+    assert data == {"service_id": "cut", "slots": ["10:00"]}
+
+
+def test_writes_in_one_handler_are_coalesced(path):
+    async def scenario():
+        storage = SQLiteStorage(path, flush_delay=0.01)
+        await storage.set_state(key(1), BookingState.choosing_service)
+        for i in range(5):
+            await storage.update_data(key(1), {f"field{i}": i})
+        # Ещё ничего не записано
+        assert rows(storage) == []
+        await asyncio.sleep(0.05)
+        return storage
+
+    storage = asyncio.run(scenario())
+    assert storage.flushes == 1 and storage.writes == 1
+    assert len(rows(storage)) == 1
+    storage.conn.close()
+
+
+def test_cleared_state_is_removed_from_table(path):
+    async def scenario():
+        storage = SQLiteStorage(path)
+        await storage.set_state(key(1), BookingState.choosing_service)
+        await storage.update_data(key(1), {"a": 1})
+        storage.flush()
+        assert len(rows(storage)) == 1
+        # FSMContext.clear() = set_state(None) + set_data({})
+        await storage.set_state(key(1), None)
+        await storage.set_data(key(1), {})
+        storage.flush()
+        assert rows(storage) == []
+        await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_memory_bound_flushes_evicted_entries(path):
+    async def scenario():
+        storage = SQLiteStorage(path, max_entries=2)
+        for user_id in (1, 2, 3):
+            await storage.set_state(key(user_id), BookingState.choosing_service)
+        assert storage.stats()["cached"] == 2
+        assert storage.evictions == 1
+        # Вытесненная грязная запись уже в БД и читается обратно
+        assert [row[0] for row in rows(storage)] == ["42:1:1"]
+        assert await storage.get_state(key(1)) == BookingState.choosing_service.state
+        await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_abandoned_flows_are_swept(path):
+    clock = FakeClock()
+
+    async def scenario():
+        storage = SQLiteStorage(path, ttl=3600, sweep_interval=60, clock=clock)
+        await storage.set_state(key(1), BookingState.choosing_service)
+        storage.flush()
+        clock.now += 1800
+        await storage.set_state(key(2), BookingState.choosing_service)
+        clock.now += 2000
+        storage.flush()
+        assert [row[0] for row in rows(storage)] == ["42:2:2"]
+        assert storage.expired == 1
+        assert await storage.get_state(key(1)) is None
+        await storage.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,98 @@
+"""
+Тесты демона проверок работоспособности и /healthz.
+"""
+
+import asyncio
+import os
+import sys
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db_manager import DatabaseManager
+import utils.health
+from utils.health import DEGRADED, HEALTHY, HealthDaemon, start_health_server
+
+
+async def fake_bot_api(peers: list):
+    """Локальный Bot API: отвечает на getMe и запоминает адрес клиента"""
+
+    async def api(request: web.Request) -> web.Response:
+        peers.append(request.transport.get_extra_info('peername'))
+        return web.json_response({'ok': True, 'result': {'id': 1, 'is_bot': True, 'username': 'health_bot'}})
+
+    app = web.Application()
+    app.router.add_get('/bot{token}/{method}', api)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', 0).start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+
+def test_probes_reuse_session_and_healthz_serves_cache(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'health.sqlite'))
+    peers = []
+
+    async def scenario():
+        api_runner, api_base = await fake_bot_api(peers)
+        daemon = HealthDaemon(db, {'client': '1:A', 'admin': '2:B'}, interval=0.05, api_base=api_base)
+        task = asyncio.create_task(daemon.run())
+        health_runner = await start_health_server(daemon, '127.0.0.1', 0)
+        try:
+            while len(peers) < 6:  # три раунда проверок двух ботов
+                await asyncio.sleep(0.01)
+            requests_before = len(peers)
+            url = f"http://127.0.0.1:{health_runner.addresses[0][1]}/healthz"
+            async with aiohttp.ClientSession() as session:
+                async with session.get(url) as response:
+                    status, report = response.status, await response.json()
+                daemon.thresholds['outbox_backlog'] = -1
+                await daemon.check()
+                async with session.get(url) as response:
+                    degraded_status, degraded = response.status, await response.json()
+            return status, report, degraded_status, degraded, requests_before
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await health_runner.cleanup()
+            await api_runner.cleanup()
+
+    try:
+        status, report, degraded_status, degraded, requests_before = asyncio.run(scenario())
+    finally:
+        db.close()
+
+    assert status == 200 and report['status'] == HEALTHY
+    assert set(report['checks']) == {'database', 'wal', 'event_loop', 'outbox', 'bot:client', 'bot:admin'}
+    assert report['checks']['bot:admin']['username'] == 'health_bot'
+    assert report['checks']['database']['write_ms'] >= 0
+    # Соединения с Bot API переиспользуются между раундами
+    assert len(set(peers[:requests_before])) <= 2
+    assert degraded_status == 503 and degraded['status'] == DEGRADED
+    assert degraded['checks']['outbox']['status'] == DEGRADED
+
+
+def test_watchdog_follows_loop_only_and_probe_keeps_data_version(tmp_path, monkeypatch):
+    path = str(tmp_path / 'health.sqlite')
+    db, peer = DatabaseManager(path), DatabaseManager(path)
+    sent = []
+    monkeypatch.setattr(utils.health, 'sd_notify', sent.append)
+    try:
+        version = peer.get_data_version()
+        daemon = HealthDaemon(db, {})
+        daemon._watchdog = True
+        # Медленная БД — отчёт деградирован, но процесс жив: watchdog продолжается
+        daemon.thresholds['db_latency_ms'] = -1
+        assert asyncio.run(daemon.check())['status'] == DEGRADED
+        assert sent == ["WATCHDOG=1"]
+        # Проба БД откатывается и не меняет data_version у других соединений
+        assert peer.get_data_version() == version
+
+        daemon.thresholds['loop_lag_ms'] = -1
+        asyncio.run(daemon.check())
+        assert sent == ["WATCHDOG=1"]
+    finally:
+        db.close()
+        peer.close()
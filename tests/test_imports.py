@@ -69,8 +69,8 @@ class TestImports:
     def test_utils_notify_import(self):
         """Тест импорта utils.notify"""
         import utils.notify
-        from utils.notify import send_order_to_admins
-        assert send_order_to_admins is not None
+        from utils.notify import format_new_order_message
+        assert format_new_order_message is not None
 
     def test_states_booking_import(self):
         """Тест импорта states.booking"""
@@ -0,0 +1,93 @@
+"""
+Тесты замера задержек: точность гистограммы и учёт собственного времени
+обработчиков, middlewares и вызовов БД.
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+from aiogram import BaseMiddleware, Bot, Dispatcher, Router
+from aiogram.types import Message, Update
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.latency import Histogram, LatencyRegistry
+
+
+def make_update(update_id, text):
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": text,
+            "chat": {"id": 5, "type": "private"},
+            "from": {"id": 5, "is_bot": False, "first_name": "Test"},
+        },
+    })
+
+
+class SlowMiddleware(BaseMiddleware):
+    def __init__(self, db):
+        super().__init__()
+        self.db = db
+
+    async def __call__(self, handler, event, data):
+        await asyncio.sleep(0.02)
+        data['db'] = self.db
+        return await handler(event, data)
+
+
+class FakeDB:
+    def get_client(self, user_id):
+        time.sleep(0.01)
+        return {"id": user_id}
+
+
+def test_histogram_percentiles_within_bucket_error():
+    histogram = Histogram()
+    for value in range(1, 10001):
+        histogram.record(value)
+    assert histogram.count == 10000 and histogram.max == 10000
+    for q, expected in ((50, 5000), (95, 9500), (99, 9900)):
+        assert abs(histogram.percentile(q) - expected) <= expected * 0.0625
+    assert histogram.percentile(100) == 10000
+
+
+def test_self_time_of_middleware_handler_and_db():
+    registry = LatencyRegistry()
+    router = Router()
+
+    @router.message()
+    async def confirm(message: Message, db):
+        db.get_client(message.from_user.id)
+        await asyncio.sleep(0.03)
+
+    db = FakeDB()
+    registry.instrument_db(db)
+    dp = Dispatcher()
+    dp.update.middleware(registry.timed(SlowMiddleware(db)))
+    dp.include_router(router)
+    registry.instrument_dispatcher(dp)
+
+    async def scenario():
+        bot = Bot("42:TEST")
+        try:
+            for update_id in range(1, 4):
+                await dp.feed_update(bot, make_update(update_id, "hi"))
+        finally:
+            await bot.session.close()
+
+    asyncio.run(scenario())
+    rows = {row['name']: row for row in registry.summary()}
+
+    handler = rows[f"handler:{__name__}.test_self_time_of_middleware_handler_and_db.<locals>.confirm"]
+    middleware = rows[f"middleware:{__name__}.SlowMiddleware"]
+    db_call = rows["db:get_client"]
+    assert handler['count'] == middleware['count'] == db_call['count'] == 3
+    # Собственное время без вложенных шагов
+    assert 20 <= middleware['p50_ms'] < 28
+    assert 30 <= handler['p50_ms'] < 38
+    assert 10 <= db_call['p50_ms'] < 15 and db_call['cpu_p50_ms'] < 5
+    assert rows['update']['p50_ms'] >= 60
+    assert "confirm" in registry.report()
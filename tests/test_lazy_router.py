@@ -0,0 +1,101 @@
+"""
+Тесты ленивых роутеров: загрузка модуля по триггерам манифеста.
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import Update
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.lazy_router import LazyRouter, MANIFEST_PATH, build_manifest, scan_module
+
+EDITOR_SOURCE = '''
+from aiogram import F, Router
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import CallbackQuery, Message
+
+router = Router()
+seen = []
+
+
+class DemoStates(StatesGroup):
+    enter_name = State()
+
+
+@router.callback_query(F.data.startswith("demo_edit:"))
+async def on_edit(callback: CallbackQuery):
+    seen.append(callback.data)
+
+
+@router.message(DemoStates.enter_name)
+async def on_name(message: Message):
+    seen.append(message.text)
+'''
+
+
+def callback_update(update_id, data):
+    return Update.model_validate({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "chat_instance": "1", "data": data,
+            "from": {"id": 7, "is_bot": False, "first_name": "Test"},
+            "message": {"message_id": 1, "date": 0, "chat": {"id": 7, "type": "private"}, "text": "menu"},
+        },
+    })
+
+
+def message_update(update_id, text):
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": text,
+            "chat": {"id": 7, "type": "private"},
+            "from": {"id": 7, "is_bot": False, "first_name": "Test"},
+        },
+    })
+
+
+def test_manifest_is_up_to_date():
+    with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+        assert json.load(f) == json.loads(json.dumps(build_manifest()))
+
+
+def test_module_is_imported_on_first_matching_event(tmp_path, monkeypatch):
+    (tmp_path / 'lazy_demo_editor.py').write_text(EDITOR_SOURCE, encoding='utf-8')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr('utils.lazy_router.PROJECT_ROOT', str(tmp_path))
+    triggers = scan_module('lazy_demo_editor')
+    assert triggers == {
+        'callback_query': {'prefixes': ['demo_edit:']},
+        'message': {'states': ['DemoStates']},
+    }
+
+    lazy = LazyRouter('lazy_demo_editor', triggers=triggers)
+    dp = Dispatcher()
+    dp.include_router(lazy)
+
+    async def scenario():
+        bot = Bot("42:TEST")
+        try:
+            # Сообщение вне состояния модуля не загружает его
+            await dp.feed_update(bot, message_update(1, "hello"))
+            assert lazy.loaded is None and 'lazy_demo_editor' not in sys.modules
+            # Состояние FSM, оставшееся с прошлого запуска, — загружает
+            await dp.storage.set_state(StorageKey(bot_id=bot.id, chat_id=7, user_id=7), "DemoStates:enter_name")
+            await dp.feed_update(bot, message_update(2, "Анна"))
+            assert lazy.loaded is not None
+            await dp.feed_update(bot, callback_update(3, "demo_edit:5"))
+        finally:
+            await bot.session.close()
+
+    try:
+        asyncio.run(scenario())
+        assert sys.modules['lazy_demo_editor'].seen == ["Анна", "demo_edit:5"]
+    finally:
+        sys.modules.pop('lazy_demo_editor', None)
@@ -0,0 +1,58 @@
+"""
+Тесты конвейера логирования (очередь, выборка, JSON-файл).
+"""
+
+import json
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import logger as log_setup
+from utils.logger import SamplingFilter
+
+
+def make_record(name: str, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord(name, level, __file__, 1, "message", None, None)
+
+
+def test_sampling_keeps_every_nth_info_and_all_warnings():
+    sampler = SamplingFilter({'handlers': 5, 'handlers.booking.time': 2})
+    time_step = [sampler.filter(make_record('handlers.booking.time')) for _ in range(10)]
+    other_step = [sampler.filter(make_record('handlers.booking.date')) for _ in range(10)]
+    assert sum(time_step) == 5  # самый длинный префикс
+    assert sum(other_step) == 2
+    assert sampler.filter(make_record('utils.outbox'))
+    assert all(sampler.filter(make_record('handlers.start', logging.WARNING)) for _ in range(3))
+
+
+def test_pipeline_writes_json_lines_to_rotating_file(tmp_path, monkeypatch):
+    for variable in ('LOG_LEVEL', 'LOG_FORMAT', 'LOG_FILE'):
+        monkeypatch.delenv(variable, raising=False)
+    path = tmp_path / 'logs' / 'bot.log'
+    log_setup.setup_logger({'file': str(path), 'sample': {'test.sampled': 3}}, name='worker1')
+    try:
+        log = logging.getLogger('test.pipeline')
+        details = {'phone': '+7900'}
+        log.info("Saved %s for user %s", details, 42, extra={'user_id': 42})
+        log.info("Client phone: %s", '+79991234567')
+        details['phone'] = 'changed'  # после вызова — в логе значение на момент вызова
+        for index in range(6):
+            logging.getLogger('test.sampled').info("tick %s", index)
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            log.exception("Failed")
+    finally:
+        log_setup.stop_logging()
+        logging.root.handlers.clear()
+
+    lines = [json.loads(line) for line in (tmp_path / 'logs' / 'bot.worker1.log').read_text('utf-8').splitlines()]
+    saved = next(line for line in lines if line['logger'] == 'test.pipeline' and line['level'] == 'INFO')
+    assert saved['msg'] == "Saved {'phone': '+7900'} for user 42"
+    assert saved['user_id'] == 42
+    assert any(line['msg'] == "Client phone: +7999***4567" for line in lines)
+    assert [line['msg'] for line in lines if line['logger'] == 'test.sampled'] == ["tick 0", "tick 3"]
+    failed = next(line for line in lines if line['level'] == 'ERROR')
+    assert 'ValueError: boom' in failed['exc']
@@ -0,0 +1,115 @@
+"""
+Тесты автоназначения мастера («Любой свободный мастер»).
+"""
+
+import asyncio
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import DatabaseManager
+from handlers.booking.utils import get_masters_for_service
+from utils.master_assignment import LeastBookedPolicy, MasterAssigner, RoundRobinPolicy
+from utils.slot_engine import SlotEngine
+
+MONDAY = date(2099, 6, 1)
+WORKDAY = {"working": True, "start": "10:00", "end": "13:00"}
+
+
+@pytest.fixture
+def db(tmp_path):
+    original_dir = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        db = DatabaseManager("assign")
+        yield db
+        db.close()
+    finally:
+        os.chdir(original_dir)
+
+
+@pytest.fixture
+def config():
+    return {
+        "booking": {"slot_duration": 60},
+        "services": [{"id": "cut", "name": "Стрижка", "price": 1000, "duration": 60}],
+        "staff": {
+            "enabled": True,
+            "masters": [
+                {"id": "anna", "name": "Анна", "services": ["cut"], "schedule": {"monday": WORKDAY}},
+                {"id": "olga", "name": "Ольга", "services": ["cut"],
+                 "schedule": {"monday": {"working": True, "start": "12:00", "end": "15:00"}}},
+                {"id": "maria", "name": "Мария", "services": ["nails"], "schedule": {"monday": WORKDAY}},
+                {"id": "ira", "name": "Ира", "services": ["cut"], "active": False, "schedule": {"monday": WORKDAY}},
+            ],
+        },
+    }
+
+
+def book(db, booking_time, master_id):
+    return db.add_booking(
+        user_id=1, client_name="Тест", phone="+79990000000",
+        service_id="cut", service_name="Стрижка",
+        master_id=master_id, master_name=None,
+        booking_datetime=f"{MONDAY.isoformat()}T{booking_time}",
+        comment=None, price=1000,
+    )
+
+
+def test_assigner_and_master_picker_agree(db, config):
+    legacy = dict(config, staff={"enabled": True, "list": config["staff"]["masters"]})
+    for conf in (config, legacy):
+        assigner = MasterAssigner(SlotEngine(conf, db))
+        assert assigner.qualified_masters("cut") == get_masters_for_service(conf, "cut")
+        assert [m["id"] for m in assigner.qualified_masters("cut")] == ["anna", "olga"]
+
+
+def test_union_grid_covers_all_qualified_masters(db, config):
+    assigner = MasterAssigner(SlotEngine(config, db))
+    slots = asyncio.run(assigner.get_free_slots(MONDAY, "cut"))
+    assert slots == ["10:00", "11:00", "12:00", "13:00", "14:00"]
+
+
+def test_union_grid_drops_slot_only_when_everyone_is_busy(db, config):
+    book(db, "10:00", "anna")
+    assigner = MasterAssigner(SlotEngine(config, db))
+    slots = asyncio.run(assigner.get_free_slots(MONDAY, "cut"))
+    assert "10:00" not in slots
+    assert "12:00" in slots
+
+
+def test_assign_skips_busy_and_unqualified_masters(db, config):
+    book(db, "12:00", "anna")
+    assigner = MasterAssigner(SlotEngine(config, db))
+    master = asyncio.run(assigner.assign(MONDAY, "cut", "12:00"))
+    assert master["id"] == "olga"
+
+
+def test_assign_returns_none_when_nobody_is_free(db, config):
+    book(db, "10:00", "anna")
+    assigner = MasterAssigner(SlotEngine(config, db))
+    assert asyncio.run(assigner.assign(MONDAY, "cut", "10:00")) is None
+
+
+def test_least_booked_policy_prefers_less_loaded_master(db, config):
+    book(db, "10:00", "anna")
+    assigner = MasterAssigner(SlotEngine(config, db), policy=LeastBookedPolicy())
+    master = asyncio.run(assigner.assign(MONDAY, "cut", "12:00"))
+    assert master["id"] == "olga"
+
+
+def test_round_robin_policy_alternates():
+    policy = RoundRobinPolicy()
+    picks = [policy.choose(["anna", "olga"], {}) for _ in range(4)]
+    assert picks == ["anna", "olga", "anna", "olga"]
+    assert policy.choose(["anna"], {}) == "anna"
+
+
+def test_policy_is_selected_from_config(db, config):
+    config["booking"]["assignment_policy"] = "round_robin"
+    assigner = MasterAssigner(SlotEngine(config, db))
+    assert assigner.policy.name == "round_robin"
@@ -0,0 +1,104 @@
+"""
+Тесты экспорта метрик Prometheus (/metrics).
+"""
+
+import asyncio
+import os
+import sys
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Dispatcher
+
+from middlewares import UserOrderingMiddleware
+from utils.fsm_storage import SQLiteStorage
+from utils.latency import LatencyRegistry
+from utils.local_endpoint import endpoint_settings
+from utils.metrics import MetricsExporter, start_metrics_server
+from utils.rate_governor import RateGovernor
+
+
+class UntouchableDB:
+    """Менеджер БД, любое обращение к методам которого — ошибка"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def __getattr__(self, name):
+        raise AssertionError(f"scrape touched the database: {name}")
+
+
+def build_exporter(tmp_path):
+    db_path = str(tmp_path / 'db.sqlite')
+    with open(db_path, 'wb') as f:
+        f.write(b'x' * 100)
+    with open(db_path + '-wal', 'wb') as f:
+        f.write(b'x' * 40)
+
+    latency = LatencyRegistry()
+    for micros in (500, 2000, 2000, 300000):
+        latency.stats('handler:handlers.booking.confirm').wall.record(micros)
+    latency.stats('db:get_slots').wall.record(1500)
+
+    governor = RateGovernor()
+    governor.requests, governor.rate_limited, governor.errors = 10, 2, 1
+
+    dp = Dispatcher(storage=SQLiteStorage(str(tmp_path / 'fsm.sqlite')))
+    ordering = UserOrderingMiddleware()
+    ordering.processed = 7
+    dp.update.outer_middleware(ordering)
+
+    exporter = MetricsExporter(latency, governor)
+    exporter.watch_bot('client', dp, UntouchableDB(db_path))
+    return exporter
+
+
+def test_render_reads_counters_without_db(tmp_path):
+    text = build_exporter(tmp_path).render()
+    lines = set(text.splitlines())
+
+    assert 'bot_updates_processed_total{bot="client"} 7' in lines
+    assert 'bot_api_rate_limited_total 2' in lines
+    assert 'bot_api_errors_total 1' in lines
+    assert 'bot_sqlite_file_bytes{db="bookings"} 100' in lines
+    assert 'bot_sqlite_wal_bytes{db="bookings"} 40' in lines
+    assert 'bot_cache_hit_ratio{cache="fsm:client"} 0.0' in lines
+    # Гистограмма накопительная по границам LATENCY_BUCKETS
+    handler = 'handler="handlers.booking.confirm"'
+    assert f'bot_handler_duration_seconds_bucket{{{handler},le="0.001"}} 1' in lines
+    assert f'bot_handler_duration_seconds_bucket{{{handler},le="0.0025"}} 3' in lines
+    assert f'bot_handler_duration_seconds_bucket{{{handler},le="0.25"}} 3' in lines
+    assert f'bot_handler_duration_seconds_bucket{{{handler},le="+Inf"}} 4' in lines
+    assert f'bot_handler_duration_seconds_count{{{handler}}} 4' in lines
+    assert 'bot_db_query_duration_seconds_count{method="get_slots"} 1' in lines
+    assert '# TYPE bot_db_query_duration_seconds histogram' in lines
+
+
+def test_metrics_endpoint(tmp_path):
+    exporter = build_exporter(tmp_path)
+
+    async def scenario():
+        runner = await start_metrics_server(exporter, '127.0.0.1', 0)
+        try:
+            port = runner.addresses[0][1]
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f'http://127.0.0.1:{port}/metrics') as response:
+                    return response.status, response.headers['Content-Type'], await response.text()
+        finally:
+            await runner.cleanup()
+
+    status, content_type, body = asyncio.run(scenario())
+    assert status == 200
+    assert content_type.startswith('text/plain; version=0.0.4')
+    assert 'bot_updates_processed_total{bot="client"} 7' in body
+
+
+def test_local_endpoint_settings(monkeypatch):
+    monkeypatch.delenv('METRICS_PORT', raising=False)
+    assert endpoint_settings({}, 'metrics', 'METRICS_PORT') is None
+    assert endpoint_settings({'metrics': {'port': 9100, 'enabled': False}}, 'metrics', 'METRICS_PORT') is None
+    monkeypatch.setenv('METRICS_PORT', '9200')
+    assert endpoint_settings({'metrics': {'port': 9100, 'host': '0.0.0.0'}}, 'metrics', 'METRICS_PORT') == \
+        {'host': '0.0.0.0', 'port': 9200}
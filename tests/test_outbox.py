@@ -0,0 +1,232 @@
+"""
+Тесты outbox уведомлений и фонового диспетчера.
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import DatabaseManager
+from utils.outbox import OutboxDispatcher, admin_notifications
+
+CONFIG = {"admin_ids": [100, 200], "business_name": "Салон"}
+
+
+class FakeClock:
+    def __init__(self):
+        # Строки outbox создаются с реальным временем
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+class FakeBot:
+    def __init__(self, errors=None):
+        self.sent = []
+        # chat_id -> список исключений, которые вернуть по очереди
+        self.errors = errors or {}
+
+    async def send_message(self, chat_id, text):
+        pending = self.errors.get(chat_id)
+        if pending:
+            raise pending.pop(0)
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture
+def db(tmp_path):
+    original_dir = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        db = DatabaseManager("outbox")
+        yield db
+        db.close()
+    finally:
+        os.chdir(original_dir)
+
+
+def new_order(db, booking_time="10:00"):
+    notifications = admin_notifications(CONFIG, "new_order", {
+        "order_data": {
+            "user_id": 1, "service_name": "Стрижка", "price": 1000,
+            "booking_date": "2099-06-01", "booking_time": booking_time,
+            "client_name": "Тест", "phone": "+79990000000", "username": "test",
+        },
+        "business_name": CONFIG["business_name"],
+    })
+    return db.add_order(
+        user_id=1, service_id="cut", service_name="Стрижка", price=1000,
+        client_name="Тест", phone="+79990000000", comment=None,
+        booking_date="2099-06-01", booking_time=booking_time, master_id=None,
+        notifications=notifications,
+    )
+
+
+def test_notifications_are_written_with_the_order(db):
+    new_order(db)
+    assert db.get_outbox_stats() == {"pending": 2}
+
+    # Конфликт слота откатывает и заказ, и его уведомления
+    with pytest.raises(ValueError):
+        new_order(db)
+    assert db.get_outbox_stats() == {"pending": 2}
+
+
+def test_admin_notifications_respect_feature_flag():
+    config = dict(CONFIG, features={"enable_admin_notify": False})
+    assert admin_notifications(config, "new_order", {}) == []
+
+
+def test_drain_sends_and_removes_rows(db):
+    order_id = new_order(db)
+    bot = FakeBot()
+    dispatcher = OutboxDispatcher(db, bot, clock=FakeClock())
+
+    assert asyncio.run(dispatcher.drain()) == 2
+    assert sorted(chat_id for chat_id, _ in bot.sent) == [100, 200]
+    assert f"#{order_id}" in bot.sent[0][1]
+    assert db.get_outbox_stats() == {}
+
+
+def test_transient_error_is_retried_with_backoff(db):
+    new_order(db)
+    clock = FakeClock()
+    bot = FakeBot(errors={100: [RuntimeError("network down")]})
+    dispatcher = OutboxDispatcher(db, bot, base_delay=10, clock=clock)
+
+    asyncio.run(dispatcher.drain())
+    assert [chat_id for chat_id, _ in bot.sent] == [200]
+    assert db.get_outbox_stats() == {"pending": 1}
+
+    # До истечения задержки повтора нет
+    clock.now += 5
+    assert asyncio.run(dispatcher.drain()) == 0
+    clock.now += 5
+    assert asyncio.run(dispatcher.drain()) == 1
+    assert [chat_id for chat_id, _ in bot.sent] == [200, 100]
+
+
+def test_permanent_error_and_attempt_limit_mark_failed(db):
+    new_order(db)
+    clock = FakeClock()
+    bot = FakeBot(errors={
+        100: [TelegramForbiddenError(method=None, message="bot was blocked")],
+        200: [RuntimeError("boom"), RuntimeError("boom")],
+    })
+    dispatcher = OutboxDispatcher(db, bot, max_attempts=2, base_delay=1, clock=clock)
+
+    asyncio.run(dispatcher.drain())
+    clock.now += 1
+    asyncio.run(dispatcher.drain())
+    assert db.get_outbox_stats() == {"failed": 2}
+    assert dispatcher.failed == 2
+
+
+def test_retry_after_does_not_count_as_attempt(db):
+    new_order(db)
+    clock = FakeClock()
+    bot = FakeBot(errors={100: [TelegramRetryAfter(method=None, message="flood", retry_after=30)]})
+    dispatcher = OutboxDispatcher(db, bot, max_attempts=1, clock=clock)
+
+    asyncio.run(dispatcher.drain())
+    assert db.get_outbox_stats() == {"pending": 1}
+    clock.now += 30
+    asyncio.run(dispatcher.drain())
+    assert db.get_outbox_stats() == {}
+
+
+def test_claimed_rows_are_redelivered_after_lease(db):
+    new_order(db)
+    clock = FakeClock()
+    # Диспетчер «упал» после захвата строк, не отправив их
+    assert len(db.claim_outbox(clock(), lease_seconds=60)) == 2
+    dispatcher = OutboxDispatcher(db, FakeBot(), clock=clock)
+    assert asyncio.run(dispatcher.drain()) == 0
+    clock.now += 60
+    assert asyncio.run(dispatcher.drain()) == 2
+
+
+def test_cancel_and_update_queue_notifications(db):
+    order_id = new_order(db)
+    asyncio.run(OutboxDispatcher(db, FakeBot(), clock=FakeClock()).drain())
+    order = db.get_order_by_id(order_id)
+    assert order["booking_date"] == "2099-06-01"
+    assert order["booking_time"] == "10:00"
+
+    bot = FakeBot()
+    changed = admin_notifications(CONFIG, "order_changed", {
+        "old_order": order, "new_order": dict(order, booking_time="11:00"),
+        "business_name": CONFIG["business_name"],
+    })
+    assert db.update_order(order_id, notifications=changed, booking_time="11:00")
+    cancelled = admin_notifications(CONFIG, "order_cancelled", {
+        "order": db.get_order_by_id(order_id), "business_name": CONFIG["business_name"],
+    })
+    assert db.cancel_order(order_id, notifications=cancelled)
+
+    asyncio.run(OutboxDispatcher(db, bot, clock=FakeClock()).drain())
+    texts = [text for _, text in bot.sent]
+    assert sum("Изменение заказа" in text for text in texts) == 2
+    assert sum("Отмена записи" in text for text in texts) == 2
+
+
+def test_quiet_traffic_is_sent_immediately_then_coalesced(db):
+    clock = FakeClock()
+    bot = FakeBot()
+    dispatcher = OutboxDispatcher(db, bot, coalesce_window=10, burst_threshold=2, clock=clock)
+
+    new_order(db, "10:00")
+    clock.now = time.time()
+    asyncio.run(dispatcher.drain())
+    assert len(bot.sent) == 2
+
+    # Второе уведомление за окно ещё уходит сразу, дальше копится сводка
+    for booking_time in ("11:00", "12:00", "13:00"):
+        new_order(db, booking_time)
+        clock.now = time.time()
+        asyncio.run(dispatcher.drain())
+    assert len(bot.sent) == 4
+    assert db.get_outbox_stats() == {"pending": 4}
+    assert dispatcher.next_wakeup() <= 10
+
+    clock.now += 10
+    assert asyncio.run(dispatcher.drain()) == 4
+    digests = bot.sent[4:]
+    assert sorted(chat_id for chat_id, _ in digests) == [100, 200]
+    assert all("Сводка: 2" in text for _, text in digests)
+    assert dispatcher.digests == 2
+    assert db.get_outbox_stats() == {}
+
+    # После окна снова тихо — одиночные сообщения
+    new_order(db, "14:00")
+    clock.now += 30
+    asyncio.run(dispatcher.drain())
+    assert "Сводка" not in bot.sent[-1][1]
+
+
+def test_digest_is_split_to_fit_message_limit(db):
+    dispatcher = OutboxDispatcher(db, FakeBot(), coalesce_window=10, clock=FakeClock())
+    rows = [{"kind": "order_cancelled", "chat_id": 100, "payload": {
+        "order": {"id": i, "service_name": "Стрижка", "booking_date": "2099-06-01",
+                  "booking_time": "10:00", "client_name": "x" * 1500, "phone": "+7"},
+        "business_name": "Салон",
+    }} for i in range(6)]
+    texts = dispatcher.render(rows)
+    assert len(texts) > 1
+    assert all(len(text) <= 4096 for text in texts)
+
+
+def test_coalescing_can_be_disabled(db):
+    for booking_time in ("10:00", "11:00", "12:00"):
+        new_order(db, booking_time)
+    bot = FakeBot()
+    dispatcher = OutboxDispatcher(db, bot, coalesce_window=0, clock=FakeClock())
+    asyncio.run(dispatcher.drain())
+    assert len(bot.sent) == 6
@@ -8,7 +8,7 @@ import os
 # Добавляем корневую директорию в путь
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.privacy import mask_phone, mask_name, mask_personal_data
+from utils.privacy import mask_phone, mask_name, mask_personal_data, Redactor
 
 
 class TestPrivacyMasking(unittest.TestCase):
@@ -53,6 +53,14 @@ class TestPrivacyMasking(unittest.TestCase):
         self.assertIn("***@example.com", result)
         self.assertNotIn("test@", result)
 
+    def test_redactor_single_pass(self):
+        """Тест маскировки токена, телефона и email за один проход"""
+        text = ("GET /bot1234567890:AAEhBOweik6ad9r_QXMENQjcrGbqCr4K-lk/getMe "
+                "phone +7 (999) 123-45-67, mail a.b@example.com, update id=791234567890")
+        result = Redactor().redact(text)
+        self.assertEqual(result, "GET /bot1234567890:***/getMe phone +7999***4567, "
+                                 "mail ***@example.com, update id=791234567890")
+
 
 class TestPhoneValidation(unittest.TestCase):
     """Тесты для валидации телефонов"""
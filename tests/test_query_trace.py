@@ -0,0 +1,57 @@
+"""
+Тесты журнала медленных SQL-запросов.
+"""
+
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import query_trace
+from utils.db_manager import DatabaseManager
+from utils.query_trace import QueryTracer, TracedConnection, fingerprint
+
+
+def test_fingerprint_strips_literals():
+    assert fingerprint("SELECT * FROM bookings WHERE user_id = 42 AND phone = 'x''y'") == \
+        "SELECT * FROM bookings WHERE user_id = ? AND phone = ?"
+    assert fingerprint("SELECT id FROM t WHERE id IN (?, ?,\n ?)  LIMIT 5") == \
+        "SELECT id FROM t WHERE id IN (?...) LIMIT ?"
+    # Числа внутри имён не трогаются
+    assert fingerprint("SELECT col2 FROM t1") == "SELECT col2 FROM t1"
+
+
+def test_slow_queries_logged_with_plan(tmp_path, monkeypatch, caplog):
+    tracer = QueryTracer(enabled=True, slow_ms=0)
+    monkeypatch.setattr(query_trace, '_tracer', tracer)
+
+    db = DatabaseManager(str(tmp_path / 'trace.sqlite'))
+    try:
+        assert isinstance(db.conn, TracedConnection)
+        tracer.reset()
+        with caplog.at_level(logging.WARNING, logger='utils.query_trace'):
+            for user_id in (1, 2, 3):
+                db.cursor.execute("SELECT * FROM bookings WHERE user_id = ?", (user_id,))
+                db.cursor.fetchall()
+            db.conn.execute("SELECT COUNT(*) FROM bookings WHERE service_name = 'x'").fetchone()
+    finally:
+        db.close()
+
+    top = {row['fingerprint']: row for row in tracer.top()}
+    by_user = top["SELECT * FROM bookings WHERE user_id = ?"]
+    assert by_user['count'] == 3 and by_user['slow'] == 3
+    assert "SELECT COUNT(*) FROM bookings WHERE service_name = ?" in top
+
+    slow = [record.getMessage() for record in caplog.records if 'Slow query' in record.getMessage()]
+    assert any('user_id = ?' in message and 'idx_bookings_user_created' in message for message in slow)
+    assert "bookings WHERE user_id = ?" in tracer.report()
+
+
+def test_tracing_off_uses_plain_connection(tmp_path, monkeypatch):
+    monkeypatch.setattr(query_trace, '_tracer', QueryTracer(enabled=False))
+    conn = query_trace.connect(str(tmp_path / 'plain.sqlite'))
+    try:
+        assert type(conn) is not TracedConnection
+    finally:
+        conn.close()
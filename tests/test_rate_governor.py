@@ -0,0 +1,127 @@
+"""
+Тесты ограничителя запросов к Telegram Bot API (на локальном фейковом API).
+"""
+
+import asyncio
+import os
+import sys
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.rate_governor import RateGovernor, TokenBucket
+
+TOKEN = "42:TEST"
+
+
+class FakeTime:
+    """Часы и sleep, которые двигают время без реального ожидания"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_burst_then_rate():
+    fake = FakeTime()
+    bucket = TokenBucket(rate=1.0, capacity=2, clock=fake.clock)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 1.0
+    assert bucket.reserve() == 2.0
+    fake.now += 10
+    assert bucket.reserve() == 0
+
+
+def test_token_bucket_pause():
+    fake = FakeTime()
+    bucket = TokenBucket(rate=10.0, capacity=10, clock=fake.clock)
+    bucket.pause(5)
+    assert bucket.reserve() == 5
+
+
+def test_chat_group_and_global_limits():
+    fake = FakeTime()
+    governor = RateGovernor(global_rate=100, chat_rate=1, chat_burst=1, group_rate=0.5,
+                            group_burst=1, clock=fake.clock, sleep=fake.sleep)
+
+    async def scenario():
+        await governor.acquire(1)
+        await governor.acquire(1)
+        assert fake.sleeps == [1.0]
+        # Другой чат не ждёт
+        await governor.acquire(2)
+        assert fake.sleeps == [1.0]
+        await governor.acquire(-100)
+        await governor.acquire(-100)
+        assert fake.sleeps[-1] == 2.0
+
+    asyncio.run(scenario())
+    assert governor.throttled_seconds == 3.0
+    assert governor.queue_depth == 0
+
+
+def run_against_fake_api(responses, governor, calls):
+    """Поднимает локальный фейковый Bot API и отправляет через него два сообщения"""
+
+    async def handler(request):
+        payload = await request.post()
+        calls.append((request.match_info['method'], payload.get('chat_id')))
+        status, body = responses.pop(0) if responses else (200, None)
+        if body is None:
+            body = {"ok": True, "result": {
+                "message_id": len(calls), "date": 0,
+                "chat": {"id": int(payload.get('chat_id')), "type": "private"},
+                "text": payload.get('text'),
+            }}
+        return web.json_response(body, status=status)
+
+    async def scenario():
+        app = web.Application()
+        app.router.add_post(f"/bot{TOKEN}/{{method}}", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{port}"))
+        session.middleware(governor)
+        bot = Bot(TOKEN, session=session)
+        try:
+            first = await bot.send_message(7, "one")
+            second = await bot.send_message(7, "two")
+            return first, second
+        finally:
+            await bot.session.close()
+            await runner.cleanup()
+
+    return asyncio.run(scenario())
+
+
+def test_retry_after_is_requeued():
+    fake = FakeTime()
+    governor = RateGovernor(chat_rate=100, chat_burst=10, clock=fake.clock, sleep=fake.sleep)
+    flood = {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 3",
+             "parameters": {"retry_after": 3}}
+    calls = []
+
+    first, second = run_against_fake_api([(429, flood)], governor, calls)
+
+    assert first.text == "one" and second.text == "two"
+    assert [method for method, _ in calls] == ["sendMessage"] * 3
+    assert governor.retries == 1
+    # Повтор ждал паузу чата, заданную retry_after
+    assert 3 in fake.sleeps
+    assert governor.stats()["requests"] == 3
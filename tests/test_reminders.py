@@ -0,0 +1,181 @@
+"""
+Тесты планировщика напоминаний: таблица reminders и куча в памяти.
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import DatabaseManager
+from utils.reminders import ReminderScheduler, booking_timestamp
+
+# Без часового пояса — локальное время, как у datetime.now()
+CONFIG = {"reminders": {"offsets_hours": [24, 2]}}
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture
+def db(tmp_path):
+    original_dir = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        db = DatabaseManager("reminders")
+        yield db
+        db.close()
+    finally:
+        os.chdir(original_dir)
+
+
+def book(db, user_id, start):
+    return db.add_order(
+        user_id=user_id, service_id="cut", service_name="Стрижка", price=1000,
+        client_name="Тест", phone="+79990000000", comment=None,
+        booking_date=start.strftime("%Y-%m-%d"), booking_time=start.strftime("%H:%M"), master_id=None,
+    )
+
+
+def schedule(scheduler, order_id, user_id, start):
+    return scheduler.schedule_reminders(
+        order_id, user_id=user_id, booking_date=start.strftime("%Y-%m-%d"),
+        booking_time=start.strftime("%H:%M"), service_name="Стрижка",
+    )
+
+
+@pytest.fixture
+def start():
+    # Визит через 3 дня, ровно в начале часа
+    return (datetime.now() + timedelta(days=3)).replace(hour=12, minute=0, second=0, microsecond=0)
+
+
+def test_batch_dispatch_at_due_time(db, start):
+    clock = FakeClock(datetime.now().timestamp())
+    bot = FakeBot()
+    scheduler = ReminderScheduler(db, bot, CONFIG, clock=clock)
+    for user_id in (1, 2, 3):
+        schedule(scheduler, book(db, user_id, start + timedelta(minutes=30 * user_id)), user_id,
+                 start + timedelta(minutes=30 * user_id))
+    assert len(scheduler) == 6
+
+    starts_at = booking_timestamp(start.strftime("%Y-%m-%d"), "12:00")
+    clock.now = starts_at - 24 * 3600 + 2 * 3600
+    batch = scheduler.pop_due(clock())
+    # Все три напоминания «за сутки» уходят одной пачкой
+    assert sorted(r["user_id"] for r in batch) == [1, 2, 3]
+    assert asyncio.run(scheduler.dispatch(batch)) == 3
+    assert "Стрижка" in bot.sent[0][1]
+    assert len(db.get_pending_reminders()) == 3
+
+
+def test_cancel_is_lazy_and_removes_rows(db, start):
+    clock = FakeClock(datetime.now().timestamp())
+    scheduler = ReminderScheduler(db, FakeBot(), CONFIG, clock=clock)
+    order_id = book(db, 1, start)
+    schedule(scheduler, order_id, 1, start)
+
+    scheduler.cancel_reminders(order_id)
+    assert len(scheduler) == 0
+    assert db.get_pending_reminders() == []
+    clock.now += 10 * 24 * 3600
+    assert scheduler.pop_due(clock()) == []
+    assert scheduler.next_due() is None
+
+
+def test_reschedule_replaces_reminders(db, start):
+    clock = FakeClock(datetime.now().timestamp())
+    scheduler = ReminderScheduler(db, FakeBot(), CONFIG, clock=clock)
+    order_id = book(db, 1, start)
+    schedule(scheduler, order_id, 1, start)
+    schedule(scheduler, order_id, 1, start + timedelta(days=1))
+
+    assert len(scheduler) == 2
+    assert len(db.get_pending_reminders()) == 2
+    assert scheduler.next_due() == booking_timestamp(
+        (start + timedelta(days=1)).strftime("%Y-%m-%d"), "12:00") - 24 * 3600
+
+
+def test_past_offsets_are_not_sent(db):
+    clock = FakeClock(datetime.now().timestamp())
+    scheduler = ReminderScheduler(db, FakeBot(), CONFIG, clock=clock)
+    soon = (datetime.now() + timedelta(hours=5)).replace(second=0, microsecond=0)
+    order_id = book(db, 1, soon)
+
+    # Напоминание «за сутки» уже опоздало — планируется только «за 2 часа»
+    assert schedule(scheduler, order_id, 1, soon) == 1
+    assert [r["kind"] for r in db.get_pending_reminders()] == ["2h"]
+
+
+def test_rebuild_after_restart(db, start):
+    clock = FakeClock(datetime.now().timestamp())
+    bot = FakeBot()
+    first = ReminderScheduler(db, bot, CONFIG, clock=clock)
+    scheduled_id = book(db, 1, start)
+    schedule(first, scheduled_id, 1, start)
+    # Запись, созданная без планировщика (например, старым процессом)
+    unscheduled_id = book(db, 2, start + timedelta(hours=1))
+
+    clock.now = booking_timestamp(start.strftime("%Y-%m-%d"), "12:00") - 24 * 3600
+    asyncio.run(first.dispatch(first.pop_due(clock())))
+    assert [chat_id for chat_id, _ in bot.sent] == [1]
+
+    second = ReminderScheduler(db, bot, CONFIG, clock=clock)
+    assert second.rebuild() == 3
+    # Уже отправленное напоминание не повторяется после перезапуска
+    kinds = sorted((r["order_id"], r["kind"]) for r in second._live.values())
+    assert kinds == [(scheduled_id, "2h"), (unscheduled_id, "24h"), (unscheduled_id, "2h")]
+
+
+def test_cancelled_order_is_skipped_at_dispatch(db, start):
+    clock = FakeClock(datetime.now().timestamp())
+    bot = FakeBot()
+    scheduler = ReminderScheduler(db, bot, CONFIG, clock=clock)
+    order_id = book(db, 1, start)
+    schedule(scheduler, order_id, 1, start)
+
+    # Отмена в другом процессе: планировщик о ней не знает
+    assert db.cancel_order(order_id)
+    clock.now += 10 * 24 * 3600
+    assert asyncio.run(scheduler.dispatch(scheduler.pop_due(clock()))) == 0
+    assert bot.sent == []
+
+
+def test_persist_only_worker_writes_rows_without_heap(db, start):
+    clock = FakeClock(datetime.now().timestamp())
+    worker = ReminderScheduler(db, FakeBot(), CONFIG, clock=clock, persist_only=True)
+    for user_id in range(1, 4):
+        order_id = book(db, user_id, start + timedelta(hours=user_id))
+        assert schedule(worker, order_id, user_id, start + timedelta(hours=user_id)) == 2
+    assert db.cancel_order(order_id)
+    worker.cancel_reminders(order_id)
+    assert len(worker._heap) == 0 and len(worker) == 0
+    assert len(db.get_pending_reminders()) == 4
+
+    # Назначенный воркер подхватывает строки из таблицы
+    designated = ReminderScheduler(db, FakeBot(), CONFIG, clock=clock)
+    assert designated.rebuild() == 4
+
+
+def test_due_index_is_used(db):
+    plan = db.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM reminders WHERE sent_at IS NULL ORDER BY due_at"
+    ).fetchall()
+    assert any("idx_reminders_due" in row["detail"] for row in plan)
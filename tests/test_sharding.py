@@ -0,0 +1,82 @@
+"""
+Тесты шардирования обновлений по пользователям и цикла воркера.
+"""
+
+import asyncio
+import os
+import queue
+import sys
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import CallbackQuery, Message
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middlewares import UserOrderingMiddleware
+from utils.sharding import consume_updates, shard_for, update_user_id
+
+
+def message_update(update_id, user_id, text="hi"):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+            "text": text,
+        },
+    }
+
+
+def callback_update(update_id, user_id, data):
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "chat_instance": "1", "data": data,
+            "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+        },
+    }
+
+
+def test_all_updates_of_a_user_go_to_one_shard():
+    assert update_user_id(message_update(1, 77)) == 77
+    assert update_user_id(callback_update(2, 77, "confirm_booking")) == 77
+    assert shard_for(message_update(1, 77), 4) == shard_for(callback_update(2, 77, "x"), 4) == 1
+    # Обновления без пользователя — на воркер 0
+    assert shard_for({"update_id": 3}, 4) == 0
+    shards = {shard_for(message_update(i, user_id), 4) for i, user_id in enumerate(range(100, 108))}
+    assert shards == {0, 1, 2, 3}
+
+
+def test_worker_loop_feeds_dispatcher_in_user_order():
+    seen = []
+    router = Router()
+
+    @router.message()
+    async def on_message(message: Message):
+        await asyncio.sleep(0.01 if message.text == "first" else 0)
+        seen.append((message.from_user.id, message.text))
+
+    @router.callback_query()
+    async def on_callback(callback: CallbackQuery):
+        seen.append((callback.from_user.id, callback.data))
+
+    dp = Dispatcher()
+    dp.update.outer_middleware(UserOrderingMiddleware())
+    dp.include_router(router)
+
+    updates = queue.Queue()
+    for update in (message_update(1, 5, "first"), callback_update(2, 5, "second"),
+                   message_update(3, 6, "other"), None):
+        updates.put(update)
+
+    async def scenario():
+        bot = Bot("42:TEST")
+        try:
+            return await consume_updates(updates, dp, bot)
+        finally:
+            await bot.session.close()
+
+    assert asyncio.run(scenario()) == 3
+    assert [text for user_id, text in seen if user_id == 5] == ["first", "second"]
+    assert seen[0] == (6, "other")
@@ -0,0 +1,182 @@
+"""
+Тесты для SlotEngine (единый расчёт свободных слотов).
+"""
+
+import asyncio
+import os
+import sys
+from datetime import date, datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import DatabaseManager
+from utils.slot_engine import SlotEngine, compute_slots, get_slot_engine, interval_mask
+
+# Понедельник в будущем
+MONDAY = date(2099, 6, 1)
+
+
+@pytest.fixture
+def db(tmp_path):
+    original_dir = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        db = DatabaseManager("slots")
+        yield db
+        db.close()
+    finally:
+        os.chdir(original_dir)
+
+
+@pytest.fixture
+def config():
+    return {
+        "config_version": 1,
+        "booking": {"work_start": 10, "work_end": 14, "slot_duration": 30},
+        "services": [
+            {"id": "cut", "name": "Стрижка", "price": 1000, "duration": 60},
+            {"id": "color", "name": "Окрашивание", "price": 3000, "duration": 120},
+        ],
+        "staff": {
+            "enabled": True,
+            "masters": [
+                {
+                    "id": "anna",
+                    "name": "Анна",
+                    "services": ["cut"],
+                    "schedule": {
+                        "monday": {"working": True, "start": "12:00", "end": "15:00"},
+                        "tuesday": {"working": False},
+                    },
+                    "closed_dates": [{"date": "2099-06-08"}],
+                }
+            ],
+        },
+    }
+
+
+def book(db, booking_date, booking_time, service_id="cut", master_id=None):
+    return db.add_booking(
+        user_id=1, client_name="Тест", phone="+79990000000",
+        service_id=service_id, service_name=service_id,
+        master_id=master_id, master_name=None,
+        booking_datetime=f"{booking_date}T{booking_time}",
+        comment=None, price=1000,
+    )
+
+
+def free(engine, *args, **kwargs):
+    return asyncio.run(engine.get_free_slots(*args, **kwargs))
+
+
+def test_compute_slots_respects_duration_and_busy_mask():
+    busy = interval_mask(11 * 60, 60)
+    slots = compute_slots([(600, 780)], busy, duration=60, step=30)
+    assert list(slots) == [600, 720]
+
+
+def test_general_hours_without_bookings(db, config):
+    engine = SlotEngine(config, db)
+    assert free(engine, MONDAY, service_id="cut") == ["10:00", "10:30", "11:00", "11:30", "12:00", "12:30", "13:00"]
+
+
+def test_booking_blocks_whole_service_duration(db, config):
+    book(db, MONDAY.isoformat(), "11:00", service_id="cut")
+    engine = SlotEngine(config, db)
+    slots = free(engine, MONDAY, service_id="cut")
+    assert "10:30" not in slots
+    assert "11:00" not in slots
+    assert "11:30" not in slots
+    assert "12:00" in slots
+
+
+def test_buffer_extends_occupancy(db, config):
+    config["booking"]["buffer_minutes"] = 30
+    book(db, MONDAY.isoformat(), "10:00", service_id="cut")
+    engine = SlotEngine(config, db)
+    assert free(engine, MONDAY, service_id="cut")[0] == "11:30"
+
+
+def test_master_schedule_and_closed_dates(db, config):
+    engine = SlotEngine(config, db)
+    assert free(engine, MONDAY, "anna", "cut") == ["12:00", "12:30", "13:00", "13:30", "14:00"]
+    assert free(engine, date(2099, 6, 2), "anna", "cut") == []
+    assert free(engine, date(2099, 6, 8), "anna", "cut") == []
+
+
+def test_master_occupancy_is_isolated(db, config):
+    book(db, MONDAY.isoformat(), "12:00", master_id="maria")
+    engine = SlotEngine(config, db)
+    assert "12:00" in free(engine, MONDAY, "anna", "cut")
+
+
+def test_exclude_order_for_reschedule(db, config):
+    order_id = book(db, MONDAY.isoformat(), "10:00")
+    engine = SlotEngine(config, db)
+    assert "10:00" not in free(engine, MONDAY, service_id="cut")
+    assert "10:00" in free(engine, MONDAY, service_id="cut", exclude_order_id=order_id)
+
+
+def test_cache_is_invalidated_by_writes(db, config):
+    engine = SlotEngine(config, db)
+    assert "10:00" in free(engine, MONDAY, service_id="cut")
+    free(engine, MONDAY, service_id="cut")
+    assert engine.hits == 1
+
+    book(db, MONDAY.isoformat(), "10:00")
+    assert "10:00" not in free(engine, MONDAY, service_id="cut")
+
+
+def test_cache_is_invalidated_by_config_version(db, config):
+    engine = SlotEngine(config, db)
+    assert free(engine, MONDAY, service_id="cut")[0] == "10:00"
+    config["booking"]["work_start"] = 11
+    config["config_version"] = 2
+    assert free(engine, MONDAY, service_id="cut")[0] == "11:00"
+
+
+def test_past_slots_are_hidden_today(db, config):
+    engine = SlotEngine(config, db)
+    now = datetime.combine(MONDAY, datetime.min.time()).replace(hour=11, minute=10)
+    assert free(engine, MONDAY, service_id="cut", now=now)[0] == "11:30"
+
+
+def test_get_slot_engine_is_shared(db, config):
+    assert get_slot_engine(config, db) is get_slot_engine(config, db)
+
+
+def nearest(engine, *args, **kwargs):
+    return asyncio.run(engine.find_nearest_slots(*args, **kwargs))
+
+
+def test_nearest_slots_span_several_days(db, config):
+    engine = SlotEngine(config, db)
+    now = datetime.combine(MONDAY, datetime.min.time()).replace(hour=12, minute=45)
+    slots = nearest(engine, "cut", days=3, limit=4, now=now)
+    assert slots == [
+        (MONDAY, "13:00"),
+        (date(2099, 6, 2), "10:00"),
+        (date(2099, 6, 2), "10:30"),
+        (date(2099, 6, 2), "11:00"),
+    ]
+
+
+def test_nearest_slots_skip_busy_and_closed_days(db, config):
+    book(db, MONDAY.isoformat(), "12:00", master_id="anna")
+    engine = SlotEngine(config, db)
+    now = datetime.combine(MONDAY, datetime.min.time())
+    slots = nearest(engine, "cut", ["anna"], days=14, limit=3, now=now)
+    # 12:00-13:00 занято, вторник — выходной
+    assert slots == [(MONDAY, "13:00"), (MONDAY, "13:30"), (MONDAY, "14:00")]
+    later = nearest(engine, "cut", ["anna"], days=15, limit=6, now=now)
+    assert later[-1][0] == date(2099, 6, 15)
+
+
+def test_nearest_slots_limit_and_empty_horizon(db, config):
+    engine = SlotEngine(config, db)
+    now = datetime.combine(date(2099, 6, 2), datetime.min.time())
+    # Во вторник Анна не работает
+    assert nearest(engine, "cut", ["anna"], days=1, now=now) == []
+    assert len(nearest(engine, "cut", days=7, limit=5, now=now)) == 5
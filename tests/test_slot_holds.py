@@ -0,0 +1,136 @@
+"""
+Тесты временных удержаний слотов.
+"""
+
+import asyncio
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import DatabaseManager
+from utils.master_assignment import MasterAssigner
+from utils.slot_engine import SlotEngine
+from utils.slot_holds import SlotHoldRegistry
+
+MONDAY = date(2099, 6, 1)
+DAY = MONDAY.isoformat()
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def db(tmp_path):
+    original_dir = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        db = DatabaseManager("holds")
+        yield db
+        db.close()
+    finally:
+        os.chdir(original_dir)
+
+
+@pytest.fixture
+def config():
+    return {
+        "booking": {"work_start": 10, "work_end": 12, "slot_duration": 60},
+        "services": [{"id": "cut", "name": "Стрижка", "price": 1000, "duration": 60}],
+        "staff": {
+            "enabled": True,
+            "masters": [
+                {"id": "anna", "name": "Анна", "services": ["cut"],
+                 "schedule": {"monday": {"working": True, "start": "10:00", "end": "12:00"}}},
+                {"id": "olga", "name": "Ольга", "services": ["cut"],
+                 "schedule": {"monday": {"working": True, "start": "10:00", "end": "12:00"}}},
+            ],
+        },
+    }
+
+
+def test_hold_conflict_and_release():
+    holds = SlotHoldRegistry(clock=FakeClock())
+    assert holds.hold(DAY, "10:00", "anna", user_id=1)
+    assert not holds.hold(DAY, "10:00", "anna", user_id=2)
+    # Другой мастер в то же время свободен
+    assert holds.hold(DAY, "10:00", "olga", user_id=2)
+
+    holds.release(1)
+    assert holds.hold(DAY, "10:00", "anna", user_id=3)
+
+
+def test_overlapping_hold_is_rejected(db, config):
+    config["services"].append({"id": "short", "name": "Чёлка", "price": 300, "duration": 30})
+    holds = SlotEngine(config, db).holds
+    assert holds.hold(DAY, "10:00", "anna", user_id=1, service_id="cut")
+    # Сетка второго клиента построена до удержания: 10:30 пересекается с 10:00–11:00
+    assert not holds.hold(DAY, "10:30", "anna", user_id=2, service_id="short")
+    assert not holds.hold(DAY, "09:30", "anna", user_id=2, service_id="cut")
+    assert holds.hold(DAY, "11:00", "anna", user_id=2, service_id="short")
+    assert holds.hold(DAY, "10:30", "olga", user_id=3, service_id="short")
+
+    # То же между процессами: чужое удержание читается из таблицы slot_holds
+    other = SlotHoldRegistry(db, occupied_minutes=lambda service_id: 60)
+    assert not other.hold(DAY, "10:15", "anna", user_id=4, service_id="cut")
+
+
+def test_new_hold_replaces_previous_one():
+    holds = SlotHoldRegistry(clock=FakeClock())
+    holds.hold(DAY, "10:00", None, user_id=1)
+    holds.hold(DAY, "11:00", None, user_id=1)
+    assert [h["booking_time"] for h in holds.active_holds(DAY)] == ["11:00"]
+
+
+def test_holds_expire_by_ttl():
+    clock = FakeClock()
+    holds = SlotHoldRegistry(ttl_seconds=60, clock=clock)
+    holds.hold(DAY, "10:00", None, user_id=1)
+    clock.now += 30
+    assert holds.expire() == 0
+    clock.now += 31
+    assert holds.active_holds(DAY) == []
+    assert holds.expire() == 1
+    assert len(holds) == 0
+    assert holds.hold(DAY, "10:00", None, user_id=2)
+
+
+def test_holds_are_shared_through_database(db):
+    clock = FakeClock()
+    first = SlotHoldRegistry(db, clock=clock)
+    second = SlotHoldRegistry(db, clock=clock)
+    assert first.hold(DAY, "10:00", "anna", user_id=1)
+    assert not second.hold(DAY, "10:00", "anna", user_id=2)
+    assert second.active_holds(DAY)[0]["user_id"] == 1
+
+    first.release(1)
+    assert second.hold(DAY, "10:00", "anna", user_id=2)
+
+
+def test_free_slots_hide_held_slots(db, config):
+    engine = SlotEngine(config, db)
+    assert asyncio.run(engine.get_free_slots(MONDAY, "anna", "cut")) == ["10:00", "11:00"]
+    engine.holds.hold(DAY, "10:00", "anna", user_id=1)
+    assert asyncio.run(engine.get_free_slots(MONDAY, "anna", "cut")) == ["11:00"]
+    assert asyncio.run(engine.get_free_slots(MONDAY, "olga", "cut")) == ["10:00", "11:00"]
+
+    engine.holds.release(1)
+    assert asyncio.run(engine.get_free_slots(MONDAY, "anna", "cut")) == ["10:00", "11:00"]
+
+
+def test_any_master_skips_held_master(db, config):
+    assigner = MasterAssigner(SlotEngine(config, db))
+    assigner.engine.holds.hold(DAY, "10:00", "anna", user_id=1)
+    assert asyncio.run(assigner.assign(MONDAY, "cut", "10:00"))["id"] == "olga"
+
+    assigner.engine.holds.hold(DAY, "10:00", "olga", user_id=2)
+    assert asyncio.run(assigner.get_free_slots(MONDAY, "cut")) == ["11:00"]
+    assert asyncio.run(assigner.assign(MONDAY, "cut", "10:00")) is None
@@ -0,0 +1,176 @@
+"""
+Тесты уникальности слота на уровне БД (один мастер — одна запись на время).
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import DatabaseManager
+from utils.db.booking_queries import BookingQueries
+from utils.db.database import LATEST_SCHEMA_VERSION, Database
+
+DAY = "2099-06-01"
+
+
+@pytest.fixture
+def workdir(tmp_path):
+    original_dir = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        yield tmp_path
+    finally:
+        os.chdir(original_dir)
+
+
+@pytest.fixture
+def db(workdir):
+    db = DatabaseManager("unique")
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def orders(workdir):
+    database = Database("orders")
+    database.init_db()
+    yield BookingQueries(database.connection)
+    database.close()
+
+
+def add(db, booking_time, master_id=None):
+    return db.add_order(
+        user_id=1, service_id="cut", service_name="Стрижка", price=1000,
+        client_name="Тест", phone="+79990000000", comment=None,
+        booking_date=DAY, booking_time=booking_time, master_id=master_id,
+    )
+
+
+# === bookings (DatabaseManager) ===
+
+def test_different_masters_can_share_a_slot(db):
+    assert add(db, "10:00", "anna")
+    assert add(db, "10:00", "olga")
+
+
+def test_same_master_slot_conflict_raises(db):
+    add(db, "10:00", "anna")
+    with pytest.raises(ValueError):
+        add(db, "10:00", "anna")
+    # add_booking по-прежнему сообщает о конфликте через None
+    assert db.add_booking(1, "Тест", None, "cut", "Стрижка", "anna", None,
+                          f"{DAY}T10:00", None, 1000) is None
+
+
+def test_slot_without_master_is_unique(db):
+    add(db, "10:00")
+    with pytest.raises(ValueError):
+        add(db, "10:00")
+
+
+def test_reschedule_conflict_raises(db):
+    add(db, "10:00", "anna")
+    order_id = add(db, "11:00", "anna")
+    with pytest.raises(ValueError):
+        db.update_order(order_id, booking_date=DAY, booking_time="10:00")
+    assert db.update_order(order_id, booking_date=DAY, booking_time="12:00")
+    assert db.get_booking_by_id(order_id)["booking_datetime"] == f"{DAY}T12:00"
+
+
+def test_concurrent_confirms_keep_outbox_and_cube_consistent(db):
+    barrier = threading.Barrier(8)
+    results = []
+
+    def confirm(user_id):
+        own = DatabaseManager("unique")
+        barrier.wait()
+        try:
+            results.append(own.add_order(
+                user_id=user_id, service_id="cut", service_name="Стрижка", price=1000,
+                client_name="Тест", phone="+79990000000", comment=None,
+                booking_date=DAY, booking_time="10:00", master_id="anna",
+                notifications=[{'kind': 'order_created', 'chat_id': 1, 'payload': {}}],
+            ))
+        except ValueError:
+            results.append(None)
+        finally:
+            own.close()
+
+    threads = [threading.Thread(target=confirm, args=(user_id,)) for user_id in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 8 and len([r for r in results if r]) == 1
+    count = lambda sql: db.conn.execute(sql).fetchone()['n']
+    assert count("SELECT COUNT(*) AS n FROM outbox") == 1
+    assert count("SELECT SUM(bookings) AS n FROM booking_cube") == 1
+
+
+def test_check_slot_availability_excluding_is_per_master(db):
+    add(db, "10:00", "olga")
+    order_id = add(db, "11:00", "anna")
+    assert db.check_slot_availability_excluding(DAY, "10:00", order_id)
+    assert db.check_slot_availability_excluding(DAY, "11:00", order_id)
+
+
+def test_legacy_global_unique_table_is_rebuilt(workdir):
+    conn = sqlite3.connect("db_legacy.sqlite")
+    conn.execute("""
+        CREATE TABLE bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+            client_name TEXT NOT NULL, phone TEXT, service_id TEXT NOT NULL,
+            service_name TEXT NOT NULL, master_id TEXT, master_name TEXT,
+            booking_datetime TEXT NOT NULL UNIQUE, comment TEXT, price REAL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        INSERT INTO bookings (user_id, client_name, service_id, service_name, master_id, booking_datetime)
+        VALUES (1, 'Тест', 'cut', 'Стрижка', 'anna', ?)
+    """, (f"{DAY}T10:00",))
+    conn.commit()
+    conn.close()
+
+    db = DatabaseManager("legacy")
+    try:
+        assert len(db.get_day_bookings(DAY)) == 1
+        assert add(db, "10:00", "olga")
+    finally:
+        db.close()
+
+
+# === orders (Database / BookingQueries) ===
+
+def test_orders_schema_has_active_slot_index(orders):
+    cursor = orders.connection.cursor()
+    cursor.execute("SELECT version FROM schema_migrations")
+    assert cursor.fetchone()[0] == LATEST_SCHEMA_VERSION
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_orders_active_slot'")
+    assert cursor.fetchone()
+
+
+def test_orders_conflict_and_rebooking_after_cancel(orders):
+    order_id = add(orders, "10:00", "anna")
+    assert add(orders, "10:00", "olga")
+    with pytest.raises(ValueError):
+        add(orders, "10:00", "anna")
+
+    # Отменённая запись не занимает слот
+    orders.cancel_order(order_id)
+    assert add(orders, "10:00", "anna")
+
+
+def test_orders_reschedule_conflict(orders):
+    add(orders, "10:00", "anna")
+    order_id = add(orders, "11:00", "anna")
+    with pytest.raises(ValueError):
+        orders.update_order(order_id, booking_time="10:00")
+    assert orders.get_order_by_id(order_id)["booking_time"] == "11:00"
+    assert orders.update_order(order_id, booking_time="12:00")
@@ -0,0 +1,46 @@
+"""
+Тесты холодного старта (tools/profile_startup.py): ленивые модули не
+импортируются при запуске, оба бота доходят до первого опроса.
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+
+from profile_startup import measure_first_poll, measure_imports, parse_importtime
+from utils.lazy_router import LAZY_MODULES
+
+
+def test_parse_importtime():
+    output = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   _io\n"
+        "import time:      2500 |       4000 | aiogram.types\n"
+        "unrelated line\n"
+    )
+    assert parse_importtime(output) == [("_io", 120, 120), ("aiogram.types", 2500, 4000)]
+
+
+def test_startup_does_not_import_lazy_modules():
+    imported = {module for module, _, _ in measure_imports()}
+    assert 'main' in imported and 'admin_bot.main' in imported
+    assert not imported & set(LAZY_MODULES)
+    assert not any(module.startswith(('admin_handlers.', 'handlers.mybookings')) for module in imported)
+
+
+def test_both_bots_reach_first_poll(tmp_path):
+    config_dir = tmp_path / 'config'
+    config_dir.mkdir()
+    (config_dir / 'settings.json').write_text(json.dumps({
+        "config_version": 1, "business_slug": "profile", "business_name": "Салон", "admin_ids": [1],
+    }), encoding='utf-8')
+
+    first_poll = asyncio.run(measure_first_poll(str(config_dir), str(config_dir / 'settings.json'), timeout=60))
+
+    assert set(first_poll) == {'client', 'admin'}
+    assert all(seconds < 60 for seconds in first_poll.values())
@@ -0,0 +1,63 @@
+"""
+Тесты временных рядов метрик (кольцевые буферы с часовыми и дневными сводками).
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db_manager import DatabaseManager
+from utils.latency import LatencyRegistry
+from utils.timeseries import DAY, HOUR, MINUTE, RESOLUTIONS, LatencyWindow, TimeSeriesRecorder, trend_points
+
+# Полночь UTC
+START = 1_800_000_000 // DAY * DAY
+
+
+def test_minutes_roll_up_into_hours_and_days(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'series.sqlite'))
+    counters = {'bookings': 0}
+    latency = {}
+    try:
+        recorder = TimeSeriesRecorder(db, flush_minutes=30)
+        recorder.counters(lambda: dict(counters))
+        recorder.gauges(lambda: dict(latency))
+        # 90 минут: по записи в минуту, задержка 10 мс в первый час и 40 мс во второй
+        for minute in range(1, 91):
+            counters['bookings'] += 1
+            latency['update_p95_ms'] = 10.0 if minute <= 60 else 40.0
+            recorder.sample(START + minute * MINUTE)
+            if recorder._samples >= recorder.flush_minutes:
+                recorder.flush()
+        recorder.flush()
+
+        hourly = dict(trend_points(db, 'hour', now=START + 90 * MINUTE))
+        assert hourly[START]['bookings'] == 60
+        assert hourly[START + HOUR]['bookings'] == 30
+        assert hourly[START]['update_p95_ms'] == 10.0
+        assert hourly[START + HOUR]['update_p95_ms'] == 40.0
+        assert dict(trend_points(db, 'day', now=START + 90 * MINUTE))[START]['bookings'] == 90
+
+        # Кольцо минут: через полный оборот слот перезаписывается, а не растёт
+        lap = RESOLUTIONS[MINUTE] * MINUTE
+        counters['bookings'] += 5
+        recorder.sample(START + MINUTE + lap)
+        recorder.flush()
+        rows = db.get_metric_series(['bookings'], MINUTE, 0)
+        assert len(rows) == 90
+        assert [row['total'] for row in rows if row['bucket_start'] == START + lap] == [5]
+    finally:
+        db.close()
+
+
+def test_latency_window_reports_last_interval_only():
+    registry = LatencyRegistry()
+    stats = registry.stats('update')
+    for _ in range(100):
+        stats.wall.record(100_000)  # 100 мс до начала окна
+    window = LatencyWindow(stats)
+    assert window() == {}
+    for _ in range(100):
+        stats.wall.record(2_000)
+    assert window()['update_p95_ms'] <= 2.2
@@ -0,0 +1,88 @@
+"""
+Тесты UserOrderingMiddleware: порядок обновлений одного пользователя,
+параллельность между пользователями и ограничения очередей.
+"""
+
+import asyncio
+import os
+import sys
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message, Update
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middlewares import UserOrderingMiddleware
+
+
+def make_update(update_id, user_id, text):
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+            "text": text,
+        },
+    })
+
+
+def build(middleware, delays):
+    log = []
+    state = {"active": 0, "peak": 0}
+    router = Router()
+
+    @router.message()
+    async def handle(message: Message):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        log.append(("start", message.from_user.id, message.text))
+        await asyncio.sleep(delays.get(message.text, 0.01))
+        log.append(("end", message.from_user.id, message.text))
+        state["active"] -= 1
+
+    dp = Dispatcher()
+    dp.update.outer_middleware(middleware)
+    dp.include_router(router)
+    return dp, log, state
+
+
+async def feed_all(dp, updates):
+    bot = Bot("42:TEST")
+    try:
+        await asyncio.gather(*(dp.feed_update(bot, update) for update in updates))
+    finally:
+        await bot.session.close()
+
+
+def test_same_user_is_ordered_other_users_run_in_parallel():
+    middleware = UserOrderingMiddleware()
+    # Первое нажатие медленное — второе всё равно ждёт его окончания
+    dp, log, state = build(middleware, {"confirm-1": 0.05, "confirm-2": 0.0})
+    updates = [make_update(1, 1, "confirm-1"), make_update(2, 1, "confirm-2"), make_update(3, 2, "other")]
+
+    asyncio.run(feed_all(dp, updates))
+
+    user1 = [(kind, text) for kind, user_id, text in log if user_id == 1]
+    assert user1 == [("start", "confirm-1"), ("end", "confirm-1"), ("start", "confirm-2"), ("end", "confirm-2")]
+    # Пользователь 2 не ждал медленного пользователя 1
+    assert log.index(("end", 2, "other")) < log.index(("end", 1, "confirm-1"))
+    assert middleware.stats()["processed"] == 3
+    assert middleware.stats()["users"] == 0
+
+
+def test_total_concurrency_is_bounded():
+    middleware = UserOrderingMiddleware(max_concurrency=2)
+    dp, log, state = build(middleware, {})
+    asyncio.run(feed_all(dp, [make_update(i, i, "hi") for i in range(1, 7)]))
+    assert state["peak"] == 2
+    assert middleware.max_queue_depth >= 4
+    assert middleware.queue_depth == 0 and middleware.active == 0
+
+
+def test_user_queue_overflow_is_dropped():
+    middleware = UserOrderingMiddleware(max_user_queue=2)
+    dp, log, state = build(middleware, {})
+    asyncio.run(feed_all(dp, [make_update(i, 1, f"tap-{i}") for i in range(1, 6)]))
+    assert middleware.dropped == 3
+    assert [text for kind, _, text in log if kind == "end"] == ["tap-1", "tap-2"]
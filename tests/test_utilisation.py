@@ -0,0 +1,74 @@
+"""
+Тесты загрузки мастеров (развёртка графиков в поминутную сетку).
+"""
+
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import DatabaseManager
+from utils.utilisation import UtilisationEngine, utilisation_report
+
+WORKDAY = {"working": True, "start": "10:00", "end": "14:00"}
+CONFIG = {
+    'booking': {'slot_duration': 30},
+    'services': [{'id': 'cut', 'name': 'Стрижка', 'duration': 60},
+                 {'id': 'color', 'name': 'Окрашивание', 'duration': 120}],
+    'staff': {'enabled': True, 'masters': [
+        # 2099-06-01 — понедельник
+        {'id': 'anna', 'name': 'Анна', 'schedule': {'monday': WORKDAY, 'tuesday': WORKDAY},
+         'closed_dates': [{'date': '2099-06-02'}]},
+        {'id': 'maria', 'name': 'Мария', 'schedule': {'monday': WORKDAY}},
+    ]},
+}
+
+
+@pytest.fixture
+def db(tmp_path):
+    original_dir = os.getcwd()
+    os.chdir(tmp_path)
+    db = DatabaseManager("utilisation")
+    for day, booking_time, master_id, service_id in (
+        ('2099-06-01', '10:00', 'anna', 'color'),   # 10:00-12:00
+        ('2099-06-01', '13:30', 'anna', 'cut'),     # 30 минут после конца смены
+        ('2099-06-01', '11:00', 'maria', 'cut'),
+        ('2099-06-02', '10:00', None, 'cut'),       # без мастера
+    ):
+        db.add_order(1, service_id, service_id, 1000, "Клиент", "+79990000000", None, day, booking_time, master_id)
+    try:
+        yield db
+    finally:
+        db.close()
+        os.chdir(original_dir)
+
+
+def test_busy_over_working_minutes_by_master_weekday_and_hour(db):
+    report = UtilisationEngine(CONFIG, db, backend='bytes').compute(date(2099, 6, 1), date(2099, 6, 2))
+    assert report['masters'] == {'anna': [240, 150], 'maria': [240, 60]}  # вторник Анны закрыт
+    assert report['weekdays'][0] == [480, 210] and report['weekdays'][1] == [0, 0]
+    assert report['hours'][10] == [120, 60] and report['hours'][11] == [120, 120]
+    assert report['hours'][13] == [120, 30] and report['hours'][14] == [0, 0]
+    assert report['outside'] == 30 and report['unassigned'] == 60
+
+    text = utilisation_report(CONFIG, db, 'next', today=date(2099, 5, 31))
+    assert "Анна" in text and "Мария" in text
+    assert "вне графика 0.5 ч, без мастера 1.0 ч" in text
+
+
+def test_legacy_staff_list_reports_masters_by_name(db):
+    config = dict(CONFIG, staff={'enabled': True, 'list': CONFIG['staff']['masters']})
+    report = UtilisationEngine(config, db, backend='bytes').compute(date(2099, 6, 1), date(2099, 6, 1))
+    assert set(report['masters']) == {'anna', 'maria'}
+    text = utilisation_report(config, db, 'next', today=date(2099, 5, 31))
+    assert "Анна" in text and "Мария" in text
+
+
+def test_numpy_backend_matches_bytes(db):
+    pytest.importorskip('numpy')
+    period = (date(2099, 5, 25), date(2099, 6, 30))
+    assert UtilisationEngine(CONFIG, db, backend='numpy').compute(*period) == \
+        UtilisationEngine(CONFIG, db, backend='bytes').compute(*period)
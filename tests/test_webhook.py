@@ -0,0 +1,104 @@
+"""
+Тесты webhook-сервера: проверка secret token, лимит параллельности и остановка.
+"""
+
+import asyncio
+import os
+import sys
+
+from aiohttp import ClientSession
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.webhook import WebhookServer, derive_secret, webhook_settings
+
+
+def make_update(update_id, user_id=1):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+            "text": "hi",
+        },
+    }
+
+
+def build(concurrency=2, handler_delay=0.05):
+    state = {"active": 0, "peak": 0, "done": []}
+    router = Router()
+
+    @router.message()
+    async def handle(message: Message):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(handler_delay)
+        state["active"] -= 1
+        state["done"].append(message.message_id)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot("42:TEST")
+    server = WebhookServer(host="127.0.0.1", port=0, concurrency=concurrency, drain_timeout=5)
+    path = server.add_bot("client", dp, bot)
+    return server, bot, path, state
+
+
+def test_secret_token_is_required():
+    async def scenario():
+        server, bot, path, state = build()
+        port = await server.start()
+        url = f"http://127.0.0.1:{port}{path}"
+        try:
+            async with ClientSession() as session:
+                async with session.post(url, json=make_update(1)) as response:
+                    assert response.status == 401
+                headers = {"X-Telegram-Bot-Api-Secret-Token": server.handlers["client"].secret_token}
+                async with session.post(url, json=make_update(2), headers=headers) as response:
+                    assert response.status == 200
+        finally:
+            await server.stop()
+            await bot.session.close()
+        return server.stats()["client"], state
+
+    stats, state = asyncio.run(scenario())
+    assert stats["rejected"] == 1 and stats["processed"] == 1
+    assert state["done"] == [2]
+
+
+def test_concurrency_limit_and_graceful_drain():
+    async def scenario():
+        server, bot, path, state = build(concurrency=2)
+        port = await server.start()
+        headers = {"X-Telegram-Bot-Api-Secret-Token": server.handlers["client"].secret_token}
+        try:
+            async with ClientSession() as session:
+                for update_id in range(1, 7):
+                    async with session.post(f"http://127.0.0.1:{port}{path}", json=make_update(update_id, update_id),
+                                            headers=headers) as response:
+                        assert response.status == 200
+            # Ответы ушли сразу, обработка ещё идёт
+            assert len(state["done"]) < 6
+        finally:
+            await server.stop()
+            await bot.session.close()
+        return state
+
+    state = asyncio.run(scenario())
+    # Остановка дождалась всех принятых обновлений
+    assert sorted(state["done"]) == [1, 2, 3, 4, 5, 6]
+    assert state["peak"] == 2
+
+
+def test_secrets_differ_per_bot_and_settings_from_env(monkeypatch):
+    client, admin = Bot("1:A"), Bot("2:B")
+    assert derive_secret(client, "s") != derive_secret(admin, "s")
+    assert derive_secret(client, "s") != derive_secret(client, "other")
+
+    monkeypatch.setenv("WEBHOOK_PORT", "9000")
+    monkeypatch.setenv("WEBHOOK_BASE_URL", "https://bot.example.com")
+    settings = webhook_settings({"webhook": {"port": 8443, "concurrency": 16}})
+    assert settings == {"port": 9000, "concurrency": 16, "base_url": "https://bot.example.com"}
@@ -0,0 +1,106 @@
+"""
+Бенчмарк куба аналитики на двух годах данных.
+
+Заполняет booking_cube так, будто каждый день за --days дней у каждого из
+--masters мастеров были записи на каждую из --services услуг (худший случай:
+все ячейки непустые) плюс месячная сводка, и замеряет экраны /analytics —
+мастера, услуги мастера, дни/месяцы — за каждый период. Отдельно — цена
+обновления куба при добавлении и отмене записи (в той же транзакции, что и
+сама запись).
+
+Запуск:
+    python tools/bench_analytics.py --days 730 --masters 8 --services 15
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.analytics import ALL, PERIODS, cube_screen
+from utils.db import DatabaseManager
+
+
+def fill(db, days: int, masters: list, services: list) -> int:
+    today = date.today()
+    cells = []
+    for offset in range(-days + 1, 31):
+        day = (today + timedelta(days=offset)).isoformat()
+        for master_id in masters:
+            for service_id in services:
+                bookings = random.randint(0, 4)
+                cells.append((day, master_id, service_id, bookings, bookings * 1500.0,
+                              random.randint(0, 1), bookings * 60))
+    db.cursor.executemany(db.CUBE_DAY_UPSERT_SQL, cells)
+    db.roll_up_booking_cube()
+    db.conn.commit()
+    return len(cells)
+
+
+def timed_ms(call, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def bench_writes(db, count: int) -> float:
+    """Среднее время add_order + cancel_order, мс"""
+    started = time.perf_counter()
+    for index in range(count):
+        order_id = db.add_order(1, 'service_0', 'Услуга', 1500, "Клиент", "+79990000000", None,
+                                '2099-01-01', f"{index // 60:02d}:{index % 60:02d}", 'master_0')
+        db.cancel_order(order_id)
+    return (time.perf_counter() - started) * 1000 / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analytics cube query latency")
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--masters", type=int, default=8)
+    parser.add_argument("--services", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    masters = [f"master_{index}" for index in range(args.masters)]
+    services = [f"service_{index}" for index in range(args.services)]
+    config = {
+        'staff': {'masters': [{'id': master_id, 'name': master_id} for master_id in masters]},
+        'services': [{'id': service_id, 'name': service_id, 'duration': 60} for service_id in services],
+    }
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='bench_analytics_') as workdir:
+        os.chdir(workdir)
+        db = DatabaseManager("bench")
+        try:
+            cells = fill(db, args.days, masters, services)
+            print(f"{cells} cube cells ({args.days} days × {args.masters} masters × {args.services} services)")
+            screens = (
+                ("masters", None, None),
+                ("services of a master", masters[0], None),
+                ("days of a master/service", masters[0], services[0]),
+                ("all masters by service", ALL, None),
+                ("all bookings by day", ALL, ALL),
+            )
+            for period in PERIODS:
+                results = [
+                    f"{name} {timed_ms(lambda: cube_screen(db, config, period, master, service), args.repeat):.1f}"
+                    for name, master, service in screens
+                ]
+                print(f"{period:8} ms: " + ", ".join(results))
+            print(f"add_order + cancel_order with cube upkeep: {bench_writes(db, 200):.2f} ms")
+        finally:
+            db.close()
+            os.chdir(original_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Стресс-бенчмарк одновременного подтверждения записи.
+
+N потоков, у каждого свой DatabaseManager (отдельное соединение к одной
+БД), одновременно подтверждают записи на одни и те же слоты тем же путём,
+что и обработчики: add_order -> _insert_booking с уведомлением в outbox и
+обновлением куба аналитики в той же транзакции. Проверяется, что на каждый
+(мастер, слот) создаётся ровно одна запись, а строки outbox и счётчики
+booking_cube совпадают с числом созданных записей (при конфликте слота
+побочные записи откатываются вместе с ней). Измеряется пропускная
+способность.
+
+Запуск:
+    python tools/bench_concurrent_booking.py --workers 16 --rounds 50 --masters 3
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import DatabaseManager
+
+SLUG = "bench"
+
+
+def run_benchmark(workers: int, rounds: int, masters: int) -> dict:
+    master_ids = [f"m{i}" for i in range(masters)]
+    barrier = threading.Barrier(workers)
+    lock = threading.Lock()
+    stats = {'created': 0, 'conflicts': 0, 'errors': 0}
+
+    def worker(index: int):
+        db = DatabaseManager(SLUG)
+        created = conflicts = errors = 0
+        barrier.wait()
+        for round_no in range(rounds):
+            booking_time = f"{9 + round_no // 60:02d}:{round_no % 60:02d}"
+            master_id = master_ids[(index + round_no) % masters]
+            try:
+                db.add_order(
+                    user_id=index, service_id="bench", service_name="Bench", price=100,
+                    client_name="Bench", phone="+70000000000", comment=None,
+                    booking_date="2099-01-01", booking_time=booking_time, master_id=master_id,
+                    notifications=[{'kind': 'order_created', 'chat_id': 1, 'payload': {'worker': index}}],
+                )
+                created += 1
+            except ValueError:
+                conflicts += 1
+            except Exception:
+                errors += 1
+        db.close()
+        with lock:
+            stats['created'] += created
+            stats['conflicts'] += conflicts
+            stats['errors'] += errors
+
+    # Схема создаётся заранее, чтобы потоки не мигрировали БД одновременно
+    DatabaseManager(SLUG).close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats['elapsed'] = time.perf_counter() - started
+    stats['expected'] = rounds * min(masters, workers)
+
+    db = DatabaseManager(SLUG)
+    try:
+        for key, sql in (
+            ('bookings', "SELECT COUNT(*) AS n FROM bookings"),
+            ('outbox', "SELECT COUNT(*) AS n FROM outbox"),
+            ('cube', "SELECT COALESCE(SUM(bookings), 0) AS n FROM booking_cube"),
+            ('cube_month', "SELECT COALESCE(SUM(bookings), 0) AS n FROM booking_cube_month"),
+        ):
+            stats[key] = db.conn.execute(sql).fetchone()['n']
+    finally:
+        db.close()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent booking confirmation benchmark")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--masters", type=int, default=3)
+    args = parser.parse_args()
+    # Конфликты слотов ожидаемы — не засоряем вывод предупреждениями
+    logging.basicConfig(level=logging.ERROR)
+
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            stats = run_benchmark(args.workers, args.rounds, args.masters)
+        finally:
+            os.chdir(original_dir)
+
+    attempts = args.workers * args.rounds
+    print(f"workers={args.workers} rounds={args.rounds} masters={args.masters}")
+    print(f"attempts:  {attempts} in {stats['elapsed']:.3f}s ({attempts / stats['elapsed']:.0f} ops/s)")
+    print(f"created:   {stats['created']} (expected {stats['expected']})")
+    print(f"conflicts: {stats['conflicts']}")
+    print(f"errors:    {stats['errors']}")
+    print(f"rows:      bookings {stats['bookings']}, outbox {stats['outbox']}, "
+          f"cube {stats['cube']}, cube_month {stats['cube_month']}")
+
+    side_rows = (stats['bookings'], stats['outbox'], stats['cube'], stats['cube_month'])
+    if stats['created'] != stats['expected'] or stats['errors'] or set(side_rows) != {stats['created']}:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
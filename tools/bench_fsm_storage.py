@@ -0,0 +1,83 @@
+"""
+Бенчмарк FSM-хранилищ: стоимость одного обновления для MemoryStorage
+и SQLiteStorage.
+
+Одно «обновление» повторяет типичный шаг сценария записи: FSM-middleware
+читает состояние, обработчик читает данные, делает несколько update_data
+и переводит в следующее состояние. Пользователи выбираются по кругу,
+так что при --users больше --max-entries проверяется и работа с вытеснением.
+
+Запуск:
+    python tools/bench_fsm_storage.py --updates 50000 --users 2000
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from states.booking import BookingState
+from utils.fsm_storage import SQLiteStorage
+
+STEPS = [BookingState.choosing_service, BookingState.choosing_date,
+         BookingState.choosing_time, BookingState.input_name]
+
+
+async def run_updates(storage, updates: int, users: int) -> float:
+    keys = [StorageKey(bot_id=1, chat_id=1000 + i, user_id=1000 + i) for i in range(users)]
+    started = time.perf_counter()
+    for n in range(updates):
+        key = keys[n % users]
+        await storage.get_state(key)
+        data = await storage.get_data(key)
+        await storage.update_data(key, {"service_id": "cut", "price": 1500})
+        await storage.update_data(key, {"booking_date": "2099-06-01", "step": data.get("step", 0) + 1})
+        await storage.update_data(key, {"booking_time": "10:00"})
+        await storage.set_state(key, STEPS[n % len(STEPS)])
+        if n % 64 == 0:
+            # Даём сработать отложенному сбросу, как между обновлениями в боте
+            await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+    if isinstance(storage, SQLiteStorage):
+        storage.flush()
+    return elapsed
+
+
+async def bench(args) -> None:
+    memory_elapsed = await run_updates(MemoryStorage(), args.updates, args.users)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = SQLiteStorage(os.path.join(tmp, "fsm.sqlite"), max_entries=args.max_entries,
+                                flush_delay=args.flush_delay)
+        sqlite_elapsed = await run_updates(storage, args.updates, args.users)
+        stats = storage.stats()
+        await storage.close()
+
+    print(f"updates={args.updates} users={args.users} max_entries={args.max_entries}")
+    for name, elapsed in (("MemoryStorage", memory_elapsed), ("SQLiteStorage", sqlite_elapsed)):
+        print(f"{name:14} {elapsed:.3f}s  {elapsed / args.updates * 1e6:.1f} µs/update")
+    print(f"sqlite stats:  {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FSM storage per-update cost benchmark")
+    parser.add_argument("--updates", type=int, default=50000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--max-entries", type=int, default=10000)
+    parser.add_argument("--flush-delay", type=float, default=0.5)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Бенчмарк накладных расходов логирования на одно обновление.
+
+Каждое «обновление» пишет столько же записей, сколько типичный шаг записи:
+лог aiogram о обработанном обновлении и пару INFO из обработчика с
+аргументами. Сравниваются:
+- sync: прежняя схема — StreamHandler с форматированием и записью прямо
+  в потоке цикла событий;
+- queue: utils.logger (очередь + поток-писатель), текстовый stdout;
+- queue+json: то же с JSON-строками в stdout и в файл с ротацией;
+- queue+sample: queue с выборкой 1 из 10 для логгера обработчика.
+
+Вывод идёт в файл; --write-delay-us добавляет задержку к каждой записи в
+stdout — так ведёт себя канал в journald или терминал под нагрузкой, когда
+запись блокируется. Меряется время в потоке цикла событий (то, что платит
+каждое обновление) и время до полной записи очереди.
+
+Запуск:
+    python tools/bench_logging.py --updates 20000
+    python tools/bench_logging.py --updates 5000 --write-delay-us 50
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import logger as log_setup
+
+HANDLER_LOGGER = 'handlers.booking.time'
+
+
+class SlowSink:
+    """Файл, каждая запись в который блокирует поток на delay секунд"""
+
+    def __init__(self, sink, delay: float):
+        self.sink = sink
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        if self.delay:
+            time.sleep(self.delay)
+        return self.sink.write(text)
+
+    def flush(self) -> None:
+        self.sink.flush()
+
+
+async def simulate(updates: int) -> float:
+    """Секунды в цикле событий на updates обновлений"""
+    aiogram_log = logging.getLogger('aiogram.event')
+    handler_log = logging.getLogger(HANDLER_LOGGER)
+    started = time.perf_counter()
+    for update_id in range(updates):
+        user_id = 1000 + update_id % 500
+        handler_log.info("User %s selected time: %s", user_id, "2026-10-19T12:30:00")
+        handler_log.info("Booking step %s for user %s", "time", user_id)
+        aiogram_log.info("Update id=%s is handled. Duration %d ms by bot id=%d", update_id, 3, 42)
+        if update_id % 256 == 0:
+            await asyncio.sleep(0)
+    return time.perf_counter() - started
+
+
+def configure(mode: str, workdir: str) -> None:
+    if mode == 'sync':
+        for handler in logging.root.handlers[:]:
+            logging.root.removeHandler(handler)
+        log_setup.stop_logging()
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter(log_setup.TEXT_FORMAT))
+        logging.root.addHandler(handler)
+        logging.root.setLevel(logging.INFO)
+        return
+    settings = {}
+    if mode == 'queue+json':
+        settings = {'format': 'json', 'file': os.path.join(workdir, 'bench.log')}
+    if mode == 'queue+sample':
+        settings = {'sample': {HANDLER_LOGGER: 10}}
+    log_setup.setup_logger(settings)
+
+
+def run(mode: str, updates: int, write_delay: float) -> dict:
+    with tempfile.TemporaryDirectory(prefix='bench_logging_') as workdir:
+        stdout = sys.stdout
+        with open(os.path.join(workdir, 'stdout.log'), 'w', encoding='utf-8') as sink:
+            sys.stdout = SlowSink(sink, write_delay)
+            try:
+                configure(mode, workdir)
+                loop_seconds = asyncio.run(simulate(updates))
+                drain_started = time.perf_counter()
+                log_setup.stop_logging()
+                drained = time.perf_counter() - drain_started
+                for handler in logging.root.handlers[:]:
+                    handler.flush()
+                    logging.root.removeHandler(handler)
+            finally:
+                sys.stdout = stdout
+    return {'loop_us': loop_seconds / updates * 1e6, 'drain_s': drained}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logging overhead per update")
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--write-delay-us", type=float, default=0.0,
+                        help="Blocking delay of every stdout write")
+    args = parser.parse_args()
+    for mode in ('sync', 'queue', 'queue+json', 'queue+sample'):
+        result = run(mode, args.updates, args.write_delay_us / 1e6)
+        print(f"{mode:13} {result['loop_us']:7.1f} µs/update in the event loop, "
+              f"queue drained {result['drain_s']:.2f}s after the last update")
+
+
+if __name__ == "__main__":
+    main()
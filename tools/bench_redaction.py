@@ -0,0 +1,73 @@
+"""
+Микробенчмарк маскировки персональных данных в логах.
+
+Сравнивает прежнюю схему (отдельный re.sub на каждый вид данных) с
+utils.privacy.Redactor (одно регулярное выражение, один проход) на смеси
+сообщений, похожей на реальный поток логов бота: большинство записей без
+персональных данных, часть — с телефоном, email или токеном. Печатает
+стоимость одной записи и долю ядра потока-писателя при заданной частоте логов.
+
+Запуск:
+    python tools/bench_redaction.py --records 200000 --rate 2000
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.privacy import REDACTION_RULES, RULE_BOUNDARY, Redactor
+
+MESSAGES = [
+    "Update id=791234567890 is handled. Duration 3 ms by bot id=6543210987",
+    "User 123456789 selected time: 2026-10-19T12:30:00",
+    "User 123456789 selected master: Анна",
+    "Booking step time for user 123456789",
+    "Added new booking with ID 4521 for user 123456789",
+    "Sent 12 notifications from outbox",
+    "User 123456789 entered phone: +7 (999) 123-45-67",
+    "Client contact: ivan.petrov@example.com, +79991234567",
+    "Request failed: https://api.telegram.org/bot1234567890:AAEhBOweik6ad9r_QXMENQjcrGbqCr4K-lk/getMe",
+    "Saved last details for user 123456789",
+]
+
+
+def multi_pass():
+    """Прежняя схема: по отдельному проходу на каждое правило"""
+    passes = [(re.compile(RULE_BOUNDARY + pattern), replace) for _, pattern, replace in REDACTION_RULES]
+
+    def redact(text: str) -> str:
+        for pattern, replace in passes:
+            text = pattern.sub(lambda match: replace(match.group()), text)
+        return text
+
+    return redact
+
+
+def measure(redact, records: int) -> float:
+    """Секунд на одну запись"""
+    messages = MESSAGES * (records // len(MESSAGES) + 1)
+    started = time.perf_counter()
+    for text in messages[:records]:
+        redact(text)
+    return (time.perf_counter() - started) / records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PII redaction cost per log record")
+    parser.add_argument("--records", type=int, default=200000)
+    parser.add_argument("--rate", type=int, default=2000, help="Log records per second")
+    args = parser.parse_args()
+    single = Redactor()
+    assert all(single.redact(text) == multi_pass()(text) for text in MESSAGES)
+    for name, redact in (('multi-pass', multi_pass()), ('single-pass', single.redact)):
+        per_record = measure(redact, args.records)
+        print(f"{name:12} {per_record * 1e6:6.2f} µs/record, "
+              f"{per_record * args.rate * 100:5.2f}% of a core at {args.rate} records/s")
+
+
+if __name__ == "__main__":
+    main()
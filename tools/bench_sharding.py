@@ -0,0 +1,108 @@
+"""
+Бенчмарк многопроцессного режима: масштабирование пропускной способности
+с числом воркеров.
+
+Фронт раздаёт синтетические обновления (сообщения от --users пользователей)
+через ShardedRunner, воркеры обрабатывают их настоящим Dispatcher с
+UserOrderingMiddleware. Обработчик имитирует работу хендлера: --cpu-ms
+миллисекунд вычислений (рендер клавиатур, расчёт слотов) и --io-ms ожидания.
+Для каждого числа воркеров печатается пропускная способность и ускорение
+относительно одного воркера; при CPU-нагрузке оно близко к линейному,
+пока воркеров не больше ядер.
+
+Запуск:
+    python tools/bench_sharding.py --updates 4000 --workers 1 2 4 --cpu-ms 1
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.sharding import ShardedRunner, consume_updates
+
+
+def make_update(update_id: int, users: int) -> dict:
+    user_id = 1000 + update_id % users
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+            "text": "📅 Записаться",
+        },
+    }
+
+
+async def bench_worker(index: int, workers: int, updates, results, cpu_ms: float, io_ms: float):
+    from aiogram import Bot, Dispatcher, Router
+    from aiogram.types import Message
+    from middlewares import UserOrderingMiddleware
+
+    router = Router()
+
+    @router.message()
+    async def handle(message: Message):
+        deadline = time.perf_counter() + cpu_ms / 1000
+        while time.perf_counter() < deadline:
+            pass
+        if io_ms:
+            await asyncio.sleep(io_ms / 1000)
+
+    dp = Dispatcher()
+    dp.update.outer_middleware(UserOrderingMiddleware())
+    dp.include_router(router)
+    bot = Bot("42:BENCH")
+    results.put(('ready', index))
+    try:
+        results.put(('done', await consume_updates(updates, dp, bot)))
+    finally:
+        await bot.session.close()
+
+
+async def run_front(workers: int, args) -> float:
+    results = multiprocessing.get_context('spawn').Queue()
+    runner = ShardedRunner(bench_worker, workers, args=(results, args.cpu_ms, args.io_ms))
+    runner.start()
+    # Запуск воркеров (импорт aiogram) не входит в замер
+    loop = asyncio.get_running_loop()
+    for _ in range(workers):
+        await loop.run_in_executor(None, results.get)
+    started = time.perf_counter()
+    for update_id in range(1, args.updates + 1):
+        await runner.submit(make_update(update_id, args.users))
+    await loop.run_in_executor(None, runner.stop)
+    elapsed = time.perf_counter() - started
+    processed = sum(results.get()[1] for _ in range(workers))
+    assert processed == args.updates, f"processed {processed} of {args.updates}"
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded dispatcher workers scaling benchmark")
+    parser.add_argument("--updates", type=int, default=4000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--cpu-ms", type=float, default=1.0)
+    parser.add_argument("--io-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    print(f"updates={args.updates} users={args.users} cpu_ms={args.cpu_ms} io_ms={args.io_ms} "
+          f"cpus={os.cpu_count()}")
+    baseline = None
+    for workers in args.workers:
+        elapsed = asyncio.run(run_front(workers, args))
+        throughput = args.updates / elapsed
+        baseline = baseline or throughput
+        print(f"workers={workers:<3} {elapsed:.3f}s  {throughput:.0f} updates/s  x{throughput / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()
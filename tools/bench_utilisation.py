@@ -0,0 +1,130 @@
+"""
+Бенчмарк отчёта о загрузке мастеров.
+
+Создаёт --masters мастеров с графиком 5/2 (09:00–20:00) и заполняет их дни
+записями примерно на --load долю смены, затем считает загрузку за --days
+дней тремя способами:
+- naive: цикл по минутам каждого дня каждого мастера (множества минут);
+- bytes: UtilisationEngine без NumPy (bytearray, срезы, translate);
+- numpy: UtilisationEngine с NumPy (если установлен).
+Результаты всех способов сверяются.
+
+Запуск:
+    python tools/bench_utilisation.py --masters 10 --days 90
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import DatabaseManager
+from utils.slot_engine import format_hhmm, get_slot_engine, parse_hhmm
+from utils.utilisation import HOURS, UtilisationEngine, np
+
+SHIFT = {"working": True, "start": "09:00", "end": "20:00"}
+WEEK = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+
+def make_config(masters: int) -> dict:
+    staff = []
+    for index in range(masters):
+        schedule = {day: (SHIFT if (position + index) % 7 < 5 else {"working": False})
+                    for position, day in enumerate(WEEK)}
+        staff.append({'id': f"master_{index}", 'name': f"Мастер {index}", 'schedule': schedule})
+    return {
+        'booking': {'slot_duration': 30},
+        'services': [{'id': 'short', 'duration': 45}, {'id': 'long', 'duration': 90}],
+        'staff': {'enabled': True, 'masters': staff},
+    }
+
+
+def fill(db, config: dict, start: date, days: int, load: float) -> int:
+    engine = get_slot_engine(config, db)
+    count = 0
+    for master in config['staff']['masters']:
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            for work_start, work_end in engine.compile_day(day, master['id']):
+                minute = work_start
+                while minute < work_end:
+                    service_id = random.choice(('short', 'long'))
+                    if random.random() < load:
+                        db.add_order(1, service_id, service_id, 1000, "Клиент", "+79990000000", None,
+                                     day.isoformat(), format_hhmm(minute), master['id'])
+                        count += 1
+                    minute += engine.get_service_duration(service_id)
+    return count
+
+
+def naive(config: dict, db, start: date, end: date) -> dict:
+    """Поминутный подсчёт: множества рабочих минут и цикл по минутам записей"""
+    engine = get_slot_engine(config, db)
+    masters = [master['id'] for master in config['staff']['masters']]
+    report = {'masters': {master_id: [0, 0] for master_id in masters}, 'hours': [[0, 0] for _ in range(HOURS)]}
+    day = start
+    while day <= end:
+        for master_id in masters:
+            working = set()
+            for work_start, work_end in engine.compile_day(day, master_id):
+                working.update(range(work_start, work_end))
+            busy = set()
+            for booking in db.get_day_bookings(day.isoformat(), master_id):
+                booking_start = parse_hhmm(booking['booking_time'])
+                for minute in range(booking_start, booking_start + engine.get_service_duration(booking['service_id'])):
+                    if minute in working:
+                        busy.add(minute)
+            report['masters'][master_id][0] += len(working)
+            report['masters'][master_id][1] += len(busy)
+            for minute in working:
+                report['hours'][minute // 60][0] += 1
+            for minute in busy:
+                report['hours'][minute // 60][1] += 1
+        day += timedelta(days=1)
+    return report
+
+
+def timed(call):
+    started = time.perf_counter()
+    result = call()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Master utilisation report cost")
+    parser.add_argument("--masters", type=int, default=10)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--load", type=float, default=0.7)
+    args = parser.parse_args()
+
+    config = make_config(args.masters)
+    start = date(2099, 1, 1)
+    end = start + timedelta(days=args.days - 1)
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='bench_utilisation_') as workdir:
+        os.chdir(workdir)
+        db = DatabaseManager("bench")
+        try:
+            bookings = fill(db, config, start, args.days, args.load)
+            print(f"{args.masters} masters × {args.days} days, {bookings} bookings")
+            reference, elapsed = timed(lambda: naive(config, db, start, end))
+            print(f"naive  {elapsed:8.1f} ms")
+            backends = ['bytes'] + (['numpy'] if np is not None else [])
+            for backend in backends:
+                report, elapsed = timed(lambda: UtilisationEngine(config, db, backend).compute(start, end))
+                assert report['masters'] == reference['masters'] and report['hours'] == reference['hours']
+                print(f"{backend:6} {elapsed:8.1f} ms")
+            if np is None:
+                print("numpy  not installed")
+        finally:
+            db.close()
+            os.chdir(original_dir)
+
+
+if __name__ == "__main__":
+    main()
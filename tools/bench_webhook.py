@@ -0,0 +1,136 @@
+"""
+Нагрузочный тест webhook-режима.
+
+Поднимает WebhookServer на локальном порту (или использует --url уже
+запущенного бота) и отправляет синтетические обновления (сообщения от
+разных пользователей) с заданной параллельностью. Измеряется, сколько
+обновлений в секунду сервер принимает и успевает обработать.
+
+Во встроенном режиме обработчик имитирует работу хендлера задержкой
+--handler-ms и не обращается к Telegram.
+
+Запуск:
+    python tools/bench_webhook.py --updates 5000 --connections 64 --concurrency 64
+    python tools/bench_webhook.py --url http://127.0.0.1:8080/webhook/client --secret <token>
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+from aiohttp import ClientSession, TCPConnector
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.webhook import WebhookServer
+
+TOKEN = "42:BENCH"
+
+
+def make_update(update_id: int, users: int) -> dict:
+    user_id = 1000 + update_id % users
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+            "text": "📅 Записаться",
+        },
+    }
+
+
+async def push_updates(url: str, secret: str, updates: int, connections: int, users: int) -> dict:
+    """Отправляет updates обновлений в connections параллельных потоков"""
+    counter = iter(range(1, updates + 1))
+    statuses = {}
+    latencies = []
+
+    async def worker(session: ClientSession):
+        for update_id in counter:
+            started = time.perf_counter()
+            async with session.post(url, json=make_update(update_id, users),
+                                    headers={"X-Telegram-Bot-Api-Secret-Token": secret}) as response:
+                await response.read()
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    async with ClientSession(connector=TCPConnector(limit=connections)) as session:
+        await asyncio.gather(*(worker(session) for _ in range(connections)))
+    latencies.sort()
+    return {
+        'elapsed': time.perf_counter() - started,
+        'statuses': statuses,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def run_embedded(args) -> None:
+    processed = 0
+    router = Router()
+
+    @router.message()
+    async def handle(message: Message):
+        nonlocal processed
+        if args.handler_ms:
+            await asyncio.sleep(args.handler_ms / 1000)
+        processed += 1
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(TOKEN)
+    server = WebhookServer(host="127.0.0.1", port=0, concurrency=args.concurrency, drain_timeout=60)
+    path = server.add_bot("client", dp, bot)
+    port = await server.start()
+    secret = server.handlers["client"].secret_token
+    try:
+        result = await push_updates(f"http://127.0.0.1:{port}{path}", secret, args.updates,
+                                    args.connections, args.users)
+        # Дожидаемся фоновой обработки (graceful drain при остановке)
+        drain_started = time.perf_counter()
+        await server.stop()
+        total = result['elapsed'] + time.perf_counter() - drain_started
+    finally:
+        await bot.session.close()
+
+    report(args, result)
+    print(f"processed: {processed} in {total:.3f}s ({processed / total:.0f} updates/s sustained)")
+
+
+def report(args, result: dict) -> None:
+    accepted = result['statuses'].get(200, 0)
+    print(f"updates={args.updates} connections={args.connections} users={args.users}")
+    print(f"statuses:  {result['statuses']}")
+    print(f"accepted:  {accepted} in {result['elapsed']:.3f}s ({accepted / result['elapsed']:.0f} updates/s)")
+    print(f"latency:   p50={result['p50_ms']:.1f}ms p99={result['p99_ms']:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Webhook endpoint load test")
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=64, help="webhook worker concurrency (embedded)")
+    parser.add_argument("--handler-ms", type=float, default=2.0, help="simulated handler time (embedded)")
+    parser.add_argument("--url", type=str, default=None, help="push to a running webhook endpoint instead")
+    parser.add_argument("--secret", type=str, default="", help="secret token for --url")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    if args.url:
+        result = asyncio.run(push_updates(args.url, args.secret, args.updates, args.connections, args.users))
+        report(args, result)
+    else:
+        asyncio.run(run_embedded(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Пересобирает манифест ленивых роутеров (utils/router_manifest.json).
+
+Запускать после изменения фильтров обработчиков в модулях из
+utils.lazy_router.LAZY_MODULES; тест tests/test_lazy_router.py проверяет,
+что манифест актуален.
+
+Запуск:
+    python tools/build_router_manifest.py [--check]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.lazy_router import MANIFEST_PATH, build_manifest
+
+
+def render_manifest() -> str:
+    return json.dumps(build_manifest(), ensure_ascii=False, indent=2, sort_keys=True) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build lazy router manifest")
+    parser.add_argument("--check", action="store_true", help="only verify the manifest is up to date")
+    args = parser.parse_args()
+
+    content = render_manifest()
+    try:
+        with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            current = f.read()
+    except OSError:
+        current = None
+    if args.check:
+        if current != content:
+            print(f"{MANIFEST_PATH} is stale, run: python tools/build_router_manifest.py")
+            sys.exit(1)
+        print("manifest is up to date")
+        return
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        f.write(content)
+    print(f"written {MANIFEST_PATH}")
+
+
+if __name__ == "__main__":
+    main()
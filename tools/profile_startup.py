@@ -0,0 +1,150 @@
+"""
+Профиль холодного старта ботов.
+
+1. Импорт: `python -X importtime -c "import main, admin_bot.main"` —
+   суммарное время импорта и самые тяжёлые модули (по cumulative).
+2. Время до первого опроса: main.py запускается отдельным процессом против
+   локального фейкового Bot API (TELEGRAM_API_URL); засекается время от
+   запуска процесса до первого getUpdates каждого бота.
+
+Функции используются тестами (tests/test_startup_profile.py).
+
+Запуск:
+    python tools/profile_startup.py --config-dir config --admin-config config/settings.json
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_STATEMENT = "import main, admin_bot.main"
+
+CLIENT_TOKEN = "42:PROFILE-CLIENT"
+ADMIN_TOKEN = "43:PROFILE-ADMIN"
+
+
+def parse_importtime(output: str) -> List[Tuple[str, int, int]]:
+    """Строки `import time: self | cumulative | module` -> (module, self_us, cumulative_us)"""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:  # заголовок таблицы
+            continue
+        rows.append((parts[2].strip(), self_us, cumulative_us))
+    return rows
+
+
+def measure_imports(statement: str = IMPORT_STATEMENT) -> List[Tuple[str, int, int]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+    )
+    return parse_importtime(result.stderr)
+
+
+def summarize_imports(rows: List[Tuple[str, int, int]], top: int = 15) -> dict:
+    return {
+        'modules': len(rows),
+        'total_ms': sum(self_us for _, self_us, _ in rows) / 1000,
+        'top': sorted(rows, key=lambda row: row[2], reverse=True)[:top],
+    }
+
+
+async def measure_first_poll(config_dir: str, admin_config: Optional[str] = None,
+                             timeout: float = 60.0) -> Dict[str, float]:
+    """Секунды от запуска main.py до первого getUpdates каждого бота"""
+    expected = {CLIENT_TOKEN: 'client'}
+    if admin_config:
+        expected[ADMIN_TOKEN] = 'admin'
+    first_poll: Dict[str, float] = {}
+    all_polled = asyncio.Event()
+    started = 0.0
+
+    async def api(request: web.Request) -> web.Response:
+        token, method = request.match_info['token'], request.match_info['method']
+        if method == 'getMe':
+            return web.json_response({'ok': True, 'result': {
+                'id': int(token.split(':')[0]), 'is_bot': True, 'first_name': 'Profile', 'username': 'profile_bot',
+            }})
+        if method == 'getUpdates':
+            label = expected.get(token)
+            if label and label not in first_poll:
+                first_poll[label] = time.perf_counter() - started
+                if len(first_poll) == len(expected):
+                    all_polled.set()
+            await asyncio.sleep(0.5)
+            return web.json_response({'ok': True, 'result': []})
+        return web.json_response({'ok': True, 'result': True})
+
+    app = web.Application()
+    app.router.add_post('/bot{token}/{method}', api)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    env = dict(os.environ, BOT_TOKEN=CLIENT_TOKEN, TELEGRAM_API_URL=f"http://127.0.0.1:{port}")
+    if admin_config:
+        env['ADMIN_BOT_TOKEN'] = ADMIN_TOKEN
+    else:
+        env.pop('ADMIN_BOT_TOKEN', None)
+    command = [sys.executable, os.path.join(PROJECT_ROOT, 'main.py'), '--config-dir', os.path.abspath(config_dir)]
+    if admin_config:
+        command += ['--admin-config', os.path.abspath(admin_config)]
+
+    workdir = tempfile.mkdtemp(prefix='profile_startup_')
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        *command, cwd=workdir, env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        await asyncio.wait_for(all_polled.wait(), timeout)
+    finally:
+        if process.returncode is None:
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), 10)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+        await runner.cleanup()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return first_poll
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start profile: imports and time to first poll")
+    parser.add_argument("--config-dir", default=os.path.join(PROJECT_ROOT, "config"))
+    parser.add_argument("--admin-config", default=None, help="also start the admin bot in the same process")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    summary = summarize_imports(measure_imports(), args.top)
+    print(f"imports: {summary['modules']} modules, {summary['total_ms']:.0f} ms")
+    for module, self_us, cumulative_us in summary['top']:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {self_us / 1000:7.1f} ms self  {module}")
+
+    first_poll = asyncio.run(measure_first_poll(args.config_dir, args.admin_config))
+    for label, seconds in first_poll.items():
+        print(f"first poll ({label}): {seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Аналитика записей: куб «день × мастер × услуга».
+
+Таблица booking_cube (utils.db_manager) хранит по ячейке на сочетание даты
+визита, мастера и услуги: записи, выручку, отмены и занятые минуты. Ячейку
+меняют добавление, перенос и отмена записи в той же транзакции, поэтому
+отчёты не читают таблицу записей. Целые месяцы длинных периодов берутся из
+месячной сводки booking_cube_month: два года — 24 × мастеров × услуг строк
+плюс неполные месяцы по краям (замер: python tools/bench_analytics.py).
+
+Длительность услуги берётся из конфига на момент записи (services[].duration,
+иначе шаг сетки — как у SlotEngine). Экран /analytics админ-бота: период →
+мастера → услуги мастера → дни (для длинных периодов — месяцы).
+"""
+
+import html
+import logging
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+from utils.master_assignment import get_staff_list
+from utils.slot_engine import get_slot_engine
+
+logger = logging.getLogger(__name__)
+
+# Период -> (название, первый и последний день относительно сегодня)
+PERIODS = {
+    'week': ("7 дней", -6, 0),
+    'month': ("30 дней", -29, 0),
+    'quarter': ("90 дней", -89, 0),
+    'year': ("год", -364, 0),
+    '2y': ("2 года", -729, 0),
+    'next': ("ближайшие 30 дней", 1, 30),
+}
+DEFAULT_PERIOD = 'month'
+# Периоды длиннее — по месяцам, а не по дням
+DAILY_MAX_DAYS = 92
+
+ALL = '*'
+NO_MASTER = '-'
+NAME_WIDTH = 14
+WEEKDAYS = ("пн", "вт", "ср", "чт", "пт", "сб", "вс")
+
+
+def configure_analytics(config: dict, db_manager) -> None:
+    """Длительности услуг для куба и первичное построение на старой БД"""
+    db_manager.booking_minutes = get_slot_engine(config, db_manager).get_service_duration
+    db_manager.ensure_booking_cube()
+
+
+def period_range(period: str, today: Optional[date] = None) -> Tuple[str, str]:
+    """Первый и последний день периода (YYYY-MM-DD)"""
+    _, first, last = PERIODS[period]
+    today = today or date.today()
+    return (today + timedelta(days=first)).isoformat(), (today + timedelta(days=last)).isoformat()
+
+
+def _master_filter(master: str) -> Optional[str]:
+    """Ключ мастера в меню -> фильтр get_booking_cube"""
+    if master == ALL:
+        return None
+    return '' if master == NO_MASTER else master
+
+
+def _names(config: dict, db_manager, group: str, keys: List[str]) -> dict:
+    """Имена мастеров и услуг из конфига, для удалённых из него — из записей"""
+    if group == 'master':
+        names = {master['id']: master.get('name') or master['id'] for master in get_staff_list(config)}
+        names[''] = "Без мастера"
+    else:
+        names = {service['id']: service.get('name') or service['id'] for service in config.get('services', [])}
+        missing = [key for key in keys if key not in names]
+        if missing:
+            names.update(db_manager.get_service_names(missing))
+    return names
+
+
+def _money(value: float) -> str:
+    return f"{int(round(value)):,}".replace(',', ' ') + "₽"
+
+
+def _totals_line(row: dict) -> str:
+    handled = row['bookings'] + row['cancelled']
+    rate = f" ({row['cancelled'] * 100 // handled}%)" if handled else ""
+    return (f"Записей: {row['bookings']} · выручка {_money(row['revenue'])} · "
+            f"отмен {row['cancelled']}{rate} · {row['minutes'] / 60:.0f} ч")
+
+
+def cube_screen(db_manager, config: dict, period: str = DEFAULT_PERIOD, master: Optional[str] = None,
+                service: Optional[str] = None, today: Optional[date] = None) -> Tuple[str, list]:
+    """
+    Экран аналитики и варианты перехода вглубь.
+
+    master/service: None — ещё не выбран (экран группирует по нему), ALL —
+    все, NO_MASTER — записи без мастера, иначе id.
+
+    Returns:
+        (текст, [(подпись кнопки, master, service), ...])
+    """
+    if period not in PERIODS:
+        period = DEFAULT_PERIOD
+    start, end = period_range(period, today)
+    master_id = _master_filter(master) if master is not None else None
+    service_id = service if service not in (None, ALL) else None
+
+    if master is None:
+        group = 'master'
+    elif service is None:
+        group = 'service'
+    else:
+        days = (date.fromisoformat(end) - date.fromisoformat(start)).days + 1
+        group = 'day' if days <= DAILY_MAX_DAYS else 'month'
+
+    totals = db_manager.get_booking_cube(start, end, None, master_id, service_id)
+    rows = [row for row in db_manager.get_booking_cube(start, end, group, master_id, service_id)
+            if row['bookings'] or row['cancelled']]
+
+    label = PERIODS[period][0]
+    lines = [f"📊 <b>Аналитика: {label}</b> "
+             f"({date.fromisoformat(start).strftime('%d.%m')}–{date.fromisoformat(end).strftime('%d.%m.%Y')})"]
+    if master is not None:
+        master_names = _names(config, db_manager, 'master', [])
+        lines.append("Мастер: " + ("все" if master == ALL else html.escape(master_names.get(master_id, master_id))))
+    if service is not None:
+        service_names = _names(config, db_manager, 'service', [service_id] if service_id else [])
+        lines.append("Услуга: " + ("все" if service == ALL else html.escape(service_names.get(service_id, service_id))))
+    lines.append(_totals_line(totals[0] if totals else {'bookings': 0, 'revenue': 0, 'cancelled': 0, 'minutes': 0}))
+
+    if not rows:
+        lines.append("\nДанных за период нет")
+        return "\n".join(lines), []
+
+    drill = []
+    if group in ('master', 'service'):
+        rows.sort(key=lambda row: row['revenue'], reverse=True)
+        names = _names(config, db_manager, group, [row['key'] for row in rows])
+        for row in rows:
+            name = names.get(row['key'], row['key'])
+            row['label'] = name
+            if group == 'master':
+                drill.append((name, row['key'] or NO_MASTER, None))
+            else:
+                drill.append((name, master, row['key']))
+        if group == 'service':
+            drill.append(("Все услуги по дням", master, ALL))
+        else:
+            drill.append(("Все мастера по услугам", ALL, None))
+    else:
+        for row in rows:
+            if group == 'day':
+                day = date.fromisoformat(row['key'])
+                row['label'] = f"{day.strftime('%d.%m')} {WEEKDAYS[day.weekday()]}"
+            else:
+                year, month = row['key'].split('-')
+                row['label'] = f"{month}.{year}"
+
+    lines.append("\n<code>" + "".ljust(NAME_WIDTH) + "зап.".rjust(5) + "выручка".rjust(10)
+                 + "отм.".rjust(5) + "ч".rjust(5))
+    for row in rows:
+        lines.append(html.escape(row['label'][:NAME_WIDTH].ljust(NAME_WIDTH)) + str(row['bookings']).rjust(5)
+                     + str(int(round(row['revenue']))).rjust(10) + str(row['cancelled']).rjust(5)
+                     + f"{row['minutes'] / 60:.0f}".rjust(5))
+    return "\n".join(lines) + "</code>", drill
@@ -10,6 +10,8 @@ import logging
 from pathlib import Path
 from typing import Any, Dict, Optional, List
 
+from utils.config_loader import notify_config_saved
+
 logger = logging.getLogger(__name__)
 
 # Корневая директория проекта (parent of utils/)
@@ -53,6 +55,8 @@ class ConfigEditor:
             json.dump(config, f, ensure_ascii=False, indent=2)
 
         logger.info(f"Config saved (version {config['config_version']})")
+        # Боты этого процесса видят правку сразу, без ожидания опроса файлов
+        notify_config_saved(self.config_path)
 
     def update_field(self, path: str, value: Any) -> None:
         """
@@ -1,6 +1,16 @@
 
+import asyncio
 import json
+import logging
 import os
+import weakref
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Наблюдатели процесса: ConfigEditor.save уведомляет их о сохранении сразу
+_watchers = weakref.WeakSet()
+
 
 def load_config(path: str) -> dict:
     config = {}
@@ -9,3 +19,80 @@ def load_config(path: str) -> dict:
             with open(os.path.join(path, filename), 'r', encoding='utf-8') as f:
                 config.update(json.load(f))
     return config
+
+
+class ConfigWatcher:
+    """
+    Единый снимок конфигурации директории на процесс.
+
+    Словарь config обновляется на месте (handlers и middlewares держат ссылку
+    на него), после чего вызываются подписчики. Файлы перечитываются только
+    при изменении mtime и config_version; изменения, сохранённые через
+    ConfigEditor в этом же процессе, применяются сразу, без ожидания опроса.
+    """
+
+    def __init__(self, path: str, config: Optional[dict] = None):
+        self.path = os.path.abspath(path)
+        self.config = config if config is not None else load_config(path)
+        self.version = self.config.get('config_version', 0)
+        self.mtime = self._latest_mtime()
+        self.listeners: List[Callable[[dict], None]] = []
+        _watchers.add(self)
+
+    def subscribe(self, listener: Callable[[dict], None]) -> None:
+        self.listeners.append(listener)
+
+    def covers(self, file_path) -> bool:
+        return os.path.dirname(os.path.abspath(file_path)) == self.path
+
+    def _latest_mtime(self) -> Optional[float]:
+        try:
+            files = [os.path.join(self.path, f) for f in os.listdir(self.path) if f.endswith('.json')]
+            if not files:
+                return None
+            return max(os.path.getmtime(f) for f in files)
+        except Exception:
+            return None
+
+    def reload(self, force: bool = False) -> bool:
+        """Перечитывает конфигурацию, если она изменилась. True — снимок обновлён"""
+        current_mtime = self._latest_mtime()
+        if current_mtime is None:
+            return False
+        if not force and self.mtime is not None and current_mtime == self.mtime:
+            return False
+        self.mtime = current_mtime
+
+        try:
+            new_config = load_config(self.path)
+        except Exception as e:
+            logger.error(f"❌ Не удалось перезагрузить конфигурацию: {e}")
+            return False
+
+        new_version = new_config.get('config_version', 0)
+        if new_version == self.version:
+            return False
+
+        self.config.clear()
+        self.config.update(new_config)
+        self.version = new_version
+        logger.info(f"🔄 Конфигурация обновлена (config_version={new_version})")
+        for listener in self.listeners:
+            try:
+                listener(self.config)
+            except Exception as e:
+                logger.error(f"❌ Ошибка подписчика конфигурации: {e}")
+        return True
+
+    async def run(self, poll_interval_seconds: float = 3.0) -> None:
+        """Опрос директории — для правок, сделанных другими процессами или вручную"""
+        while True:
+            await asyncio.sleep(poll_interval_seconds)
+            self.reload()
+
+
+def notify_config_saved(file_path) -> None:
+    """Применяет сохранённый файл во всех снимках процесса, которые его содержат"""
+    for watcher in list(_watchers):
+        if watcher.covers(file_path):
+            watcher.reload(force=True)
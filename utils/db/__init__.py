@@ -3,8 +3,16 @@ DatabaseManager - единый интерфейс для работы с баз
 Использует реальную реализацию из db_manager.py.
 """
 
+import csv
+import logging
+import sqlite3
+from datetime import date, datetime, timedelta
+from io import StringIO
+
 from utils.db_manager import DatabaseManager as RealDatabaseManager
 
+logger = logging.getLogger(__name__)
+
 
 class DatabaseManager(RealDatabaseManager):
     """
@@ -47,25 +55,48 @@ class DatabaseManager(RealDatabaseManager):
         )
 
     def get_order_by_id(self, order_id):
-        """Алиас для get_booking_by_id."""
-        return self.get_booking_by_id(order_id)
+        """
+        Алиас для get_booking_by_id.
+
+        Дополняет запись полями старого API: booking_date, booking_time и
+        status (отменённые записи удаляются, поэтому найденная всегда active).
+        """
+        order = self.get_booking_by_id(order_id)
+        if order:
+            booking_date, _, booking_time = (order.get('booking_datetime') or '').partition('T')
+            order.setdefault('booking_date', booking_date)
+            order.setdefault('booking_time', booking_time[:5])
+            order.setdefault('status', 'active')
+        return order
 
     def add_order(self, user_id, service_id, service_name, price, client_name, phone,
-                  comment, booking_date, booking_time, master_id, master_name=None):
-        """Совместимость со старым API (save.py)."""
+                  comment, booking_date, booking_time, master_id, master_name=None, notifications=None):
+        """
+        Совместимость со старым API (save.py).
+
+        notifications записываются в outbox в той же транзакции, что и заказ.
+
+        Raises:
+            ValueError: слот уже занят (нарушен уникальный индекс idx_bookings_master_slot)
+        """
         booking_datetime = f"{booking_date}T{booking_time}"
-        return self.add_booking(
-            user_id=user_id,
-            client_name=client_name or "Не указано",
-            phone=phone or "Не указан",
-            service_id=service_id,
-            service_name=service_name,
-            master_id=master_id,
-            master_name=master_name,
-            booking_datetime=booking_datetime,
-            comment=comment,
-            price=price
-        )
+        try:
+            return self._insert_booking(
+                user_id=user_id,
+                client_name=client_name or "Не указано",
+                phone=phone or "Не указан",
+                service_id=service_id,
+                service_name=service_name,
+                master_id=master_id,
+                master_name=master_name,
+                booking_datetime=booking_datetime,
+                comment=comment,
+                price=price,
+                notifications=notifications
+            )
+        except sqlite3.IntegrityError as e:
+            logger.warning(f"Slot already taken: {booking_datetime}, master_id={master_id}: {e}")
+            raise ValueError(f"Слот {booking_date} {booking_time} уже занят") from e
 
     def add_user(self, user_id, username, first_name, last_name):
         """Заглушка - пользователи сохраняются через client_details."""
@@ -87,19 +118,154 @@ class DatabaseManager(RealDatabaseManager):
 
     def check_slot_availability_excluding(self, date_str, time_str, order_id):
         """Проверка доступности слота при переносе (исключая текущий заказ)."""
-        busy = self.get_busy_slots(date_str)
+        order = self.get_booking_by_id(order_id) or {}
+        busy = [
+            b['booking_time'] for b in self.get_day_bookings(date_str, order.get('master_id'))
+            if b['id'] != order_id and (b['master_id'] or '') == (order.get('master_id') or '')
+        ]
         return time_str not in busy
 
-    def update_order(self, order_id, **updates):
-        """Обновление заказа."""
+    def update_order(self, order_id, notifications=None, **updates):
+        """
+        Обновление заказа.
+
+        booking_date/booking_time собираются в booking_datetime. Занятость нового
+        слота проверяет уникальный индекс — без отдельного SELECT.
+        notifications записываются в outbox в той же транзакции.
+
+        Raises:
+            ValueError: новый слот уже занят
+        """
         if not updates:
             return False
+        updates = dict(updates)
+        if 'booking_date' in updates or 'booking_time' in updates:
+            booking_date = updates.pop('booking_date', None)
+            booking_time = updates.pop('booking_time', None)
+            if not (booking_date and booking_time):
+                current = self.get_booking_by_id(order_id)
+                if not current:
+                    return False
+                old_date, _, old_time = current['booking_datetime'].partition('T')
+                booking_date = booking_date or old_date
+                booking_time = booking_time or old_time[:5]
+            updates['booking_datetime'] = f"{booking_date}T{booking_time}"
+        # Длительность фиксируется при записи; меняется только вместе с услугой
+        if 'service_id' in updates and 'duration' not in updates:
+            updates['duration'] = self.booking_minutes(updates['service_id'])
         try:
+            self._touch_user(self._user_of_booking(order_id))
+            before = self._cube_booking(order_id)
             set_clause = ", ".join(f"{k} = ?" for k in updates.keys())
             sql = f"UPDATE bookings SET {set_clause} WHERE id = ?"
             self.cursor.execute(sql, (*updates.values(), order_id))
+            updated = self.cursor.rowcount > 0
+            if updated:
+                # Перенос или смена услуги: запись переезжает в другую ячейку куба
+                self._cube_add(*before, -1)
+                self._cube_add(*self._cube_booking(order_id), 1)
+                self._queue_notifications(notifications)
             self.conn.commit()
-            return self.cursor.rowcount > 0
+            self._local_writes += 1
+            return updated
+        except sqlite3.IntegrityError as e:
+            self.conn.rollback()
+            logger.warning(f"Cannot move order {order_id}, slot already taken: {e}")
+            raise ValueError(f"Слот {updates.get('booking_datetime')} уже занят") from e
         except Exception:
             self.conn.rollback()
             return False
+
+    def cancel_order(self, order_id, notifications=None):
+        """
+        Отмена заказа (запись удаляется, как в cancel_booking).
+
+        notifications записываются в outbox в той же транзакции.
+        """
+        try:
+            self._touch_user(self._user_of_booking(order_id))
+            booking = self._cube_booking(order_id)
+            self.cursor.execute("DELETE FROM bookings WHERE id = ?", (order_id,))
+            cancelled = self.cursor.rowcount > 0
+            if cancelled:
+                self._cube_add(*booking, -1, cancelled=1)
+                self.cursor.execute("DELETE FROM reminders WHERE order_id = ?", (order_id,))
+                self._queue_notifications(notifications)
+            self.conn.commit()
+            self._local_writes += 1
+        except sqlite3.Error as e:
+            logger.error(f"Failed to cancel order {order_id}: {e}")
+            self.conn.rollback()
+            return False
+        if cancelled:
+            self.bookings_cancelled += 1
+            logger.info("Canceled booking with ID %s", order_id)
+        return cancelled
+
+    # === Статистика админ-панели ===
+
+    def get_stats(self, period='today'):
+        """
+        Сводка для админ-панели (формат StatsQueries.get_stats) по кубу аналитики:
+        записи с датой визита от начала периода до сегодня, будущие — отдельно.
+        """
+        days_back = {'today': 0, 'week': 7, 'month': 30}.get(period, 0)
+        today = date.today()
+        start = (today - timedelta(days=days_back)).isoformat()
+        tomorrow = (today + timedelta(days=1)).isoformat()
+        done = self.get_booking_cube(start, today.isoformat())
+        planned = self.get_booking_cube(tomorrow, '9999-12-31')
+        services = sorted(self.get_booking_cube(start, '9999-12-31', 'service'),
+                          key=lambda row: row['bookings'], reverse=True)
+        services = [row for row in services if row['bookings'] > 0][:5]
+        names = self.get_service_names([row['key'] for row in services])
+        try:
+            self.cursor.execute('''
+                SELECT COUNT(*) AS count FROM (
+                    SELECT MIN(created_at) AS first_booking FROM bookings GROUP BY user_id
+                ) WHERE first_booking >= ?
+            ''', (start,))
+            new_clients = self.cursor.fetchone()['count']
+        except sqlite3.Error as e:
+            logger.error(f"Error getting stats: {e}")
+            new_clients = 0
+        done = done[0] if done else {'bookings': 0, 'revenue': 0}
+        planned = planned[0] if planned else {'bookings': 0, 'revenue': 0}
+        return {
+            'total_orders': done['bookings'],
+            'planned_orders': planned['bookings'],
+            'top_services': [(names.get(row['key'], row['key']), row['bookings']) for row in services],
+            'total_revenue': int(round(done['revenue'])),
+            'planned_revenue': int(round(planned['revenue'])),
+            'new_clients': new_clients,
+        }
+
+    def get_service_names(self, service_ids):
+        """Названия услуг из записей (для услуг, удалённых из конфига)"""
+        if not service_ids:
+            return {}
+        placeholders = ', '.join('?' for _ in service_ids)
+        self.cursor.execute(f'''
+            SELECT service_id, MAX(service_name) AS service_name FROM bookings
+            WHERE service_id IN ({placeholders}) GROUP BY service_id
+        ''', list(service_ids))
+        return {row['service_id']: row['service_name'] for row in self.cursor.fetchall()}
+
+    def get_orders_csv(self, days=30):
+        """Записи, созданные за последние N дней, в формате CSV (с мастером)"""
+        cutoff = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+        self.cursor.execute('''
+            SELECT id, user_id, service_id, service_name, master_id, master_name, price, client_name, phone,
+                   comment, substr(booking_datetime, 1, 10) AS booking_date,
+                   substr(booking_datetime, 12, 5) AS booking_time, 'active' AS status, created_at
+            FROM bookings
+            WHERE created_at >= ?
+            ORDER BY created_at DESC
+        ''', (cutoff,))
+        output = StringIO()
+        writer = csv.writer(output, delimiter=';')
+        writer.writerow(['ID', 'User ID', 'Service ID', 'Service Name', 'Master ID', 'Master Name', 'Price',
+                         'Client Name', 'Phone', 'Comment', 'Booking Date', 'Booking Time', 'Status', 'Created At'])
+        for row in self.cursor.fetchall():
+            writer.writerow(row.values())
+        return output.getvalue().encode('utf-8-sig')
@@ -23,31 +23,22 @@ class BookingQueries:
                   client_name: str, phone: str, comment: str = None,
                   booking_date: str = None, booking_time: str = None,
                   master_id: str = None) -> int:
-        """Добавление заказа с защитой от race condition"""
+        """
+        Добавление заказа с защитой от race condition.
+
+        Занятость слота проверяет сама БД (уникальный индекс idx_orders_active_slot),
+        поэтому отдельный SELECT перед вставкой не нужен.
+        """
         try:
             self._ensure_connection()
             # Используем `with self.connection` для атомарной транзакции
             with self.connection:
+                # BEGIN IMMEDIATE сразу берёт блокировку на запись: параллельные
+                # подтверждения выстраиваются в очередь (busy_timeout), а не падают на COMMIT
+                self.connection.execute("BEGIN IMMEDIATE")
                 cursor = self.connection.cursor()
                 created_at = datetime.now().isoformat()
 
-                # Шаг 1: Проверяем доступность слота
-                if booking_date and booking_time:
-                    if master_id:
-                        cursor.execute("""
-                            SELECT COUNT(*) FROM orders
-                            WHERE booking_date = ? AND booking_time = ? AND master_id = ? AND status = 'active'
-                        """, (booking_date, booking_time, master_id))
-                    else:
-                        cursor.execute("""
-                            SELECT COUNT(*) FROM orders
-                            WHERE booking_date = ? AND booking_time = ? AND status = 'active'
-                        """, (booking_date, booking_time))
-                    
-                    if cursor.fetchone()[0] > 0:
-                        raise ValueError(f"Слот {booking_date} {booking_time} уже занят")
-
-                # Шаг 2: Создаем заказ (если слот свободен)
                 cursor.execute("""
                     INSERT INTO orders (user_id, service_id, service_name, price, client_name, phone,
                                        comment, booking_date, booking_time, master_id, status, created_at)
@@ -73,10 +64,10 @@ class BookingQueries:
 
             return order_id
 
-        except ValueError as e:
-            # Ошибка (слот занят) будет обработана, транзакция автоматически отменена
-            logger.warning(f"Slot already taken: {e}")
-            raise
+        except sqlite3.IntegrityError as e:
+            # Слот занят (нарушен уникальный индекс), транзакция автоматически отменена
+            logger.warning(f"Slot already taken: {booking_date} {booking_time}, master_id={master_id}: {e}")
+            raise ValueError(f"Слот {booking_date} {booking_time} уже занят") from e
         except sqlite3.Error as e:
             # Ошибка БД, транзакция автоматически отменена
             logger.error(f"Error adding order: {e}")
@@ -130,6 +121,58 @@ class BookingQueries:
             logger.error(f"Error getting user bookings: {e}")
             return []
 
+    def get_client_history(self, user_id: int, limit: int = 5, offset: int = 0) -> list:
+        """
+        Последние заказы клиента (новые первыми), не более limit.
+
+        Использует индекс idx_orders_user_created: читается только нужная страница,
+        а не вся история клиента.
+        """
+        try:
+            self._ensure_connection()
+            cursor = self.connection.cursor()
+            cursor.execute("""
+                SELECT id, service_name, booking_date, booking_time, price, status,
+                       created_at, comment, client_name, phone, master_id
+                FROM orders
+                WHERE user_id = ?
+                ORDER BY created_at DESC
+                LIMIT ? OFFSET ?
+            """, (user_id, limit, offset))
+
+            return [
+                {
+                    'id': row[0],
+                    'service_name': row[1],
+                    'booking_date': row[2],
+                    'booking_time': row[3],
+                    'price': row[4],
+                    'status': row[5],
+                    'created_at': row[6],
+                    'comment': row[7],
+                    'client_name': row[8],
+                    'phone': row[9],
+                    'master_id': row[10],
+                }
+                for row in cursor.fetchall()
+            ]
+
+        except sqlite3.Error as e:
+            logger.error(f"Error getting client history: {e}")
+            return []
+
+    def count_client_orders(self, user_id: int) -> int:
+        """Количество заказов клиента (по индексу idx_orders_user_created)"""
+        try:
+            self._ensure_connection()
+            cursor = self.connection.cursor()
+            cursor.execute("SELECT COUNT(*) FROM orders WHERE user_id = ?", (user_id,))
+            return cursor.fetchone()[0]
+
+        except sqlite3.Error as e:
+            logger.error(f"Error counting client orders: {e}")
+            return 0
+
     def get_order_by_id(self, order_id: int) -> dict:
         """Получение информации о заказе по ID"""
         try:
@@ -167,7 +210,12 @@ class BookingQueries:
             return None
 
     def update_order(self, order_id: int, **kwargs) -> bool:
-        """Обновление полей заказа"""
+        """
+        Обновление полей заказа.
+
+        Raises:
+            ValueError: новый слот уже занят активной записью того же мастера
+        """
         try:
             self._ensure_connection()
             set_parts = []
@@ -185,14 +233,18 @@ class BookingQueries:
                 return False
 
             values.append(order_id)
-            cursor = self.connection.cursor()
-            query = f"UPDATE orders SET {', '.join(set_parts)} WHERE id = ?"
-            cursor.execute(query, values)
-            self.connection.commit()
+            with self.connection:
+                self.connection.execute("BEGIN IMMEDIATE")
+                cursor = self.connection.cursor()
+                query = f"UPDATE orders SET {', '.join(set_parts)} WHERE id = ?"
+                cursor.execute(query, values)
 
-            logger.info(f"Order {order_id} updated: {kwargs}")
+            logger.info("Order %s updated: %s", order_id, sorted(kwargs))
             return cursor.rowcount > 0
 
+        except sqlite3.IntegrityError as e:
+            logger.warning(f"Cannot move order {order_id}, slot already taken: {e}")
+            raise ValueError(f"Слот {kwargs.get('booking_date')} {kwargs.get('booking_time')} уже занят") from e
         except sqlite3.Error as e:
             logger.error(f"Error updating order: {e}")
             return False
@@ -2,9 +2,11 @@
 import sqlite3
 import logging
 
+from utils import query_trace
+
 logger = logging.getLogger(__name__)
 
-LATEST_SCHEMA_VERSION = 3
+LATEST_SCHEMA_VERSION = 4
 
 # Белый список таблиц для защиты от SQL injection
 ALLOWED_TABLES = {'orders', 'users', 'schema_migrations'}
@@ -26,7 +28,7 @@ class Database:
                 self.connection.close()
             except Exception:
                 pass
-            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection = query_trace.connect(self.db_path, check_same_thread=False)
             try:
                 self.connection.execute("PRAGMA foreign_keys = ON")
                 self.connection.execute("PRAGMA busy_timeout = 5000")
@@ -172,6 +174,35 @@ class Database:
 
             self._set_schema_version(cursor, 3)
 
+        current_version = self._get_schema_version(cursor)
+        if current_version < 4:
+            # Уникальность активного слота на уровне БД: один мастер — одна запись
+            # на дату/время. Записи без мастера (master_id IS NULL) делят один общий ключ ''.
+            cursor.execute(
+                """
+                SELECT GROUP_CONCAT(id) FROM orders
+                WHERE status = 'active' AND booking_date IS NOT NULL AND booking_time IS NOT NULL
+                GROUP BY COALESCE(master_id, ''), booking_date, booking_time
+                HAVING COUNT(*) > 1
+                """
+            )
+            duplicates = [row[0] for row in cursor.fetchall()]
+            if duplicates:
+                raise RuntimeError(
+                    f"Duplicate active bookings for the same slot (order ids: {'; '.join(duplicates)}). "
+                    "Cancel the duplicates and restart to finish the migration."
+                )
+
+            cursor.execute(
+                """
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_active_slot
+                ON orders(COALESCE(master_id, ''), booking_date, booking_time)
+                WHERE status = 'active'
+                """
+            )
+
+            self._set_schema_version(cursor, 4)
+
         current_version = self._get_schema_version(cursor)
         if current_version < target_version:
             raise RuntimeError(
@@ -181,7 +212,7 @@ class Database:
     def init_db(self):
         """Инициализация базы данных и создание таблиц"""
         try:
-            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection = query_trace.connect(self.db_path, check_same_thread=False)
             try:
                 self.connection.execute("PRAGMA foreign_keys = ON")
             except Exception:
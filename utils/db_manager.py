@@ -1,14 +1,44 @@
+import json
 import sqlite3
 import logging
-from datetime import datetime
+import time
+from datetime import date, datetime, timedelta
+
+from utils import query_trace
 
 logger = logging.getLogger(__name__)
 
+# Booked minutes per booking when no duration lookup is configured
+DEFAULT_BOOKING_MINUTES = 60
+# Cube grouping -> key expression on the daily and the monthly table (None: daily only)
+CUBE_GROUPS = {
+    'day': ('day', None),
+    'month': ('substr(day, 1, 7)', 'month'),
+    'master': ('master_id', 'master_id'),
+    'service': ('service_id', 'service_id'),
+}
+
 class DatabaseManager:
     def __init__(self, db_path="booking_bot.db"):
+        self.db_path = db_path
         try:
-            self.conn = sqlite3.connect(db_path)
+            self.conn = query_trace.connect(db_path)
+            # Several processes (sharded workers, admin bot) share the file:
+            # WAL lets readers run alongside the single writer, writers wait for the lock
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA busy_timeout=5000")
             self.conn.row_factory = self.dict_factory
+            # Счётчик собственных записей (для инвалидации кэшей слотов)
+            self._local_writes = 0
+            # Separate counter for slot holds so they don't invalidate slot caches
+            self._hold_writes = 0
+            # Per-user write counters (client history cache invalidation)
+            self._user_writes = {}
+            # Bookings added / cancelled through this connection (time series)
+            self.bookings_added = 0
+            self.bookings_cancelled = 0
+            # service_id -> booked minutes for the analytics cube (see utils.analytics)
+            self.booking_minutes = lambda service_id: DEFAULT_BOOKING_MINUTES
             self.cursor = self.conn.cursor()
             self._init_db()
             logger.info(f"Successfully connected to database at {db_path}")
@@ -24,24 +54,42 @@ class DatabaseManager:
             d[col[0]] = row[idx]
         return d
 
+    BOOKINGS_TABLE_SQL = '''
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            client_name TEXT NOT NULL,
+            phone TEXT,
+            service_id TEXT NOT NULL,
+            service_name TEXT NOT NULL,
+            master_id TEXT,
+            master_name TEXT,
+            booking_datetime TEXT NOT NULL,
+            comment TEXT,
+            price REAL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            duration INTEGER
+        )
+    '''
+
     def _init_db(self):
         """Initializes the database schema by creating necessary tables."""
         try:
+            self.cursor.execute(self.BOOKINGS_TABLE_SQL.format(name='bookings'))
+            self._add_booking_duration()
+            self._drop_global_slot_unique()
+            # One booking per master per slot; bookings without a master share the '' key
             self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS bookings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    client_name TEXT NOT NULL,
-                    phone TEXT,
-                    service_id TEXT NOT NULL,
-                    service_name TEXT NOT NULL,
-                    master_id TEXT,
-                    master_name TEXT,
-                    booking_datetime TEXT NOT NULL UNIQUE,
-                    comment TEXT,
-                    price REAL,
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
-                )
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_master_slot
+                ON bookings(COALESCE(master_id, ''), booking_datetime)
+            ''')
+            self.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_bookings_datetime
+                ON bookings(booking_datetime)
+            ''')
+            self.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_bookings_user_created
+                ON bookings(user_id, created_at)
             ''')
             self.cursor.execute('''
                 CREATE TABLE IF NOT EXISTS client_details (
@@ -50,6 +98,103 @@ class DatabaseManager:
                     phone TEXT NOT NULL
                 )
             ''')
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS slot_holds (
+                    booking_date TEXT NOT NULL,
+                    booking_time TEXT NOT NULL,
+                    master_key TEXT NOT NULL DEFAULT '',
+                    user_id INTEGER NOT NULL,
+                    service_id TEXT,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (booking_date, booking_time, master_key)
+                )
+            ''')
+            self.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_slot_holds_expires
+                ON slot_holds(expires_at)
+            ''')
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS reminders (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    order_id INTEGER NOT NULL,
+                    user_id INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    due_at REAL NOT NULL,
+                    payload TEXT NOT NULL,
+                    sent_at REAL,
+                    UNIQUE (order_id, kind)
+                )
+            ''')
+            self.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_reminders_due
+                ON reminders(due_at) WHERE sent_at IS NULL
+            ''')
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    chat_id INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT,
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            self.cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_outbox_due
+                ON outbox(status, next_attempt_at)
+            ''')
+            # Fixed-size ring buffers of metric samples, one per resolution:
+            # a bucket's slot is (bucket_start // resolution) % capacity
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS metric_series (
+                    resolution INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    slot INTEGER NOT NULL,
+                    bucket_start INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    total REAL NOT NULL,
+                    min REAL NOT NULL,
+                    max REAL NOT NULL,
+                    PRIMARY KEY (resolution, name, slot)
+                ) WITHOUT ROWID
+            ''')
+            # Analytics cube: one row per (booking day, master, service), maintained
+            # in the same transaction as every booking insert, update and cancel
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS booking_cube (
+                    day TEXT NOT NULL,
+                    master_id TEXT NOT NULL,
+                    service_id TEXT NOT NULL,
+                    bookings INTEGER NOT NULL DEFAULT 0,
+                    revenue REAL NOT NULL DEFAULT 0,
+                    cancelled INTEGER NOT NULL DEFAULT 0,
+                    minutes INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, master_id, service_id)
+                ) WITHOUT ROWID
+            ''')
+            # Monthly roll-up of the cube: long ranges read whole months from here
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS booking_cube_month (
+                    month TEXT NOT NULL,
+                    master_id TEXT NOT NULL,
+                    service_id TEXT NOT NULL,
+                    bookings INTEGER NOT NULL DEFAULT 0,
+                    revenue REAL NOT NULL DEFAULT 0,
+                    cancelled INTEGER NOT NULL DEFAULT 0,
+                    minutes INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (month, master_id, service_id)
+                ) WITHOUT ROWID
+            ''')
+            # Single row rewritten by the health daemon to measure write latency
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS health_probe (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    checked_at REAL NOT NULL
+                )
+            ''')
             self.conn.commit()
             logger.info("Database tables initialized or already exist.")
         except sqlite3.Error as e:
@@ -57,25 +202,66 @@ class DatabaseManager:
             self.conn.rollback() # Rollback changes on error
             raise
 
-    def add_booking(self, user_id, client_name, phone, service_id, service_name, master_id, master_name, booking_datetime, comment, price):
-        """Adds a new booking to the database."""
+    def _add_booking_duration(self):
+        """
+        Adds bookings.duration (minutes booked, fixed at insert time) to tables
+        created before it existed. Old rows get it in backfill_booking_durations.
+        """
+        self.cursor.execute("PRAGMA table_info(bookings)")
+        if not any(row['name'] == 'duration' for row in self.cursor.fetchall()):
+            self.cursor.execute("ALTER TABLE bookings ADD COLUMN duration INTEGER")
+
+    def _drop_global_slot_unique(self):
+        """
+        Rebuilds the bookings table created with the old UNIQUE(booking_datetime)
+        constraint, which blocked two different masters from taking the same time.
+        """
+        self.cursor.execute("PRAGMA index_list(bookings)")
+        if not any(row['origin'] == 'u' for row in self.cursor.fetchall()):
+            return
+        logger.info("Rebuilding bookings table: per-master slot uniqueness")
+        self.cursor.execute(self.BOOKINGS_TABLE_SQL.format(name='bookings_new'))
+        self.cursor.execute("INSERT INTO bookings_new SELECT * FROM bookings")
+        self.cursor.execute("DROP TABLE bookings")
+        self.cursor.execute("ALTER TABLE bookings_new RENAME TO bookings")
+
+    def _insert_booking(self, user_id, client_name, phone, service_id, service_name, master_id, master_name, booking_datetime, comment, price,
+                        notifications=None):
+        """
+        Inserts a booking and returns its ID. sqlite3.IntegrityError means the slot is taken.
+        Notifications are queued to the outbox in the same transaction, with the new order_id.
+        The service duration is stored with the booking, so later config edits don't change it.
+        """
         try:
+            duration = self.booking_minutes(service_id)
             sql = '''
-                INSERT INTO bookings (user_id, client_name, phone, service_id, service_name, master_id, master_name, booking_datetime, comment, price)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO bookings (user_id, client_name, phone, service_id, service_name, master_id, master_name, booking_datetime, comment, price, duration)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             '''
-            self.cursor.execute(sql, (user_id, client_name, phone, service_id, service_name, master_id, master_name, booking_datetime, comment, price))
-            self.conn.commit()
+            self.cursor.execute(sql, (user_id, client_name, phone, service_id, service_name, master_id, master_name, booking_datetime, comment, price, duration))
             booking_id = self.cursor.lastrowid
-            logger.info(f"Added new booking with ID {booking_id} for user {user_id}")
-            return booking_id
-        except sqlite3.IntegrityError as e:
-            logger.warning(f"Failed to add booking due to integrity error (likely duplicate datetime): {e}")
+            self._cube_add(booking_datetime[:10], master_id, service_id, price, duration, 1)
+            self._queue_notifications(notifications, order_id=booking_id)
+            self.conn.commit()
+        except sqlite3.Error:
             self.conn.rollback()
+            raise
+        self._local_writes += 1
+        self.bookings_added += 1
+        self._touch_user(user_id)
+        logger.info("Added new booking with ID %s for user %s", booking_id, user_id)
+        return booking_id
+
+    def add_booking(self, user_id, client_name, phone, service_id, service_name, master_id, master_name, booking_datetime, comment, price):
+        """Adds a new booking to the database. Returns None if the slot is taken."""
+        try:
+            return self._insert_booking(user_id, client_name, phone, service_id, service_name,
+                                        master_id, master_name, booking_datetime, comment, price)
+        except sqlite3.IntegrityError as e:
+            logger.warning(f"Failed to add booking due to integrity error (slot {booking_datetime} taken for master {master_id}): {e}")
             return None
         except sqlite3.Error as e:
             logger.error(f"Failed to add booking for user {user_id}: {e}")
-            self.conn.rollback()
             return None
 
     def get_user_bookings(self, user_id):
@@ -87,13 +273,69 @@ class DatabaseManager:
             logger.error(f"Failed to get bookings for user {user_id}: {e}")
             return []
 
+    def get_client_history(self, user_id, limit=5, offset=0):
+        """
+        Returns the newest bookings of a user (newest first), at most limit rows.
+        Served by idx_bookings_user_created, so it never scans the whole history.
+        """
+        try:
+            self.cursor.execute('''
+                SELECT id, service_name, price, comment, client_name, phone, master_id,
+                       strftime('%Y-%m-%d', booking_datetime) AS booking_date,
+                       strftime('%H:%M', booking_datetime) AS booking_time,
+                       'active' AS status, created_at
+                FROM bookings
+                WHERE user_id = ?
+                ORDER BY created_at DESC, id DESC
+                LIMIT ? OFFSET ?
+            ''', (user_id, limit, offset))
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to get history for user {user_id}: {e}")
+            return []
+
+    def count_client_orders(self, user_id):
+        """Returns the number of bookings of a user."""
+        try:
+            self.cursor.execute("SELECT COUNT(*) AS count FROM bookings WHERE user_id = ?", (user_id,))
+            return self.cursor.fetchone()['count']
+        except sqlite3.Error as e:
+            logger.error(f"Failed to count bookings for user {user_id}: {e}")
+            return 0
+
+    def _touch_user(self, user_id):
+        """Marks the user's bookings as changed."""
+        if user_id is not None:
+            self._user_writes[user_id] = self._user_writes.get(user_id, 0) + 1
+
+    def _user_of_booking(self, booking_id):
+        """Returns the owner of a booking (None if it does not exist)."""
+        self.cursor.execute("SELECT user_id FROM bookings WHERE id = ?", (booking_id,))
+        row = self.cursor.fetchone()
+        return row['user_id'] if row else None
+
+    def get_user_version(self, user_id):
+        """
+        Returns a value that changes whenever the user's bookings may have changed:
+        own writes are counted per user, other connections via PRAGMA data_version.
+        """
+        return (self._user_writes.get(user_id, 0), self.get_data_version()[1])
+
     def cancel_booking(self, booking_id):
         """Cancels (deletes) a booking by its ID."""
         try:
+            self._touch_user(self._user_of_booking(booking_id))
+            booking = self._cube_booking(booking_id)
             self.cursor.execute("DELETE FROM bookings WHERE id = ?", (booking_id,))
+            deleted = self.cursor.rowcount
+            if deleted > 0:
+                self._cube_add(*booking, -1, cancelled=1)
+            self.cursor.execute("DELETE FROM reminders WHERE order_id = ?", (booking_id,))
             self.conn.commit()
-            if self.cursor.rowcount > 0:
-                logger.info(f"Canceled booking with ID {booking_id}")
+            self._local_writes += 1
+            if deleted > 0:
+                self.bookings_cancelled += 1
+                logger.info("Canceled booking with ID %s", booking_id)
                 return True
             else:
                 logger.warning(f"Attempted to cancel non-existent booking with ID {booking_id}")
@@ -124,7 +366,7 @@ class DatabaseManager:
             '''
             self.cursor.execute(sql, (user_id, client_name, phone))
             self.conn.commit()
-            logger.info(f"Saved last details for user {user_id}")
+            logger.info("Saved last details for user %s", user_id)
         except sqlite3.Error as e:
             logger.error(f"Failed to save last details for user {user_id}: {e}")
             self.conn.rollback()
@@ -156,6 +398,564 @@ class DatabaseManager:
             logger.error(f"Failed to get busy slots for date {date_str} and master {master_id}: {e}")
             return []
 
+    def get_day_bookings(self, date_str, master_id=None):
+        """
+        Returns bookings for a date (YYYY-MM-DD) as dicts with id, service_id,
+        master_id, booking_date and booking_time (HH:MM).
+        """
+        try:
+            next_day = (datetime.fromisoformat(date_str) + timedelta(days=1)).date().isoformat()
+        except ValueError as e:
+            logger.error(f"Failed to get bookings for date {date_str} and master {master_id}: {e}")
+            return []
+        return self.get_bookings_between(date_str, next_day, master_id)
+
+    def get_bookings_between(self, start_date, end_date, master_id=None):
+        """
+        Returns bookings with start_date <= date < end_date (YYYY-MM-DD) in one
+        query. Uses a range predicate on booking_datetime so the lookup is
+        served by its index.
+        """
+        try:
+            sql = '''
+                SELECT id, service_id, master_id,
+                       strftime('%Y-%m-%d', booking_datetime) AS booking_date,
+                       strftime('%H:%M', booking_datetime) AS booking_time
+                FROM bookings
+                WHERE booking_datetime >= ? AND booking_datetime < ?
+            '''
+            params = [start_date, end_date]
+            if master_id:
+                sql += " AND master_id = ?"
+                params.append(master_id)
+            sql += " ORDER BY booking_datetime"
+            self.cursor.execute(sql, params)
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to get bookings between {start_date} and {end_date} for master {master_id}: {e}")
+            return []
+
+    def upsert_slot_hold(self, booking_date, booking_time, master_key, user_id, service_id, expires_at, now):
+        """
+        Places or extends a temporary slot hold. An existing hold is only
+        taken over if it has expired or belongs to the same user.
+        Returns True if the hold is now owned by user_id.
+        """
+        try:
+            self.cursor.execute('''
+                INSERT INTO slot_holds (booking_date, booking_time, master_key, user_id, service_id, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(booking_date, booking_time, master_key) DO UPDATE SET
+                    user_id = excluded.user_id,
+                    service_id = excluded.service_id,
+                    expires_at = excluded.expires_at
+                WHERE slot_holds.expires_at <= ? OR slot_holds.user_id = excluded.user_id
+            ''', (booking_date, booking_time, master_key, user_id, service_id, expires_at, now))
+            self.conn.commit()
+            self._hold_writes += 1
+            return self.cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.error(f"Failed to place slot hold for user {user_id}: {e}")
+            self.conn.rollback()
+            return False
+
+    def delete_slot_hold(self, booking_date, booking_time, master_key):
+        """Deletes a single slot hold."""
+        try:
+            self.cursor.execute(
+                "DELETE FROM slot_holds WHERE booking_date = ? AND booking_time = ? AND master_key = ?",
+                (booking_date, booking_time, master_key),
+            )
+            self.conn.commit()
+            self._hold_writes += 1
+        except sqlite3.Error as e:
+            logger.error(f"Failed to delete slot hold {booking_date} {booking_time}: {e}")
+            self.conn.rollback()
+
+    def delete_slot_holds(self, user_id=None, expired_before=None):
+        """Deletes holds of a user and/or holds that expired before the given timestamp."""
+        try:
+            if user_id is not None:
+                self.cursor.execute("DELETE FROM slot_holds WHERE user_id = ?", (user_id,))
+            if expired_before is not None:
+                self.cursor.execute("DELETE FROM slot_holds WHERE expires_at <= ?", (expired_before,))
+            self.conn.commit()
+            self._hold_writes += 1
+        except sqlite3.Error as e:
+            logger.error(f"Failed to delete slot holds: {e}")
+            self.conn.rollback()
+
+    def get_slot_holds(self, now):
+        """Returns all holds that are still active at the given timestamp."""
+        try:
+            self.cursor.execute('''
+                SELECT booking_date, booking_time, master_key, user_id, service_id, expires_at
+                FROM slot_holds
+                WHERE expires_at > ?
+            ''', (now,))
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to get slot holds: {e}")
+            return []
+
+    # === Reminders ===
+
+    def get_active_orders_for_reminders(self, from_date=None):
+        """Returns upcoming bookings (from_date, default today, onwards) ordered by time."""
+        from_date = from_date or datetime.now().date().isoformat()
+        try:
+            self.cursor.execute('''
+                SELECT id, user_id, service_name,
+                       strftime('%Y-%m-%d', booking_datetime) AS booking_date,
+                       strftime('%H:%M', booking_datetime) AS booking_time
+                FROM bookings
+                WHERE booking_datetime >= ?
+                ORDER BY booking_datetime
+            ''', (from_date,))
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to get orders for reminders: {e}")
+            return []
+
+    def add_reminders(self, reminders, replace=True):
+        """
+        Stores reminders (dicts with order_id, user_id, kind, due_at, payload and
+        optional sent_at) and returns {(order_id, kind): id} for the rows written.
+        With replace=False existing (order_id, kind) rows are kept as they are.
+        """
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        written = {}
+        try:
+            for reminder in reminders:
+                self.cursor.execute(
+                    f"{verb} INTO reminders (order_id, user_id, kind, due_at, payload, sent_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (reminder['order_id'], reminder['user_id'], reminder['kind'], reminder['due_at'],
+                     json.dumps(reminder['payload'], ensure_ascii=False), reminder.get('sent_at')),
+                )
+                if self.cursor.rowcount > 0:
+                    written[(reminder['order_id'], reminder['kind'])] = self.cursor.lastrowid
+            self.conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to store reminders: {e}")
+            self.conn.rollback()
+            return {}
+        return written
+
+    def delete_order_reminders(self, order_id):
+        """Deletes reminders of an order and returns their IDs."""
+        try:
+            self.cursor.execute("SELECT id FROM reminders WHERE order_id = ?", (order_id,))
+            ids = [row['id'] for row in self.cursor.fetchall()]
+            if ids:
+                self.cursor.execute("DELETE FROM reminders WHERE order_id = ?", (order_id,))
+                self.conn.commit()
+            return ids
+        except sqlite3.Error as e:
+            logger.error(f"Failed to delete reminders of order {order_id}: {e}")
+            self.conn.rollback()
+            return []
+
+    def mark_reminders_sent(self, reminder_ids, sent_at):
+        """Marks reminders as sent; the rows stay so a restart does not resend them."""
+        try:
+            self.cursor.executemany(
+                "UPDATE reminders SET sent_at = ? WHERE id = ?", [(sent_at, i) for i in reminder_ids]
+            )
+            self.conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to mark reminders as sent: {e}")
+            self.conn.rollback()
+
+    def purge_reminders(self, due_before):
+        """Deletes reminders that were due before the given timestamp."""
+        try:
+            self.cursor.execute("DELETE FROM reminders WHERE due_at < ?", (due_before,))
+            self.conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to purge reminders: {e}")
+            self.conn.rollback()
+
+    def get_unsent_reminder_ids(self, reminder_ids):
+        """Returns which of the given reminders still exist and are not sent."""
+        ids = list(reminder_ids)
+        if not ids:
+            return set()
+        try:
+            placeholders = ",".join("?" * len(ids))
+            self.cursor.execute(
+                f"SELECT id FROM reminders WHERE sent_at IS NULL AND id IN ({placeholders})", ids
+            )
+            return {row['id'] for row in self.cursor.fetchall()}
+        except sqlite3.Error as e:
+            logger.error(f"Failed to check reminders: {e}")
+            return set(ids)
+
+    def get_pending_reminders(self, after_id=0):
+        """
+        Returns unsent reminders ordered by due time (partial index idx_reminders_due);
+        after_id limits the result to reminders added after the given ID.
+        """
+        try:
+            self.cursor.execute('''
+                SELECT id, order_id, user_id, kind, due_at, payload FROM reminders
+                WHERE sent_at IS NULL AND id > ?
+                ORDER BY due_at
+            ''', (after_id,))
+            rows = self.cursor.fetchall()
+            for row in rows:
+                row['payload'] = json.loads(row['payload'])
+            return rows
+        except sqlite3.Error as e:
+            logger.error(f"Failed to get reminders: {e}")
+            return []
+
+    # === Notification outbox ===
+
+    def _queue_notifications(self, notifications, order_id=None):
+        """
+        Inserts outbox rows without committing, so the caller's transaction
+        covers both the order change and its notifications.
+        Each notification is a dict with kind, chat_id and payload.
+        """
+        now = time.time()
+        for notification in notifications or []:
+            payload = dict(notification['payload'])
+            if order_id is not None:
+                payload['order_id'] = order_id
+            self.cursor.execute(
+                "INSERT INTO outbox (kind, chat_id, payload, next_attempt_at) VALUES (?, ?, ?, ?)",
+                (notification['kind'], notification['chat_id'], json.dumps(payload, ensure_ascii=False), now),
+            )
+
+    def enqueue_notifications(self, notifications):
+        """Queues notifications to the outbox in their own transaction."""
+        try:
+            self._queue_notifications(notifications)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to queue notifications: {e}")
+            self.conn.rollback()
+            raise
+
+    def claim_outbox(self, now, limit=50, lease_seconds=60):
+        """
+        Returns due pending notifications and leases them for lease_seconds,
+        so a crashed send is retried after the lease instead of being lost.
+        """
+        try:
+            self.cursor.execute('''
+                SELECT id, kind, chat_id, payload, attempts FROM outbox
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                ORDER BY next_attempt_at, id
+                LIMIT ?
+            ''', (now, limit))
+            rows = self.cursor.fetchall()
+            if rows:
+                self.cursor.executemany(
+                    "UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                    [(now + lease_seconds, row['id']) for row in rows],
+                )
+                self.conn.commit()
+            for row in rows:
+                row['payload'] = json.loads(row['payload'])
+            return rows
+        except sqlite3.Error as e:
+            logger.error(f"Failed to claim outbox: {e}")
+            self.conn.rollback()
+            return []
+
+    def complete_outbox(self, outbox_id):
+        """Removes a delivered notification."""
+        try:
+            self.cursor.execute("DELETE FROM outbox WHERE id = ?", (outbox_id,))
+            self.conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to complete outbox entry {outbox_id}: {e}")
+            self.conn.rollback()
+
+    def retry_outbox(self, outbox_id, attempts, next_attempt_at, error):
+        """Schedules another delivery attempt."""
+        try:
+            self.cursor.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (attempts, next_attempt_at, error, outbox_id),
+            )
+            self.conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to reschedule outbox entry {outbox_id}: {e}")
+            self.conn.rollback()
+
+    def defer_outbox(self, outbox_ids, next_attempt_at):
+        """Releases claimed notifications until next_attempt_at without counting an attempt."""
+        try:
+            self.cursor.executemany(
+                "UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                [(next_attempt_at, outbox_id) for outbox_id in outbox_ids],
+            )
+            self.conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to defer outbox entries: {e}")
+            self.conn.rollback()
+
+    def fail_outbox(self, outbox_id, attempts, error):
+        """Marks a notification as undeliverable (kept for inspection)."""
+        try:
+            self.cursor.execute(
+                "UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                (attempts, error, outbox_id),
+            )
+            self.conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to mark outbox entry {outbox_id} as failed: {e}")
+            self.conn.rollback()
+
+    def get_outbox_stats(self):
+        """Returns the number of outbox rows per status."""
+        try:
+            self.cursor.execute("SELECT status, COUNT(*) AS count FROM outbox GROUP BY status")
+            return {row['status']: row['count'] for row in self.cursor.fetchall()}
+        except sqlite3.Error as e:
+            logger.error(f"Failed to get outbox stats: {e}")
+            return {}
+
+    # === Metric time series ===
+
+    METRIC_UPSERT_SQL = '''
+        INSERT INTO metric_series (resolution, name, slot, bucket_start, count, total, min, max)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (resolution, name, slot) DO UPDATE SET
+            count = CASE WHEN bucket_start = excluded.bucket_start THEN count + excluded.count ELSE excluded.count END,
+            total = CASE WHEN bucket_start = excluded.bucket_start THEN total + excluded.total ELSE excluded.total END,
+            min = CASE WHEN bucket_start = excluded.bucket_start THEN MIN(min, excluded.min) ELSE excluded.min END,
+            max = CASE WHEN bucket_start = excluded.bucket_start THEN MAX(max, excluded.max) ELSE excluded.max END,
+            bucket_start = excluded.bucket_start
+        WHERE excluded.bucket_start >= metric_series.bucket_start
+    '''
+
+    def add_metric_samples(self, rows):
+        """
+        Merges pre-aggregated buckets into the ring buffers in one transaction.
+        Each row is (resolution, name, slot, bucket_start, count, total, min, max);
+        a bucket from a newer period overwrites the slot, older ones are ignored.
+        """
+        try:
+            self.cursor.executemany(self.METRIC_UPSERT_SQL, rows)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to write metric samples: {e}")
+            self.conn.rollback()
+
+    def get_metric_series(self, names, resolution, since):
+        """Returns buckets of the given metrics starting at or after since, oldest first."""
+        try:
+            placeholders = ', '.join('?' for _ in names)
+            self.cursor.execute(f'''
+                SELECT name, bucket_start, count, total, min, max FROM metric_series
+                WHERE resolution = ? AND name IN ({placeholders}) AND bucket_start >= ?
+                ORDER BY bucket_start
+            ''', (resolution, *names, since))
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to read metric series: {e}")
+            return []
+
+    # === Analytics cube ===
+
+    CUBE_UPSERT_SQL = '''
+        INSERT INTO {table} ({period}, master_id, service_id, bookings, revenue, cancelled, minutes)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT({period}, master_id, service_id) DO UPDATE SET
+            bookings = bookings + excluded.bookings,
+            revenue = revenue + excluded.revenue,
+            cancelled = cancelled + excluded.cancelled,
+            minutes = minutes + excluded.minutes
+    '''
+    CUBE_DAY_UPSERT_SQL = CUBE_UPSERT_SQL.format(table='booking_cube', period='day')
+    CUBE_MONTH_UPSERT_SQL = CUBE_UPSERT_SQL.format(table='booking_cube_month', period='month')
+
+    def _cube_booking(self, booking_id):
+        """Returns the cube coordinates of a booking: (day, master_id, service_id, price, duration)."""
+        self.cursor.execute(
+            "SELECT booking_datetime, master_id, service_id, price, duration FROM bookings WHERE id = ?",
+            (booking_id,)
+        )
+        row = self.cursor.fetchone()
+        if not row:
+            return None
+        duration = row['duration']
+        if duration is None:  # row from before bookings.duration, not backfilled yet
+            duration = self.booking_minutes(row['service_id'])
+        return row['booking_datetime'][:10], row['master_id'], row['service_id'], row['price'], duration
+
+    def _cube_add(self, day, master_id, service_id, price, duration, sign, cancelled=0):
+        """
+        Adds (sign=1) or removes (sign=-1) one booking from its day and month cells,
+        with the minutes stored on the booking. Must run inside the transaction
+        that changes the booking.
+        """
+        values = (master_id or '', service_id, sign, sign * (price or 0), cancelled, sign * (duration or 0))
+        self.cursor.execute(self.CUBE_DAY_UPSERT_SQL, (day, *values))
+        self.cursor.execute(self.CUBE_MONTH_UPSERT_SQL, (day[:7], *values))
+
+    def roll_up_booking_cube(self):
+        """Recomputes the monthly table from the daily one (caller commits)."""
+        self.cursor.execute("DELETE FROM booking_cube_month")
+        self.cursor.execute('''
+            INSERT INTO booking_cube_month (month, master_id, service_id, bookings, revenue, cancelled, minutes)
+            SELECT substr(day, 1, 7), master_id, service_id, SUM(bookings), SUM(revenue), SUM(cancelled), SUM(minutes)
+            FROM booking_cube
+            GROUP BY substr(day, 1, 7), master_id, service_id
+        ''')
+
+    def rebuild_booking_cube(self):
+        """
+        Recomputes the cube from the bookings table. Cancelled bookings are deleted
+        rows, so cancellation counts start from zero after a rebuild.
+        """
+        try:
+            self._backfill_booking_durations()
+            self.cursor.execute('''
+                SELECT substr(booking_datetime, 1, 10) AS day, COALESCE(master_id, '') AS master_id,
+                       service_id, COUNT(*) AS bookings, COALESCE(SUM(price), 0) AS revenue,
+                       COALESCE(SUM(duration), 0) AS minutes
+                FROM bookings
+                GROUP BY day, master_id, service_id
+            ''')
+            cells = [
+                (row['day'], row['master_id'], row['service_id'], row['bookings'], row['revenue'], 0, row['minutes'])
+                for row in self.cursor.fetchall()
+            ]
+            self.cursor.execute("DELETE FROM booking_cube")
+            self.cursor.executemany(self.CUBE_DAY_UPSERT_SQL, cells)
+            self.roll_up_booking_cube()
+            self.conn.commit()
+            logger.info("Rebuilt booking cube: %s cells", len(cells))
+            return len(cells)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to rebuild booking cube: {e}")
+            self.conn.rollback()
+            return 0
+
+    def _backfill_booking_durations(self):
+        """Stores current service durations on bookings made before bookings.duration (caller commits)."""
+        self.cursor.execute("SELECT DISTINCT service_id FROM bookings WHERE duration IS NULL")
+        services = [row['service_id'] for row in self.cursor.fetchall()]
+        self.cursor.executemany(
+            "UPDATE bookings SET duration = ? WHERE duration IS NULL AND service_id = ?",
+            [(self.booking_minutes(service_id), service_id) for service_id in services]
+        )
+        return len(services)
+
+    def ensure_booking_cube(self):
+        """Builds the cube once for databases that had bookings before it existed."""
+        if self._backfill_booking_durations():
+            self.conn.commit()
+        self.cursor.execute("SELECT EXISTS (SELECT 1 FROM booking_cube) AS built, "
+                            "EXISTS (SELECT 1 FROM bookings) AS has_bookings")
+        row = self.cursor.fetchone()
+        if row['has_bookings'] and not row['built']:
+            self.rebuild_booking_cube()
+
+    @staticmethod
+    def _cube_ranges(start_day, end_day):
+        """
+        Splits [start_day, end_day] into daily edges and whole months:
+        returns ([(first_day, last_day), ...], (first_month, last_month) or None).
+        """
+        start, end = date.fromisoformat(start_day), date.fromisoformat(end_day)
+        first_month = start if start.day == 1 else (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        after_end = end + timedelta(days=1)
+        end_month = after_end if after_end.day == 1 else end.replace(day=1)  # first day after whole months
+        if first_month >= end_month:
+            return [(start_day, end_day)], None
+        days = []
+        if start < first_month:
+            days.append((start_day, (first_month - timedelta(days=1)).isoformat()))
+        if end_month <= end:
+            days.append((end_month.isoformat(), end_day))
+        last_month = end_month - timedelta(days=1)
+        return days, (first_month.isoformat()[:7], last_month.isoformat()[:7])
+
+    def get_booking_cube(self, start_day, end_day, group_by=None, master_id=None, service_id=None):
+        """
+        Aggregates cube cells with start_day <= day <= end_day (YYYY-MM-DD).
+        group_by is one of CUBE_GROUPS (None for a single total row);
+        master_id '' selects bookings without a master. Whole months inside
+        the range are read from the monthly roll-up.
+        """
+        day_key, month_key = CUBE_GROUPS[group_by] if group_by else ("''", "''")
+        if month_key is None:
+            day_ranges, months = [(start_day, end_day)], None
+        else:
+            day_ranges, months = self._cube_ranges(start_day, end_day)
+        filters, filter_params = "", []
+        if master_id is not None:
+            filters += " AND master_id = ?"
+            filter_params.append(master_id)
+        if service_id is not None:
+            filters += " AND service_id = ?"
+            filter_params.append(service_id)
+        columns = "bookings, revenue, cancelled, minutes"
+        parts, params = [], []
+        for first, last in day_ranges:
+            parts.append(f"SELECT {day_key} AS key, {columns} FROM booking_cube WHERE day BETWEEN ? AND ?{filters}")
+            params += [first, last, *filter_params]
+        if months:
+            parts.append(f"SELECT {month_key} AS key, {columns} FROM booking_cube_month "
+                         f"WHERE month BETWEEN ? AND ?{filters}")
+            params += [*months, *filter_params]
+        key = "key, " if group_by else ""
+        group = "GROUP BY key ORDER BY key" if group_by else ""
+        try:
+            self.cursor.execute(f'''
+                SELECT {key}COALESCE(SUM(bookings), 0) AS bookings, COALESCE(SUM(revenue), 0) AS revenue,
+                       COALESCE(SUM(cancelled), 0) AS cancelled, COALESCE(SUM(minutes), 0) AS minutes
+                FROM ({' UNION ALL '.join(parts)})
+                {group}
+            ''', params)
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to read booking cube: {e}")
+            return []
+
+    # === Health probe ===
+
+    def write_health_probe(self, now):
+        """
+        Writes the health probe row and rolls it back. The write takes the
+        database write lock like a real booking would, but nothing is
+        committed, so PRAGMA data_version of other connections (and the slot
+        and client-history caches keyed on it) does not change.
+        """
+        if self.conn.in_transaction:
+            return  # never roll back someone else's pending writes
+        try:
+            self.cursor.execute("INSERT OR REPLACE INTO health_probe (id, checked_at) VALUES (1, ?)", (now,))
+        finally:
+            self.conn.rollback()
+
+    def read_health_probe(self):
+        """Reads through the bookings table; returns the latest booking ID (None if empty)."""
+        self.cursor.execute("SELECT MAX(id) AS last_id FROM bookings")
+        return self.cursor.fetchone()['last_id']
+
+    def get_data_version(self):
+        """
+        Returns a value that changes whenever bookings may have changed:
+        own writes are counted locally, writes from other connections
+        (e.g. the admin bot process) are detected via PRAGMA data_version.
+        """
+        try:
+            row = self.conn.execute("PRAGMA data_version").fetchone()
+            external = row['data_version'] if row else 0
+        except sqlite3.Error:
+            external = 0
+        return (self._local_writes, external)
+
+    def get_hold_version(self):
+        """Same as get_data_version(), but counts own slot hold writes instead of bookings."""
+        return (self._hold_writes, self.get_data_version()[1])
+
     def close(self):
         """Closes the database connection."""
         if self.conn:
@@ -0,0 +1,262 @@
+"""
+FSM-хранилище aiogram на SQLite.
+
+В отличие от MemoryStorage, незавершённые сценарии (запись, перенос,
+редактирование в админке) переживают перезапуск бота.
+
+- Перед таблицей стоит LRU-кэш в памяти (не больше max_entries записей).
+  Чтения обслуживаются из кэша, в БД идут только промахи.
+- Запись отложенная (write-back): изменённые ключи помечаются «грязными»
+  и сбрасываются одной транзакцией через flush_delay секунд после первого
+  изменения. Несколько update_data/set_state в одном обработчике дают
+  одну запись в БД. При вытеснении из кэша грязная запись сбрасывается сразу.
+- Пустые записи (нет состояния и данных) удаляются из таблицы.
+- Заброшенные сценарии (без изменений дольше ttl секунд) удаляются
+  при очередном сбросе, не чаще раза в sweep_interval секунд.
+
+Данные хранятся в JSON (множества — списками, прочие типы — строками).
+
+Настройки — config['fsm'] (storage: sqlite | memory, ttl_hours, max_entries).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from utils import query_trace
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_FLUSH_DELAY = 0.5
+# Незавершённый сценарий хранится сутки
+DEFAULT_TTL = 24 * 3600
+DEFAULT_SWEEP_INTERVAL = 600
+
+
+def _json_default(value):
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    return str(value)
+
+
+def storage_key_id(key: StorageKey) -> str:
+    """Компактный строковый ключ записи"""
+    parts = [str(key.bot_id), str(key.chat_id), str(key.user_id)]
+    if key.thread_id or key.business_connection_id or key.destiny != 'default':
+        parts += [str(key.thread_id or ''), key.business_connection_id or '', key.destiny]
+    return ':'.join(parts)
+
+
+class _Record:
+    __slots__ = ('state', 'data', 'updated_at')
+
+    def __init__(self, state: Optional[str] = None, data: Optional[dict] = None, updated_at: float = 0.0):
+        self.state = state
+        self.data = data if data is not None else {}
+        self.updated_at = updated_at
+
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище FSM: таблица fsm_state в SQLite + write-back LRU в памяти"""
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 flush_delay: float = DEFAULT_FLUSH_DELAY, ttl: float = DEFAULT_TTL,
+                 sweep_interval: float = DEFAULT_SWEEP_INTERVAL, clock=time.time):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.flush_delay = flush_delay
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self.conn = query_trace.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS fsm_state (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_fsm_state_updated ON fsm_state(updated_at)")
+        self.conn.commit()
+        self._cache: "OrderedDict[str, _Record]" = OrderedDict()
+        self._dirty: Dict[str, _Record] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._last_sweep = self.clock()
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.flushes = 0
+        self.evictions = 0
+        self.expired = 0
+
+    @classmethod
+    def for_business(cls, business_slug: str, name: str = 'client', **kwargs) -> "SQLiteStorage":
+        """Хранилище рядом с БД бизнеса: fsm_<slug>_<name>.sqlite"""
+        return cls(os.path.join(os.getcwd(), f"fsm_{business_slug}_{name}.sqlite"), **kwargs)
+
+    # === Кэш ===
+
+    def _load(self, key_id: str) -> _Record:
+        record = self._cache.get(key_id)
+        if record is not None:
+            self._cache.move_to_end(key_id)
+            self.hits += 1
+            return record
+        self.misses += 1
+        row = self.conn.execute(
+            "SELECT state, data, updated_at FROM fsm_state WHERE key = ?", (key_id,)
+        ).fetchone()
+        if row is not None and row[2] >= self.clock() - self.ttl:
+            record = _Record(row[0], json.loads(row[1]), row[2])
+        else:
+            record = _Record()
+        self._remember(key_id, record)
+        return record
+
+    def _remember(self, key_id: str, record: _Record) -> None:
+        self._cache[key_id] = record
+        self._cache.move_to_end(key_id)
+        while len(self._cache) > self.max_entries:
+            evicted_id, evicted = self._cache.popitem(last=False)
+            self.evictions += 1
+            if self._dirty.pop(evicted_id, None) is not None:
+                self._write({evicted_id: evicted})
+
+    def _touch(self, key_id: str, record: _Record) -> None:
+        record.updated_at = self.clock()
+        self._dirty[key_id] = record
+        self._schedule_flush()
+
+    # === Запись в БД ===
+
+    def _schedule_flush(self) -> None:
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._flush_handle = loop.call_later(self.flush_delay, self.flush)
+
+    def _write(self, records: Mapping[str, _Record]) -> None:
+        upserts, deletes = [], []
+        for key_id, record in records.items():
+            if record.state is None and not record.data:
+                deletes.append((key_id,))
+            else:
+                upserts.append((key_id, record.state, json.dumps(record.data, ensure_ascii=False,
+                                                                 default=_json_default), record.updated_at))
+        try:
+            with self.conn:
+                if upserts:
+                    self.conn.executemany('''
+                        INSERT INTO fsm_state (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                        ON CONFLICT(key) DO UPDATE SET
+                            state = excluded.state, data = excluded.data, updated_at = excluded.updated_at
+                    ''', upserts)
+                if deletes:
+                    self.conn.executemany("DELETE FROM fsm_state WHERE key = ?", deletes)
+            self.writes += len(records)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to persist FSM state: {e}")
+
+    def flush(self) -> int:
+        """Сбрасывает изменённые записи одной транзакцией, возвращает их число"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        dirty, self._dirty = self._dirty, {}
+        if dirty:
+            self._write(dirty)
+            self.flushes += 1
+        if self.clock() - self._last_sweep >= self.sweep_interval:
+            self.sweep()
+        return len(dirty)
+
+    def sweep(self) -> int:
+        """Удаляет заброшенные сценарии (без изменений дольше ttl)"""
+        self._last_sweep = now = self.clock()
+        deadline = now - self.ttl
+        stale = [key_id for key_id, record in self._cache.items()
+                 if record.updated_at and record.updated_at < deadline and key_id not in self._dirty]
+        for key_id in stale:
+            del self._cache[key_id]
+        try:
+            with self.conn:
+                removed = self.conn.execute("DELETE FROM fsm_state WHERE updated_at < ?", (deadline,)).rowcount
+        except sqlite3.Error as e:
+            logger.error(f"Failed to sweep FSM state: {e}")
+            removed = 0
+        self.expired += removed
+        if removed:
+            logger.info(f"FSM storage: removed {removed} abandoned conversations")
+        return removed
+
+    # === BaseStorage ===
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        key_id = storage_key_id(key)
+        record = self._load(key_id)
+        record.state = state.state if isinstance(state, State) else state
+        self._touch(key_id, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return self._load(storage_key_id(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        key_id = storage_key_id(key)
+        record = self._load(key_id)
+        record.data = data.copy()
+        self._touch(key_id, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return self._load(storage_key_id(key)).data.copy()
+
+    async def close(self) -> None:
+        self.flush()
+        self.conn.close()
+
+    def stats(self) -> dict:
+        """Снимок метрик"""
+        return {
+            'cached': len(self._cache),
+            'dirty': len(self._dirty),
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'flushes': self.flushes,
+            'evictions': self.evictions,
+            'expired': self.expired,
+        }
+
+
+def create_fsm_storage(config: dict, name: str) -> BaseStorage:
+    """FSM-хранилище бота name по config['fsm'] (по умолчанию SQLite)"""
+    settings = config.get('fsm', {})
+    if settings.get('storage', 'sqlite') == 'memory':
+        return MemoryStorage()
+    return SQLiteStorage.for_business(
+        config.get('business_slug', 'default_business'), name,
+        max_entries=settings.get('max_entries', DEFAULT_MAX_ENTRIES),
+        ttl=settings.get('ttl_hours', DEFAULT_TTL / 3600) * 3600,
+    )
@@ -0,0 +1,229 @@
+"""
+Демон проверки работоспособности в процессе бота и локальный /healthz.
+
+HealthDaemon раз в interval секунд одновременно выполняет проверки:
+- Bot API: getMe каждого бота через одну HTTP-сессию на всё время работы;
+- БД: время записи служебной строки health_probe (транзакция
+  откатывается, чтобы не сбрасывать кэши других процессов) и чтения;
+- размер WAL-файла БД;
+- задержка цикла событий (отдельная задача измеряет, насколько
+  просыпается позже положенного);
+- очередь outbox (из диспетчера процесса, без него — запросом к БД).
+
+Результат кэшируется: GET /healthz отдаёт последний отчёт в JSON сразу,
+без проверок (200 — всё в порядке, 503 — есть проблемы или отчёт устарел).
+Скрипты deploy/linux обращаются к нему вместо systemctl/sqlite3. Если
+процесс запущен systemd с WatchdogSec (NOTIFY_SOCKET, WATCHDOG_USEC),
+после каждого раунда проверок с нормальной задержкой цикла событий
+отправляется WATCHDOG=1: перезапуск лечит только зависший процесс, сбои
+Telegram или медленный диск видны лишь в статусе /healthz.
+
+Настройки — config['health'] (enabled, host, port, interval и пороги
+db_latency_ms, wal_bytes, loop_lag_ms, outbox_backlog), переменная
+окружения HEALTH_PORT перекрывает порт. Без порта /healthz не поднимается.
+Отдельный процесс админ-бота слушает port + 1.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+import aiohttp
+from aiohttp import web
+
+from utils.local_endpoint import DEFAULT_HOST, serve_local_endpoint, start_local_endpoint
+from utils.monitoring import DEFAULT_API_BASE, BotMonitor
+from utils.outbox import get_outbox_dispatcher
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 30.0
+LOOP_LAG_TICK = 0.5
+# Пороги, после которых проверка считается проблемной
+DEFAULT_THRESHOLDS = {
+    'db_latency_ms': 200.0,
+    'wal_bytes': 64 * 1024 * 1024,
+    'loop_lag_ms': 500.0,
+    'outbox_backlog': 100,
+}
+
+HEALTHY = "healthy"
+DEGRADED = "degraded"
+
+
+def sd_notify(message: str) -> bool:
+    """Сообщение systemd (sd_notify), если процесс запущен с NOTIFY_SOCKET"""
+    address = os.getenv('NOTIFY_SOCKET')
+    if not address:
+        return False
+    if address.startswith('@'):
+        address = '\0' + address[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.sendto(message.encode(), address)
+        return True
+    except OSError as e:
+        logger.warning(f"sd_notify failed: {e}")
+        return False
+
+
+class HealthDaemon:
+    """Периодические проверки процесса с кэшированным отчётом"""
+
+    def __init__(self, db_manager, bots: Dict[str, str], interval: float = DEFAULT_INTERVAL,
+                 thresholds: Optional[dict] = None, api_base: Optional[str] = None):
+        """
+        Args:
+            db_manager: Менеджер БД процесса
+            bots: Имя бота -> токен
+            interval: Секунд между проверками
+            thresholds: Пороги (см. DEFAULT_THRESHOLDS)
+            api_base: Адрес Bot API (по умолчанию TELEGRAM_API_URL или api.telegram.org)
+        """
+        self.db_manager = db_manager
+        self.bots = bots
+        self.interval = interval
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self.api_base = api_base or os.getenv('TELEGRAM_API_URL') or DEFAULT_API_BASE
+        self.started = time.time()
+        self.report: Optional[dict] = None
+        self.checked_at = 0.0
+        self.loop_lag = 0.0
+        self.loop_lag_max = 0.0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._monitors: Dict[str, BotMonitor] = {}
+        self._watchdog = bool(os.getenv('WATCHDOG_USEC'))
+
+    @classmethod
+    def from_config(cls, config: dict, db_manager, bots: Dict[str, str]) -> "HealthDaemon":
+        settings = config.get('health', {})
+        thresholds = {key: settings[key] for key in DEFAULT_THRESHOLDS if key in settings}
+        return cls(db_manager, bots, settings.get('interval', DEFAULT_INTERVAL), thresholds)
+
+    # --- проверки --------------------------------------------------------
+
+    async def _watch_loop(self) -> None:
+        """Задержка пробуждения цикла событий относительно заказанной"""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LOOP_LAG_TICK)
+            self.loop_lag = max(0.0, loop.time() - start - LOOP_LAG_TICK)
+            self.loop_lag_max = max(self.loop_lag_max, self.loop_lag)
+
+    async def _check_bot(self, name: str) -> dict:
+        result = await self._monitors[name].check_bot_alive()
+        return {key: value for key, value in result.items() if key not in ('bot_name', 'checked_at')}
+
+    def _check_database(self) -> dict:
+        try:
+            start = time.perf_counter()
+            self.db_manager.write_health_probe(time.time())
+            written = time.perf_counter()
+            self.db_manager.read_health_probe()
+            read = time.perf_counter()
+        except Exception as e:
+            return {'status': 'error', 'error': str(e)}
+        write_ms, read_ms = (written - start) * 1000, (read - written) * 1000
+        slow = max(write_ms, read_ms) > self.thresholds['db_latency_ms']
+        return {'status': DEGRADED if slow else HEALTHY,
+                'write_ms': round(write_ms, 3), 'read_ms': round(read_ms, 3)}
+
+    def _check_wal(self) -> dict:
+        path = getattr(self.db_manager, 'db_path', None)
+        try:
+            size = os.path.getsize(f"{path}-wal") if path else 0
+        except OSError:
+            size = 0
+        return {'status': DEGRADED if size > self.thresholds['wal_bytes'] else HEALTHY, 'bytes': size}
+
+    def _check_loop(self) -> dict:
+        lag_ms, max_ms = self.loop_lag * 1000, self.loop_lag_max * 1000
+        self.loop_lag_max = self.loop_lag
+        return {'status': DEGRADED if max_ms > self.thresholds['loop_lag_ms'] else HEALTHY,
+                'lag_ms': round(lag_ms, 3), 'max_lag_ms': round(max_ms, 3)}
+
+    def _check_outbox(self) -> dict:
+        dispatcher = get_outbox_dispatcher(self.db_manager)
+        rows = dispatcher.rows_by_status if dispatcher is not None else self.db_manager.get_outbox_stats()
+        pending, failed = rows.get('pending', 0), rows.get('failed', 0)
+        return {'status': DEGRADED if pending > self.thresholds['outbox_backlog'] else HEALTHY,
+                'pending': pending, 'failed': failed}
+
+    async def check(self) -> dict:
+        """Все проверки (запросы к Bot API — одновременно), обновляет кэшированный отчёт"""
+        names = list(self.bots)
+        bot_checks = asyncio.gather(*(self._check_bot(name) for name in names))
+        checks = {
+            'database': self._check_database(),
+            'wal': self._check_wal(),
+            'event_loop': self._check_loop(),
+            'outbox': self._check_outbox(),
+        }
+        for name, result in zip(names, await bot_checks):
+            checks[f"bot:{name}"] = result
+        healthy = all(result['status'] == HEALTHY for result in checks.values())
+        self.checked_at = time.time()
+        self.report = {
+            'status': HEALTHY if healthy else DEGRADED,
+            'checked_at': datetime.fromtimestamp(self.checked_at).isoformat(),
+            'uptime_s': round(self.checked_at - self.started),
+            'checks': checks,
+        }
+        if not healthy:
+            problems = ', '.join(name for name, result in checks.items() if result['status'] != HEALTHY)
+            logger.warning(f"Health check degraded: {problems}")
+        # Watchdog — только живость самого процесса, внешние сбои его не касаются
+        if self._watchdog and checks['event_loop']['status'] == HEALTHY:
+            sd_notify("WATCHDOG=1")
+        return self.report
+
+    def snapshot(self) -> dict:
+        """Последний отчёт; устаревший (демон не успевает проверять) — не в порядке"""
+        if self.report is None:
+            return {'status': 'starting', 'uptime_s': round(time.time() - self.started)}
+        if time.time() - self.checked_at > 3 * self.interval:
+            return dict(self.report, status='stale')
+        return self.report
+
+    async def run(self) -> None:
+        """Фоновая задача: проверки раз в interval через одну HTTP-сессию"""
+        self._session = aiohttp.ClientSession()
+        self._monitors = {name: BotMonitor(token, name, self._session, self.api_base)
+                          for name, token in self.bots.items()}
+        lag_task = asyncio.create_task(self._watch_loop())
+        sd_notify("READY=1")
+        try:
+            while True:
+                try:
+                    await self.check()
+                except Exception as e:
+                    logger.error(f"Health check error: {e}")
+                await asyncio.sleep(self.interval)
+        finally:
+            lag_task.cancel()
+            await self._session.close()
+
+
+def _routes(daemon: HealthDaemon) -> dict:
+    async def healthz(request: web.Request) -> web.Response:
+        report = daemon.snapshot()
+        return web.Response(text=json.dumps(report, ensure_ascii=False), content_type='application/json',
+                            status=200 if report['status'] == HEALTHY else 503)
+
+    return {'/healthz': healthz}
+
+
+async def start_health_server(daemon: HealthDaemon, host: str = DEFAULT_HOST, port: int = 0) -> web.AppRunner:
+    """Запускает GET /healthz в текущем цикле событий"""
+    return await start_local_endpoint(_routes(daemon), host, port)
+
+
+async def serve_health(config: dict, daemon: HealthDaemon, port_offset: int = 0) -> Optional[web.AppRunner]:
+    """/healthz по настройкам config['health'] / HEALTH_PORT (None — не настроен или не запустился)"""
+    return await serve_local_endpoint(config, 'health', 'HEALTH_PORT', _routes(daemon), port_offset)
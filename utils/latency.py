@@ -0,0 +1,311 @@
+"""
+Задержки обработки обновлений: обработчики, middlewares и вызовы БД.
+
+Каждая точка измерения (handler:<модуль.функция>, middleware:<класс>,
+db:<метод>, update) хранит две гистограммы — wall и CPU время — в
+HDR-стиле: 16 линейных корзин на каждую степень двойки (погрешность
+≤ 6%), значения в микросекундах до ~12 дней. Корзины — заранее выделенный
+array, запись — только арифметика над int, без новых объектов на событие
+(на обновление создаётся лишь кадр учёта, см. ниже).
+
+Время считается «собственным»: из времени middleware вычитается время
+всего, что оно вызвало (следующие middlewares, обработчик), а из времени
+обработчика — время его запросов к БД. Учёт ведётся в кадре текущего
+обновления (contextvar), который выставляет UpdateLatencyMiddleware.
+CPU — время потока (time.thread_time) между входом и выходом: при
+большой нагрузке в него попадает и работа других задач цикла событий,
+пока шаг ждал ввода-вывода.
+
+Подключение — LatencyRegistry.instrument_dispatcher / timed / instrument_db,
+отчёт — команда /latency админ-бота. Настройка config['latency']['enabled'].
+"""
+
+import contextvars
+import functools
+import inspect
+import logging
+import time
+from array import array
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+# Значения до 2**40 мкс (~12 дней), больше — в последнюю корзину
+VALUE_BITS = 40
+MAX_VALUE = (1 << VALUE_BITS) - 1
+BUCKETS = SUB_BUCKETS * (VALUE_BITS - SUB_BUCKET_BITS + 1)
+
+
+def bucket_index(value: int) -> int:
+    if value < SUB_BUCKETS:
+        return value
+    if value > MAX_VALUE:
+        value = MAX_VALUE
+    exponent = value.bit_length() - SUB_BUCKET_BITS - 1
+    return SUB_BUCKETS * (exponent + 1) + (value >> exponent) - SUB_BUCKETS
+
+
+def bucket_upper_bound(index: int) -> int:
+    """Наибольшее значение, попадающее в корзину"""
+    if index < SUB_BUCKETS:
+        return index
+    exponent, offset = divmod(index - SUB_BUCKETS, SUB_BUCKETS)
+    return ((SUB_BUCKETS + offset + 1) << exponent) - 1
+
+
+class Histogram:
+    """Лог-линейная гистограмма значений в микросекундах"""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = array('Q', bytes(8 * BUCKETS))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value: int) -> None:
+        if value < 0:  # погрешность вычитания вложенного времени
+            value = 0
+        self.counts[bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def copy(self) -> "Histogram":
+        snapshot = Histogram()
+        snapshot.counts = array('Q', self.counts)
+        snapshot.count, snapshot.total, snapshot.max = self.count, self.total, self.max
+        return snapshot
+
+    def since(self, snapshot: "Histogram") -> "Histogram":
+        """Значения, записанные после снимка (max — общий, по окну не известен)"""
+        window = Histogram()
+        window.counts = array('Q', [now - before for now, before in zip(self.counts, snapshot.counts)])
+        window.count = self.count - snapshot.count
+        window.total = self.total - snapshot.total
+        window.max = self.max
+        return window
+
+    def cumulative(self, bounds) -> List[int]:
+        """Число значений не больше каждой из границ (по возрастанию, мкс; с точностью до корзины)"""
+        result = []
+        seen = 0
+        for index, count in enumerate(self.counts):
+            upper = bucket_upper_bound(index)
+            while len(result) < len(bounds) and upper > bounds[len(result)]:
+                result.append(seen)
+            if len(result) == len(bounds):
+                break
+            seen += count
+        result.extend([seen] * (len(bounds) - len(result)))
+        return result
+
+    def percentile(self, q: float) -> int:
+        """Значение q-го процентиля (верхняя граница корзины, не больше max)"""
+        if not self.count:
+            return 0
+        rank = max(1, round(self.count * q / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bucket_upper_bound(index), self.max)
+        return self.max
+
+
+class LatencyStats:
+    """Wall и CPU гистограммы одной точки измерения"""
+
+    __slots__ = ('name', 'wall', 'cpu')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall = Histogram()
+        self.cpu = Histogram()
+
+    def record(self, wall: float, cpu: float) -> None:
+        self.wall.record(int(wall * 1_000_000))
+        self.cpu.record(int(cpu * 1_000_000))
+
+    def summary(self) -> dict:
+        return {
+            'name': self.name,
+            'count': self.wall.count,
+            'p50_ms': self.wall.percentile(50) / 1000,
+            'p95_ms': self.wall.percentile(95) / 1000,
+            'p99_ms': self.wall.percentile(99) / 1000,
+            'max_ms': self.wall.max / 1000,
+            'cpu_p50_ms': self.cpu.percentile(50) / 1000,
+            'cpu_p99_ms': self.cpu.percentile(99) / 1000,
+        }
+
+
+class _Frame:
+    """Время вложенных измерений текущего шага обновления"""
+
+    __slots__ = ('child_wall', 'child_cpu')
+
+    def __init__(self):
+        self.child_wall = 0.0
+        self.child_cpu = 0.0
+
+
+_current_frame: contextvars.ContextVar = contextvars.ContextVar('latency_frame', default=None)
+
+
+async def _pass_through(handler, event, data):
+    return await handler(event, data)
+
+
+class LatencyRegistry:
+    """Точки измерения процесса"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._stats: Dict[str, LatencyStats] = {}
+
+    def stats(self, name: str) -> LatencyStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = LatencyStats(name)
+        return stats
+
+    # --- измерение -------------------------------------------------------
+
+    def begin_update(self):
+        """Кадр учёта для обновления; токен вернуть в end_update"""
+        return _current_frame.set(_Frame())
+
+    def end_update(self, token) -> None:
+        _current_frame.reset(token)
+
+    async def measure(self, stats: LatencyStats, call, *args):
+        """Ждёт call(*args) и записывает его собственное время"""
+        frame = _current_frame.get()
+        if frame is None:
+            wall_start, cpu_start = time.perf_counter(), time.thread_time()
+            try:
+                return await call(*args)
+            finally:
+                stats.record(time.perf_counter() - wall_start, time.thread_time() - cpu_start)
+        saved_wall, saved_cpu = frame.child_wall, frame.child_cpu
+        frame.child_wall = frame.child_cpu = 0.0
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            return await call(*args)
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            stats.record(wall - frame.child_wall, cpu - frame.child_cpu)
+            frame.child_wall = saved_wall + wall
+            frame.child_cpu = saved_cpu + cpu
+
+    def measure_sync(self, stats: LatencyStats, func):
+        """Обёртка синхронной функции (вызовы БД) с тем же учётом"""
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            frame = _current_frame.get()
+            if frame is not None:
+                saved_wall, saved_cpu = frame.child_wall, frame.child_cpu
+                frame.child_wall = frame.child_cpu = 0.0
+            wall_start, cpu_start = time.perf_counter(), time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                wall = time.perf_counter() - wall_start
+                cpu = time.thread_time() - cpu_start
+                if frame is None:
+                    stats.record(wall, cpu)
+                else:
+                    stats.record(wall - frame.child_wall, cpu - frame.child_cpu)
+                    frame.child_wall = saved_wall + wall
+                    frame.child_cpu = saved_cpu + cpu
+
+        return wrapper
+
+    # --- подключение -----------------------------------------------------
+
+    def instrument_dispatcher(self, dp) -> None:
+        """
+        Замер обновлений, маршрутизации и обработчиков диспетчера. Вызывать
+        после регистрации остальных middlewares: время «update» считается
+        с момента, когда обновление дождалось своей очереди, а последним
+        inner-middleware встаёт замер фильтров и маршрутизации aiogram.
+        """
+        if not self.enabled:
+            return
+        from middlewares.latency import HandlerLatencyMiddleware, TimedMiddleware, UpdateLatencyMiddleware
+
+        dp.update.outer_middleware(UpdateLatencyMiddleware(self))
+        dp.update.middleware(TimedMiddleware(self, _pass_through, 'aiogram.routing'))
+        handler_middleware = HandlerLatencyMiddleware(self)
+        for name, observer in dp.observers.items():
+            if name not in ('update', 'error'):
+                observer.middleware(handler_middleware)
+
+    def timed(self, middleware, name: Optional[str] = None):
+        """Middleware в обёртке, замеряющей его собственное время"""
+        if not self.enabled:
+            return middleware
+        from middlewares.latency import TimedMiddleware
+
+        cls = type(middleware)
+        return TimedMiddleware(self, middleware, name or f"{cls.__module__}.{cls.__qualname__}")
+
+    def instrument_db(self, db_manager) -> None:
+        """Замер публичных методов менеджера БД (обёртки ставятся на экземпляр)"""
+        if not self.enabled or getattr(db_manager, '_latency_instrumented', False):
+            return
+        for name, member in inspect.getmembers(type(db_manager), inspect.isfunction):
+            if not name.startswith('_'):
+                setattr(db_manager, name, self.measure_sync(self.stats(f"db:{name}"),
+                                                            getattr(db_manager, name)))
+        db_manager._latency_instrumented = True
+
+    # --- отчёт -----------------------------------------------------------
+
+    def points(self, prefix: str = '') -> List[LatencyStats]:
+        """Точки измерения с данными"""
+        return [stats for name, stats in list(self._stats.items())
+                if name.startswith(prefix) and stats.wall.count]
+
+    def summary(self, prefix: str = '') -> List[dict]:
+        """Сводка по точкам с данными, по убыванию p99"""
+        rows = [stats.summary() for stats in self.points(prefix)]
+        return sorted(rows, key=lambda row: row['p99_ms'], reverse=True)
+
+    def report(self, limit: int = 10) -> str:
+        """Текст для админа: p50 / p95 / p99 по обработчикам, middlewares и БД"""
+        sections = (('handler:', '🧩 Обработчики'), ('middleware:', '🔗 Middlewares'), ('db:', '💾 БД'))
+        lines = ["⏱ <b>Задержки, мс</b> (p50 / p95 / p99, число вызовов)"]
+        for prefix, title in sections:
+            rows = self.summary(prefix)
+            if not rows:
+                continue
+            lines.append(f"\n<b>{title}</b>")
+            for row in rows[:limit]:
+                name = '.'.join(row['name'][len(prefix):].split('.')[-2:])
+                lines.append(
+                    f"<code>{row['p50_ms']:7.1f} /{row['p95_ms']:7.1f} /{row['p99_ms']:7.1f}</code>"
+                    f" ×{row['count']} {name}"
+                )
+        if len(lines) == 1:
+            lines.append("\nДанных пока нет")
+        return "\n".join(lines)
+
+
+_registry: Optional[LatencyRegistry] = None
+
+
+def get_latency_registry(config: Optional[dict] = None) -> LatencyRegistry:
+    """Общий реестр задержек процесса (config['latency']['enabled'], по умолчанию включён)"""
+    global _registry
+    if _registry is None:
+        settings = (config or {}).get('latency', {})
+        _registry = LatencyRegistry(enabled=settings.get('enabled', True))
+    return _registry
@@ -0,0 +1,226 @@
+"""
+Ленивые роутеры: модуль с обработчиками импортируется при первом
+обновлении, которое может до него дойти.
+
+Что может «разбудить» модуль, записано в манифесте utils/router_manifest.json.
+Манифест строится заранее (python tools/build_router_manifest.py) разбором
+декораторов обработчиков без импорта модулей:
+- callback_query: data == "x" / data.startswith("x") / data.in_([...]);
+- message: text == "x" / text.in_([...]), Command("x"), CommandStart();
+- состояния FSM: обработчик с фильтром по состоянию срабатывает только в
+  нём, поэтому достаточно имени его StatesGroup;
+- обработчик без разбираемых фильтров делает модуль «любым» для своего
+  типа событий — он загрузится на первом же таком событии.
+
+LazyRouter стоит на месте настоящего роутера (порядок обработки тот же) и
+после загрузки просто включает его в себя. Модуль без записи в манифесте
+импортируется сразу.
+"""
+
+import ast
+import importlib
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from aiogram import Router
+from aiogram.dispatcher.event.bases import UNHANDLED
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MANIFEST_PATH = os.path.join(PROJECT_ROOT, 'utils', 'router_manifest.json')
+
+# Модули, которые подключаются лениво (модуль -> имя роутера в нём)
+LAZY_MODULES = {
+    'handlers.mybookings': 'mybookings_router',
+    'admin_handlers.services_editor': 'router',
+    'admin_handlers.settings_editor': 'router',
+    'admin_handlers.business_settings': 'router',
+    'admin_handlers.texts_editor': 'router',
+    'admin_handlers.notifications_editor': 'router',
+    'admin_handlers.staff': 'router',
+    'admin_handlers.promotions_editor': 'router',
+}
+
+# Поле события, по которому проверяются триггеры
+EVENT_FIELDS = {'callback_query': 'data', 'message': 'text'}
+
+_manifest: Optional[Dict[str, Any]] = None
+
+
+# --- построение манифеста -------------------------------------------------
+
+def _module_files(module: str) -> List[str]:
+    base = os.path.join(PROJECT_ROOT, *module.split('.'))
+    if os.path.isdir(base):
+        return sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(base) if '__pycache__' not in root
+            for name in names if name.endswith('.py')
+        )
+    return [base + '.py']
+
+
+def _strings(node: ast.AST) -> Optional[List[str]]:
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        values = [item.value for item in node.elts
+                  if isinstance(item, ast.Constant) and isinstance(item.value, str)]
+        return values if len(values) == len(node.elts) else None
+    return None
+
+
+def _is_field(node: ast.AST) -> bool:
+    """F.data / F.text"""
+    return (isinstance(node, ast.Attribute) and node.attr in EVENT_FIELDS.values()
+            and isinstance(node.value, ast.Name) and node.value.id == 'F')
+
+
+def _filter_triggers(node: ast.AST, triggers: dict) -> bool:
+    """Добавляет триггеры фильтра, False — фильтр не сужает набор событий"""
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitAnd):
+        left = _filter_triggers(node.left, triggers)
+        return _filter_triggers(node.right, triggers) or left
+    if isinstance(node, ast.Compare) and _is_field(node.left) and isinstance(node.ops[0], ast.Eq):
+        values = _strings(node.comparators[0])
+        if values:
+            triggers['equals'].update(values)
+            return True
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.args:
+        values = _strings(node.args[0])
+        if _is_field(node.func.value) and values:
+            if node.func.attr == 'startswith':
+                triggers['prefixes'].update(values)
+                return True
+            if node.func.attr == 'in_':
+                triggers['equals'].update(values)
+                return True
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        if node.func.id == 'CommandStart':
+            triggers['commands'].add('start')
+            return True
+        if node.func.id == 'Command' and node.args:
+            commands = [value for arg in node.args for value in (_strings(arg) or [])]
+            if commands:
+                triggers['commands'].update(command.lstrip('/') for command in commands)
+                return True
+    return False
+
+
+def _handler_filters(node: ast.Call):
+    """(тип события, фильтры) для @router.<event>(...) и router.<event>.register(fn, ...)"""
+    func = node.func
+    if not isinstance(func, ast.Attribute):
+        return None
+    if func.attr == 'register' and isinstance(func.value, ast.Attribute):
+        return func.value.attr, node.args[1:]
+    if isinstance(func.value, ast.Name) and func.value.id.endswith('router'):
+        return func.attr, node.args
+    return None
+
+
+def scan_module(module: str) -> Dict[str, dict]:
+    """Триггеры обработчиков модуля (или пакета) по типам событий"""
+    triggers: Dict[str, dict] = {}
+    for path in _module_files(module):
+        with open(path, 'r', encoding='utf-8') as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.Call):
+                continue
+            handler = _handler_filters(node)
+            if handler is None:
+                continue
+            event_type, filters = handler
+            if event_type not in EVENT_FIELDS:
+                continue
+            found = {'equals': set(), 'prefixes': set(), 'commands': set(), 'states': set()}
+            # Состояние FSM — аргумент вида Group.state
+            states = {arg.value.id for arg in filters
+                      if isinstance(arg, ast.Attribute) and isinstance(arg.value, ast.Name)
+                      and arg.value.id != 'F'}
+            if states:
+                found['states'] = states
+            elif not any([_filter_triggers(arg, found) for arg in filters]):
+                found['any'] = True
+            entry = triggers.setdefault(event_type, {})
+            for key, values in found.items():
+                if key == 'any':
+                    entry['any'] = True
+                elif values:
+                    entry[key] = sorted(set(entry.get(key, [])) | values)
+    return triggers
+
+
+def build_manifest(modules: Iterable[str] = LAZY_MODULES) -> Dict[str, Any]:
+    return {module: scan_module(module) for module in sorted(modules)}
+
+
+def load_manifest() -> Dict[str, Any]:
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+                _manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Router manifest unavailable ({e}), routers load eagerly")
+            _manifest = {}
+    return _manifest
+
+
+# --- ленивый роутер -------------------------------------------------------
+
+class LazyRouter(Router):
+    """Заглушка роутера модуля: импортирует его, когда событие может до него дойти"""
+
+    def __init__(self, module: str, attr: str = 'router', triggers: Optional[dict] = None):
+        super().__init__(name=f"lazy:{module}")
+        self.module = module
+        self.attr = attr
+        self.triggers = triggers or {}
+        self.loaded: Optional[Router] = None
+
+    def load(self) -> Router:
+        if self.loaded is None:
+            router = getattr(importlib.import_module(self.module), self.attr)
+            self.include_router(router)
+            self.loaded = router
+            logger.info(f"📦 Router {self.module} loaded")
+        return self.loaded
+
+    def matches(self, update_type: str, event: Any, raw_state: Optional[str]) -> bool:
+        triggers = self.triggers.get(update_type)
+        if not triggers:
+            return False
+        if triggers.get('any'):
+            return True
+        if raw_state and raw_state.split(':', 1)[0] in triggers.get('states', ()):
+            return True
+        value = getattr(event, EVENT_FIELDS[update_type], None)
+        if not value:
+            return False
+        if value in triggers.get('equals', ()) or value.startswith(tuple(triggers.get('prefixes', ()))):
+            return True
+        if value.startswith('/') and triggers.get('commands'):
+            parts = value[1:].split(maxsplit=1)
+            return bool(parts) and parts[0].split('@', 1)[0] in triggers['commands']
+        return False
+
+    async def propagate_event(self, update_type: str, event: Any, **kwargs: Any) -> Any:
+        if self.loaded is None:
+            if not self.matches(update_type, event, kwargs.get('raw_state')):
+                return UNHANDLED
+            self.load()
+        return await super().propagate_event(update_type=update_type, event=event, **kwargs)
+
+
+def lazy_router(module: str, attr: Optional[str] = None) -> Router:
+    """Роутер модуля: ленивый, если модуль есть в манифесте, иначе обычный"""
+    attr = attr or LAZY_MODULES.get(module, 'router')
+    triggers = load_manifest().get(module)
+    if triggers is None:
+        return getattr(importlib.import_module(module), attr)
+    return LazyRouter(module, attr, triggers)
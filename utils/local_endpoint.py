@@ -0,0 +1,57 @@
+"""
+Локальные HTTP-эндпоинты процесса (/metrics, /healthz).
+
+Маленький aiohttp-сервер в цикле событий бота. Настройки — секция конфига
+(enabled, host, port), переменная окружения перекрывает порт; без порта
+сервер не запускается. port_offset разводит процессы одного бота
+(воркер i — port + i, админ-бот — port + 1).
+"""
+
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+
+def endpoint_settings(config: dict, config_key: str, env_var: str) -> Optional[dict]:
+    """host/port из config[config_key] и env_var или None, если сервер не настроен"""
+    settings = dict(config.get(config_key, {}))
+    port = os.getenv(env_var) or settings.get('port')
+    if not settings.get('enabled', True) or port in (None, ''):
+        return None
+    return {'host': settings.get('host', DEFAULT_HOST), 'port': int(port)}
+
+
+async def start_local_endpoint(routes: Dict[str, Handler], host: str = DEFAULT_HOST,
+                               port: int = 0) -> web.AppRunner:
+    """Запускает GET-маршруты routes (путь -> обработчик) в текущем цикле событий"""
+    app = web.Application()
+    for path, handler in routes.items():
+        app.router.add_get(path, handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    for path in routes:
+        logger.info(f"Local endpoint on http://{host}:{port}{path}")
+    return runner
+
+
+async def serve_local_endpoint(config: dict, config_key: str, env_var: str, routes: Dict[str, Handler],
+                               port_offset: int = 0) -> Optional[web.AppRunner]:
+    """Сервер по настройкам config (None — не настроен или не запустился)"""
+    settings = endpoint_settings(config, config_key, env_var)
+    if settings is None:
+        return None
+    port = settings['port'] + port_offset
+    try:
+        return await start_local_endpoint(routes, settings['host'], port)
+    except OSError as e:
+        logger.error(f"Local endpoint {', '.join(routes)} failed to start on port {port}: {e}")
+        return None
@@ -1,37 +1,224 @@
+"""
+Настройка логирования: запись логов вынесена из цикла событий.
 
+Корневой логгер пишет в очередь (QueueHandler), а вывод — форматирование,
+JSON, запись в stdout и файл — делает фоновый поток QueueListener. В потоке
+обработчика остаётся только подстановка аргументов в сообщение (поэтому в
+горячих местах логируем в %-стиле: logger.info("... %s", value) — при
+отброшенной записи строка не собирается вовсе).
+
+- stdout: текст (по умолчанию) или JSON-строки (format = "json");
+- файл (file): JSON-строки с ротацией по размеру (max_bytes, backups);
+- sample: {"имя логгера или префикс": N} — из INFO/DEBUG записей этого
+  логгера проходит каждая N-я, WARNING и выше — все;
+- токены ботов, телефоны и email маскируются в потоке-писателе, один раз
+  на запись (utils.privacy.Redactor).
+
+Настройки — config['logging'] (level, format, file, max_bytes, backups,
+sample), переменные окружения LOG_LEVEL, LOG_FORMAT, LOG_FILE их
+перекрывают. Бенчмарки: python tools/bench_logging.py,
+python tools/bench_redaction.py.
+"""
+
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
 import sys
+from datetime import datetime
+from typing import Dict, Optional
+
+from utils.privacy import Redactor, redactor as default_redactor
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - [%(name)s] - %(message)s'
+
+# Поля LogRecord, которые не относятся к extra
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
 
 class SensitiveDataFilter(logging.Filter):
     """
-    Фильтр для скрытия чувствительных данных в логах, например, токенов.
+    Фильтр для скрытия чувствительных данных в логах: токены ботов, телефоны,
+    email (utils.privacy.Redactor, один проход по тексту). Маскирует готовое
+    сообщение и текст трассировки, поэтому аргументы записи должны быть уже
+    подставлены (AsyncQueueHandler.prepare).
     """
+
+    def __init__(self, redactor: Redactor = default_redactor):
+        super().__init__()
+        self.redactor = redactor
+
     def filter(self, record):
-        # Здесь можно будет добавить логику скрытия данных, если понадобится.
-        # Например, скрывать токен бота.
+        message = record.getMessage()
+        record.msg = self.redactor.redact(message)
+        record.args = None
+        if record.exc_text:
+            record.exc_text = self.redactor.redact(record.exc_text)
         return True
 
-def setup_logger():
+
+class SamplingFilter(logging.Filter):
+    """Пропускает каждую N-ю INFO/DEBUG запись логгера (по самому длинному префиксу имени)"""
+
+    def __init__(self, rates: Dict[str, int]):
+        super().__init__()
+        self.rates = {name: max(1, int(rate)) for name, rate in rates.items()}
+        self._counters: Dict[str, int] = {}
+        # Имя логгера -> правило (None — без выборки)
+        self._resolved: Dict[str, Optional[str]] = {}
+
+    def _rule(self, name: str) -> Optional[str]:
+        if name not in self._resolved:
+            matches = [prefix for prefix in self.rates if name == prefix or name.startswith(prefix + '.')]
+            self._resolved[name] = max(matches, key=len) if matches else None
+        return self._resolved[name]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rule = self._rule(record.name)
+        if rule is None:
+            return True
+        count = self._counters.get(rule, 0)
+        self._counters[rule] = count + 1
+        return count % self.rates[rule] == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись одной JSON-строкой: время, уровень, логгер, сообщение, extra-поля"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RedactingQueueListener(logging.handlers.QueueListener):
+    """Поток-писатель: маскирует запись один раз, до раздачи обработчикам"""
+
+    def __init__(self, log_queue, *handlers, respect_handler_level=False):
+        super().__init__(log_queue, *handlers, respect_handler_level=respect_handler_level)
+        self.redact = SensitiveDataFilter()
+
+    def prepare(self, record):
+        self.redact.filter(record)
+        return record
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
     """
-    Настраивает и конфигурирует стандартный логгер Python.
+    QueueHandler без форматирования в вызывающем потоке: подставляются только
+    аргументы (объекты в них могут измениться к моменту записи), трассировка
+    исключения превращается в текст. Остальное делает поток-писатель.
     """
+
+    def prepare(self, record):
+        # Запись видит только этот обработчик корневого логгера — без копии
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def logging_settings(settings: Optional[dict] = None) -> dict:
+    """Настройки config['logging'] с учётом переменных окружения"""
+    settings = dict(settings or {})
+    for key, variable in (('level', 'LOG_LEVEL'), ('format', 'LOG_FORMAT'), ('file', 'LOG_FILE')):
+        if os.getenv(variable):
+            settings[key] = os.getenv(variable)
+    return settings
+
+
+def _file_path(path: str, name: Optional[str]) -> str:
+    """bot.log + name=admin -> bot.admin.log (у каждого процесса свой файл и своя ротация)"""
+    if not name:
+        return path
+    base, ext = os.path.splitext(path)
+    return f"{base}.{name}{ext or '.log'}"
+
+
+def build_handlers(settings: dict, name: Optional[str] = None) -> list:
+    """Обработчики потока-писателя: stdout и, если задан файл, JSON-файл с ротацией"""
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(JsonFormatter() if settings.get('format') == 'json' else logging.Formatter(TEXT_FORMAT))
+    handlers = [console]
+    if settings.get('file'):
+        path = _file_path(settings['file'], name)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=int(settings.get('max_bytes', DEFAULT_MAX_BYTES)),
+            backupCount=int(settings.get('backups', DEFAULT_BACKUPS)), encoding='utf-8',
+        )
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    return handlers
+
+
+def stop_logging() -> None:
+    """Дописывает очередь и останавливает поток-писатель"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def setup_logger(settings: Optional[dict] = None, name: Optional[str] = None):
+    """
+    Настраивает корневой логгер: очередь в потоке вызова, вывод — в фоновом
+    потоке. Повторный вызов (например, после загрузки конфигурации)
+    перенастраивает конвейер.
+
+    Args:
+        settings: config['logging']
+        name: Имя процесса для файла логов (admin, worker1, ...)
+    """
+    global _listener
+    settings = logging_settings(settings)
+
     # Удаляем все существующие обработчики у корневого логгера
     for handler in logging.root.handlers[:]:
         logging.root.removeHandler(handler)
+    stop_logging()
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = AsyncQueueHandler(log_queue)
+    if settings.get('sample'):
+        queue_handler.addFilter(SamplingFilter(settings['sample']))
+    logging.root.addHandler(queue_handler)
+    logging.root.setLevel(str(settings.get('level', 'INFO')).upper())
+
+    _listener = RedactingQueueListener(log_queue, *build_handlers(settings, name),
+                                       respect_handler_level=True)
+    _listener.start()
 
-    # Конфигурируем логгер
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - [%(name)s] - %(message)s',
-        stream=sys.stdout,
-    )
-
-    # Добавляем фильтр (пока он ничего не делает, но готов к использованию)
-    logger = logging.getLogger()
-    logger.addFilter(SensitiveDataFilter())
-    
     # Устанавливаем уровень INFO для aiogram, чтобы избежать спама DEBUG-сообщениями
     logging.getLogger('aiogram').setLevel(logging.INFO)
     logging.getLogger('aiogram.dispatcher').setLevel(logging.INFO)
 
     logging.info("Logger configured.")
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,186 @@
+"""
+Автоназначение мастера для варианта «Любой свободный мастер».
+
+Занятость всех мастеров на дату берётся одним запросом (битовые маски
+из SlotEngine), поэтому проверка «свободен ли мастер в HH:MM» — это
+O(1) на мастера, а выбор мастера — O(число мастеров).
+
+Политика распределения нагрузки задаётся в booking.assignment_policy:
+- least_booked — мастер с наименьшим числом записей на этот день;
+- round_robin — по кругу между свободными мастерами.
+"""
+
+import logging
+import weakref
+from array import array
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from utils.slot_engine import SlotEngine, as_date, compute_slots, get_slot_engine, parse_hhmm
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLICY = 'least_booked'
+
+
+class LeastBookedPolicy:
+    """Выбирает мастера с наименьшим числом записей на день"""
+
+    name = 'least_booked'
+
+    def choose(self, candidates: List[str], counts: Dict[str, int]) -> str:
+        # min() стабилен: при равенстве побеждает мастер, идущий раньше в конфиге
+        return min(candidates, key=lambda master_id: counts.get(master_id, 0))
+
+
+class RoundRobinPolicy:
+    """Распределяет записи по кругу между свободными мастерами"""
+
+    name = 'round_robin'
+
+    def __init__(self):
+        self._last: Optional[str] = None
+        self._order: List[str] = []
+
+    def choose(self, candidates: List[str], counts: Dict[str, int]) -> str:
+        for master_id in candidates:
+            if master_id not in self._order:
+                self._order.append(master_id)
+
+        if self._last in self._order:
+            start = self._order.index(self._last) + 1
+        else:
+            start = 0
+        ring = self._order[start:] + self._order[:start]
+        chosen = next(m for m in ring if m in candidates)
+        self._last = chosen
+        return chosen
+
+
+def get_staff_list(config: dict) -> List[dict]:
+    """Мастера из конфига: staff.masters (устаревший ключ — staff.list)"""
+    staff = config.get('staff', {})
+    return staff.get('masters') or staff.get('list') or []
+
+
+def get_masters_for_service(config: dict, service_id: str) -> List[dict]:
+    """Активные мастера, выполняющие услугу (общие для выбора мастера и автоназначения)"""
+    return [
+        master for master in get_staff_list(config)
+        if master.get('active', True) and service_id in master.get('services', [])
+    ]
+
+
+POLICIES = {
+    LeastBookedPolicy.name: LeastBookedPolicy,
+    RoundRobinPolicy.name: RoundRobinPolicy,
+}
+
+
+class MasterAssigner:
+    """Подбор свободного мастера и объединённая сетка слотов"""
+
+    def __init__(self, engine: SlotEngine, policy=None):
+        self.engine = engine
+        self._fixed_policy = policy
+        self._policy = None
+        self._policy_name = None
+
+    @property
+    def config(self) -> dict:
+        return self.engine.config
+
+    @property
+    def policy(self):
+        """Текущая политика (пересоздаётся при смене booking.assignment_policy)"""
+        if self._fixed_policy is not None:
+            return self._fixed_policy
+        name = self.config.get('booking', {}).get('assignment_policy', DEFAULT_POLICY)
+        if name not in POLICIES:
+            logger.warning(f"Unknown assignment policy '{name}', using '{DEFAULT_POLICY}'")
+            name = DEFAULT_POLICY
+        if name != self._policy_name:
+            self._policy = POLICIES[name]()
+            self._policy_name = name
+        return self._policy
+
+    def qualified_masters(self, service_id: str) -> List[dict]:
+        """Активные мастера, выполняющие услугу"""
+        return get_masters_for_service(self.config, service_id)
+
+    def get_union_minutes(self, target_date: date, service_id: str) -> array:
+        """Объединение свободных слотов всех подходящих мастеров (с учётом удержаний)"""
+        hold_masks = self.engine.get_hold_masks(target_date)
+
+        def factory():
+            masks, _ = self.engine.get_day_occupancy(target_date)
+            duration = self.engine.get_service_duration(service_id)
+            step = self.engine.get_step()
+            buffer = self.engine.get_buffer()
+            union = set()
+            for master in self.qualified_masters(service_id):
+                work_intervals = self.engine.compile_day(target_date, master['id'])
+                if work_intervals:
+                    busy_mask = masks.get(master['id'], 0) | hold_masks.get(master['id'], 0)
+                    union.update(compute_slots(work_intervals, busy_mask, duration, step, buffer))
+            return array('H', sorted(union))
+
+        if hold_masks:
+            return factory()
+        return self.engine._cached(('any_master', target_date, service_id), factory)
+
+    async def get_free_slots(self, target_date, service_id: str,
+                             now: Optional[datetime] = None) -> List[str]:
+        """Сетка времени для «Любой свободный мастер» в формате "HH:MM" """
+        target_date = as_date(target_date)
+        slots = self.get_union_minutes(target_date, service_id)
+        return self.engine.format_slots(slots, target_date, now)
+
+    def find_free_masters(self, target_date: date, service_id: str, start: int) -> List[str]:
+        """ID подходящих мастеров, свободных в start (минуты от начала суток)"""
+        masks, _ = self.engine.get_day_occupancy(target_date)
+        hold_masks = self.engine.get_hold_masks(target_date)
+        duration = self.engine.get_service_duration(service_id)
+        need = ((1 << (duration + self.engine.get_buffer())) - 1) << start
+
+        free = []
+        for master in self.qualified_masters(service_id):
+            master_id = master['id']
+            if (masks.get(master_id, 0) | hold_masks.get(master_id, 0)) & need:
+                continue
+            if any(ws <= start and start + duration <= we
+                   for ws, we in self.engine.compile_day(target_date, master_id)):
+                free.append(master_id)
+        return free
+
+    async def assign(self, target_date, service_id: str, time_str: str) -> Optional[dict]:
+        """
+        Выбирает свободного мастера на дату и время.
+
+        Возвращает: данные мастера или None, если все заняты
+        """
+        target_date = as_date(target_date)
+        candidates = self.find_free_masters(target_date, service_id, parse_hhmm(time_str))
+        if not candidates:
+            return None
+
+        _, counts = self.engine.get_day_occupancy(target_date)
+        master_id = self.policy.choose(candidates, counts)
+        logger.info(
+            f"Auto-assigned master {master_id} for {service_id} on "
+            f"{target_date.isoformat()} {time_str} ({self.policy.name})"
+        )
+        return next(m for m in self.qualified_masters(service_id) if m['id'] == master_id)
+
+
+_assigners: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def get_master_assigner(config: dict, db_manager) -> MasterAssigner:
+    """Возвращает общий MasterAssigner для пары (config, db_manager)"""
+    engine = get_slot_engine(config, db_manager)
+    assigner = _assigners.get(engine)
+    if assigner is None:
+        assigner = MasterAssigner(engine)
+        _assigners[engine] = assigner
+    return assigner
@@ -0,0 +1,242 @@
+"""
+Метрики процесса в формате Prometheus: GET /metrics на локальном
+aiohttp-сервере, работающем в цикле событий бота.
+
+Скрейп только читает счётчики, которые компоненты и так ведут в памяти
+(UserOrderingMiddleware, реестр задержек, RateGovernor, OutboxDispatcher,
+ReminderScheduler, SQLiteStorage, SlotEngine), и размеры файлов SQLite —
+к самой БД он не обращается. Число строк outbox по статусам обновляет
+диспетчер после каждого своего прохода.
+
+Гистограммы задержек отдаются с фиксированными границами LATENCY_BUCKETS,
+пересчитанными из гистограмм utils.latency (с точностью до их корзины).
+
+Настройки — config['metrics'] (enabled, host, port), переменная окружения
+METRICS_PORT перекрывает порт. Без порта сервер не запускается.
+В многопроцессном режиме воркер с номером i слушает port + i.
+"""
+
+import logging
+import os
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+from utils.local_endpoint import DEFAULT_HOST, serve_local_endpoint, start_local_endpoint
+from utils.outbox import get_outbox_dispatcher
+from utils.slot_engine import find_slot_engine
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Границы гистограмм задержек, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_LATENCY_BOUNDS_US = [int(bound * 1_000_000) for bound in LATENCY_BUCKETS]
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: Optional[dict]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _number(value) -> str:
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class MetricsExporter:
+    """Собирает метрики наблюдаемых ботов и фоновых задач в текст Prometheus"""
+
+    def __init__(self, latency=None, governor=None):
+        self.latency = latency
+        self.governor = governor
+        self._bots: Dict[str, tuple] = {}
+        self._schedulers = []
+        self._webhooks = []
+        self._lines: List[str] = []
+
+    def watch_bot(self, name: str, dp, db_manager=None) -> None:
+        self._bots[name] = (dp, db_manager)
+
+    def watch_scheduler(self, scheduler) -> None:
+        self._schedulers.append(scheduler)
+
+    def watch_webhook(self, server) -> None:
+        self._webhooks.append(server)
+
+    # --- вывод -----------------------------------------------------------
+
+    def _family(self, name: str, kind: str, help_text: str, samples) -> None:
+        """samples — пары (labels, value); пустое семейство не выводится"""
+        samples = list(samples)
+        if not samples:
+            return
+        self._lines.append(f"# HELP {name} {help_text}")
+        self._lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            self._lines.append(f"{name}{_labels(labels)} {_number(value)}")
+
+    def _histogram(self, name: str, help_text: str, prefix: str, label: Optional[str]) -> None:
+        points = self.latency.points(prefix) if self.latency is not None else []
+        if not points:
+            return
+        self._lines.append(f"# HELP {name} {help_text}")
+        self._lines.append(f"# TYPE {name} histogram")
+        for stats in sorted(points, key=lambda stats: stats.name):
+            labels = {label: stats.name[len(prefix):]} if label else {}
+            histogram = stats.wall
+            for bound, count in zip(LATENCY_BUCKETS, histogram.cumulative(_LATENCY_BOUNDS_US)):
+                self._lines.append(f"{name}_bucket{_labels(dict(labels, le=bound))} {count}")
+            self._lines.append(f"{name}_bucket{_labels(dict(labels, le='+Inf'))} {histogram.count}")
+            self._lines.append(f"{name}_sum{_labels(labels)} {histogram.total / 1_000_000!r}")
+            self._lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+    # --- семейства -------------------------------------------------------
+
+    def _ordering(self) -> Dict[str, dict]:
+        """Метрики UserOrderingMiddleware каждого бота"""
+        from middlewares import find_ordering_middleware
+
+        result = {}
+        for name, (dp, _) in self._bots.items():
+            middleware = find_ordering_middleware(dp)
+            if middleware is not None:
+                result[name] = middleware.stats()
+        return result
+
+    def _collect_updates(self) -> None:
+        ordering = self._ordering()
+        self._family('bot_updates_processed_total', 'counter', 'Processed updates',
+                     (({'bot': name}, stats['processed']) for name, stats in ordering.items()))
+        self._family('bot_updates_failed_total', 'counter', 'Updates whose handler raised',
+                     (({'bot': name}, stats['failed']) for name, stats in ordering.items()))
+        self._family('bot_updates_dropped_total', 'counter', 'Updates dropped by the per-user queue limit',
+                     (({'bot': name}, stats['dropped']) for name, stats in ordering.items()))
+        self._family('bot_updates_active', 'gauge', 'Updates being processed',
+                     (({'bot': name}, stats['active']) for name, stats in ordering.items()))
+        self._family('bot_updates_queued', 'gauge', 'Updates waiting for their turn',
+                     (({'bot': name}, stats['queue_depth']) for name, stats in ordering.items()))
+        webhook = [(name, stats) for server in self._webhooks for name, stats in server.stats().items()]
+        self._family('bot_webhook_updates_total', 'counter', 'Webhook updates by outcome',
+                     (({'bot': name, 'outcome': outcome}, stats[outcome])
+                      for name, stats in webhook for outcome in ('received', 'processed', 'failed', 'rejected')))
+
+    def _collect_latency(self) -> None:
+        self._histogram('bot_update_duration_seconds', 'Update processing time', 'update', None)
+        self._histogram('bot_handler_duration_seconds', 'Handler time excluding DB calls',
+                        'handler:', 'handler')
+        self._histogram('bot_middleware_duration_seconds', 'Middleware time excluding nested calls',
+                        'middleware:', 'middleware')
+        self._histogram('bot_db_query_duration_seconds', 'Database call time', 'db:', 'method')
+
+    def _collect_api(self) -> None:
+        if self.governor is None:
+            return
+        stats = self.governor.stats()
+        self._family('bot_api_requests_total', 'counter', 'Bot API requests', [(None, stats['requests'])])
+        self._family('bot_api_rate_limited_total', 'counter', 'Bot API 429 responses',
+                     [(None, stats['rate_limited'])])
+        self._family('bot_api_retries_total', 'counter', 'Requests retried after 429', [(None, stats['retries'])])
+        self._family('bot_api_errors_total', 'counter', 'Bot API errors other than 429',
+                     [(None, stats['errors'])])
+        self._family('bot_api_queue_depth', 'gauge', 'Requests waiting for the rate limiter',
+                     [(None, stats['queue_depth'])])
+        self._family('bot_api_throttled_seconds_total', 'counter', 'Time spent waiting for the rate limiter',
+                     [(None, stats['throttled_seconds'])])
+
+    def _db_managers(self) -> list:
+        managers = []
+        for _, db_manager in self._bots.values():
+            if db_manager is not None and all(db_manager is not known for known in managers):
+                managers.append(db_manager)
+        return managers
+
+    def _collect_notifications(self) -> None:
+        dispatchers = [dispatcher for dispatcher in map(get_outbox_dispatcher, self._db_managers()) if dispatcher]
+        self._family('bot_outbox_sent_total', 'counter', 'Admin notifications sent',
+                     ((None, dispatcher.sent) for dispatcher in dispatchers))
+        self._family('bot_outbox_failed_total', 'counter', 'Admin notifications given up',
+                     ((None, dispatcher.failed) for dispatcher in dispatchers))
+        self._family('bot_outbox_digests_total', 'counter', 'Notification digests sent',
+                     ((None, dispatcher.digests) for dispatcher in dispatchers))
+        self._family('bot_outbox_rows', 'gauge', 'Outbox rows by status after the last dispatcher pass',
+                     (({'status': status}, count) for dispatcher in dispatchers
+                      for status, count in sorted(dispatcher.rows_by_status.items())))
+        self._family('bot_reminders_pending', 'gauge', 'Scheduled client reminders',
+                     ((None, len(scheduler)) for scheduler in self._schedulers))
+        self._family('bot_reminders_sent_total', 'counter', 'Client reminders sent',
+                     ((None, scheduler.sent) for scheduler in self._schedulers))
+        self._family('bot_reminders_failed_total', 'counter', 'Client reminders failed',
+                     ((None, scheduler.failed) for scheduler in self._schedulers))
+
+    def _collect_storage(self) -> None:
+        fsm = {name: (dp.storage.stats(), getattr(dp.storage, 'path', None))
+               for name, (dp, _) in self._bots.items() if hasattr(dp.storage, 'stats')}
+        self._family('bot_fsm_states', 'gauge', 'FSM states cached in memory',
+                     (({'bot': name}, stats['cached']) for name, (stats, _) in fsm.items()))
+        self._family('bot_fsm_dirty_states', 'gauge', 'FSM states not yet written to SQLite',
+                     (({'bot': name}, stats['dirty']) for name, (stats, _) in fsm.items()))
+        self._family('bot_fsm_writes_total', 'counter', 'FSM state changes',
+                     (({'bot': name}, stats['writes']) for name, (stats, _) in fsm.items()))
+
+        caches = {f"fsm:{name}": (stats['hits'], stats['misses']) for name, (stats, _) in fsm.items()}
+        for db_manager in self._db_managers():
+            engine = find_slot_engine(db_manager)
+            if engine is not None:
+                caches['slots'] = (engine.hits, engine.misses)
+        self._family('bot_cache_hits_total', 'counter', 'Cache hits',
+                     (({'cache': cache}, hits) for cache, (hits, _) in caches.items()))
+        self._family('bot_cache_misses_total', 'counter', 'Cache misses',
+                     (({'cache': cache}, misses) for cache, (_, misses) in caches.items()))
+        self._family('bot_cache_hit_ratio', 'gauge', 'Cache hit ratio since start',
+                     (({'cache': cache}, round(hits / (hits + misses), 4) if hits + misses else 0.0)
+                      for cache, (hits, misses) in caches.items()))
+
+        files = {'bookings': getattr(db_manager, 'db_path', None) for db_manager in self._db_managers()}
+        files.update({f"fsm:{name}": path for name, (_, path) in fsm.items()})
+        files = {db: path for db, path in files.items() if path and path != ':memory:'}
+        self._family('bot_sqlite_file_bytes', 'gauge', 'SQLite database file size',
+                     (({'db': db}, file_size(path)) for db, path in files.items()))
+        self._family('bot_sqlite_wal_bytes', 'gauge', 'SQLite write-ahead log size',
+                     (({'db': db}, file_size(path + '-wal')) for db, path in files.items()))
+
+    def render(self) -> str:
+        self._lines = []
+        self._collect_updates()
+        self._collect_latency()
+        self._collect_api()
+        self._collect_notifications()
+        self._collect_storage()
+        lines, self._lines = self._lines, []
+        return "\n".join(lines) + "\n"
+
+
+def _routes(exporter: MetricsExporter) -> dict:
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(body=exporter.render().encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+    return {'/metrics': metrics}
+
+
+async def start_metrics_server(exporter: MetricsExporter, host: str = DEFAULT_HOST,
+                               port: int = 0) -> web.AppRunner:
+    """Запускает GET /metrics в текущем цикле событий"""
+    return await start_local_endpoint(_routes(exporter), host, port)
+
+
+async def serve_metrics(config: dict, exporter: MetricsExporter, port_offset: int = 0) -> Optional[web.AppRunner]:
+    """Сервер метрик по настройкам config['metrics'] / METRICS_PORT (None — не настроен или не запустился)"""
+    return await serve_local_endpoint(config, 'metrics', 'METRICS_PORT', _routes(exporter), port_offset)
@@ -18,24 +18,50 @@ from utils.db import DatabaseManager
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_API_BASE = "https://api.telegram.org"
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
 
 class BotMonitor:
     """
     Монитор для проверки работоспособности бота
     """
 
-    def __init__(self, bot_token: str, bot_name: str = "bot"):
+    def __init__(self, bot_token: str, bot_name: str = "bot",
+                 session: Optional[aiohttp.ClientSession] = None,
+                 api_base: str = DEFAULT_API_BASE):
         """
         Args:
             bot_token: Токен Telegram-бота
             bot_name: Имя бота для логов (client/admin)
+            session: Общая HTTP-сессия (без неё на каждую проверку открывается своя)
+            api_base: Адрес Bot API (TELEGRAM_API_URL для локального сервера)
         """
         self.bot_token = bot_token
         self.bot_name = bot_name
-        self.api_url = f"https://api.telegram.org/bot{bot_token}"
+        self.session = session
+        self.api_url = f"{api_base.rstrip('/')}/bot{bot_token}"
         self.last_check_time = None
         self.last_status = None
 
+    async def _call(self, method: str) -> Dict:
+        """GET метода Bot API через общую сессию (или разовую, если её нет)"""
+        if self.session is not None:
+            async with self.session.get(f"{self.api_url}/{method}", timeout=REQUEST_TIMEOUT) as response:
+                return await self._result(response)
+        async with aiohttp.ClientSession(timeout=REQUEST_TIMEOUT) as session:
+            async with session.get(f"{self.api_url}/{method}") as response:
+                return await self._result(response)
+
+    @staticmethod
+    async def _result(response) -> Dict:
+        if response.status != 200:
+            raise Exception(f"HTTP {response.status}")
+        data = await response.json()
+        if not data.get("ok"):
+            raise Exception(f"API вернул ok=false: {data}")
+        return data.get("result", {})
+
     async def check_bot_alive(self) -> Dict:
         """
         Проверяет что бот жив и отвечает на запросы
@@ -46,31 +72,20 @@ class BotMonitor:
         start_time = time.time()
 
         try:
-            timeout = aiohttp.ClientTimeout(total=10)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(f"{self.api_url}/getMe") as response:
-                    response_time = time.time() - start_time
-
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get("ok"):
-                            bot_info = data.get("result", {})
-                            status = {
-                                "status": "healthy",
-                                "bot_name": self.bot_name,
-                                "username": bot_info.get("username"),
-                                "first_name": bot_info.get("first_name"),
-                                "response_time_ms": round(response_time * 1000, 2),
-                                "checked_at": datetime.now().isoformat()
-                            }
-                            logger.info(f"✅ {self.bot_name}: Бот работает (отклик {status['response_time_ms']}ms)")
-                            self.last_status = status
-                            self.last_check_time = datetime.now()
-                            return status
-                        else:
-                            raise Exception(f"API вернул ok=false: {data}")
-                    else:
-                        raise Exception(f"HTTP {response.status}")
+            bot_info = await self._call("getMe")
+            response_time = time.time() - start_time
+            status = {
+                "status": "healthy",
+                "bot_name": self.bot_name,
+                "username": bot_info.get("username"),
+                "first_name": bot_info.get("first_name"),
+                "response_time_ms": round(response_time * 1000, 2),
+                "checked_at": datetime.now().isoformat()
+            }
+            logger.info(f"✅ {self.bot_name}: Бот работает (отклик {status['response_time_ms']}ms)")
+            self.last_status = status
+            self.last_check_time = datetime.now()
+            return status
 
         except asyncio.TimeoutError:
             status = {
@@ -104,21 +119,15 @@ class BotMonitor:
             Dict с информацией о webhook
         """
         try:
-            timeout = aiohttp.ClientTimeout(total=10)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.get(f"{self.api_url}/getWebhookInfo") as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        if data.get("ok"):
-                            webhook_info = data.get("result", {})
-                            return {
-                                "url": webhook_info.get("url", ""),
-                                "has_custom_certificate": webhook_info.get("has_custom_certificate", False),
-                                "pending_update_count": webhook_info.get("pending_update_count", 0),
-                                "last_error_date": webhook_info.get("last_error_date"),
-                                "last_error_message": webhook_info.get("last_error_message"),
-                                "max_connections": webhook_info.get("max_connections")
-                            }
+            webhook_info = await self._call("getWebhookInfo")
+            return {
+                "url": webhook_info.get("url", ""),
+                "has_custom_certificate": webhook_info.get("has_custom_certificate", False),
+                "pending_update_count": webhook_info.get("pending_update_count", 0),
+                "last_error_date": webhook_info.get("last_error_date"),
+                "last_error_message": webhook_info.get("last_error_message"),
+                "max_connections": webhook_info.get("max_connections")
+            }
         except Exception as e:
             logger.error(f"Ошибка получения webhook info: {e}")
             return {"error": str(e)}
@@ -212,62 +221,64 @@ class MetricsCollector:
             today = date.today()
             today_str = today.strftime("%Y-%m-%d")
 
-            # Получаем статистику
-            with self.db_manager.get_connection() as conn:
-                cursor = conn.cursor()
-
-                # Количество заказов за сегодня
-                cursor.execute("""
-                    SELECT COUNT(*)
-                    FROM orders
-                    WHERE date(created_at) = date('now')
-                """)
-                orders_today = cursor.fetchone()[0]
-
-                # Количество новых пользователей за сегодня
-                cursor.execute("""
-                    SELECT COUNT(*)
-                    FROM users
-                    WHERE date(created_at) = date('now')
-                """)
-                new_users_today = cursor.fetchone()[0]
-
-                # Всего пользователей
-                cursor.execute("SELECT COUNT(*) FROM users")
-                total_users = cursor.fetchone()[0]
-
-                # Всего заказов
-                cursor.execute("SELECT COUNT(*) FROM orders")
-                total_orders = cursor.fetchone()[0]
-
-                # Популярные услуги за неделю
-                cursor.execute("""
-                    SELECT service_name, COUNT(*) as count
-                    FROM orders
-                    WHERE created_at >= datetime('now', '-7 days')
-                    GROUP BY service_name
-                    ORDER BY count DESC
-                    LIMIT 5
-                """)
-                popular_services = [
-                    {"service": row[0], "count": row[1]}
-                    for row in cursor.fetchall()
-                ]
-
-                metrics = {
-                    "date": today_str,
-                    "orders_today": orders_today,
-                    "new_users_today": new_users_today,
-                    "total_users": total_users,
-                    "total_orders": total_orders,
-                    "popular_services_week": popular_services,
-                    "collected_at": datetime.now().isoformat()
-                }
+            # Заказы — таблица bookings, пользователи — её user_id
+            cursor = self.db_manager.conn.cursor()
+
+            # Количество заказов за сегодня
+            cursor.execute("""
+                SELECT COUNT(*) AS count
+                FROM bookings
+                WHERE created_at >= date('now')
+            """)
+            orders_today = cursor.fetchone()['count']
+
+            # Количество новых пользователей за сегодня (первая запись сегодня)
+            cursor.execute("""
+                SELECT COUNT(*) AS count FROM (
+                    SELECT user_id
+                    FROM bookings
+                    GROUP BY user_id
+                    HAVING MIN(created_at) >= date('now')
+                )
+            """)
+            new_users_today = cursor.fetchone()['count']
+
+            # Всего пользователей
+            cursor.execute("SELECT COUNT(DISTINCT user_id) AS count FROM bookings")
+            total_users = cursor.fetchone()['count']
+
+            # Всего заказов
+            cursor.execute("SELECT COUNT(*) AS count FROM bookings")
+            total_orders = cursor.fetchone()['count']
+
+            # Популярные услуги за неделю
+            cursor.execute("""
+                SELECT service_name, COUNT(*) as count
+                FROM bookings
+                WHERE created_at >= datetime('now', '-7 days')
+                GROUP BY service_name
+                ORDER BY count DESC
+                LIMIT 5
+            """)
+            popular_services = [
+                {"service": row['service_name'], "count": row['count']}
+                for row in cursor.fetchall()
+            ]
+
+            metrics = {
+                "date": today_str,
+                "orders_today": orders_today,
+                "new_users_today": new_users_today,
+                "total_users": total_users,
+                "total_orders": total_orders,
+                "popular_services_week": popular_services,
+                "collected_at": datetime.now().isoformat()
+            }
 
-                logger.info(f"📊 Метрики: {orders_today} заказов сегодня, "
-                           f"{new_users_today} новых пользователей")
+            logger.info(f"📊 Метрики: {orders_today} заказов сегодня, "
+                       f"{new_users_today} новых пользователей")
 
-                return metrics
+            return metrics
 
         except Exception as e:
             logger.error(f"Ошибка сбора метрик: {e}")
@@ -291,12 +302,14 @@ async def run_health_check(client_token: str, admin_token: str, db_path: str) ->
     """
     logger.info("🔍 Начало проверки работоспособности...")
 
-    # Проверяем боты
-    client_monitor = BotMonitor(client_token, "client_bot")
-    admin_monitor = BotMonitor(admin_token, "admin_bot")
-
-    client_status = await client_monitor.check_bot_alive()
-    admin_status = await admin_monitor.check_bot_alive()
+    # Проверяем боты: одновременно и через одну сессию
+    async with aiohttp.ClientSession() as session:
+        client_monitor = BotMonitor(client_token, "client_bot", session)
+        admin_monitor = BotMonitor(admin_token, "admin_bot", session)
+        client_status, admin_status = await asyncio.gather(
+            client_monitor.check_bot_alive(),
+            admin_monitor.check_bot_alive(),
+        )
 
     # Проверяем БД
     db_monitor = DatabaseMonitor(db_path)
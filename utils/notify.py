@@ -1,12 +1,61 @@
 
 import logging
-from aiogram import Bot
-from aiogram.exceptions import TelegramAPIError
+import weakref
+from collections import OrderedDict
 from datetime import datetime
 from utils.db import DatabaseManager
 
 logger = logging.getLogger(__name__)
 
+HISTORY_CACHE_SIZE = 1024
+
+
+class ClientHistoryCache:
+    """
+    LRU готовых текстов истории клиента.
+
+    Запись хранит версию заказов пользователя (db_manager.get_user_version),
+    поэтому любое изменение его заказов делает её устаревшей.
+    """
+
+    def __init__(self, maxsize: int = HISTORY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple, version):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: tuple, version, text: str) -> None:
+        self._entries[key] = (version, text)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        """Явно сбрасывает все записи пользователя"""
+        for key in [k for k in self._entries if k[0] == user_id]:
+            del self._entries[key]
+
+
+_history_caches: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def get_history_cache(db_manager) -> ClientHistoryCache:
+    """Кэш истории клиентов для db_manager"""
+    cache = _history_caches.get(db_manager)
+    if cache is None:
+        cache = ClientHistoryCache()
+        _history_caches[db_manager] = cache
+    return cache
+
 def format_time(time_str: str) -> str:
     """Форматирует время в HH:MM формат"""
     if not time_str or ':' in time_str:
@@ -17,61 +66,77 @@ def format_time(time_str: str) -> str:
         return time_str
 
 # НОВОЕ: Функция для получения истории клиента (ошибка #3)
-def get_client_history_text(db_manager: DatabaseManager, user_id: int, current_order_id: int, limit: int = 5) -> str:
-    """Получает текст с историей заказов клиента"""
+def get_client_history_text(db_manager: DatabaseManager, user_id: int, current_order_id: int, limit: int = 5,
+                            comment: str = None) -> str:
+    """
+    Получает текст с историей заказов клиента (с кэшем по пользователю).
+
+    comment — комментарий текущего заказа из уведомления: заказ может быть
+    старше последних limit записей (или уже удалён при отмене).
+    """
     try:
-        # Получаем все заказы клиента (не только активные)
-        all_bookings = db_manager.bookings.get_user_bookings(user_id, active_only=False)
-        
-        if not all_bookings or len(all_bookings) <= 1:
-            return ""  # Нет истории (первый заказ)
-        
-        history_text = "📜 История клиента:\n"
-        
-        count = 0
-        for booking in all_bookings:
-            if count >= limit:
-                break
-            
-            # Форматируем дату
-            try:
-                date_obj = datetime.fromisoformat(booking['booking_date'])
-                date_formatted = date_obj.strftime('%d.%m.%Y')
-            except (ValueError, TypeError):
-                date_formatted = booking['booking_date']
-            
-            # Форматируем время
-            time_formatted = format_time(booking.get('booking_time', ''))
-            
-            # Статус эмодзи
-            if booking['id'] == current_order_id:
-                status_emoji = "🆕"
-            elif booking['status'] == 'active':
-                status_emoji = "✅"
-            elif booking['status'] == 'cancelled':
-                status_emoji = "❌"
-            elif booking['status'] == 'completed':
-                status_emoji = "✔️"
-            else:
-                status_emoji = "❓"
-            
-            history_text += f"  • Заказ #{booking['id']}: {booking['service_name']} ({date_formatted} {time_formatted}) {status_emoji}\n"
-            count += 1
-        
+        version = db_manager.get_user_version(user_id) if hasattr(db_manager, 'get_user_version') else None
+        cache = get_history_cache(db_manager) if version is not None else None
+        key = (user_id, current_order_id, limit)
+        history_text = cache.get(key, version) if cache is not None else None
+        if history_text is None:
+            history_text = _render_client_history(db_manager, user_id, current_order_id, limit)
+            if cache is not None:
+                cache.put(key, version, history_text)
+
         # Добавляем комментарий текущего заказа, если есть
-        current_booking = next((b for b in all_bookings if b['id'] == current_order_id), None)
-        if current_booking and current_booking.get('comment'):
-            history_text += f"\n💬 Комментарий:\n└ \"{current_booking['comment']}\"\n"
-        
+        if history_text and comment:
+            history_text += f"\n💬 Комментарий:\n└ \"{comment}\"\n"
         return history_text
-        
+
     except Exception as e:
         logger.error(f"Error getting client history: {e}")
         return ""
 
-# ИЗМЕНЕНО: Добавлен параметр db_manager для истории клиента (ошибка #3, #7)
-async def send_order_to_admins(bot: Bot, admin_ids: list, order_data: dict, business_name: str, db_manager: DatabaseManager =None):
-    """Отправка уведомления о новом заказе администраторам"""
+
+def _render_client_history(db_manager: DatabaseManager, user_id: int, current_order_id: int, limit: int) -> str:
+    """Текст истории: читает из БД только последние limit заказов"""
+    queries = getattr(db_manager, 'bookings', db_manager)
+    if queries.count_client_orders(user_id) <= 1:
+        return ""  # Нет истории (первый заказ)
+    all_bookings = queries.get_client_history(user_id, limit=limit)
+    
+    history_text = "📜 История клиента:\n"
+    
+    count = 0
+    for booking in all_bookings:
+        if count >= limit:
+            break
+        
+        # Форматируем дату
+        try:
+            date_obj = datetime.fromisoformat(booking['booking_date'])
+            date_formatted = date_obj.strftime('%d.%m.%Y')
+        except (ValueError, TypeError):
+            date_formatted = booking['booking_date']
+        
+        # Форматируем время
+        time_formatted = format_time(booking.get('booking_time', ''))
+        
+        # Статус эмодзи
+        if booking['id'] == current_order_id:
+            status_emoji = "🆕"
+        elif booking['status'] == 'active':
+            status_emoji = "✅"
+        elif booking['status'] == 'cancelled':
+            status_emoji = "❌"
+        elif booking['status'] == 'completed':
+            status_emoji = "✔️"
+        else:
+            status_emoji = "❓"
+        
+        history_text += f"  • Заказ #{booking['id']}: {booking['service_name']} ({date_formatted} {time_formatted}) {status_emoji}\n"
+        count += 1
+    
+    return history_text
+
+def format_new_order_message(order_data: dict, business_name: str, db_manager: DatabaseManager = None) -> str:
+    """Текст уведомления о новом заказе"""
     message_text = (
         f"🔔 Новая заявка в {business_name}\n\n"
         f"ID заявки: #{order_data['order_id']}\n"
@@ -105,22 +170,16 @@ async def send_order_to_admins(bot: Bot, admin_ids: list, order_data: dict, busi
 
     # НОВОЕ: Добавляем историю клиента (ошибка #3)
     if db_manager and order_data.get('user_id'):
-        history_text = get_client_history_text(db_manager, order_data['user_id'], order_data['order_id'])
+        history_text = get_client_history_text(db_manager, order_data['user_id'], order_data['order_id'],
+                                               comment=order_data.get('comment'))
         if history_text:
             message_text += f"\n{history_text}"
 
-    for admin_id in admin_ids:
-        try:
-            await bot.send_message(admin_id, message_text)
-            logger.info(f"Order notification sent to admin {admin_id}")
-        except TelegramAPIError as e:
-            logger.error(f"Failed to send notification to admin {admin_id}: {e}")
-        except Exception as e:
-            logger.error(f"Unexpected error sending notification to admin {admin_id}: {e}")
-
-# ИЗМЕНЕНО: Добавлен параметр db_manager для истории клиента (ошибка #3, #7)
-async def send_order_change_to_admins(bot: Bot, admin_ids: list, old_order: dict, new_order: dict, business_name: str, db_manager: DatabaseManager=None):
-    """Отправляет уведомление администраторам об изменении заказа"""
+    return message_text
+
+
+def format_order_change_message(old_order: dict, new_order: dict, business_name: str, db_manager: DatabaseManager = None) -> str:
+    """Текст уведомления об изменении заказа"""
     # Форматируем время
     old_time = format_time(old_order.get('booking_time', ''))
     new_time = format_time(new_order.get('booking_time', ''))
@@ -160,15 +219,32 @@ async def send_order_change_to_admins(bot: Bot, admin_ids: list, old_order: dict
 
     # НОВОЕ: Добавляем историю клиента (ошибка #3)
     if db_manager and old_order.get('user_id'):
-        history_text = get_client_history_text(db_manager, old_order['user_id'], old_order['id'])
+        history_text = get_client_history_text(db_manager, old_order['user_id'], old_order['id'],
+                                               comment=old_order.get('comment'))
         if history_text:
             message_text += f"\n{history_text}"
 
-    for admin_id in admin_ids:
-        try:
-            await bot.send_message(admin_id, message_text)
-            logger.info(f"Order change notification sent to admin {admin_id}")
-        except TelegramAPIError as e:
-            logger.error(f"Failed to send change notification to admin {admin_id}: {e}")
-        except Exception as e:
-            logger.error(f"Unexpected error sending change notification to admin {admin_id}: {e}")
+    return message_text
+
+
+def format_cancellation_message(order: dict, business_name: str, db_manager: DatabaseManager = None) -> str:
+    """Текст уведомления об отмене заказа"""
+    formatted_time = format_time(order.get('booking_time', ''))
+
+    message_text = (
+        f"❌ Отмена записи в {business_name}\n\n"
+        f"ID заявки: #{order['id']}\n"
+        f"Услуга: {order['service_name']}\n"
+        f"Дата: {order['booking_date']}\n"
+        f"Время: {formatted_time}\n"
+        f"Клиент: {order['client_name']}\n"
+        f"Телефон: {order['phone']}\n"
+    )
+
+    if db_manager and order.get('user_id'):
+        history_text = get_client_history_text(db_manager, order['user_id'], order['id'],
+                                               comment=order.get('comment'))
+        if history_text:
+            message_text += f"\n{history_text}"
+
+    return message_text
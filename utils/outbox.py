@@ -0,0 +1,289 @@
+"""
+Outbox уведомлений администраторам.
+
+Уведомления о новой записи, переносе и отмене записываются в таблицу
+outbox в той же транзакции, что и сам заказ, — обработчик пользователя
+не ждёт отправки сообщений админам. Фоновый OutboxDispatcher забирает
+строки из таблицы и рассылает их:
+- с ограниченной параллельностью (booking.outbox_concurrency);
+- с повторами и экспоненциальной задержкой;
+- с доставкой «как минимум один раз»: строка удаляется только после
+  успешной отправки и переживает перезапуск бота;
+- со сводками при всплеске: пока админу приходит не больше
+  notify_burst_threshold уведомлений за notify_coalesce_window секунд,
+  каждое уходит сразу; дальше события окна откладываются в таблице
+  (defer_outbox) и уходят одним сообщением-сводкой в конце окна.
+
+Текст сообщения формируется в момент отправки (utils.notify).
+"""
+
+import asyncio
+import logging
+import time
+import weakref
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNotFound,
+    TelegramRetryAfter,
+)
+
+from utils.notify import format_cancellation_message, format_new_order_message, format_order_change_message
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_BASE_DELAY = 2.0
+DEFAULT_MAX_DELAY = 600.0
+DEFAULT_POLL_INTERVAL = 5.0
+DEFAULT_LEASE_SECONDS = 60
+# Сводки: больше burst_threshold уведомлений одному админу за coalesce_window секунд
+DEFAULT_COALESCE_WINDOW = 10.0
+DEFAULT_BURST_THRESHOLD = 3
+MAX_MESSAGE_LENGTH = 4096
+DIGEST_SEPARATOR = "\n\n━━━━━━━━━━━━━━━━━━━━\n\n"
+
+# Ошибки, которые не исправятся повтором (бот заблокирован, чат не найден и т.п.)
+PERMANENT_ERRORS = (TelegramForbiddenError, TelegramNotFound, TelegramBadRequest)
+
+
+def _render_new_order(payload: dict, db_manager) -> str:
+    order_data = dict(payload['order_data'], order_id=payload['order_id'])
+    return format_new_order_message(order_data, payload['business_name'], db_manager)
+
+
+def _render_order_changed(payload: dict, db_manager) -> str:
+    return format_order_change_message(
+        payload['old_order'], payload['new_order'], payload['business_name'], db_manager
+    )
+
+
+def _render_order_cancelled(payload: dict, db_manager) -> str:
+    return format_cancellation_message(payload['order'], payload['business_name'], db_manager)
+
+
+RENDERERS: Dict[str, Callable[[dict, object], str]] = {
+    'new_order': _render_new_order,
+    'order_changed': _render_order_changed,
+    'order_cancelled': _render_order_cancelled,
+}
+
+
+def admin_notifications(config: dict, kind: str, payload: dict) -> List[dict]:
+    """
+    Строки outbox для всех админов (пусто, если уведомления выключены
+    в features.enable_admin_notify).
+    """
+    if not config.get('features', {}).get('enable_admin_notify', True):
+        return []
+    return [
+        {'kind': kind, 'chat_id': admin_id, 'payload': payload}
+        for admin_id in config.get('admin_ids', [])
+    ]
+
+
+class OutboxDispatcher:
+    """Фоновая рассылка уведомлений из таблицы outbox"""
+
+    def __init__(self, db_manager, bot, concurrency: int = DEFAULT_CONCURRENCY,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, base_delay: float = DEFAULT_BASE_DELAY,
+                 max_delay: float = DEFAULT_MAX_DELAY, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 lease_seconds: int = DEFAULT_LEASE_SECONDS, coalesce_window: float = DEFAULT_COALESCE_WINDOW,
+                 burst_threshold: int = DEFAULT_BURST_THRESHOLD, clock=time.time):
+        self.db_manager = db_manager
+        self.bot = bot
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.coalesce_window = coalesce_window
+        self.burst_threshold = max(1, burst_threshold)
+        self.clock = clock
+        self.sent = 0
+        self.failed = 0
+        self.digests = 0
+        # Строк outbox по статусам после последнего прохода (для /metrics)
+        self.rows_by_status: Dict[str, int] = {}
+        # chat_id -> время отправок за последнее окно
+        self._recent: Dict[int, Deque[float]] = {}
+        # chat_id -> когда отправить накопленную сводку
+        self._digest_at: Dict[int, float] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def wake(self) -> None:
+        """Будит диспетчер сразу после записи в outbox"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def backoff(self, attempts: int) -> float:
+        """Задержка перед попыткой номер attempts + 1"""
+        return min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+
+    def _recent_sends(self, chat_id: int, now: float) -> Deque[float]:
+        recent = self._recent.setdefault(chat_id, deque())
+        while recent and recent[0] <= now - self.coalesce_window:
+            recent.popleft()
+        return recent
+
+    def plan(self, rows: List[dict], now: float) -> List[List[dict]]:
+        """
+        Делит захваченные строки на отправки: одиночные сообщения, пока у админа
+        тихо, и сводки при всплеске. Строки, которые ждут сводки, откладываются.
+        """
+        by_chat: Dict[int, List[dict]] = {}
+        for row in rows:
+            by_chat.setdefault(row['chat_id'], []).append(row)
+
+        batches = []
+        for chat_id, chat_rows in by_chat.items():
+            if self.coalesce_window <= 0:
+                batches.extend([row] for row in chat_rows)
+                continue
+            recent = self._recent_sends(chat_id, now)
+            digest_at = self._digest_at.get(chat_id)
+            if digest_at is None and len(recent) + len(chat_rows) <= self.burst_threshold:
+                batches.extend([row] for row in chat_rows)
+                recent.extend([now] * len(chat_rows))
+            elif digest_at is None or now < digest_at:
+                # Всплеск: копим события окна в одну сводку
+                if digest_at is None:
+                    digest_at = self._digest_at[chat_id] = now + self.coalesce_window
+                self.db_manager.defer_outbox([row['id'] for row in chat_rows], digest_at)
+            else:
+                batches.append(chat_rows)
+                recent.append(now)
+        return batches
+
+    def render(self, rows: List[dict]) -> List[str]:
+        """Текст одиночного уведомления или сводки (несколько сообщений, если не влезает)"""
+        texts = [RENDERERS[row['kind']](row['payload'], self.db_manager) for row in rows]
+        if len(texts) == 1:
+            return texts
+        header = f"📬 <b>Сводка: {len(texts)} уведомлений</b>"
+        messages, current = [], header
+        for text in texts:
+            candidate = f"{current}{DIGEST_SEPARATOR}{text}"
+            if len(candidate) > MAX_MESSAGE_LENGTH and current != header:
+                messages.append(current)
+                candidate = text
+            current = candidate
+        messages.append(current)
+        return messages
+
+    async def _deliver(self, rows: List[dict]) -> None:
+        """Отправляет одно уведомление или сводку; результат применяется ко всем строкам"""
+        chat_id = rows[0]['chat_id']
+        label = f"Outbox {','.join(str(row['id']) for row in rows)}"
+        try:
+            for text in self.render(rows):
+                await self.bot.send_message(chat_id, text)
+        except TelegramRetryAfter as e:
+            # Ограничение Telegram — не считаем как неудачную попытку
+            for row in rows:
+                self.db_manager.retry_outbox(row['id'], row['attempts'], self.clock() + e.retry_after, str(e))
+            logger.warning(f"{label}: flood control, retry in {e.retry_after}s")
+        except PERMANENT_ERRORS as e:
+            for row in rows:
+                self.db_manager.fail_outbox(row['id'], row['attempts'] + 1, str(e))
+            self.failed += len(rows)
+            logger.error(f"{label}: cannot deliver to {chat_id}: {e}")
+        except Exception as e:
+            for row in rows:
+                attempts = row['attempts'] + 1
+                if attempts >= self.max_attempts:
+                    self.db_manager.fail_outbox(row['id'], attempts, str(e))
+                    self.failed += 1
+                    logger.error(f"Outbox {row['id']}: giving up after {attempts} attempts: {e}")
+                else:
+                    delay = self.backoff(attempts)
+                    self.db_manager.retry_outbox(row['id'], attempts, self.clock() + delay, str(e))
+                    logger.warning(f"Outbox {row['id']}: attempt {attempts} failed, retry in {delay:.0f}s: {e}")
+        else:
+            for row in rows:
+                self.db_manager.complete_outbox(row['id'])
+            self.sent += len(rows)
+            if len(rows) > 1:
+                self.digests += 1
+            logger.info("%s: %s notification(s) sent to admin %s", label, len(rows), chat_id)
+
+    async def drain(self) -> int:
+        """Отправляет все готовые к отправке уведомления, возвращает их число"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(rows):
+            async with semaphore:
+                await self._deliver(rows)
+
+        processed = 0
+        flushed = set()
+        try:
+            while True:
+                now = self.clock()
+                rows = self.db_manager.claim_outbox(now, limit=self.concurrency * 8,
+                                                    lease_seconds=self.lease_seconds)
+                if not rows:
+                    return processed
+                batches = self.plan(rows, now)
+                flushed.update(batch[0]['chat_id'] for batch in batches if len(batch) > 1)
+                await asyncio.gather(*(deliver(batch) for batch in batches))
+                processed += sum(len(batch) for batch in batches)
+        finally:
+            # Окно сводки закрывается, когда отправлено всё накопленное
+            for chat_id in flushed:
+                self._digest_at.pop(chat_id, None)
+
+    def next_wakeup(self) -> float:
+        """Сколько ждать до следующего прохода (опрос или ближайшая сводка)"""
+        if not self._digest_at:
+            return self.poll_interval
+        return max(0.0, min(self.poll_interval, min(self._digest_at.values()) - self.clock()))
+
+    async def run(self) -> None:
+        """Фоновая задача: рассылает outbox при записи и раз в poll_interval (повторы)"""
+        self._wakeup = asyncio.Event()
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.drain()
+            except Exception as e:
+                logger.error(f"Outbox dispatcher error: {e}")
+            self.rows_by_status = self.db_manager.get_outbox_stats()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.next_wakeup())
+            except asyncio.TimeoutError:
+                pass
+
+
+_dispatchers: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def start_outbox_dispatcher(db_manager, bot, config: Optional[dict] = None) -> asyncio.Task:
+    """Создаёт диспетчер для db_manager и запускает его фоновой задачей"""
+    booking = (config or {}).get('booking', {})
+    dispatcher = OutboxDispatcher(
+        db_manager, bot,
+        concurrency=booking.get('outbox_concurrency', DEFAULT_CONCURRENCY),
+        max_attempts=booking.get('outbox_max_attempts', DEFAULT_MAX_ATTEMPTS),
+        coalesce_window=booking.get('notify_coalesce_window', DEFAULT_COALESCE_WINDOW),
+        burst_threshold=booking.get('notify_burst_threshold', DEFAULT_BURST_THRESHOLD),
+    )
+    _dispatchers[db_manager] = dispatcher
+    return asyncio.create_task(dispatcher.run())
+
+
+def get_outbox_dispatcher(db_manager) -> Optional[OutboxDispatcher]:
+    """Диспетчер db_manager, если он запущен в этом процессе"""
+    return _dispatchers.get(db_manager)
+
+
+def wake_outbox(db_manager) -> None:
+    """Будит диспетчер db_manager (если запущен в этом процессе)"""
+    dispatcher = _dispatchers.get(db_manager)
+    if dispatcher is not None:
+        dispatcher.wake()
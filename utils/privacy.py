@@ -42,32 +42,67 @@ def mask_name(name: str) -> str:
     return " ".join(masked_words)
 
 
+def _mask_token(token: str) -> str:
+    """123456789:AAE...xyz -> 123456789:*** (в URL Bot API — bot123456789:***)"""
+    return token.split(':', 1)[0] + ":***"
+
+
+def _mask_phone_match(phone: str) -> str:
+    """+7 (999) 123-45-67 -> +7999***4567"""
+    digits = ''.join(char for char in phone if char.isdigit())
+    return ("+" if phone.startswith("+") else "") + digits[:4] + "***" + digits[-4:]
+
+
+def _mask_email(email: str) -> str:
+    return "***@" + email.split('@', 1)[1]
+
+
+# Правила маскировки: имя, шаблон, замена найденного фрагмента. Порядок
+# важен — при совпадении в одной позиции побеждает более раннее правило
+# (токен бота начинается с цифр и не должен маскироваться как телефон).
+REDACTION_RULES = (
+    ('token', r'(?:bot)?\d{6,12}:[A-Za-z0-9_-]{30,}', _mask_token),
+    ('phone', r'\+?[78][\s(-]{0,2}\d{3}[\s)-]{0,2}\d{3}[\s-]?\d{2}[\s-]?\d{2}(?!\d)', _mask_phone_match),
+    ('email', r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', _mask_email),
+)
+# Все шаблоны начинаются на границе слова: общая проверка перед альтернативой
+# отсекает большинство позиций одной проверкой вместо трёх
+RULE_BOUNDARY = r'(?<![\w+])'
+
+
+class Redactor:
+    """
+    Маскировка персональных данных за один проход: все шаблоны собраны в одно
+    регулярное выражение с именованными группами, замена выбирается по имени
+    сработавшей группы.
+    """
+
+    def __init__(self, rules=REDACTION_RULES):
+        alternatives = '|'.join(f'(?P<{name}>{pattern})' for name, pattern, _ in rules)
+        self.pattern = re.compile(f'{RULE_BOUNDARY}(?:{alternatives})')
+        self.replacements = {name: replace for name, _, replace in rules}
+
+    def _replace(self, match) -> str:
+        return self.replacements[match.lastgroup](match.group())
+
+    def redact(self, text: str) -> str:
+        if not text:
+            return text
+        return self.pattern.sub(self._replace, text)
+
+
+redactor = Redactor()
+
+
 def mask_personal_data(text: str) -> str:
     """
     Автоматически маскирует персональные данные в тексте
 
-    - Номера телефонов
+    - Токены ботов
+    - Номера телефонов (российские форматы)
     - Email адреса
-    - Потенциальные имена (капитализированные слова)
     """
-    if not text:
-        return text
-
-    # Маскируем телефоны (российские форматы)
-    text = re.sub(
-        r'(\+?[78][\d]{3})[\d]{3}([\d]{4})',
-        r'\1***\2',
-        text
-    )
-
-    # Маскируем email
-    text = re.sub(
-        r'([a-zA-Z0-9._%+-]+)@([a-zA-Z0-9.-]+\.[a-zA-Z]{2,})',
-        r'***@\2',
-        text
-    )
-
-    return text
+    return redactor.redact(text)
 
 
 def safe_log_order_creation(user_id: int, service_name: str, client_name: str,
@@ -0,0 +1,272 @@
+"""
+Журнал медленных SQL-запросов.
+
+Трассировка включается до открытия соединений (configure_query_tracer в
+main.py / admin_bot/main.py, или переменная окружения SQL_TRACE=1): тогда
+connect() открывает соединение с TracedConnection, курсоры которого
+замеряют execute/executemany/executescript и чтение результатов
+(fetchone/fetchmany/fetchall — для SELECT основная работа SQLite часто
+происходит именно при выборке строк). Без трассировки connect() — обычный
+sqlite3.connect, накладных расходов нет.
+
+Время агрегируется по «отпечатку» запроса: литералы заменены на ?,
+списки IN (?, ?, ...) свёрнуты, пробелы нормализованы. Запрос дольше
+slow_ms пишется в лог вместе с EXPLAIN QUERY PLAN (план считается один раз
+на отпечаток). Топ отпечатков по суммарному времени — QueryTracer.report()
+и команда /sql админ-бота.
+
+Настройки — config['sql_trace'] (enabled, slow_ms, explain),
+SQL_TRACE_SLOW_MS перекрывает порог.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLOW_MS = 50.0
+# Сколько отпечатков хранить (запросы с f-строками могут плодить новые)
+MAX_FINGERPRINTS = 2000
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+_EXPLAINABLE = ('select', 'insert', 'update', 'delete', 'replace', 'with')
+
+
+def fingerprint(sql: str) -> str:
+    """Нормализованный текст запроса без литералов"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _SPACE.sub(' ', sql).strip()
+    return _IN_LIST.sub('(?...)', sql)
+
+
+class QueryStats:
+    """Агрегат по одному отпечатку"""
+
+    __slots__ = ('fingerprint', 'count', 'total', 'max', 'slow', 'plan')
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.slow = 0
+        self.plan: Optional[List[str]] = None
+
+    def summary(self) -> dict:
+        return {
+            'fingerprint': self.fingerprint,
+            'count': self.count,
+            'total_ms': round(self.total * 1000, 3),
+            'avg_ms': round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+            'max_ms': round(self.max * 1000, 3),
+            'slow': self.slow,
+        }
+
+
+class QueryTracer:
+    """Агрегаты по отпечаткам запросов всех трассируемых соединений процесса"""
+
+    def __init__(self, enabled: bool = False, slow_ms: float = DEFAULT_SLOW_MS, explain: bool = True):
+        self.enabled = enabled
+        self.slow_seconds = slow_ms / 1000
+        self.explain = explain
+        self._stats: Dict[str, QueryStats] = {}
+        # Отпечатки по исходному тексту (regex на каждый запрос дороже словаря)
+        self._fingerprints: Dict[str, str] = {}
+        # Соединения FSM пишутся и из потоков
+        self._lock = threading.Lock()
+
+    def _entry(self, sql: str) -> QueryStats:
+        key = self._fingerprints.get(sql)
+        if key is None:
+            key = fingerprint(sql)
+            if len(self._fingerprints) < MAX_FINGERPRINTS:
+                self._fingerprints[sql] = key
+        stats = self._stats.get(key)
+        if stats is None:
+            if len(self._stats) >= MAX_FINGERPRINTS:
+                key = '<other>'
+                stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = QueryStats(key)
+        return stats
+
+    def record(self, conn, sql: str, params, elapsed: float, statement_elapsed: float,
+               counted: bool = True) -> None:
+        """
+        elapsed — время этого вызова (execute или fetch*), statement_elapsed —
+        всё время запроса на текущий момент; counted=False для чтения строк
+        уже учтённого запроса.
+        """
+        with self._lock:
+            stats = self._entry(sql)
+            if counted:
+                stats.count += 1
+            stats.total += elapsed
+            stats.max = max(stats.max, statement_elapsed)
+            # Медленным запрос считается один раз — когда время пересекло порог
+            slow = statement_elapsed >= self.slow_seconds and (
+                counted or statement_elapsed - elapsed < self.slow_seconds)
+            if slow:
+                stats.slow += 1
+        if slow:
+            if stats.plan is None and self.explain:
+                stats.plan = self.explain_plan(conn, sql, params)
+            plan = "\n    ".join(stats.plan or ()) or "-"
+            logger.warning(
+                f"Slow query {statement_elapsed * 1000:.1f} ms: {stats.fingerprint}\n"
+                f"  plan:\n    {plan}"
+            )
+
+    @staticmethod
+    def explain_plan(conn, sql: str, params) -> List[str]:
+        """EXPLAIN QUERY PLAN запроса (строки плана, отступ по вложенности)"""
+        # params=None — executemany/executescript, их не объясняем
+        if params is None or not sql.lstrip().lower().startswith(_EXPLAINABLE):
+            return []
+        cursor = sqlite3.Cursor(conn)
+        cursor.row_factory = None
+        try:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            rows = cursor.fetchall()
+        except sqlite3.Error as e:
+            return [f"(EXPLAIN failed: {e})"]
+        finally:
+            cursor.close()
+        depth = {0: 0}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, 0) + 1
+            lines.append("  " * (depth[node_id] - 1) + detail)
+        return lines
+
+    # --- отчёт -----------------------------------------------------------
+
+    def top(self, limit: int = 10) -> List[dict]:
+        """Отпечатки с наибольшим суммарным временем"""
+        with self._lock:
+            rows = [stats.summary() for stats in self._stats.values() if stats.count]
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)[:limit]
+
+    def report(self, limit: int = 10) -> str:
+        """Текст для админа: топ запросов по суммарному времени"""
+        if not self.enabled:
+            return "🐢 Трассировка SQL выключена (config sql_trace.enabled или SQL_TRACE=1)"
+        lines = [f"🐢 <b>SQL: топ-{limit} по суммарному времени</b> (порог {self.slow_seconds * 1000:.0f} мс)"]
+        for row in self.top(limit):
+            text = row['fingerprint']
+            if len(text) > 300:
+                text = text[:300] + '…'
+            text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+            lines.append(
+                f"\n<b>{row['total_ms']:.0f} мс</b> ×{row['count']}, "
+                f"avg {row['avg_ms']:.2f}, max {row['max_ms']:.1f}, медленных {row['slow']}\n"
+                f"<code>{text}</code>"
+            )
+        if len(lines) == 1:
+            lines.append("\nДанных пока нет")
+        return "\n".join(lines)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Курсор, замеряющий выполнение запросов и чтение их результатов"""
+
+    _trace_sql: Optional[str] = None
+    _trace_params = None
+    _trace_elapsed = 0.0
+
+    def _traced(self, sql: str, params, call, *args):
+        start = time.perf_counter()
+        try:
+            return call(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._trace_sql, self._trace_params, self._trace_elapsed = sql, params, elapsed
+            _tracer.record(self.connection, sql, params, elapsed, elapsed)
+
+    def execute(self, sql, parameters=()):
+        return self._traced(sql, parameters, super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._traced(sql, None, super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._traced(sql_script, None, super().executescript, sql_script)
+
+    def _fetch(self, call, *args):
+        if self._trace_sql is None:
+            return call(*args)
+        start = time.perf_counter()
+        try:
+            return call(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._trace_elapsed += elapsed
+            _tracer.record(self.connection, self._trace_sql, self._trace_params,
+                           elapsed, self._trace_elapsed, counted=False)
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+
+class TracedConnection(sqlite3.Connection):
+    """Соединение, все курсоры которого — TracedCursor"""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute* создают курсор в обход cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+_tracer = QueryTracer(enabled=bool(os.getenv('SQL_TRACE')))
+
+
+def configure_query_tracer(config: Optional[dict] = None) -> QueryTracer:
+    """
+    Включает трассировку по config['sql_trace'] и переменным окружения.
+    Действует на соединения, открытые после вызова.
+    """
+    settings = (config or {}).get('sql_trace', {})
+    slow_ms = os.getenv('SQL_TRACE_SLOW_MS') or settings.get('slow_ms', DEFAULT_SLOW_MS)
+    _tracer.enabled = bool(settings.get('enabled', False) or os.getenv('SQL_TRACE'))
+    _tracer.slow_seconds = float(slow_ms) / 1000
+    _tracer.explain = settings.get('explain', True)
+    return _tracer
+
+
+def get_query_tracer() -> QueryTracer:
+    return _tracer
+
+
+def connect(database: str, **kwargs) -> sqlite3.Connection:
+    """sqlite3.connect, при включённой трассировке — с TracedConnection"""
+    if _tracer.enabled:
+        kwargs.setdefault('factory', TracedConnection)
+    return sqlite3.connect(database, **kwargs)
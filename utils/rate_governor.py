@@ -0,0 +1,180 @@
+"""
+Ограничитель исходящих запросов к Telegram Bot API.
+
+RateGovernor подключается как request-middleware к сессии aiogram Bot
+(bot.session.middleware(governor)), поэтому через него проходят все
+вызовы: send_message из outbox, edit_text при навигации, рассылки.
+Один экземпляр можно подключить к нескольким ботам — тогда лимиты общие.
+
+Лимиты (token bucket, см. лимиты Telegram):
+- глобальный: ~30 запросов в секунду;
+- на чат: ~1 сообщение в секунду с небольшим запасом (burst);
+- на группу: ~20 сообщений в минуту (chat_id < 0).
+
+Ответ 429 (TelegramRetryAfter) не считается ошибкой: чат (или весь бот,
+если чата нет) ставится на паузу на retry_after секунд, и запрос
+автоматически повторяется.
+
+Метрики: queue_depth (сколько запросов сейчас ждут), throttled_seconds
+(суммарное время ожидания), retries (повторы после 429), rate_limited
+(все ответы 429), errors (прочие ошибки Bot API).
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GLOBAL_RATE = 30.0
+DEFAULT_CHAT_RATE = 1.0
+DEFAULT_CHAT_BURST = 5
+DEFAULT_GROUP_RATE = 20 / 60
+DEFAULT_GROUP_BURST = 3
+DEFAULT_MAX_RETRIES = 3
+# Сколько бакетов чатов держать в памяти (давно неактивные вытесняются)
+MAX_CHAT_BUCKETS = 10000
+
+
+class TokenBucket:
+    """
+    Token bucket с резервированием: токен можно «занять в долг», тогда
+    reserve() вернёт время ожидания. Порядок ожидающих сохраняется.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self.paused_until = 0.0
+
+    def reserve(self) -> float:
+        """Забирает один токен, возвращает время ожидания в секундах"""
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(wait, self.paused_until - now)
+
+    def pause(self, seconds: float) -> None:
+        """Запрещает запросы на seconds секунд (после 429)"""
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+
+class RateGovernor(BaseRequestMiddleware):
+    """Request-middleware aiogram с глобальным, чатовым и групповым лимитами"""
+
+    def __init__(self, global_rate: float = DEFAULT_GLOBAL_RATE,
+                 chat_rate: float = DEFAULT_CHAT_RATE, chat_burst: int = DEFAULT_CHAT_BURST,
+                 group_rate: float = DEFAULT_GROUP_RATE, group_burst: int = DEFAULT_GROUP_BURST,
+                 max_retries: int = DEFAULT_MAX_RETRIES, clock=time.monotonic, sleep=asyncio.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate, max(1.0, global_rate), clock)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self._chat_buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        # Метрики
+        self.queue_depth = 0
+        self.throttled_seconds = 0.0
+        self.retries = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.errors = 0
+
+    def chat_bucket(self, chat_id) -> TokenBucket:
+        """Бакет чата (для групп — групповой лимит)"""
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            if is_group:
+                bucket = TokenBucket(self.group_rate, self.group_burst, self.clock)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst, self.clock)
+            self._chat_buckets[chat_id] = bucket
+            if len(self._chat_buckets) > MAX_CHAT_BUCKETS:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def _wait(self, bucket: TokenBucket) -> None:
+        delay = bucket.reserve()
+        if delay > 0:
+            self.throttled_seconds += delay
+            await self.sleep(delay)
+
+    async def acquire(self, chat_id=None) -> None:
+        """Ждёт разрешения на запрос (сначала лимит чата, затем глобальный)"""
+        self.queue_depth += 1
+        try:
+            if chat_id is not None:
+                await self._wait(self.chat_bucket(chat_id))
+            await self._wait(self.global_bucket)
+        finally:
+            self.queue_depth -= 1
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, 'chat_id', None)
+        attempt = 0
+        while True:
+            await self.acquire(chat_id)
+            self.requests += 1
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.rate_limited += 1
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.retries += 1
+                bucket = self.chat_bucket(chat_id) if chat_id is not None else self.global_bucket
+                bucket.pause(e.retry_after)
+                logger.warning(
+                    f"Telegram flood control on {type(method).__name__} (chat {chat_id}): "
+                    f"retry in {e.retry_after}s, attempt {attempt}/{self.max_retries}"
+                )
+            except TelegramAPIError:
+                self.errors += 1
+                raise
+
+    def stats(self) -> dict:
+        """Снимок метрик"""
+        return {
+            'queue_depth': self.queue_depth,
+            'throttled_seconds': round(self.throttled_seconds, 3),
+            'retries': self.retries,
+            'requests': self.requests,
+            'rate_limited': self.rate_limited,
+            'errors': self.errors,
+            'chat_buckets': len(self._chat_buckets),
+        }
+
+
+_governor: Optional[RateGovernor] = None
+
+
+def get_rate_governor(config: Optional[dict] = None) -> RateGovernor:
+    """
+    Общий RateGovernor процесса. Лимиты берутся из config['telegram_limits']
+    (global_rate, chat_rate, chat_burst, group_rate, group_burst, max_retries).
+    """
+    global _governor
+    if _governor is None:
+        limits = (config or {}).get('telegram_limits', {})
+        _governor = RateGovernor(**{
+            key: value for key, value in limits.items()
+            if key in ('global_rate', 'chat_rate', 'chat_burst', 'group_rate', 'group_burst', 'max_retries')
+        })
+    return _governor
@@ -0,0 +1,308 @@
+"""
+Напоминания клиентам о записи.
+
+ReminderScheduler хранит напоминания в таблице reminders и держит в памяти
+одну min-кучу (due_at, reminder_id) с единственным таймером — без отдельной
+задачи на каждое напоминание:
+- schedule_reminders / cancel_reminders — O(log n) на напоминание
+  (отмена ленивая: запись удаляется из словаря живых, а из кучи — при извлечении);
+- напоминания, срок которых наступил одновременно, отправляются пачкой;
+- отмена записи в БД (cancel_order) удаляет и её напоминания, поэтому
+  перед отправкой пачка сверяется с таблицей;
+- в многопроцессном режиме напоминания отправляет один процесс; записи
+  других процессов он подхватывает опросом таблицы (poll_interval, load_new),
+  а остальные воркеры только пишут в таблицу (persist_only, без кучи);
+- при перезапуске куча восстанавливается из таблицы (индекс idx_reminders_due),
+  а для записей без напоминаний они создаются по get_active_orders_for_reminders.
+
+Отправленные напоминания помечаются sent_at и не удаляются, поэтому после
+перезапуска не дублируются. Напоминание, срок которого уже прошёл к моменту
+записи (например, напоминание за 24 часа при записи на сегодня), сохраняется
+сразу как отправленное.
+
+Настройки (config['reminders']):
+- offsets_hours — за сколько часов до визита напоминать (по умолчанию [24, 2]);
+- enabled — выключатель (по умолчанию включено).
+Часовой пояс салона — booking.timezone или timezone_offset_hours.
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramNotFound, TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OFFSETS_HOURS = [24, 2]
+DEFAULT_CONCURRENCY = 8
+# Отправленные напоминания хранятся неделю после срока, затем удаляются
+PURGE_AFTER_SECONDS = 7 * 24 * 3600
+# Пауза перед повтором, если Telegram временно недоступен
+RETRY_DELAY_SECONDS = 60
+
+DEFAULT_REMINDER_TEXT = (
+    "⏰ <b>Напоминание о записи</b>\n\n"
+    "💇 {service}\n"
+    "📅 {date} в {time}\n\n"
+    "Ждём вас! Если планы изменились, отмените запись в разделе «📋 Мои записи»."
+)
+
+
+def get_timezone(config: dict):
+    """Часовой пояс салона: booking.timezone, иначе timezone_offset_hours, иначе локальный"""
+    name = config.get('booking', {}).get('timezone')
+    if name and ZoneInfo is not None:
+        try:
+            return ZoneInfo(name)
+        except Exception:
+            logger.warning(f"Unknown timezone '{name}', falling back to offset")
+    offset = config.get('timezone_offset_hours')
+    if offset is not None:
+        return timezone(timedelta(hours=offset))
+    return None
+
+
+def booking_timestamp(booking_date: str, booking_time: str, tz=None) -> Optional[float]:
+    """Unix-время начала визита (None, если дата/время не разбираются)"""
+    try:
+        start = datetime.fromisoformat(f"{booking_date}T{booking_time}")
+    except (TypeError, ValueError):
+        return None
+    if tz is not None:
+        start = start.replace(tzinfo=tz)
+    return start.timestamp()
+
+
+class ReminderScheduler:
+    """Планировщик напоминаний: таблица reminders + одна куча в памяти"""
+
+    def __init__(self, db_manager, bot, config: dict, concurrency: int = DEFAULT_CONCURRENCY,
+                 poll_interval: Optional[float] = None, clock=time.time, persist_only: bool = False):
+        self.db_manager = db_manager
+        self.bot = bot
+        self.config = config
+        self.concurrency = max(1, concurrency)
+        # Опрос таблицы на напоминания, созданные другими процессами (None — не нужен)
+        self.poll_interval = poll_interval
+        # Только запись в таблицу: run() не запускается, куча не ведётся
+        self.persist_only = persist_only
+        self.clock = clock
+        self.sent = 0
+        self.failed = 0
+        self._heap: List[Tuple[float, int]] = []
+        # reminder_id -> напоминание; чего нет в словаре, то отменено
+        self._live: Dict[int, dict] = {}
+        self._by_order: Dict[int, Set[int]] = {}
+        # Наибольший известный ID напоминания (для load_new)
+        self._max_id = 0
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def offsets(self) -> List[Tuple[str, float]]:
+        """Пары (kind, секунд до визита) из reminders.offsets_hours"""
+        hours = self.config.get('reminders', {}).get('offsets_hours', DEFAULT_OFFSETS_HOURS)
+        return [(f"{h}h", h * 3600) for h in hours]
+
+    def build_reminders(self, order: dict, now: float) -> List[dict]:
+        """Напоминания для записи; уже просроченные помечаются отправленными"""
+        starts_at = booking_timestamp(order.get('booking_date'), order.get('booking_time'),
+                                      get_timezone(self.config))
+        if starts_at is None or starts_at <= now:
+            return []
+        payload = {
+            'service_name': order.get('service_name'),
+            'booking_date': order['booking_date'],
+            'booking_time': order['booking_time'],
+            'starts_at': starts_at,
+        }
+        reminders = []
+        for kind, seconds in self.offsets():
+            due_at = starts_at - seconds
+            reminders.append({
+                'order_id': order['id'], 'user_id': order['user_id'], 'kind': kind,
+                'due_at': due_at, 'payload': payload,
+                'sent_at': now if due_at <= now else None,
+            })
+        return reminders
+
+    def wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _push(self, reminder: dict) -> None:
+        reminder_id = reminder['id']
+        self._max_id = max(self._max_id, reminder_id)
+        self._live[reminder_id] = reminder
+        self._by_order.setdefault(reminder['order_id'], set()).add(reminder_id)
+        heapq.heappush(self._heap, (reminder['due_at'], reminder_id))
+
+    def _forget_order(self, order_id: int) -> None:
+        for reminder_id in self._by_order.pop(order_id, ()):
+            self._live.pop(reminder_id, None)
+
+    def schedule_reminders(self, order_id: int, user_id: int = None, booking_date: str = None,
+                           booking_time: str = None, service_name: str = None, **_) -> int:
+        """Планирует напоминания по записи (заменяет прежние), возвращает их число"""
+        if not self.config.get('reminders', {}).get('enabled', True) or user_id is None:
+            return 0
+        order = {'id': order_id, 'user_id': user_id, 'booking_date': booking_date,
+                 'booking_time': booking_time, 'service_name': service_name}
+        reminders = self.build_reminders(order, self.clock())
+        if not reminders:
+            return 0
+        written = self.db_manager.add_reminders(reminders)
+        self._forget_order(order_id)
+        scheduled = 0
+        for reminder in reminders:
+            reminder_id = written.get((order_id, reminder['kind']))
+            if reminder_id is not None and reminder['sent_at'] is None:
+                if not self.persist_only:
+                    self._push(dict(reminder, id=reminder_id))
+                scheduled += 1
+        if not self.persist_only:
+            self.wake()
+        return scheduled
+
+    def cancel_reminders(self, order_id: int) -> None:
+        """Отменяет напоминания записи"""
+        self.db_manager.delete_order_reminders(order_id)
+        self._forget_order(order_id)
+
+    def rebuild(self) -> int:
+        """Восстанавливает кучу из БД после перезапуска, возвращает число напоминаний"""
+        now = self.clock()
+        self.db_manager.purge_reminders(now - PURGE_AFTER_SECONDS)
+        if self.config.get('reminders', {}).get('enabled', True):
+            missing = []
+            for order in self.db_manager.get_active_orders_for_reminders():
+                missing.extend(self.build_reminders(dict(order), now))
+            # Существующие (в т.ч. отправленные) напоминания не перезаписываются
+            if missing:
+                self.db_manager.add_reminders(missing, replace=False)
+
+        self._heap = []
+        self._live = {}
+        self._by_order = {}
+        for row in self.db_manager.get_pending_reminders():
+            reminder = dict(row)
+            self._live[reminder['id']] = reminder
+            self._by_order.setdefault(reminder['order_id'], set()).add(reminder['id'])
+            self._heap.append((reminder['due_at'], reminder['id']))
+            self._max_id = max(self._max_id, reminder['id'])
+        heapq.heapify(self._heap)
+        logger.info(f"Reminder scheduler: {len(self._live)} pending reminders")
+        return len(self._live)
+
+    def load_new(self) -> int:
+        """Добавляет в кучу напоминания, записанные в таблицу другими процессами"""
+        # Заменённые и отменённые там напоминания отсеются при отправке (dispatch)
+        rows = self.db_manager.get_pending_reminders(after_id=self._max_id)
+        for row in rows:
+            self._push(dict(row))
+        return len(rows)
+
+    def pop_due(self, now: float) -> List[dict]:
+        """Забирает из кучи все напоминания со сроком <= now"""
+        batch = []
+        while self._heap and self._heap[0][0] <= now:
+            _, reminder_id = heapq.heappop(self._heap)
+            reminder = self._live.pop(reminder_id, None)
+            if reminder is None:
+                continue  # отменено
+            ids = self._by_order.get(reminder['order_id'])
+            if ids is not None:
+                ids.discard(reminder_id)
+                if not ids:
+                    del self._by_order[reminder['order_id']]
+            batch.append(reminder)
+        return batch
+
+    def next_due(self) -> Optional[float]:
+        """Срок ближайшего живого напоминания"""
+        while self._heap and self._heap[0][1] not in self._live:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def render(self, reminder: dict) -> str:
+        payload = reminder['payload']
+        try:
+            date_formatted = datetime.fromisoformat(payload['booking_date']).strftime('%d.%m.%Y')
+        except (TypeError, ValueError):
+            date_formatted = payload.get('booking_date')
+        template = self.config.get('messages', {}).get('reminder', DEFAULT_REMINDER_TEXT)
+        return template.format(service=payload.get('service_name') or '', date=date_formatted,
+                               time=payload.get('booking_time'))
+
+    async def _send(self, reminder: dict) -> bool:
+        """True — напоминание обработано (отправлено или недоставляемо)"""
+        if reminder['payload'].get('starts_at', 0) <= self.clock():
+            # Визит уже начался (бот был выключен) — напоминать поздно
+            return True
+        try:
+            await self.bot.send_message(reminder['user_id'], self.render(reminder))
+        except (TelegramForbiddenError, TelegramNotFound) as e:
+            self.failed += 1
+            logger.warning(f"Reminder {reminder['id']} for order {reminder['order_id']} not delivered: {e}")
+            return True
+        except Exception as e:
+            delay = e.retry_after if isinstance(e, TelegramRetryAfter) else RETRY_DELAY_SECONDS
+            logger.warning(f"Reminder {reminder['id']} failed, retry in {delay}s: {e}")
+            self._push(dict(reminder, due_at=self.clock() + delay))
+            return False
+        self.sent += 1
+        return True
+
+    async def dispatch(self, batch: List[dict]) -> int:
+        """Отправляет пачку напоминаний и одной транзакцией помечает их отправленными"""
+        # Запись могли отменить в другом процессе (админ-бот) — такие пропускаем
+        pending = self.db_manager.get_unsent_reminder_ids(r['id'] for r in batch)
+        batch = [reminder for reminder in batch if reminder['id'] in pending]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(reminder):
+            async with semaphore:
+                return await self._send(reminder)
+
+        results = await asyncio.gather(*(send(reminder) for reminder in batch))
+        done = [reminder['id'] for reminder, ok in zip(batch, results) if ok]
+        if done:
+            self.db_manager.mark_reminders_sent(done, self.clock())
+        return len(done)
+
+    async def run(self) -> None:
+        """Фоновая задача: спит до ближайшего срока (или до нового напоминания)"""
+        self._wakeup = asyncio.Event()
+        self.rebuild()
+        while True:
+            self._wakeup.clear()
+            try:
+                batch = self.pop_due(self.clock())
+                if batch:
+                    await self.dispatch(batch)
+                    continue
+            except Exception as e:
+                logger.error(f"Reminder scheduler error: {e}")
+            next_due = self.next_due()
+            timeout = None if next_due is None else max(0.0, next_due - self.clock())
+            if self.poll_interval is not None:
+                timeout = self.poll_interval if timeout is None else min(timeout, self.poll_interval)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            if self.poll_interval is not None:
+                try:
+                    self.load_new()
+                except Exception as e:
+                    logger.error(f"Reminder scheduler error: {e}")
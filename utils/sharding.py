@@ -0,0 +1,181 @@
+"""
+Многопроцессный режим: обновления шардируются по user_id между воркерами.
+
+Фронт-процесс получает обновления (polling или webhook) и раскладывает
+их по N процессам-воркерам: воркер = user_id % N. Все обновления одного
+пользователя попадают в один процесс, поэтому его FSM-состояние и порядок
+обработки остаются локальными для воркера (общий SQLite-файл FSM не
+конфликтует), а разные пользователи обрабатываются на разных ядрах.
+
+- ShardedRunner запускает воркеры (multiprocessing, spawn) и передаёт им
+  «сырые» обновления через очереди; при остановке воркеры дообрабатывают
+  очередь.
+- consume_updates — цикл воркера: читает свою очередь и подаёт обновления
+  в Dispatcher (feed_raw_update).
+- poll_into / build_front_app — приём обновлений фронтом.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import queue as queue_module
+import secrets
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 10000
+# Сколько обновлений воркер забирает из очереди за раз
+RECEIVE_BATCH = 256
+
+
+def update_user_id(update: Dict[str, Any]) -> Optional[int]:
+    """ID пользователя из «сырого» обновления (from / user внутри события)"""
+    for field, event in update.items():
+        if field == 'update_id' or not isinstance(event, dict):
+            continue
+        user = event.get('from') or event.get('user')
+        if isinstance(user, dict) and 'id' in user:
+            return user['id']
+        chat = event.get('chat')
+        if isinstance(chat, dict) and 'id' in chat:
+            return chat['id']
+    return None
+
+
+def shard_for(update: Dict[str, Any], workers: int) -> int:
+    """Номер воркера для обновления (без пользователя — воркер 0)"""
+    user_id = update_user_id(update)
+    return user_id % workers if user_id is not None else 0
+
+
+def _worker_entry(target: Callable, index: int, workers: int, updates, args: Sequence) -> None:
+    try:
+        asyncio.run(target(index, workers, updates, *args))
+    except KeyboardInterrupt:
+        pass
+
+
+class ShardedRunner:
+    """Пул процессов-воркеров с очередью обновлений у каждого"""
+
+    def __init__(self, target: Callable, workers: int, args: Sequence = (),
+                 queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.target = target
+        self.workers = max(1, workers)
+        self.args = tuple(args)
+        self.queue_size = queue_size
+        self.queues: List[Any] = []
+        self.processes: List[multiprocessing.Process] = []
+        self.submitted = [0] * self.workers
+
+    def start(self) -> None:
+        context = multiprocessing.get_context('spawn')
+        self.queues = [context.Queue(self.queue_size) for _ in range(self.workers)]
+        self.processes = [
+            context.Process(target=_worker_entry, name=f"bot-worker-{index}",
+                            args=(self.target, index, self.workers, self.queues[index], self.args))
+            for index in range(self.workers)
+        ]
+        for process in self.processes:
+            process.start()
+        logger.info(f"🧩 Started {self.workers} update workers")
+
+    async def submit(self, update: Dict[str, Any]) -> int:
+        """Передаёт обновление воркеру его пользователя, возвращает номер воркера"""
+        index = shard_for(update, self.workers)
+        target = self.queues[index]
+        try:
+            target.put_nowait(update)
+        except queue_module.Full:
+            # Воркер не успевает — ждём места, не блокируя цикл событий
+            await asyncio.get_running_loop().run_in_executor(None, target.put, update)
+        self.submitted[index] += 1
+        return index
+
+    def alive(self) -> bool:
+        return all(process.is_alive() for process in self.processes)
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Просит воркеры дообработать очереди и завершиться"""
+        for target in self.queues:
+            target.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"{process.name} did not stop in {timeout}s, terminating")
+                process.terminate()
+                process.join()
+        logger.info("🛑 Update workers stopped")
+
+    def stats(self) -> dict:
+        depths = []
+        for target in self.queues:
+            try:
+                depths.append(target.qsize())
+            except NotImplementedError:  # macOS
+                depths.append(None)
+        return {'submitted': list(self.submitted), 'queue_depth': depths}
+
+
+async def consume_updates(updates, dispatcher: Dispatcher, bot: Bot, **data: Any) -> int:
+    """
+    Цикл воркера: подаёт обновления из очереди в диспетчер (каждое — отдельной
+    задачей, порядок по пользователю обеспечивает UserOrderingMiddleware).
+    Завершается по None, дождавшись обработки принятых. Возвращает их число.
+    """
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    processed = 0
+    running = True
+    while running:
+        batch = [await loop.run_in_executor(None, updates.get)]
+        while len(batch) < RECEIVE_BATCH:
+            try:
+                batch.append(updates.get_nowait())
+            except queue_module.Empty:
+                break
+        for update in batch:
+            if update is None:
+                running = False
+                break
+            task = asyncio.create_task(dispatcher.feed_raw_update(bot, update, **data))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            processed += 1
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return processed
+
+
+async def poll_into(runner: ShardedRunner, bot: Bot, allowed_updates: Optional[List[str]] = None,
+                    timeout: int = 30) -> None:
+    """Фронт в режиме polling: long-poll getUpdates и раздача воркерам"""
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=timeout, allowed_updates=allowed_updates)
+        except Exception as e:
+            logger.error(f"getUpdates failed: {e}")
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            offset = update.update_id + 1
+            await runner.submit(update.model_dump(mode='json', by_alias=True, exclude_none=True))
+
+
+def build_front_app(runner: ShardedRunner, path: str, secret_token: str) -> web.Application:
+    """Фронт в режиме webhook: принимает обновления и раздаёт воркерам"""
+
+    async def handle(request: web.Request) -> web.Response:
+        if not secrets.compare_digest(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), secret_token):
+            return web.Response(body="Unauthorized", status=401)
+        await runner.submit(await request.json())
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_post(path, handle)
+    return app
@@ -0,0 +1,426 @@
+"""
+SlotEngine — единый расчёт свободных слотов для записи.
+
+Все вычисления ведутся в целых минутах от начала суток:
+- рабочее время берётся из скомпилированного графика мастера
+  (schedule + closed_dates), а без мастера — из настроек бронирования;
+- длительность услуги и буфер между записями учитываются при проверке
+  пересечений;
+- занятость дня хранится битовой маской (1 бит = 1 минута).
+
+Результаты кэшируются по ключу (дата, мастер, услуга, версия данных),
+где версия данных = версия конфига + версия БД.
+"""
+
+import logging
+import weakref
+from array import array
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from utils.slot_holds import DEFAULT_HOLD_TTL_SECONDS, SlotHoldRegistry
+from utils.staff_manager import StaffManager
+
+logger = logging.getLogger(__name__)
+
+# Значения по умолчанию (совпадают с прежней логикой обработчиков)
+DEFAULT_WORK_HOURS = (9 * 60, 18 * 60)
+DEFAULT_SLOT_STEP = 30
+
+# Поиск ближайшего свободного времени
+DEFAULT_NEAREST_DAYS = 14
+DEFAULT_NEAREST_LIMIT = 8
+
+MINUTES_IN_DAY = 24 * 60
+
+
+def parse_hhmm(value: str) -> int:
+    """Переводит "HH:MM" в минуты от начала суток"""
+    hours, minutes = value.strip().split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def format_hhmm(minutes: int) -> str:
+    """Переводит минуты от начала суток в "HH:MM" """
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def as_date(value) -> date:
+    """Приводит строку ISO / datetime / date к date"""
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def interval_mask(start: int, length: int) -> int:
+    """Битовая маска интервала [start, start + length) в минутах"""
+    if length <= 0:
+        return 0
+    return ((1 << length) - 1) << start
+
+
+def compute_slots(work_intervals, busy_mask: int, duration: int, step: int,
+                  buffer: int = 0) -> array:
+    """
+    Рассчитывает начала свободных слотов.
+
+    Параметры:
+    - work_intervals: рабочие интервалы [(start, end), ...] в минутах
+    - busy_mask: битовая маска занятых минут
+    - duration: длительность услуги в минутах
+    - step: шаг сетки слотов в минутах
+    - buffer: буфер после услуги в минутах
+
+    Возвращает: array('H') с началами слотов в минутах
+    """
+    slots = array('H')
+    need = (1 << (duration + buffer)) - 1
+    for work_start, work_end in work_intervals:
+        for start in range(work_start, work_end - duration + 1, step):
+            if not (busy_mask >> start) & need:
+                slots.append(start)
+    return slots
+
+
+class SlotEngine:
+    """Единый источник свободных слотов для всех сценариев записи"""
+
+    def __init__(self, config: dict, db_manager, cache_size: int = 512):
+        self.config = config
+        self.db_manager = db_manager
+        self.staff_manager = StaffManager(config)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, array]" = OrderedDict()
+        self._schedule_cache: Dict[tuple, Tuple[Tuple[int, int], ...]] = {}
+        self._compiled_config_version = None
+        self.holds = SlotHoldRegistry(
+            db_manager, self._hold_ttl(),
+            occupied_minutes=lambda service_id: self.get_service_duration(service_id) + self.get_buffer(),
+        )
+        self.hits = 0
+        self.misses = 0
+
+    # === Версии данных ===
+
+    def _config_version(self):
+        return self.config.get('config_version', 0)
+
+    def _sync_config(self) -> None:
+        """Сбрасывает скомпилированные графики при смене версии конфига"""
+        version = self._config_version()
+        if version != self._compiled_config_version:
+            self.staff_manager.reload(self.config)
+            self._schedule_cache.clear()
+            self.holds.ttl_seconds = self._hold_ttl()
+            self._compiled_config_version = version
+
+    def data_version(self) -> tuple:
+        """Версия данных: (версия конфига, версия БД)"""
+        get_version = getattr(self.db_manager, 'get_data_version', None)
+        db_version = get_version() if get_version else 0
+        return (self._config_version(), db_version)
+
+    def invalidate(self) -> None:
+        """Полностью очищает кэш слотов"""
+        self._cache.clear()
+        self._schedule_cache.clear()
+        self._compiled_config_version = None
+
+    # === Настройки ===
+
+    def get_step(self) -> int:
+        """Шаг сетки слотов в минутах"""
+        booking = self.config.get('booking', {})
+        step = booking.get('slot_duration') or self.config.get('booking_settings', {}).get('time_slot_interval')
+        try:
+            step = int(step)
+        except (TypeError, ValueError):
+            step = DEFAULT_SLOT_STEP
+        return step if step > 0 else DEFAULT_SLOT_STEP
+
+    def get_buffer(self) -> int:
+        """Буфер между записями в минутах (booking.buffer_minutes)"""
+        try:
+            return max(0, int(self.config.get('booking', {}).get('buffer_minutes', 0) or 0))
+        except (TypeError, ValueError):
+            return 0
+
+    def _hold_ttl(self) -> int:
+        """Время удержания выбранного слота (booking.hold_ttl_seconds)"""
+        try:
+            return int(self.config.get('booking', {}).get('hold_ttl_seconds', DEFAULT_HOLD_TTL_SECONDS))
+        except (TypeError, ValueError):
+            return DEFAULT_HOLD_TTL_SECONDS
+
+    def get_service_duration(self, service_id: Optional[str]) -> int:
+        """Длительность услуги в минутах (по умолчанию — шаг сетки)"""
+        if service_id:
+            for service in self.config.get('services', []):
+                if service.get('id') == service_id:
+                    try:
+                        duration = int(service.get('duration') or 0)
+                    except (TypeError, ValueError):
+                        duration = 0
+                    if duration > 0:
+                        return duration
+                    break
+        return self.get_step()
+
+    # === Компиляция графика ===
+
+    def _default_hours(self, target_date: date) -> Tuple[int, int]:
+        """Рабочие часы салона без привязки к мастеру"""
+        work_hours = self.config.get('work_hours', {})
+        day_hours = work_hours.get(target_date.strftime('%A').lower()) if work_hours else None
+        if day_hours:
+            start_str, end_str = day_hours.split('-')
+            return parse_hhmm(start_str), parse_hhmm(end_str)
+
+        booking = self.config.get('booking', {})
+        if 'work_start' in booking and 'work_end' in booking:
+            return int(booking['work_start']) * 60, int(booking['work_end']) * 60
+
+        return DEFAULT_WORK_HOURS
+
+    def compile_day(self, target_date: date, master_id: Optional[str] = None) -> Tuple[Tuple[int, int], ...]:
+        """
+        Рабочие интервалы на дату в минутах.
+
+        Для мастера учитываются его schedule и closed_dates; если мастер
+        не найден в конфиге, используются общие часы работы.
+        """
+        self._sync_config()
+        key = (target_date, master_id)
+        compiled = self._schedule_cache.get(key)
+        if compiled is not None:
+            return compiled
+
+        master = self.staff_manager.get_master_by_id(master_id) if master_id else None
+        if master is not None:
+            hours = self.staff_manager.get_working_hours(master, target_date)
+            compiled = ((parse_hhmm(hours['start']), parse_hhmm(hours['end'])),) if hours else ()
+        else:
+            start, end = self._default_hours(target_date)
+            compiled = ((start, end),) if start < end else ()
+
+        self._schedule_cache[key] = compiled
+        return compiled
+
+    # === Занятость ===
+
+    def build_busy_mask(self, bookings: list, exclude_order_id: Optional[int] = None) -> int:
+        """Битовая маска занятых минут по списку записей дня"""
+        buffer = self.get_buffer()
+        mask = 0
+        for booking in bookings:
+            if exclude_order_id is not None and booking.get('id') == exclude_order_id:
+                continue
+            booking_time = booking.get('booking_time')
+            if not booking_time:
+                continue
+            try:
+                start = parse_hhmm(booking_time)
+            except ValueError:
+                continue
+            length = self.get_service_duration(booking.get('service_id')) + buffer
+            mask |= interval_mask(start, min(length, MINUTES_IN_DAY - start))
+        return mask
+
+    def get_busy_mask(self, target_date: date, master_id: Optional[str] = None,
+                      exclude_order_id: Optional[int] = None) -> int:
+        """Занятость мастера (или всего салона, если мастер не указан)"""
+        bookings = self.db_manager.get_day_bookings(target_date.isoformat(), master_id)
+        return self.build_busy_mask(bookings, exclude_order_id)
+
+    def get_hold_masks(self, target_date: date) -> Dict[str, int]:
+        """
+        Маски удержанных слотов на дату: {master_id или '': маска}.
+
+        Не кэшируются — удержания живут минуты и читаются из памяти.
+        """
+        by_master: Dict[str, list] = {}
+        for hold in self.holds.active_holds(target_date.isoformat()):
+            by_master.setdefault(hold['master_id'] or '', []).append(hold)
+        return {m: self.build_busy_mask(h) for m, h in by_master.items()}
+
+    def without_holds(self, slots, hold_mask: int, service_id: Optional[str]) -> array:
+        """Убирает из слотов пересекающиеся с удержаниями"""
+        if not hold_mask:
+            return slots
+        need = (1 << (self.get_service_duration(service_id) + self.get_buffer())) - 1
+        return array('H', (m for m in slots if not (hold_mask >> m) & need))
+
+    # === Публичный API ===
+
+    def _cached(self, key: tuple, factory):
+        """LRU-кэш результатов, ключ дополняется версией данных"""
+        key = key + (self.data_version(),)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        value = factory()
+        self._cache[key] = value
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return value
+
+    def get_free_minutes(self, target_date: date, master_id: Optional[str] = None,
+                         service_id: Optional[str] = None,
+                         exclude_order_id: Optional[int] = None) -> array:
+        """Свободные слоты в минутах от начала суток (с кэшированием)"""
+        def factory():
+            work_intervals = self.compile_day(target_date, master_id)
+            if not work_intervals:
+                return array('H')
+            busy_mask = self.get_busy_mask(target_date, master_id, exclude_order_id)
+            return compute_slots(
+                work_intervals, busy_mask,
+                duration=self.get_service_duration(service_id),
+                step=self.get_step(),
+                buffer=self.get_buffer(),
+            )
+
+        return self._cached((target_date, master_id, service_id, exclude_order_id), factory)
+
+    def get_day_occupancy(self, target_date: date,
+                          exclude_order_id: Optional[int] = None) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """
+        Занятость всех мастеров на дату одним запросом к БД.
+
+        Возвращает: ({master_id: битовая маска}, {master_id: число записей})
+        """
+        def factory():
+            by_master: Dict[str, list] = {}
+            for booking in self.db_manager.get_day_bookings(target_date.isoformat()):
+                if booking.get('master_id'):
+                    by_master.setdefault(booking['master_id'], []).append(booking)
+            masks = {m: self.build_busy_mask(b, exclude_order_id) for m, b in by_master.items()}
+            counts = {m: len(b) for m, b in by_master.items()}
+            return masks, counts
+
+        return self._cached(('occupancy', target_date, exclude_order_id), factory)
+
+    @staticmethod
+    def format_slots(slots: array, target_date: date, now: Optional[datetime] = None) -> List[str]:
+        """Форматирует минуты в "HH:MM", отбрасывая прошедшее время сегодня"""
+        now = now or datetime.now()
+        if target_date == now.date():
+            current = now.hour * 60 + now.minute
+            return [format_hhmm(m) for m in slots if m > current]
+        return [format_hhmm(m) for m in slots]
+
+    async def get_free_slots(self, target_date, master_id: Optional[str] = None,
+                             service_id: Optional[str] = None,
+                             exclude_order_id: Optional[int] = None,
+                             now: Optional[datetime] = None) -> List[str]:
+        """
+        Свободные слоты на дату в формате "HH:MM".
+
+        Для сегодняшней даты прошедшее время отбрасывается, удержанные
+        другими пользователями слоты скрываются.
+        """
+        target_date = as_date(target_date)
+        slots = self.get_free_minutes(target_date, master_id, service_id, exclude_order_id)
+
+        hold_masks = self.get_hold_masks(target_date)
+        if hold_masks:
+            if master_id:
+                hold_mask = hold_masks.get(master_id, 0)
+            else:
+                hold_mask = 0
+                for mask in hold_masks.values():
+                    hold_mask |= mask
+            slots = self.without_holds(slots, hold_mask, service_id)
+
+        return self.format_slots(slots, target_date, now)
+
+    async def find_nearest_slots(self, service_id: Optional[str] = None,
+                                 master_ids: Optional[List[str]] = None,
+                                 days: Optional[int] = None,
+                                 limit: Optional[int] = None,
+                                 start_date: Optional[date] = None,
+                                 now: Optional[datetime] = None) -> List[Tuple[date, str]]:
+        """
+        K ближайших свободных слотов на горизонте N дней.
+
+        Параметры:
+        - master_ids: None — без мастера (общие часы салона),
+          [id] — конкретный мастер, [id, ...] — «любой свободный мастер»
+        - days: горизонт поиска (booking.nearest_search_days)
+        - limit: сколько слотов вернуть (booking.nearest_slots_limit)
+
+        Все записи горизонта читаются одним запросом, дни перебираются
+        по порядку до набора limit слотов.
+
+        Возвращает: [(date, "HH:MM"), ...] по возрастанию
+        """
+        booking = self.config.get('booking', {})
+        days = days or booking.get('nearest_search_days', DEFAULT_NEAREST_DAYS)
+        limit = limit or booking.get('nearest_slots_limit', DEFAULT_NEAREST_LIMIT)
+        now = now or datetime.now()
+        start_date = start_date or now.date()
+        end_date = start_date + timedelta(days=days)
+
+        single_master = master_ids[0] if master_ids and len(master_ids) == 1 else None
+        bookings_by_date: Dict[str, list] = {}
+        for booking_row in self.db_manager.get_bookings_between(
+            start_date.isoformat(), end_date.isoformat(), single_master
+        ):
+            bookings_by_date.setdefault(booking_row['booking_date'], []).append(booking_row)
+
+        duration = self.get_service_duration(service_id)
+        step = self.get_step()
+        buffer = self.get_buffer()
+
+        found: List[Tuple[date, str]] = []
+        for offset in range(days):
+            target_date = start_date + timedelta(days=offset)
+            day_bookings = bookings_by_date.get(target_date.isoformat(), [])
+            hold_masks = self.get_hold_masks(target_date)
+
+            if master_ids is None:
+                busy_mask = self.build_busy_mask(day_bookings)
+                for mask in hold_masks.values():
+                    busy_mask |= mask
+                minutes = compute_slots(self.compile_day(target_date), busy_mask, duration, step, buffer)
+            else:
+                union = set()
+                for master_id in master_ids:
+                    work_intervals = self.compile_day(target_date, master_id)
+                    if not work_intervals:
+                        continue
+                    master_bookings = [b for b in day_bookings if b.get('master_id') == master_id]
+                    busy_mask = self.build_busy_mask(master_bookings) | hold_masks.get(master_id, 0)
+                    union.update(compute_slots(work_intervals, busy_mask, duration, step, buffer))
+                minutes = sorted(union)
+
+            for slot in self.format_slots(minutes, target_date, now):
+                found.append((target_date, slot))
+                if len(found) >= limit:
+                    return found
+
+        return found
+
+
+_engines: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def get_slot_engine(config: dict, db_manager) -> SlotEngine:
+    """Возвращает общий SlotEngine для пары (config, db_manager)"""
+    engine = _engines.get(db_manager)
+    if engine is None or engine.config is not config:
+        engine = SlotEngine(config, db_manager)
+        _engines[db_manager] = engine
+    return engine
+
+
+def find_slot_engine(db_manager) -> Optional[SlotEngine]:
+    """SlotEngine db_manager, если он уже создан (без создания нового)"""
+    return _engines.get(db_manager)
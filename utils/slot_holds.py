@@ -0,0 +1,202 @@
+"""
+Временные удержания слотов (slot holds).
+
+После выбора времени слот удерживается за пользователем на
+booking.hold_ttl_seconds (по умолчанию 10 минут), пока он вводит имя,
+телефон и комментарий. Другие пользователи не видят удержанный слот в
+сетке времени, поэтому на шаге подтверждения конфликтов почти не бывает.
+
+Конфликт проверяется по интервалу: удержание занимает [время, время +
+длительность услуги) у мастера, и новое удержание, пересекающееся с чужим,
+отклоняется — даже если выбранное время взято из сетки, построенной до
+чужого удержания.
+
+Удержания хранятся в памяти процесса и дублируются в таблицу slot_holds,
+чтобы их видели другие процессы (например, второй воркер). Истечение
+обрабатывает одна фоновая задача с min-heap по времени истечения —
+без отдельной задачи на каждое удержание.
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOLD_TTL_SECONDS = 600
+
+# Ключ удержания: (дата YYYY-MM-DD, время HH:MM, master_id или '')
+HoldKey = Tuple[str, str, str]
+
+
+def _minutes(hhmm: str) -> int:
+    hours, minutes = hhmm.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+class SlotHoldRegistry:
+    """Реестр удержаний слотов с истечением по таймеру"""
+
+    def __init__(self, db_manager=None, ttl_seconds: int = DEFAULT_HOLD_TTL_SECONDS, clock=time.time,
+                 occupied_minutes: Optional[Callable[[Optional[str]], int]] = None):
+        """
+        Args:
+            occupied_minutes: Сколько минут занимает удержание услуги
+                (по умолчанию 1 — конфликтует только то же время)
+        """
+        self.db_manager = db_manager
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.occupied_minutes = occupied_minutes or (lambda service_id: 1)
+        # Собственные удержания процесса: key -> {'user_id', 'service_id', 'expires_at'}
+        self._holds: Dict[HoldKey, dict] = {}
+        self._by_user: Dict[int, HoldKey] = {}
+        # Удержания других процессов (снимок таблицы slot_holds)
+        self._remote: Dict[HoldKey, dict] = {}
+        self._remote_version = None
+        # Min-heap (expires_at, key) для таймера истечения
+        self._heap: List[Tuple[float, HoldKey]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    # === Удержание / освобождение ===
+
+    def hold(self, booking_date: str, booking_time: str, master_id: Optional[str],
+             user_id: int, service_id: Optional[str] = None) -> bool:
+        """
+        Удерживает слот за пользователем (предыдущее удержание снимается).
+
+        Возвращает False, если интервал услуги пересекается с удержанием
+        другого пользователя у того же мастера.
+        """
+        now = self.clock()
+        key = (booking_date, booking_time, master_id or '')
+
+        if self._conflicts(key, user_id, service_id, now):
+            return False
+
+        expires_at = now + self.ttl_seconds
+        if self.db_manager is not None and not self.db_manager.upsert_slot_hold(
+            booking_date, booking_time, master_id or '', user_id, service_id, expires_at, now
+        ):
+            return False
+
+        previous = self._by_user.get(user_id)
+        if previous and previous != key:
+            self._drop(previous)
+            if self.db_manager is not None:
+                self.db_manager.delete_slot_hold(*previous)
+
+        self._holds[key] = {'user_id': user_id, 'service_id': service_id, 'expires_at': expires_at}
+        self._by_user[user_id] = key
+        self._remote.pop(key, None)
+        heapq.heappush(self._heap, (expires_at, key))
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def release(self, user_id: int) -> None:
+        """Снимает удержание пользователя (если есть)"""
+        key = self._by_user.get(user_id)
+        if not key:
+            return
+        self._drop(key)
+        if self.db_manager is not None:
+            self.db_manager.delete_slot_hold(*key)
+
+    def _drop(self, key: HoldKey) -> None:
+        hold = self._holds.pop(key, None)
+        if hold and self._by_user.get(hold['user_id']) == key:
+            del self._by_user[hold['user_id']]
+
+    # === Чтение ===
+
+    def _refresh_remote(self, now: float) -> None:
+        """Перечитывает таблицу slot_holds, если её меняли другие соединения"""
+        if self.db_manager is None:
+            return
+        version = self.db_manager.get_hold_version()
+        if version == self._remote_version:
+            return
+        self._remote_version = version
+        self._remote = {
+            (row['booking_date'], row['booking_time'], row['master_key']): {
+                'user_id': row['user_id'],
+                'service_id': row['service_id'],
+                'expires_at': row['expires_at'],
+            }
+            for row in self.db_manager.get_slot_holds(now)
+            if (row['booking_date'], row['booking_time'], row['master_key']) not in self._holds
+        }
+
+    def _conflicts(self, key: HoldKey, user_id: int, service_id: Optional[str], now: float) -> bool:
+        """Пересекается ли [время, время + длительность) с чужими удержаниями мастера на дату"""
+        self._refresh_remote(now)
+        booking_date, booking_time, master_key = key
+        start = _minutes(booking_time)
+        end = start + self.occupied_minutes(service_id)
+        for source in (self._holds, self._remote):
+            for (hold_date, hold_time, hold_master), hold in source.items():
+                if (hold_date != booking_date or hold_master != master_key
+                        or hold['user_id'] == user_id or hold['expires_at'] <= now):
+                    continue
+                hold_start = _minutes(hold_time)
+                if hold_start < end and start < hold_start + self.occupied_minutes(hold['service_id']):
+                    return True
+        return False
+
+    def active_holds(self, booking_date: str, exclude_user_id: Optional[int] = None) -> List[dict]:
+        """
+        Действующие удержания на дату.
+
+        Возвращает: [{'booking_time', 'master_id', 'service_id', 'user_id'}, ...]
+        """
+        now = self.clock()
+        self._refresh_remote(now)
+        result = []
+        for source in (self._holds, self._remote):
+            for (hold_date, hold_time, master_key), hold in source.items():
+                if hold_date != booking_date or hold['expires_at'] <= now:
+                    continue
+                if exclude_user_id is not None and hold['user_id'] == exclude_user_id:
+                    continue
+                result.append({
+                    'booking_time': hold_time,
+                    'master_id': master_key or None,
+                    'service_id': hold['service_id'],
+                    'user_id': hold['user_id'],
+                })
+        return result
+
+    def __len__(self) -> int:
+        return len(self._holds)
+
+    # === Истечение ===
+
+    def expire(self) -> int:
+        """Снимает все истёкшие удержания, возвращает их число"""
+        now = self.clock()
+        expired = 0
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._heap)
+            hold = self._holds.get(key)
+            # Запись в куче могла устареть (удержание продлено или снято)
+            if hold and hold['expires_at'] == expires_at:
+                self._drop(key)
+                expired += 1
+        if expired and self.db_manager is not None:
+            self.db_manager.delete_slot_holds(expired_before=now)
+        return expired
+
+    async def run(self) -> None:
+        """Фоновая задача: спит до ближайшего истечения и снимает удержания"""
+        self._wakeup = asyncio.Event()
+        while True:
+            self.expire()
+            timeout = self._heap[0][0] - self.clock() if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
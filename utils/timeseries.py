@@ -0,0 +1,204 @@
+"""
+Временные ряды метрик бота: минутные точки с автоматическим сведением
+в часовые и дневные.
+
+Хранилище — таблица metric_series в БД записей: на каждое разрешение
+(минута, час, день) кольцевой буфер фиксированного размера, слот точки —
+(начало интервала // разрешение) % ёмкость. Новый интервал перезаписывает
+слот, поэтому таблица не растёт.
+
+TimeSeriesRecorder раз в минуту читает счётчики процесса (записи, отмены,
+обновления, ошибки) и процентили задержки обновлений за минуту, сводит их
+в памяти сразу во все три разрешения и раз в flush_minutes пишет пачкой
+(UPSERT складывает точки нескольких процессов). Счётчики хранятся как
+приращения за интервал, показатели (задержки) — как сумма/число/min/max
+минутных значений.
+
+Отчёт «тренд» (команда /trend админ-бота) читает готовые точки и не
+обращается к таблице записей. Настройки — config['timeseries']
+(enabled, flush_minutes).
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MINUTE, HOUR, DAY = 60, 3600, 86400
+# Разрешение (секунды) -> ёмкость кольца: 2 суток минут, 90 суток часов, 2 года дней
+RESOLUTIONS = {MINUTE: 2 * 24 * 60, HOUR: 90 * 24, DAY: 2 * 365}
+DEFAULT_FLUSH_MINUTES = 5
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+# Ряды стандартного набора и их вид
+SERIES = {
+    'bookings': COUNTER,
+    'cancellations': COUNTER,
+    'updates': COUNTER,
+    'errors': COUNTER,
+    'update_p50_ms': GAUGE,
+    'update_p95_ms': GAUGE,
+    'update_p99_ms': GAUGE,
+}
+
+
+class TimeSeriesRecorder:
+    """Минутные точки метрик процесса с записью пачками"""
+
+    def __init__(self, db_manager, flush_minutes: int = DEFAULT_FLUSH_MINUTES,
+                 interval: float = MINUTE, clock=time.time):
+        self.db_manager = db_manager
+        self.flush_minutes = max(1, flush_minutes)
+        self.interval = interval
+        self.clock = clock
+        self._counters: List[Callable[[], Dict[str, float]]] = []
+        self._gauges: List[Callable[[], Dict[str, float]]] = []
+        self._last: Dict[str, float] = {}
+        # (разрешение, имя, начало интервала) -> [count, total, min, max]
+        self._pending: Dict[Tuple[int, str, int], list] = {}
+        self._samples = 0
+
+    def counters(self, read: Callable[[], Dict[str, float]]) -> None:
+        """read() — накопленные значения счётчиков; в ряд идут приращения"""
+        self._counters.append(read)
+        self._last.update(read())
+
+    def gauges(self, read: Callable[[], Dict[str, float]]) -> None:
+        """read() — значения показателей за прошедшую минуту (пропущенные — нет данных)"""
+        self._gauges.append(read)
+
+    def _add(self, name: str, value: float, timestamp: float) -> None:
+        for resolution in RESOLUTIONS:
+            key = (resolution, name, int(timestamp // resolution) * resolution)
+            bucket = self._pending.get(key)
+            if bucket is None:
+                self._pending[key] = [1, value, value, value]
+            else:
+                bucket[0] += 1
+                bucket[1] += value
+                bucket[2] = min(bucket[2], value)
+                bucket[3] = max(bucket[3], value)
+
+    def sample(self, now: Optional[float] = None) -> None:
+        """Точка за минуту, закончившуюся в now"""
+        now = self.clock() if now is None else now
+        timestamp = now - self.interval / 2
+        for read in self._counters:
+            for name, value in read().items():
+                self._add(name, value - self._last.get(name, 0), timestamp)
+                self._last[name] = value
+        for read in self._gauges:
+            for name, value in read().items():
+                self._add(name, value, timestamp)
+        self._samples += 1
+
+    def rows(self) -> list:
+        """Накопленные интервалы в виде строк metric_series"""
+        return [
+            (resolution, name, (start // resolution) % RESOLUTIONS[resolution], start, *bucket)
+            for (resolution, name, start), bucket in self._pending.items()
+        ]
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        rows = self.rows()
+        self._pending = {}
+        self._samples = 0
+        self.db_manager.add_metric_samples(rows)
+
+    async def run(self) -> None:
+        """Фоновая задача: точка в конце каждой минуты, запись раз в flush_minutes"""
+        try:
+            while True:
+                await asyncio.sleep(self.interval - self.clock() % self.interval)
+                self.sample()
+                if self._samples >= self.flush_minutes:
+                    self.flush()
+        finally:
+            # Остановка процесса: недописанные точки не теряются
+            self.flush()
+
+
+class LatencyWindow:
+    """Процентили времени обновлений за интервал между вызовами"""
+
+    def __init__(self, stats):
+        self.stats = stats
+        self._snapshot = stats.wall.copy()
+
+    def __call__(self) -> Dict[str, float]:
+        current = self.stats.wall.copy()
+        window = current.since(self._snapshot)
+        self._snapshot = current
+        if not window.count:
+            return {}
+        return {f"update_p{q}_ms": window.percentile(q) / 1000 for q in (50, 95, 99)}
+
+
+def build_recorder(config: dict, db_manager, dispatchers, latency=None, governor=None) -> Optional[TimeSeriesRecorder]:
+    """Стандартный набор рядов процесса (None — ряды выключены в конфиге)"""
+    from middlewares import find_ordering_middleware
+
+    settings = config.get('timeseries', {})
+    if not settings.get('enabled', True):
+        return None
+    recorder = TimeSeriesRecorder(db_manager, settings.get('flush_minutes', DEFAULT_FLUSH_MINUTES))
+    orderings = [middleware for middleware in map(find_ordering_middleware, dispatchers) if middleware]
+
+    def counters() -> Dict[str, float]:
+        return {
+            'bookings': db_manager.bookings_added,
+            'cancellations': db_manager.bookings_cancelled,
+            'updates': sum(middleware.processed for middleware in orderings),
+            'errors': sum(middleware.failed for middleware in orderings) + (governor.errors if governor else 0),
+        }
+
+    recorder.counters(counters)
+    if latency is not None and latency.enabled:
+        recorder.gauges(LatencyWindow(latency.stats('update')))
+    return recorder
+
+
+# --- отчёт ---------------------------------------------------------------
+
+TREND_PERIODS = {
+    # период -> (разрешение, число интервалов, формат времени)
+    'hour': (HOUR, 24, '%d.%m %H:00'),
+    'day': (DAY, 30, '%d.%m'),
+}
+TREND_COLUMNS = (('bookings', '📅'), ('cancellations', '❌'), ('updates', '📨'),
+                 ('errors', '⚠️'), ('update_p95_ms', 'p95'))
+
+
+def trend_points(db_manager, period: str = 'hour', now: Optional[float] = None) -> List[Tuple[int, dict]]:
+    """Интервалы периода (новые сверху) со значениями рядов: сумма для счётчиков, среднее для показателей"""
+    resolution, intervals, _ = TREND_PERIODS[period]
+    now = time.time() if now is None else now
+    since = (int(now // resolution) - intervals + 1) * resolution
+    points: Dict[int, dict] = {}
+    for row in db_manager.get_metric_series([name for name, _ in TREND_COLUMNS], resolution, since):
+        value = row['total'] if SERIES.get(row['name']) == COUNTER else row['total'] / row['count']
+        points.setdefault(row['bucket_start'], {})[row['name']] = value
+    return sorted(points.items(), reverse=True)
+
+
+def trend_report(db_manager, period: str = 'hour', now: Optional[float] = None) -> str:
+    """Текст для админа: тренд по часам за сутки или по дням за месяц"""
+    _, intervals, time_format = TREND_PERIODS[period]
+    title = ("по часам за сутки" if period == 'hour' else f"по дням за {intervals} дней") + ", UTC"
+    lines = [f"📈 <b>Тренд {title}</b>", "<code>" + "время".ljust(12)
+             + "".join(label.rjust(7) for _, label in TREND_COLUMNS)]
+    for start, values in trend_points(db_manager, period, now):
+        cells = []
+        for name, _ in TREND_COLUMNS:
+            value = values.get(name)
+            cells.append(('-' if value is None else f"{value:.0f}").rjust(7))
+        lines.append(datetime.fromtimestamp(start, timezone.utc).strftime(time_format).ljust(12) + "".join(cells))
+    if len(lines) == 2:
+        return f"📈 <b>Тренд {title}</b>\n\nДанных пока нет"
+    return "\n".join(lines) + "</code>"
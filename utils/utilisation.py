@@ -0,0 +1,213 @@
+"""
+Загрузка мастеров: занятые минуты ÷ рабочие минуты по графику.
+
+Рабочее время каждого мастера на каждый день периода берётся из SlotEngine
+(schedule + closed_dates, без мастера — часы салона) и разворачивается в
+поминутную сетку «мастер·день × 1440 минут». Записи периода читаются одним
+запросом и накладываются на сетку пачкой, после чего за один проход
+считаются суммы по мастерам, дням недели и часам.
+
+С NumPy сетка — одна матрица: интервалы превращаются в разности (+1 в
+начале, -1 в конце) и разворачиваются cumsum по строкам, пересечение с
+записями — побитовое «и». Без NumPy каждая строка — bytearray: рабочие
+интервалы заполняются срезами, записи перекодируются bytes.translate, счёт
+— bytearray.count по часам; всё это выполняется в C, без цикла по минутам.
+
+Занятое время вне графика (запись после конца смены) в загрузку не входит
+и показывается отдельно. Отчёт — команда /utilisation админ-бота.
+"""
+
+import html
+import logging
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+from utils.analytics import period_range
+from utils.master_assignment import get_staff_list
+from utils.slot_engine import MINUTES_IN_DAY, get_slot_engine, parse_hhmm
+
+try:
+    import numpy as np
+except ImportError:  # без NumPy — построчные байтовые массивы
+    np = None
+
+logger = logging.getLogger(__name__)
+
+HOURS = 24
+WEEKDAYS = ("пн", "вт", "ср", "чт", "пт", "сб", "вс")
+# Периоды отчёта (ключи utils.analytics.PERIODS)
+UTILISATION_PERIODS = {'month': "30 дней", 'quarter': "90 дней", 'next': "ближайшие 30 дней"}
+
+# Состояние минуты в байтовой сетке
+OFF, FREE, BUSY, OUTSIDE = 0, 1, 2, 3
+# Наложение записи: вне графика -> OUTSIDE, свободная рабочая -> BUSY
+_BOOK = bytes.maketrans(bytes((OFF, FREE)), bytes((OUTSIDE, BUSY)))
+
+
+def _grid_numpy(rows: int, work: list, booked: list) -> Tuple[list, list, list]:
+    """Почасовые рабочие и занятые минуты строк и минуты записей вне графика"""
+
+    def cover(intervals):
+        diff = np.zeros((rows, MINUTES_IN_DAY + 1), dtype=np.int16)
+        if intervals:
+            row, start, end = np.array(intervals, dtype=np.intp).T
+            np.add.at(diff, (row, start), 1)
+            np.add.at(diff, (row, end), -1)
+        return np.cumsum(diff, axis=1, dtype=np.int16)[:, :MINUTES_IN_DAY] > 0
+
+    working, booking = cover(work), cover(booked)
+    busy = working & booking
+    hourly_work = working.reshape(rows, HOURS, 60).sum(axis=2)
+    hourly_busy = busy.reshape(rows, HOURS, 60).sum(axis=2)
+    outside = (booking & ~working).sum(axis=1)
+    return hourly_work.tolist(), hourly_busy.tolist(), outside.tolist()
+
+
+def _grid_bytes(rows: int, work: list, booked: list) -> Tuple[list, list, list]:
+    """То же на bytearray: срезы, translate и count вместо цикла по минутам"""
+    grid = [bytearray(MINUTES_IN_DAY) for _ in range(rows)]
+    for row, start, end in work:
+        grid[row][start:end] = bytes((FREE,)) * (end - start)
+    for row, start, end in booked:
+        grid[row][start:end] = grid[row][start:end].translate(_BOOK)
+    hourly_work, hourly_busy, outside = [], [], []
+    for line in grid:
+        busy = [line.count(BUSY, hour * 60, hour * 60 + 60) for hour in range(HOURS)]
+        hourly_busy.append(busy)
+        hourly_work.append([line.count(FREE, hour * 60, hour * 60 + 60) + busy[hour] for hour in range(HOURS)])
+        outside.append(line.count(OUTSIDE))
+    return hourly_work, hourly_busy, outside
+
+
+class UtilisationEngine:
+    """Загрузка мастеров за период по графикам SlotEngine и записям из БД"""
+
+    def __init__(self, config: dict, db_manager, backend: Optional[str] = None):
+        """
+        Args:
+            config: Конфигурация бота (staff, services, booking)
+            db_manager: Менеджер БД
+            backend: 'numpy' или 'bytes' (по умолчанию — NumPy, если установлен)
+        """
+        self.config = config
+        self.db_manager = db_manager
+        self.backend = backend or ('numpy' if np is not None else 'bytes')
+        if self.backend == 'numpy' and np is None:
+            raise RuntimeError("NumPy is not installed")
+
+    def _masters(self, engine) -> List[str]:
+        """Строки отчёта: мастера, а без персонала — салон целиком ('')"""
+        masters = get_staff_list(self.config) if engine.staff_manager.is_enabled() else []
+        return [master['id'] for master in masters] or ['']
+
+    def compute(self, start: date, end: date) -> dict:
+        """
+        Загрузка за дни start..end включительно.
+
+        Returns:
+            {'masters': {id: [рабочие, занятые]}, 'weekdays': 7 × [рабочие, занятые],
+             'hours': 24 × [...], 'master_weekdays': {id: 7 × [...]},
+             'outside': минут записей вне графика, 'unassigned': минут записей без мастера}
+        """
+        engine = get_slot_engine(self.config, self.db_manager)
+        masters = self._masters(engine)
+        index = {master_id: position for position, master_id in enumerate(masters)}
+        days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+        # Развёртка графиков: строка = мастер × день
+        work = []
+        for position, master_id in enumerate(masters):
+            for offset, day in enumerate(days):
+                row = position * len(days) + offset
+                for interval_start, interval_end in engine.compile_day(day, master_id or None):
+                    work.append((row, interval_start, min(interval_end, MINUTES_IN_DAY)))
+
+        # Записи периода одним запросом
+        booked, unassigned = [], 0
+        salon = masters == ['']
+        durations = {}
+        bookings = self.db_manager.get_bookings_between(start.isoformat(), (end + timedelta(days=1)).isoformat())
+        for booking in bookings:
+            service_id = booking['service_id']
+            if service_id not in durations:
+                durations[service_id] = engine.get_service_duration(service_id)
+            booking_start = parse_hhmm(booking['booking_time'])
+            booking_end = min(booking_start + durations[service_id], MINUTES_IN_DAY)
+            position = 0 if salon else index.get(booking['master_id'])
+            if position is None:
+                unassigned += booking_end - booking_start
+                continue
+            offset = (date.fromisoformat(booking['booking_date']) - start).days
+            booked.append((position * len(days) + offset, booking_start, booking_end))
+
+        grid = _grid_numpy if self.backend == 'numpy' else _grid_bytes
+        hourly_work, hourly_busy, outside = grid(len(masters) * len(days), work, booked)
+
+        # Один проход по строкам: мастера, дни недели, часы
+        report = {
+            'masters': {master_id: [0, 0] for master_id in masters},
+            'weekdays': [[0, 0] for _ in WEEKDAYS],
+            'hours': [[sum(worked), sum(busy)] for worked, busy in zip(zip(*hourly_work), zip(*hourly_busy))],
+            'master_weekdays': {master_id: [[0, 0] for _ in WEEKDAYS] for master_id in masters},
+            'outside': sum(outside),
+            'unassigned': unassigned,
+        }
+        weekdays = [day.weekday() for day in days]
+        for row, (work_hours, busy_hours) in enumerate(zip(hourly_work, hourly_busy)):
+            worked = sum(work_hours)
+            if not worked:
+                continue
+            busy = sum(busy_hours)
+            master_id = masters[row // len(days)]
+            weekday = weekdays[row % len(days)]
+            for totals in (report['masters'][master_id], report['weekdays'][weekday],
+                           report['master_weekdays'][master_id][weekday]):
+                totals[0] += worked
+                totals[1] += busy
+        return report
+
+
+def _percent(totals) -> str:
+    worked, busy = totals
+    return f"{busy * 100 // worked}%" if worked else "-"
+
+
+def utilisation_report(config: dict, db_manager, period: str = 'month', today: Optional[date] = None) -> str:
+    """Текст для админа: загрузка по мастерам, дням недели и часам"""
+    if period not in UTILISATION_PERIODS:
+        period = 'month'
+    first, last = (date.fromisoformat(day) for day in period_range(period, today))
+    report = UtilisationEngine(config, db_manager).compute(first, last)
+    title = (f"⏱ <b>Загрузка мастеров: {UTILISATION_PERIODS[period]}</b> "
+             f"({first.strftime('%d.%m')}–{last.strftime('%d.%m.%Y')})")
+
+    total = [sum(values[0] for values in report['masters'].values()),
+             sum(values[1] for values in report['masters'].values())]
+    if not total[0]:
+        return f"{title}\n\nПо графику нет рабочего времени"
+    names = {master['id']: master.get('name') or master['id'] for master in get_staff_list(config)}
+    names[''] = "Салон"
+
+    lines = [title, f"Всего: {_percent(total)} ({total[1] // 60} из {total[0] // 60} ч)", "<code>"
+             + "".ljust(12) + "загр.".rjust(6) + "занято".rjust(8) + "график".rjust(8)]
+    for master_id, values in sorted(report['masters'].items(), key=lambda item: -item[1][1]):
+        lines.append(html.escape(names.get(master_id, master_id)[:12].ljust(12)) + _percent(values).rjust(6)
+                     + f"{values[1] // 60}ч".rjust(8) + f"{values[0] // 60}ч".rjust(8))
+    lines.append("")
+    lines.append(" ".join(f"{name} {_percent(values)}" for name, values in zip(WEEKDAYS, report['weekdays'])
+                          if values[0]))
+    lines.append("")
+    for hour, values in enumerate(report['hours']):
+        if values[0]:
+            share = values[1] / values[0]
+            lines.append(f"{hour:02d}:00 " + "▇" * round(share * 10) + "·" * (10 - round(share * 10))
+                         + f" {_percent(values)}")
+    lines.append("</code>")
+    extra = []
+    if report['outside']:
+        extra.append(f"вне графика {report['outside'] / 60:.1f} ч")
+    if report['unassigned']:
+        extra.append(f"без мастера {report['unassigned'] / 60:.1f} ч")
+    if extra:
+        lines.append("Не учтено: " + ", ".join(extra))
+    return "\n".join(lines)
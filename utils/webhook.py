@@ -0,0 +1,204 @@
+"""
+Режим webhook: приём обновлений Telegram встроенным aiohttp-сервером.
+
+Один WebhookServer обслуживает несколько ботов (клиентский и админ-бот)
+в одном aiohttp-приложении: у каждого бота свой путь /webhook/<name>
+и свой secret token (заголовок X-Telegram-Bot-Api-Secret-Token).
+
+- Telegram получает ответ сразу, обновление обрабатывается в фоне;
+  число одновременно обрабатываемых обновлений ограничено общим
+  семафором (webhook.concurrency).
+- При остановке сервер перестаёт принимать запросы и ждёт завершения
+  уже принятых обновлений не дольше webhook.drain_timeout секунд.
+
+Настройки — config['webhook'] (base_url, host, port, path_prefix,
+secret_token, concurrency, drain_timeout), переменные окружения
+WEBHOOK_BASE_URL, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_SECRET их перекрывают.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "0.0.0.0"
+DEFAULT_PORT = 8080
+DEFAULT_PATH_PREFIX = "/webhook"
+DEFAULT_CONCURRENCY = 64
+DEFAULT_DRAIN_TIMEOUT = 10.0
+
+
+def webhook_settings(config: dict) -> dict:
+    """Настройки webhook из config['webhook'] с учётом переменных окружения"""
+    settings = dict(config.get('webhook', {}))
+    env = {
+        'base_url': os.getenv('WEBHOOK_BASE_URL'),
+        'host': os.getenv('WEBHOOK_HOST'),
+        'port': os.getenv('WEBHOOK_PORT'),
+        'secret_token': os.getenv('WEBHOOK_SECRET'),
+    }
+    settings.update({key: value for key, value in env.items() if value})
+    settings['port'] = int(settings.get('port', DEFAULT_PORT))
+    return settings
+
+
+def derive_secret(bot: Bot, secret: Optional[str] = None) -> str:
+    """
+    Secret token бота: хэш общего секрета (если задан) и токена бота —
+    у каждого бота свой. Telegram допускает только A-Z, a-z, 0-9, _ и -.
+    """
+    seed = f"{secret or ''}:{bot.token}".encode()
+    return hashlib.sha256(seed).hexdigest()
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """SimpleRequestHandler с общим лимитом параллельной обработки и ожиданием при остановке"""
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, semaphore: asyncio.Semaphore,
+                 secret_token: Optional[str] = None, **data: Any):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True,
+                         secret_token=secret_token, **data)
+        self.semaphore = semaphore
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self.verify_secret(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), self.bot):
+            self.rejected += 1
+            logger.warning(f"Webhook {request.path}: rejected request with a wrong secret token")
+            return web.Response(body="Unauthorized", status=401)
+        self.received += 1
+        return await super().handle(request)
+
+    __call__ = handle
+
+    async def _background_feed_update(self, bot: Bot, update: Dict[str, Any]) -> None:
+        async with self.semaphore:
+            try:
+                await super()._background_feed_update(bot, update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.exception(f"Webhook update {update.get('update_id')} failed: {e}")
+
+    async def drain(self, timeout: float) -> None:
+        """Ждёт обработки принятых обновлений, остальные отменяет по таймауту"""
+        tasks = set(self._background_feed_update_tasks)
+        if not tasks:
+            return
+        logger.info(f"Webhook: draining {len(tasks)} in-flight updates")
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Webhook: {len(pending)} updates cancelled after {timeout}s drain timeout")
+
+    async def close(self) -> None:
+        # Сессии ботов закрывает владелец (main), здесь только дожидаемся обработки
+        pass
+
+    def stats(self) -> dict:
+        return {
+            'received': self.received,
+            'processed': self.processed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'in_flight': self.in_flight,
+        }
+
+
+class WebhookServer:
+    """aiohttp-приложение, принимающее обновления нескольких ботов"""
+
+    def __init__(self, base_url: Optional[str] = None, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 path_prefix: str = DEFAULT_PATH_PREFIX, secret_token: Optional[str] = None,
+                 concurrency: int = DEFAULT_CONCURRENCY, drain_timeout: float = DEFAULT_DRAIN_TIMEOUT,
+                 **_):
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.host = host
+        self.port = port
+        self.path_prefix = path_prefix.rstrip('/')
+        self.secret_token = secret_token
+        self.drain_timeout = drain_timeout
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.app = web.Application()
+        self.app.on_shutdown.append(self._drain)
+        self.handlers: Dict[str, BoundedRequestHandler] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+    @classmethod
+    def from_config(cls, config: dict) -> "WebhookServer":
+        return cls(**webhook_settings(config))
+
+    def add_bot(self, name: str, dispatcher: Dispatcher, bot: Bot, **data: Any) -> str:
+        """Регистрирует бота, возвращает путь его webhook"""
+        path = f"{self.path_prefix}/{name}"
+        handler = BoundedRequestHandler(
+            dispatcher, bot, self.semaphore,
+            secret_token=derive_secret(bot, self.secret_token), **data
+        )
+        handler.register(self.app, path=path)
+        setup_application(self.app, dispatcher, bot=bot, **data)
+        self.handlers[name] = handler
+        return path
+
+    async def _drain(self, app: web.Application) -> None:
+        await asyncio.gather(*(handler.drain(self.drain_timeout) for handler in self.handlers.values()))
+
+    async def start(self) -> int:
+        """Запускает HTTP-сервер, возвращает фактический порт"""
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        sockets = getattr(site._server, 'sockets', None) or []
+        if sockets:
+            self.port = sockets[0].getsockname()[1]
+        logger.info(f"🌐 Webhook server listening on {self.host}:{self.port}")
+        return self.port
+
+    async def register_webhooks(self, drop_pending_updates: bool = False) -> None:
+        """Сообщает Telegram адреса webhook всех ботов (нужен base_url)"""
+        if not self.base_url:
+            raise ValueError("webhook.base_url (WEBHOOK_BASE_URL) is required to register webhooks")
+        for name, handler in self.handlers.items():
+            await handler.bot.set_webhook(
+                url=f"{self.base_url}{self.path_prefix}/{name}",
+                secret_token=handler.secret_token,
+                allowed_updates=handler.dispatcher.resolve_used_update_types(),
+                drop_pending_updates=drop_pending_updates,
+            )
+            logger.info(f"✅ Webhook for '{name}' set to {self.base_url}{self.path_prefix}/{name}")
+
+    async def stop(self) -> None:
+        """Останавливает приём и дожидается обработки принятых обновлений"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+            logger.info("🛑 Webhook server stopped")
+
+    async def serve_forever(self, register: bool = True) -> None:
+        await self.start()
+        try:
+            if register:
+                await self.register_webhooks()
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
+
+    def stats(self) -> Dict[str, dict]:
+        return {name: handler.stats() for name, handler in self.handlers.items()}
+